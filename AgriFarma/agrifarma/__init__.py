@@ -15,6 +15,34 @@ def create_app(config_object: str | object = "config.Config") -> Flask:
     app.config.from_object(config_object)
     # Defaults
     app.config.setdefault('LOW_INVENTORY_THRESHOLD', 5)
+    app.config.setdefault('IDEMPOTENCY_WINDOW_SECONDS', 24 * 60 * 60)
+    app.config.setdefault('MOCK_WEBHOOK_SECRET', '')
+    app.config.setdefault('FORUM_POSTS_PER_PAGE', 25)
+    app.config.setdefault('FORUM_STREAM_THREADS', False)
+    app.config.setdefault('LIKE_STATE_CACHE_TTL', 5)
+    app.config.setdefault('CATEGORY_TREE_TTL', 300)
+    app.config.setdefault('HOT_SCORE_HALF_LIFE_HOURS', 36)
+    app.config.setdefault('PUSH_ENABLED', False)
+    app.config.setdefault('PUSH_HEARTBEAT_SECONDS', 15)
+    app.config.setdefault('PUSH_MAX_CONNECTIONS', 200)
+    app.config.setdefault('PUSH_STREAM_MAX_SECONDS', 300)
+    app.config.setdefault('PUSH_QUEUE_SIZE', 100)
+    app.config.setdefault('RECOMMENDATIONS_PER_PRODUCT', 10)
+    app.config.setdefault('RECOMMENDATIONS_MAX_BASKET', 50)
+    app.config.setdefault('CATALOG_FACETS_TTL', 60)
+    app.config.setdefault('REVIEWS_PER_PAGE', 10)
+    app.config.setdefault('REPORT_TIMEZONE', 'UTC')
+    app.config.setdefault('COHORT_REPORT_WEEKS', 12)
+    app.config.setdefault('COHORT_REFRESH_SECONDS', 300)
+    app.config.setdefault('TRACKING_BUFFER_SIZE', 10000)
+    app.config.setdefault('TRACKING_BATCH_SIZE', 500)
+    app.config.setdefault('TRACKING_FLUSH_SECONDS', 5)
+    app.config.setdefault('FORECAST_HISTORY_DAYS', 90)
+    app.config.setdefault('FORECAST_ALPHA', 0.3)
+    app.config.setdefault('FORECAST_LEAD_TIME_DAYS', 7)
+    app.config.setdefault('FORECAST_SERVICE_Z', 1.65)
+    app.config.setdefault('CATALOG_IMPORT_CHUNK_SIZE', 500)
+    app.config.setdefault('CATALOG_IMPORT_REPORT_LIMIT', 1000)
     
     # Enable error propagation in debug mode (kept True for clearer traces)
     app.config['PROPAGATE_EXCEPTIONS'] = True
@@ -41,6 +69,16 @@ def create_app(config_object: str | object = "config.Config") -> Flask:
             from agrifarma.models import likes as _likes_models  # noqa: F401
             from agrifarma.models import forum as _forum_models  # noqa: F401
             from agrifarma.models import message as _message_models  # noqa: F401
+            from agrifarma.models import idempotency as _idempotency_models  # noqa: F401
+            from agrifarma.models import webhook as _webhook_models  # noqa: F401
+            from agrifarma.models import ranking as _ranking_models  # noqa: F401
+            from agrifarma.models import recommendation as _recommendation_models  # noqa: F401
+            from agrifarma.models import cohort as _cohort_models  # noqa: F401
+            from agrifarma.models import tracking as _tracking_models  # noqa: F401
+            from agrifarma.models import sketch as _sketch_models  # noqa: F401
+            from agrifarma.models import seller as _seller_models  # noqa: F401
+            from agrifarma.models import forecast as _forecast_models  # noqa: F401
+            from agrifarma.models import product_import as _product_import_models  # noqa: F401
         except Exception:
             # Best-effort import; blueprints may import models as well
             pass
@@ -66,6 +104,16 @@ def register_extensions(app: Flask) -> None:
         from agrifarma.models import password_reset as _password_reset_models  # noqa: F401
         from agrifarma.models import likes as _likes_models  # noqa: F401
         from agrifarma.models import message as _message_models  # noqa: F401
+        from agrifarma.models import idempotency as _idempotency_models  # noqa: F401
+        from agrifarma.models import webhook as _webhook_models  # noqa: F401
+        from agrifarma.models import ranking as _ranking_models  # noqa: F401
+        from agrifarma.models import recommendation as _recommendation_models  # noqa: F401
+        from agrifarma.models import cohort as _cohort_models  # noqa: F401
+        from agrifarma.models import tracking as _tracking_models  # noqa: F401
+        from agrifarma.models import sketch as _sketch_models  # noqa: F401
+        from agrifarma.models import seller as _seller_models  # noqa: F401
+        from agrifarma.models import forecast as _forecast_models  # noqa: F401
+        from agrifarma.models import product_import as _product_import_models  # noqa: F401
         migrate.init_app(app, db)
 
     # Provide a default upload destination if not set (e.g. in tests)
@@ -153,6 +201,18 @@ def register_blueprints(app: Flask) -> None:
         app.register_blueprint(api_bp)
     except Exception:
         pass
+    # payment webhooks blueprint
+    try:
+        from .routes.webhooks import bp as webhooks_bp
+        app.register_blueprint(webhooks_bp)
+    except Exception:
+        pass
+    # server-sent event push stream
+    try:
+        from .routes.events import bp as events_bp
+        app.register_blueprint(events_bp)
+    except Exception:
+        pass
     return None
 
 
@@ -199,3 +259,250 @@ def register_cli(app: Flask) -> None:
         }
         for k, v in totals.items():
             click.echo(f"{k}: {v}")
+
+    @app.cli.command("purge-idempotency")
+    def purge_idempotency_command() -> None:
+        """Delete idempotency keys whose replay window has passed."""
+        from agrifarma.services import idempotency
+        removed = idempotency.purge_expired()
+        click.echo(f"🧹 Removed {removed} expired idempotency keys.")
+
+    @app.cli.group("stats")
+    def stats_group() -> None:
+        """Materialized per-user activity stats."""
+
+    @stats_group.command("rebuild")
+    @click.option("--user", "user_id", type=int, default=None, help="Rebuild a single user (default: everyone)")
+    def stats_rebuild_command(user_id) -> None:
+        """Recompute user_stats rows from forum, blog and order tables."""
+        from agrifarma.services import user_stats
+        if user_id is not None:
+            user_stats.rebuild_user(user_id)
+            db.session.commit()
+            click.echo(f"✅ Rebuilt stats for user {user_id}.")
+            return
+        total = user_stats.rebuild_all()
+        click.echo(f"✅ Rebuilt stats for {total} users.")
+
+    @app.cli.group("sellers")
+    def sellers_group() -> None:
+        """Per-seller sales aggregates."""
+
+    @sellers_group.command("rebuild")
+    @click.option("--seller", "seller_id", type=int, default=None, help="Rebuild a single seller (default: everyone)")
+    def sellers_rebuild_command(seller_id) -> None:
+        """Recompute seller_daily and seller_product_daily from paid orders."""
+        from agrifarma.services import seller_stats
+        rows = seller_stats.rebuild([seller_id] if seller_id is not None else None)
+        click.echo(f"✅ Rebuilt {rows} seller aggregate rows.")
+
+    @app.cli.group("forecast")
+    def forecast_group() -> None:
+        """Demand forecasts and reorder alerts."""
+
+    @forecast_group.command("refresh")
+    def forecast_refresh_command() -> None:
+        """Refit demand for every active product and update reorder alerts."""
+        from agrifarma.services import forecast
+        run = forecast.refresh()
+        click.echo(f"✅ Forecast {run.products} products over {run.history_days} days in {run.seconds:.2f}s "
+                   f"(alerts raised {run.alerts_raised}, resolved {run.alerts_resolved}).")
+
+    @app.cli.group("catalog")
+    def catalog_group() -> None:
+        """Bulk product imports."""
+
+    @catalog_group.command("import")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--apply", "apply_changes", is_flag=True, help="Write the changes (default: dry run)")
+    @click.option("--user", "email", default=None, help="Seller of new products (default: first admin)")
+    def catalog_import_command(path, apply_changes: bool, email) -> None:
+        """Create or update products from a CSV/XLSX file, matched by SKU or name."""
+        import os
+        from agrifarma.models.user import User
+        from agrifarma.services import product_import
+        user = User.query.filter_by(email=email).first() if email else User.query.filter_by(role='Admin').order_by(User.id).first()
+        if user is None:
+            raise click.ClickException("no such user" if email else "no admin user to own new products")
+        job = product_import.queue(os.path.abspath(path), os.path.basename(path), user.id, dry_run=not apply_changes)
+        job = product_import.run(job.id)
+        if job.status == 'failed':
+            raise click.ClickException(job.message or "import failed")
+        for entry in job.report or []:
+            if entry['action'] == 'error':
+                click.echo(f"row {entry['row']} {entry['key']}: {entry['errors']}")
+        verb = "Imported" if apply_changes else "Dry run"
+        click.echo(f"✅ {verb}: {job.created_count} created, {job.updated_count} updated, "
+                   f"{job.unchanged_count} unchanged, {job.error_count} errors.")
+
+    @app.cli.group("forum")
+    def forum_group() -> None:
+        """Forum maintenance."""
+
+    @forum_group.command("repair-stats")
+    def forum_repair_stats_command() -> None:
+        """Recompute category thread/post counts and last activity."""
+        from agrifarma.services import forum as forum_service
+        numbered = forum_service.backfill_positions()
+        db.session.commit()
+        fixed = forum_service.repair_category_stats()
+        click.echo(f"✅ Numbered {numbered} posts; repaired {fixed} categories.")
+
+    @forum_group.command("rebuild-tree")
+    def forum_rebuild_tree_command() -> None:
+        """Recompute the category closure table from parent links."""
+        from agrifarma.services import category_tree
+        links = category_tree.rebuild_closure()
+        db.session.commit()
+        click.echo(f"✅ Wrote {links} category closure rows.")
+
+    @app.cli.group("blog")
+    def blog_group() -> None:
+        """Knowledge base maintenance."""
+
+    @blog_group.command("rebuild-tags")
+    def blog_rebuild_tags_command() -> None:
+        """Re-index blog tags from the comma-separated column and recount them."""
+        from agrifarma.services import tags as tag_service
+        tagged = tag_service.rebuild_index()
+        click.echo(f"✅ Indexed tags for {tagged} blog posts.")
+
+    @app.cli.group("ranking")
+    def ranking_group() -> None:
+        """Hot scores for trending blog posts and forum threads."""
+
+    @ranking_group.command("redecay")
+    def ranking_redecay_command() -> None:
+        """Rebase hot scores on the current time (run periodically, e.g. hourly)."""
+        from agrifarma.services import ranking
+        touched = ranking.redecay()
+        db.session.commit()
+        click.echo("✅ Re-decayed " + ", ".join(f"{n} {kind} scores" for kind, n in touched.items()) + ".")
+
+    @ranking_group.command("rebuild")
+    def ranking_rebuild_command() -> None:
+        """Recompute hot scores from likes, comments and replies."""
+        from agrifarma.services import ranking
+        written = ranking.rebuild_all()
+        click.echo("✅ Rebuilt " + ", ".join(f"{n} {kind} scores" for kind, n in written.items()) + ".")
+
+    @app.cli.group("recommend")
+    def recommend_group() -> None:
+        """Item-to-item product recommendations."""
+
+    @recommend_group.command("refresh")
+    @click.option("--full", is_flag=True, help="Recount all orders instead of only new ones")
+    def recommend_refresh_command(full: bool) -> None:
+        """Count new orders and re-rank the products they affect (run e.g. nightly)."""
+        from agrifarma.services import recommendations
+        run = recommendations.refresh(full=full)
+        click.echo(f"✅ {run.orders_processed} orders counted, {run.products_refreshed} products re-ranked "
+                   f"in {run.seconds:.2f}s (watermark: order {run.last_order_id}).")
+
+    @app.cli.group("cohorts")
+    def cohorts_group() -> None:
+        """Weekly cohort retention."""
+
+    @cohorts_group.command("refresh")
+    @click.option("--full", is_flag=True, help="Recount all users, posts and orders instead of only new ones")
+    def cohorts_refresh_command(full: bool) -> None:
+        """Fold new users, posts and orders into the retention cells."""
+        from agrifarma.services import cohorts
+        run = cohorts.refresh(full=full)
+        if run is None:
+            click.echo("✅ Nothing new to count.")
+            return
+        click.echo(f"✅ {run.rows_processed} rows counted in {run.seconds:.2f}s "
+                   f"(watermarks: user {run.last_user_id}, post {run.last_post_id}, order {run.last_order_id}).")
+
+    @app.cli.group("tracking")
+    def tracking_group() -> None:
+        """Page view and impression tracking."""
+
+    @tracking_group.command("rollup")
+    def tracking_rollup_command() -> None:
+        """Count events not yet in the counters (workers do this after every flush)."""
+        from agrifarma.services import tracking
+        with db.engine.begin() as conn:
+            counted = tracking.rollup(conn)
+        click.echo(f"✅ {counted} events rolled up.")
+
+    @tracking_group.command("prune")
+    @click.option("--days", default=90, show_default=True, help="Keep raw events this many days")
+    def tracking_prune_command(days: int) -> None:
+        """Delete raw events already counted in the daily and total counters."""
+        from agrifarma.services import tracking
+        deleted = tracking.prune(days)
+        click.echo(f"✅ Deleted {deleted} events older than {days} days.")
+
+    @app.cli.group("inbox")
+    def inbox_group() -> None:
+        """Consultancy messaging."""
+
+    @inbox_group.command("rebuild")
+    def inbox_rebuild_command() -> None:
+        """Thread loose messages into conversations and recount unread messages."""
+        from agrifarma.services import inbox
+        conversations = inbox.rebuild()
+        click.echo(f"✅ Rebuilt {conversations} conversations.")
+
+    @app.cli.group("payments")
+    def payments_group() -> None:
+        """Payment maintenance jobs."""
+
+    @payments_group.command("reconcile")
+    @click.option("--status", "statuses", multiple=True, help="payment_status to scan (repeatable; default Pending/Paid/Failed)")
+    @click.option("--since", type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="Only orders created on/after this date")
+    @click.option("--until", type=click.DateTime(formats=["%Y-%m-%d"]), default=None, help="Only orders created before this date")
+    @click.option("--batch-size", default=500, show_default=True)
+    @click.option("--workers", default=8, show_default=True, help="Concurrent gateway lookups")
+    @click.option("--gateway", default=None, help="Gateway to verify against (default: PAYMENT_GATEWAY)")
+    @click.option("--dry-run", is_flag=True, help="Report mismatches without updating orders")
+    def reconcile_command(statuses, since, until, batch_size, workers, gateway, dry_run) -> None:
+        """Verify order payment status against the gateway and fix drift."""
+        from agrifarma.services import reconciliation
+        from agrifarma.services.payment import get_payment_gateway
+        report = reconciliation.reconcile_payments(
+            statuses=statuses or reconciliation.RECONCILABLE_STATUSES,
+            since=since, until=until, batch_size=batch_size, workers=workers,
+            gateway=get_payment_gateway(gateway) if gateway else None, dry_run=dry_run,
+        )
+        for order_id, recorded, actual in report.mismatches:
+            click.echo(f"order {order_id}: {recorded} -> {actual}")
+        stats = report.to_dict()
+        click.echo(
+            f"{'🔎 Dry run' if dry_run else '✅ Reconciled'}: scanned={stats['scanned']} verified={stats['verified']} "
+            f"mismatches={stats['mismatches']} skipped={stats['skipped']} errors={stats['errors']} "
+            f"in {stats['elapsed']}s ({stats['throughput']}/s)"
+        )
+
+    @app.cli.group("webhooks")
+    def webhooks_group() -> None:
+        """Payment webhook queue."""
+
+    @webhooks_group.command("work")
+    @click.option("--batch-size", default=200, show_default=True)
+    @click.option("--interval", default=2.0, show_default=True, help="Seconds to sleep when the queue is empty")
+    @click.option("--once", is_flag=True, help="Drain the queue once and exit")
+    def webhooks_work_command(batch_size: int, interval: float, once: bool) -> None:
+        """Apply pending webhook events to orders."""
+        import time
+        from agrifarma.services import webhooks
+        while True:
+            stats = webhooks.process_pending(batch_size=batch_size)
+            if stats['processed']:
+                click.echo(
+                    f"processed={stats['processed']} applied={stats['applied']} ignored={stats['ignored']} "
+                    f"errors={stats['errors']} lag avg={stats['avg_lag']}s max={stats['max_lag']}s"
+                )
+                continue
+            if once:
+                break
+            time.sleep(interval)
+
+    @webhooks_group.command("stats")
+    def webhooks_stats_command() -> None:
+        """Show webhook queue depth and lag."""
+        from agrifarma.services import webhooks
+        metrics = webhooks.lag_metrics()
+        click.echo(f"pending={metrics['pending']} oldest={metrics['oldest_pending_seconds']}s")
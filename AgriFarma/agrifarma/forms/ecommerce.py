@@ -1,23 +1,33 @@
 # -*- coding: utf-8 -*-
 from flask_wtf import FlaskForm
-from wtforms import StringField, TextAreaField, DecimalField, IntegerField, SelectField, SubmitField
-from wtforms.validators import DataRequired, NumberRange, Length, Email
-from agrifarma.models.ecommerce import PRODUCT_STATUSES, ORDER_STATUSES
+from flask_wtf.file import FileField, FileAllowed, FileRequired
+from wtforms import StringField, TextAreaField, DecimalField, IntegerField, SelectField, SubmitField, HiddenField, BooleanField
+from wtforms.validators import DataRequired, NumberRange, Length, Email, Optional
+from wtforms.widgets import HiddenInput
+from agrifarma.models.ecommerce import PRODUCT_CATEGORIES, PRODUCT_STATUSES, ORDER_STATUSES
 
-CATEGORIES = ["seeds","fertilizers","equipment","bio","other"]
+CATEGORIES = list(PRODUCT_CATEGORIES)
 PAYMENT_METHODS = ["COD","card","wallet"]
 
 class ProductForm(FlaskForm):
     name = StringField("Name", validators=[DataRequired(), Length(max=200)])
+    sku = StringField("SKU", validators=[Optional(), Length(max=64)])
     description = TextAreaField("Description")
     price = DecimalField("Price", validators=[DataRequired(), NumberRange(min=0)], places=2)
-    category = SelectField("Category", choices=[(c, c.title()) for c in CATEGORIES], validators=[DataRequired()])
+    category = SelectField("Category", choices=[(c, c) for c in CATEGORIES], validators=[DataRequired()])
     images = StringField("Images (comma-separated)")
     inventory = IntegerField("Inventory", default=0, validators=[NumberRange(min=0)])
+    # inventory when the edit form was rendered; edits apply the difference from it
+    inventory_seen = IntegerField(widget=HiddenInput(), validators=[Optional()])
     status = SelectField("Status", choices=[(s, s) for s in PRODUCT_STATUSES])
     featured = SelectField("Featured", choices=[("false","No"),("true","Yes")], validators=[DataRequired()])
     submit = SubmitField("Save Product")
 
+class ProductImportForm(FlaskForm):
+    file = FileField("CSV or Excel file", validators=[FileRequired(), FileAllowed(['csv', 'xlsx'], 'CSV or XLSX only')])
+    dry_run = BooleanField("Dry run (report changes without saving)", default=True)
+    submit = SubmitField("Upload")
+
 class AddToCartForm(FlaskForm):
     quantity = IntegerField("Quantity", validators=[DataRequired(), NumberRange(min=1, max=100)], default=1)
     submit = SubmitField("Add to Cart")
@@ -29,6 +39,10 @@ class UpdateCartItemForm(FlaskForm):
 class CheckoutForm(FlaskForm):
     shipping_address = StringField("Shipping Address", validators=[DataRequired(), Length(max=256)])
     payment_method = SelectField("Payment Method", choices=[(m, m) for m in PAYMENT_METHODS], validators=[DataRequired()])
+    mobile_number = StringField("Wallet Mobile Number", validators=[Optional(), Length(max=20)])
+    # Filled in by the card provider's client-side widget (e.g. a Stripe PaymentMethod id)
+    payment_token = HiddenField(validators=[Length(max=255)])
+    idempotency_key = HiddenField(validators=[Length(max=128)])
     submit = SubmitField("Place Order")
 
 class ReviewForm(FlaskForm):
@@ -2,7 +2,7 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, TextAreaField, SelectField, SubmitField
 from wtforms.validators import DataRequired, Length
-from agrifarma.models.forum import Category
+from agrifarma.services import category_tree
 
 
 class NewThreadForm(FlaskForm):
@@ -13,8 +13,8 @@ class NewThreadForm(FlaskForm):
     submit = SubmitField('Create Thread')
 
     def set_choices(self):
-        cats = Category.query.order_by(Category.name).all()
-        self.category_id.choices = [(c.id, c.name) for c in cats]
+        # Shared in-process snapshot: no query unless categories changed
+        self.category_id.choices = category_tree.get_tree().choices()
 
 
 class ReplyForm(FlaskForm):
@@ -27,8 +27,8 @@ class MoveThreadForm(FlaskForm):
     submit = SubmitField('Move')
 
     def set_choices(self):
-        cats = Category.query.order_by(Category.name).all()
-        self.category_id.choices = [(c.id, c.name) for c in cats]
+        # Shared in-process snapshot: no query unless categories changed
+        self.category_id.choices = category_tree.get_tree().choices()
 
 
 class SearchForm(FlaskForm):
@@ -11,8 +11,6 @@ PREDEFINED_CATEGORIES = [
     'Irrigation',
 ]
 
-# Association table for tags (simple CSV storage alternative)
-
 class BlogPost(db.Model):
     __tablename__ = 'blog_posts'
     id = db.Column(db.Integer, primary_key=True)
@@ -21,9 +19,11 @@ class BlogPost(db.Model):
     category = db.Column(db.String(64), nullable=False)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
-    tags = db.Column(db.String(255))  # comma-separated tags
+    tags = db.Column(db.String(255))  # comma-separated tags (display copy of blog_post_tags)
     media_files = db.Column(db.String(512))  # comma-separated filenames
     approved = db.Column(db.Boolean, default=True)
+    # Decayed engagement relative to the blog ranking epoch; maintained by services.ranking
+    hot_score = db.Column(db.Float, nullable=False, default=0.0, server_default='0', index=True)
 
     author = db.relationship('User', backref='blog_posts')
     comments = db.relationship('Comment', backref='post', cascade='all, delete-orphan')
@@ -70,3 +70,22 @@ class Comment(db.Model):
     approved = db.Column(db.Boolean, default=True)
 
     author = db.relationship('User', backref='comments')
+
+
+class Tag(db.Model):
+    """Normalized blog tag; post_count (approved posts only) is maintained by services.tags"""
+    __tablename__ = 'tags'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), unique=True, nullable=False)  # lower-cased, see services.tags.normalize
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
+
+
+class BlogPostTag(db.Model):
+    """Blog post <-> tag link. The PK serves tags-of-a-post lookups, the index posts-with-a-tag"""
+    __tablename__ = 'blog_post_tags'
+    blog_id = db.Column(db.Integer, db.ForeignKey('blog_posts.id'), primary_key=True)
+    tag_id = db.Column(db.Integer, db.ForeignKey('tags.id'), primary_key=True)
+
+    __table_args__ = (
+        db.Index('ix_blog_post_tags_tag_blog', 'tag_id', 'blog_id'),
+    )
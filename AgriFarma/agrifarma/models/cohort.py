@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Cohort retention and purchase funnel aggregates (see services.cohorts / services.funnel)."""
+from datetime import datetime, UTC
+from agrifarma.extensions import db
+
+
+class CohortMember(db.Model):
+    """A user's join week plus bitmaps of the weeks since joining they were active in.
+
+    Bit ``i`` (little-endian) of ``post_weeks`` / ``order_weeks`` is set once
+    the user posted / ordered in week ``i`` after their join week. The bitmaps
+    let a refresh tell whether new activity adds a user to a retention cell.
+    """
+    __tablename__ = 'cohort_members'
+
+    user_id = db.Column(db.Integer, primary_key=True)  # no FK: cohorts keep deleted users
+    cohort_week = db.Column(db.Date, nullable=False, index=True)
+    post_weeks = db.Column(db.LargeBinary, nullable=False, default=b'')
+    order_weeks = db.Column(db.LargeBinary, nullable=False, default=b'')
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<CohortMember {self.user_id} {self.cohort_week}>"
+
+
+class CohortCell(db.Model):
+    """Distinct users of one join-week cohort active in week ``age`` after joining.
+
+    metric 'joined' (age 0) is the cohort size; 'posts' and 'orders' count
+    users who posted / ordered that week and 'active' users who did either.
+    """
+    __tablename__ = 'cohort_cells'
+
+    metric = db.Column(db.String(8), primary_key=True)
+    cohort_week = db.Column(db.Date, primary_key=True)
+    age = db.Column(db.Integer, primary_key=True)
+    users = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<CohortCell {self.metric} {self.cohort_week}+{self.age}w={self.users}>"
+
+
+class CohortRun(db.Model):
+    """One cohort refresh; the latest run's last_*_id columns are the watermarks."""
+    __tablename__ = 'cohort_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC).replace(tzinfo=None), nullable=False)
+    full = db.Column(db.Boolean, default=False, nullable=False)
+    last_user_id = db.Column(db.Integer, nullable=False, default=0)
+    last_post_id = db.Column(db.Integer, nullable=False, default=0)
+    last_order_id = db.Column(db.Integer, nullable=False, default=0)
+    rows_processed = db.Column(db.Integer, nullable=False, default=0)
+    seconds = db.Column(db.Float)
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<CohortRun {self.id} users<={self.last_user_id} posts<={self.last_post_id} orders<={self.last_order_id}>"
+
+
+class FunnelWeek(db.Model):
+    """Events at one purchase funnel stage (view, cart, checkout, paid) in a week."""
+    __tablename__ = 'funnel_weeks'
+
+    week = db.Column(db.Date, primary_key=True)  # Monday, UTC
+    stage = db.Column(db.String(10), primary_key=True)
+    events = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<FunnelWeek {self.week} {self.stage}={self.events}>"
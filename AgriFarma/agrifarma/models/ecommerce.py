@@ -1,10 +1,18 @@
 # -*- coding: utf-8 -*-
+import threading
 from datetime import datetime, UTC
 from decimal import Decimal
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
 from agrifarma.extensions import db
 from .user import User
 
 PRODUCT_STATUSES = ("Active", "Inactive")
+# Catalog categories offered by ProductForm and used by the seed data
+PRODUCT_CATEGORIES = (
+    "Seeds", "Fertilizers", "Pesticides", "Irrigation", "Tools",
+    "Sensors", "Soil Amendments", "Greenhouse", "Machinery", "Packaging", "Other",
+)
 ORDER_STATUSES = ("Pending", "Paid", "Shipped", "Cancelled")
 REVIEW_STATUSES = ("Pending", "Approved", "Rejected")
 
@@ -12,6 +20,7 @@ class Product(db.Model):
     __tablename__ = 'products'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False, index=True)
+    sku = db.Column(db.String(64))  # optional, unique; bulk imports match on it before name
     description = db.Column(db.Text)
     price = db.Column(db.Numeric(10,2), nullable=False, default=0)
     category = db.Column(db.String(64), index=True)
@@ -21,13 +30,36 @@ class Product(db.Model):
     status = db.Column(db.String(16), default='Active', index=True)
     featured = db.Column(db.Boolean, default=False, index=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
+    # Approved-review aggregates, maintained by services.reviews
+    rating_avg = db.Column(db.Float, default=0, nullable=False, server_default='0')
+    rating_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    rating_1 = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    rating_2 = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    rating_3 = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    rating_4 = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    rating_5 = db.Column(db.Integer, default=0, nullable=False, server_default='0')
 
     seller = db.relationship('User')
     reviews = db.relationship('Review', back_populates='product', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        # faceted shop listing: active products of a category in name order, or by price
+        db.Index('ix_products_status_category_name', 'status', 'category', 'name'),
+        db.Index('ix_products_status_price', 'status', 'price'),
+        db.Index('ix_products_status_rating', 'status', 'rating_avg', 'rating_count'),
+        db.Index('ix_products_sku', 'sku', unique=True),
+    )
+
     def image_list(self):
         return [i for i in (self.images or '').split(',') if i]
 
+    def rating_histogram(self):
+        """(stars, count, percent of ratings) from 5 stars down to 1."""
+        total = self.rating_count or 0
+        return [(stars, getattr(self, f'rating_{stars}') or 0,
+                 round(100 * (getattr(self, f'rating_{stars}') or 0) / total) if total else 0)
+                for stars in range(5, 0, -1)]
+
 class Review(db.Model):
     __tablename__ = 'reviews'
     id = db.Column(db.Integer, primary_key=True)
@@ -41,6 +73,9 @@ class Review(db.Model):
     product = db.relationship('Product', back_populates='reviews')
     user = db.relationship('User')
 
+    # a product's approved reviews, newest first (keyset pages on the detail page)
+    __table_args__ = (db.Index('ix_reviews_product_approved_created', 'product_id', 'approved', 'created_at', 'id'),)
+
 class CartItem(db.Model):
     __tablename__ = 'cart_items'
     id = db.Column(db.Integer, primary_key=True)
@@ -55,15 +90,22 @@ class CartItem(db.Model):
 class Order(db.Model):
     __tablename__ = 'orders'
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     shipping_address = db.Column(db.String(256), nullable=False)
     payment_method = db.Column(db.String(64), nullable=False)  # e.g. COD, card, wallet
     payment_status = db.Column(db.String(32), default='Pending', index=True)  # Pending, Paid, Failed, Refunded
     payment_transaction_id = db.Column(db.String(128))  # Payment gateway transaction ID
-    status = db.Column(db.String(16), default='Pending', index=True)  # Order status
+    status = db.Column(db.String(16), default='Pending')  # Order status
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
     total_amount = db.Column(db.Numeric(10,2), default=0)
 
+    # Date-range filters (services.date_ranges) compare created_at directly; these
+    # also serve plain user_id / status lookups, replacing the single-column indexes
+    __table_args__ = (
+        db.Index('ix_orders_user_created', 'user_id', 'created_at'),
+        db.Index('ix_orders_status_created', 'status', 'created_at'),
+    )
+
     user = db.relationship('User')
     items = db.relationship('OrderItem', back_populates='order', cascade='all, delete-orphan')
 
@@ -78,5 +120,54 @@ class OrderItem(db.Model):
     order = db.relationship('Order', back_populates='items')
     product = db.relationship('Product')
 
+    # a seller's open orders start from their products' lines (services.seller_stats)
+    __table_args__ = (db.Index('ix_order_items_product_order', 'product_id', 'order_id'),)
+
     def line_total(self):
         return (self.unit_price or Decimal('0')) * self.quantity
+
+STOCK_MOVEMENT_REASONS = ("reserve", "release", "adjust")
+
+class StockMovement(db.Model):
+    """Append-only ledger of inventory changes (one row per product per event)."""
+    __tablename__ = 'stock_movements'
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False, index=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id', ondelete='SET NULL'), nullable=True, index=True)
+    delta = db.Column(db.Integer, nullable=False)  # negative = stock leaves, positive = stock returns
+    reason = db.Column(db.String(16), nullable=False)  # one of STOCK_MOVEMENT_REASONS
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
+
+
+# Bumped after any committed product or review write; services.catalog
+# compares it with its facet snapshot to know when to rebuild.
+_catalog_version = [0]
+_catalog_lock = threading.Lock()
+
+def catalog_version() -> int:
+    return _catalog_version[0]
+
+def _mark_catalog_changed(session) -> None:
+    if session is not None:
+        session.info['catalog_changed'] = True
+    with _catalog_lock:
+        _catalog_version[0] += 1
+
+def _catalog_row_changed(mapper, connection, target):
+    _mark_catalog_changed(object_session(target))
+
+for _model in (Product, Review):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _catalog_row_changed)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _catalog_bulk_write(state):
+    # bulk statements such as inventory reservations skip the mapper events above
+    if not state.is_select and state.bind_mapper is not None and state.bind_mapper.class_ in (Product, Review):
+        _mark_catalog_changed(state.session)
+
+@event.listens_for(Session, 'after_commit')
+def _catalog_committed(session):
+    if session.info.pop('catalog_changed', False):
+        with _catalog_lock:
+            _catalog_version[0] += 1
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Demand forecasts and reorder alerts (see services.forecast)."""
+from datetime import datetime, UTC
+from agrifarma.extensions import db
+
+
+class ProductForecast(db.Model):
+    """Latest demand forecast of one product, replaced on every forecast run."""
+    __tablename__ = 'product_forecasts'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    daily_demand = db.Column(db.Float, nullable=False, default=0)  # smoothed units per day
+    demand_std = db.Column(db.Float, nullable=False, default=0)    # RMS one-day-ahead error
+    inventory = db.Column(db.Integer, nullable=False, default=0)   # stock when forecast
+    days_of_cover = db.Column(db.Float)                            # None when nothing sells
+    reorder_point = db.Column(db.Integer, nullable=False, default=0)
+    needs_reorder = db.Column(db.Boolean, nullable=False, default=False)
+    computed_at = db.Column(db.DateTime, nullable=False)
+
+    product = db.relationship('Product')
+
+    __table_args__ = (
+        db.Index('ix_product_forecasts_reorder_cover', 'needs_reorder', 'days_of_cover'),
+    )
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<ProductForecast #{self.product_id} {self.daily_demand:.2f}/day rop={self.reorder_point}>"
+
+
+class InventoryAlert(db.Model):
+    """A product falling to its reorder point; resolved once a later run finds it restocked."""
+    __tablename__ = 'inventory_alerts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    raised_at = db.Column(db.DateTime, nullable=False)
+    resolved_at = db.Column(db.DateTime, index=True)
+    inventory = db.Column(db.Integer, nullable=False)
+    days_of_cover = db.Column(db.Float)
+    reorder_point = db.Column(db.Integer, nullable=False)
+
+    product = db.relationship('Product')
+
+    __table_args__ = (
+        db.Index('ix_inventory_alerts_product_resolved', 'product_id', 'resolved_at'),
+        db.Index('ix_inventory_alerts_raised', 'raised_at'),
+    )
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<InventoryAlert #{self.product_id} {self.raised_at} {'resolved' if self.resolved_at else 'open'}>"
+
+
+class ForecastRun(db.Model):
+    """One forecast run; the latest tells reports how fresh the numbers are."""
+    __tablename__ = 'forecast_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC).replace(tzinfo=None), nullable=False)
+    history_days = db.Column(db.Integer, nullable=False)
+    products = db.Column(db.Integer, nullable=False, default=0)
+    alerts_raised = db.Column(db.Integer, nullable=False, default=0)
+    alerts_resolved = db.Column(db.Integer, nullable=False, default=0)
+    seconds = db.Column(db.Float)
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<ForecastRun {self.id} products={self.products}>"
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
+import threading
 from datetime import datetime, UTC
+from sqlalchemy import delete, event, insert, literal, select, true
+from sqlalchemy.orm import Session, object_session
 from agrifarma.extensions import db
 
 class Category(db.Model):
@@ -8,11 +11,104 @@ class Category(db.Model):
     name = db.Column(db.String(120), unique=True, nullable=False)
     parent_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=True)
 
+    # Aggregates over this category and all its subcategories, kept current by
+    # services.forum on every post/delete/move (`flask forum repair-stats` rebuilds them)
+    thread_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    post_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    last_post_at = db.Column(db.DateTime)
+    last_thread_id = db.Column(db.Integer)
+
     parent = db.relationship('Category', remote_side=[id], backref='children')
+    last_thread = db.relationship('Thread', primaryjoin='foreign(Category.last_thread_id) == Thread.id', viewonly=True)
 
     def __repr__(self):
         return f"<Category {self.name}>"
 
+
+class CategoryClosure(db.Model):
+    """Every (ancestor, descendant) pair of the category tree, self-pairs at depth 0."""
+    __tablename__ = 'category_closure'
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('categories.id', ondelete='CASCADE'), primary_key=True)
+    descendant_id = db.Column(db.Integer, db.ForeignKey('categories.id', ondelete='CASCADE'), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (db.Index('ix_category_closure_descendant', 'descendant_id', 'depth'),)
+
+
+# Bumped after any committed category change; services.category_tree compares
+# it with its snapshot to know when to rebuild.
+_tree_version = [0]
+_tree_lock = threading.Lock()
+
+def category_tree_version() -> int:
+    return _tree_version[0]
+
+def _mark_changed(target) -> None:
+    session = object_session(target)
+    if session is not None:
+        session.info['categories_changed'] = True
+    with _tree_lock:
+        _tree_version[0] += 1
+
+def _link_under_parent(connection, category_id, parent_id) -> None:
+    """Add closure rows joining category_id's subtree to parent_id and its ancestors."""
+    closure = CategoryClosure.__table__
+    if parent_id is None:
+        return
+    ancestors = closure.alias('a')
+    subtree = closure.alias('s')
+    connection.execute(insert(closure).from_select(
+        ['ancestor_id', 'descendant_id', 'depth'],
+        select(ancestors.c.ancestor_id, subtree.c.descendant_id, ancestors.c.depth + subtree.c.depth + 1)
+        .select_from(ancestors.join(subtree, true()))  # deliberate cross product
+        .where(ancestors.c.descendant_id == parent_id, subtree.c.ancestor_id == category_id)
+    ))
+
+@event.listens_for(Category, 'after_insert')
+def _category_inserted(mapper, connection, target):
+    closure = CategoryClosure.__table__
+    connection.execute(insert(closure).values(ancestor_id=target.id, descendant_id=target.id, depth=0))
+    _link_under_parent(connection, target.id, target.parent_id)
+    _mark_changed(target)
+
+@event.listens_for(Category, 'after_update')
+def _category_updated(mapper, connection, target):
+    history = db.inspect(target).attrs.parent_id.history
+    if history.has_changes():
+        closure = CategoryClosure.__table__
+        if target.parent_id is not None and connection.execute(
+            select(literal(1)).where(closure.c.ancestor_id == target.id, closure.c.descendant_id == target.parent_id)
+        ).first():
+            raise ValueError("A category cannot be moved under itself or one of its subcategories")
+        # Detach the subtree from its old ancestors, then hang it under the new parent
+        subtree = select(closure.c.descendant_id).where(closure.c.ancestor_id == target.id)
+        connection.execute(delete(closure).where(
+            closure.c.descendant_id.in_(subtree),
+            closure.c.ancestor_id.not_in(subtree),
+        ))
+        _link_under_parent(connection, target.id, target.parent_id)
+    _mark_changed(target)
+
+@event.listens_for(Category, 'after_delete')
+def _category_deleted(mapper, connection, target):
+    closure = CategoryClosure.__table__
+    connection.execute(delete(closure).where(
+        (closure.c.descendant_id == target.id) | (closure.c.ancestor_id == target.id)
+    ))
+    _mark_changed(target)
+
+@event.listens_for(Session, 'after_commit')
+def _categories_committed(session):
+    # Bump again once the change is visible, so a snapshot rebuilt mid-transaction
+    # by another thread doesn't stay current
+    if session.info.pop('categories_changed', False):
+        with _tree_lock:
+            _tree_version[0] += 1
+
+@event.listens_for(Session, 'after_rollback')
+def _categories_rolled_back(session):
+    session.info.pop('categories_changed', None)
+
 class Thread(db.Model):
     __tablename__ = 'threads'
     id = db.Column(db.Integer, primary_key=True)
@@ -20,11 +116,17 @@ class Thread(db.Model):
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=True)
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
+    # Highest post position handed out so far; bumped atomically per reply
+    post_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    # Decayed engagement relative to the thread ranking epoch; maintained by services.ranking
+    hot_score = db.Column(db.Float, nullable=False, default=0.0, server_default='0', index=True)
 
     category = db.relationship('Category', backref='threads')
     author = db.relationship('User', backref='threads', foreign_keys=[author_id])
     posts = db.relationship('Post', backref='thread', cascade='all, delete-orphan', order_by='Post.created_at')
 
+    __table_args__ = (db.Index('ix_threads_category_created', 'category_id', 'created_at'),)
+
     def __repr__(self):
         return f"<Thread {self.title}>"
 
@@ -35,8 +137,12 @@ class Post(db.Model):
     author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
+    # 1-based number within the thread; never reused, so links stay stable
+    position = db.Column(db.Integer)
 
     author = db.relationship('User', backref='posts', foreign_keys=[author_id])
 
+    __table_args__ = (db.Index('ix_posts_thread_position', 'thread_id', 'position'),)
+
     def __repr__(self):
         return f"<Post {self.id} on Thread {self.thread_id}>"
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""Idempotency keys for checkout and payment calls."""
+from datetime import datetime, UTC
+from agrifarma.extensions import db
+
+IDEMPOTENCY_STATUSES = ("in_progress", "completed")
+
+class IdempotencyKey(db.Model):
+    """Remembers the outcome of a request so retries can replay it."""
+    __tablename__ = 'idempotency_keys'
+
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(64), nullable=False)  # e.g. 'checkout', 'payment:mock'
+    key = db.Column(db.String(128), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True, index=True)
+    status = db.Column(db.String(16), default='in_progress', nullable=False)  # one of IDEMPOTENCY_STATUSES
+    response = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    __table_args__ = (db.UniqueConstraint('scope', 'key', name='uq_idempotency_scope_key'),)
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<IdempotencyKey {self.scope}:{self.key} {self.status}>"
@@ -9,11 +9,15 @@ class PostLike(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     post_id = db.Column(db.Integer, db.ForeignKey('posts.id', ondelete='CASCADE'), nullable=False, index=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
     
-    # Unique constraint: one like per user per post
-    __table_args__ = (db.UniqueConstraint('post_id', 'user_id', name='uq_post_user_like'),)
+    # Unique constraint: one like per user per post; (user_id, post_id) answers
+    # "which of these posts did the viewer like" from the index alone
+    __table_args__ = (
+        db.UniqueConstraint('post_id', 'user_id', name='uq_post_user_like'),
+        db.Index('ix_post_likes_user_post', 'user_id', 'post_id'),
+    )
     
     post = db.relationship('Post', backref='likes')
     user = db.relationship('User')
@@ -24,11 +28,14 @@ class BlogLike(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     blog_id = db.Column(db.Integer, db.ForeignKey('blog_posts.id', ondelete='CASCADE'), nullable=False, index=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC))
     
-    # Unique constraint: one like per user per blog
-    __table_args__ = (db.UniqueConstraint('blog_id', 'user_id', name='uq_blog_user_like'),)
+    # Unique constraint: one like per user per blog; see PostLike for the index
+    __table_args__ = (
+        db.UniqueConstraint('blog_id', 'user_id', name='uq_blog_user_like'),
+        db.Index('ix_blog_likes_user_blog', 'user_id', 'blog_id'),
+    )
     
     blog = db.relationship('BlogPost', backref='likes')
     user = db.relationship('User')
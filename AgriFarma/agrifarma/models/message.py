@@ -7,7 +7,9 @@ class Message(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     # Correct foreign key references to the users table (was mistakenly 'user.id')
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
-    receiver_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    # Indexed through ix_message_receiver_read_created (receiver_id leads)
+    receiver_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id', ondelete='CASCADE'), nullable=True)
     subject = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
     read = db.Column(db.Boolean, default=False, nullable=False)
@@ -17,10 +19,64 @@ class Message(db.Model):
     sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_messages')
     receiver = db.relationship('User', foreign_keys=[receiver_id], backref='received_messages')
 
+    __table_args__ = (
+        # "my unread messages, newest first" and "messages of this conversation in order"
+        db.Index('ix_message_receiver_read_created', 'receiver_id', 'read', 'created_at'),
+        db.Index('ix_message_conversation_created', 'conversation_id', 'created_at'),
+    )
+
     def mark_as_read(self):
         """Mark message as read and persist the change."""
-        self.read = True
+        from agrifarma.services import inbox  # local import: services import this module
+        inbox.mark_read(self.receiver_id, message_ids=[self.id])
         db.session.commit()
 
     def __repr__(self):  # pragma: no cover - debug helper
         return f'<Message {self.id} from User {self.sender_id} to User {self.receiver_id}>'
+
+
+class Conversation(db.Model):
+    """All messages between two users, with the latest one copied onto the row."""
+    __tablename__ = 'conversations'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # The pair is stored ordered (low id, high id) so each pair has exactly one row
+    user_low_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    user_high_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    message_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    # Denormalized latest message so the inbox never touches the message table
+    last_message_id = db.Column(db.Integer)
+    last_message_at = db.Column(db.DateTime)
+    last_sender_id = db.Column(db.Integer)
+    last_subject = db.Column(db.String(200))
+    last_snippet = db.Column(db.String(160))
+
+    members = db.relationship('ConversationMember', back_populates='conversation', cascade='all, delete-orphan')
+
+    __table_args__ = (db.UniqueConstraint('user_low_id', 'user_high_id', name='uq_conversation_pair'),)
+
+    def other_user_id(self, user_id: int) -> int:
+        return self.user_high_id if user_id == self.user_low_id else self.user_low_id
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f'<Conversation {self.id} {self.user_low_id}<->{self.user_high_id}>'
+
+
+class ConversationMember(db.Model):
+    """One participant's view of a conversation: unread count and inbox sort key."""
+    __tablename__ = 'conversation_members'
+
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id', ondelete='CASCADE'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    unread_count = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    # Copy of conversations.last_message_at; the inbox is a range of the index below
+    last_message_at = db.Column(db.DateTime)
+
+    conversation = db.relationship('Conversation', back_populates='members')
+    user = db.relationship('User')
+
+    __table_args__ = (db.Index('ix_conversation_members_user_last', 'user_id', 'last_message_at'),)
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f'<ConversationMember {self.conversation_id}:{self.user_id} unread={self.unread_count}>'
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Bulk product import jobs (see services.product_import)."""
+from datetime import datetime, UTC
+from agrifarma.extensions import db
+
+IMPORT_STATUSES = ("queued", "running", "done", "failed")
+
+
+class ProductImport(db.Model):
+    """One CSV/XLSX catalog import, dry run or applied, with its progress and diff report."""
+    __tablename__ = 'product_imports'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)  # as uploaded, for display
+    path = db.Column(db.String(512), nullable=False)      # stored copy that the job reads
+    dry_run = db.Column(db.Boolean, nullable=False, default=True)
+    status = db.Column(db.String(16), nullable=False, default='queued')  # one of IMPORT_STATUSES
+    total_rows = db.Column(db.Integer)
+    processed_rows = db.Column(db.Integer, nullable=False, default=0)
+    created_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_count = db.Column(db.Integer, nullable=False, default=0)
+    unchanged_count = db.Column(db.Integer, nullable=False, default=0)
+    error_count = db.Column(db.Integer, nullable=False, default=0)
+    # diff entries: {'row', 'action': create|update|error, 'key', 'changes' or 'errors'}
+    report = db.Column(db.JSON)
+    message = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC).replace(tzinfo=None), nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    user = db.relationship('User')
+
+    @property
+    def percent(self) -> int:
+        if not self.total_rows:
+            return 100 if self.status == 'done' else 0
+        return min(100, round(100 * (self.processed_rows or 0) / self.total_rows))
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<ProductImport {self.id} {self.status} {self.processed_rows}/{self.total_rows}>"
@@ -25,26 +25,26 @@ class Profile(db.Model):
 
     user = db.relationship("User", back_populates="profile")
 
-    # Activity metrics derived from forum and likes
+    # Activity metrics are read from the materialized user_stats row
+    @property
+    def stats(self) -> "UserStats":
+        from agrifarma.services import user_stats
+        return user_stats.stats_for(self.user_id)
+
     @property
     def posts_count(self) -> int:
-        from agrifarma.models.forum import Post
-        return db.session.query(Post).filter_by(author_id=self.user_id).count()
+        return self.stats.posts_count
 
     @property
     def likes_count(self) -> int:
-        from agrifarma.models.forum import Post as ForumPost
-        from agrifarma.models.likes import PostLike
-        # Count likes on posts authored by this user
-        return (
-            db.session.query(PostLike)
-            .join(ForumPost, ForumPost.id == PostLike.post_id)
-            .filter(ForumPost.author_id == self.user_id)
-            .count()
-        )
+        return self.stats.likes_received
 
     @property
     def latest_posts(self) -> list:
+        """The user's five newest forum posts (Post objects, opening posts included).
+
+        Not cached: ``stats.latest_activity`` is the mixed feed the profile pages show.
+        """
         from agrifarma.models.forum import Post
         return (
             db.session.query(Post)
@@ -53,3 +53,30 @@ class Profile(db.Model):
             .limit(5)
             .all()
         )
+
+
+LATEST_ACTIVITY_SIZE = 5
+
+class UserStats(db.Model):
+    """Per-user activity counters, kept current by services.user_stats on every write."""
+    __tablename__ = "user_stats"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+
+    posts_count = db.Column(db.Integer, default=0, nullable=False)
+    threads_count = db.Column(db.Integer, default=0, nullable=False)
+    likes_received = db.Column(db.Integer, default=0, nullable=False)
+    blog_posts_count = db.Column(db.Integer, default=0, nullable=False)
+    comments_count = db.Column(db.Integer, default=0, nullable=False)
+    orders_count = db.Column(db.Integer, default=0, nullable=False)
+    unread_messages = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+    last_active = db.Column(db.DateTime)
+    # Newest first, at most LATEST_ACTIVITY_SIZE dicts: kind, id, ref, title, at
+    latest = db.Column(db.JSON)
+
+    @property
+    def latest_activity(self) -> list:
+        """Cached activity entries with ``at`` parsed back to a datetime"""
+        return [dict(a, at=datetime.fromisoformat(a['at'])) for a in (self.latest or [])]
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<UserStats user={self.user_id}>"
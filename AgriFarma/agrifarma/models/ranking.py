@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""Shared state for time-decayed hot scores (see services.ranking)."""
+from agrifarma.extensions import db
+
+class RankingEpoch(db.Model):
+    """Reference time the stored hot scores of one kind are expressed against."""
+    __tablename__ = 'ranking_epochs'
+
+    kind = db.Column(db.String(16), primary_key=True)  # 'blog' or 'thread'
+    epoch = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<RankingEpoch {self.kind} {self.epoch}>"
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Item-to-item product recommendations (see services.recommendations)."""
+from datetime import datetime, UTC
+from agrifarma.extensions import db
+
+
+class ProductCopurchase(db.Model):
+    """Number of orders containing both products (stored in both directions).
+
+    The diagonal row (product_id == other_id) is the number of orders
+    containing the product, i.e. the norm used by the cosine score.
+    """
+    __tablename__ = 'product_copurchases'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    other_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<ProductCopurchase {self.product_id}+{self.other_id}={self.orders}>"
+
+
+class ProductRecommendation(db.Model):
+    """Precomputed top-N neighbours of a product, read by the product page."""
+    __tablename__ = 'product_recommendations'
+
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)  # 1 = best
+    recommended_id = db.Column(db.Integer, db.ForeignKey('products.id', ondelete='CASCADE'), nullable=False)
+    score = db.Column(db.Float, nullable=False)  # cosine similarity of the two purchase vectors
+    copurchases = db.Column(db.Integer, nullable=False)
+
+    recommended = db.relationship('Product', foreign_keys=[recommended_id])
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<ProductRecommendation {self.product_id}#{self.rank} -> {self.recommended_id} ({self.score:.3f})>"
+
+
+class RecommenderRun(db.Model):
+    """One refresh of the recommender; the latest run's last_order_id is the watermark."""
+    __tablename__ = 'recommender_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    started_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC).replace(tzinfo=None), nullable=False)
+    full = db.Column(db.Boolean, default=False, nullable=False)
+    last_order_id = db.Column(db.Integer, nullable=False, default=0)
+    orders_processed = db.Column(db.Integer, nullable=False, default=0)
+    products_refreshed = db.Column(db.Integer, nullable=False, default=0)
+    seconds = db.Column(db.Float)
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<RecommenderRun {self.id} upto={self.last_order_id}>"
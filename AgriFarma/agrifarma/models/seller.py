@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""Per-seller daily sales aggregates (see services.seller_stats)."""
+from agrifarma.extensions import db
+
+
+class SellerDaily(db.Model):
+    """Paid orders, units and revenue of one seller's products on one day (report time zone)."""
+    __tablename__ = 'seller_daily'
+
+    seller_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<SellerDaily {self.seller_id} {self.day} units={self.units}>"
+
+
+class SellerProductDaily(db.Model):
+    """Units and revenue of one product on one day, for a seller's top products."""
+    __tablename__ = 'seller_product_daily'
+
+    seller_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<SellerProductDaily {self.seller_id} {self.day} #{self.product_id} units={self.units}>"
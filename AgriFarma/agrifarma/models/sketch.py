@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""Daily probabilistic sketches (see services.sketches)."""
+from datetime import datetime, UTC
+from agrifarma.extensions import db
+
+
+class SketchDay(db.Model):
+    """One named sketch (search top-k, distinct visitors, ...) for one UTC day, as a compressed blob.
+
+    Workers merge their in-memory sketch into the day's row; reports merge
+    the rows of a date range.
+    """
+    __tablename__ = 'sketch_days'
+
+    name = db.Column(db.String(16), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC).replace(tzinfo=None), nullable=False)
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<SketchDay {self.name} {self.day} {len(self.data or b'')}B>"
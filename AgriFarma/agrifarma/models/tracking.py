@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Page view / impression events and their rollups (see services.tracking)."""
+from datetime import datetime, UTC
+from agrifarma.extensions import db
+
+
+class TrackedEvent(db.Model):
+    """One page view or impression; rows are only ever appended (and pruned once rolled up)."""
+    __tablename__ = 'events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(16), nullable=False)  # product, impression, blog, thread
+    entity_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer)  # no FK: events outlive deleted users
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<TrackedEvent {self.id} {self.kind}:{self.entity_id}>"
+
+
+class EventDailyCount(db.Model):
+    """Events of one kind for one entity on one (UTC) day."""
+    __tablename__ = 'event_daily_counts'
+
+    kind = db.Column(db.String(16), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_event_daily_counts_kind_day', 'kind', 'day'),
+    )
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<EventDailyCount {self.kind}:{self.entity_id} {self.day}={self.count}>"
+
+
+class EventTotal(db.Model):
+    """All-time events of one kind for one entity (the view counter shown on pages)."""
+    __tablename__ = 'event_totals'
+
+    kind = db.Column(db.String(16), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_event_totals_kind_count', 'kind', 'count'),
+    )
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<EventTotal {self.kind}:{self.entity_id}={self.count}>"
+
+
+class EventRollup(db.Model):
+    """Single row (id 1): events with ids up to last_event_id are in the counters."""
+    __tablename__ = 'event_rollups'
+
+    id = db.Column(db.Integer, primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC).replace(tzinfo=None), nullable=False)
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<EventRollup events<={self.last_event_id}>"
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Raw inbound payment webhooks, stored before any processing."""
+from datetime import datetime, UTC
+from agrifarma.extensions import db
+
+WEBHOOK_STATUSES = ("pending", "processing", "applied", "ignored", "error")
+
+class WebhookEvent(db.Model):
+    """One verified webhook delivery.
+
+    The raw body is written once and never changed; the worker only fills in
+    ``status``/``processed_at``. (provider, event_id) is unique so redeliveries
+    are dropped at insert time.
+    """
+    __tablename__ = 'webhook_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(32), nullable=False)
+    event_id = db.Column(db.String(128), nullable=False)
+    event_type = db.Column(db.String(64))
+    payment_status = db.Column(db.String(32))  # target Order.payment_status, if any
+    transaction_id = db.Column(db.String(128), index=True)
+    order_id = db.Column(db.Integer, index=True)
+    payload = db.Column(db.Text, nullable=False)
+    received_at = db.Column(db.DateTime, default=lambda: datetime.now(UTC), nullable=False)
+    processed_at = db.Column(db.DateTime)
+    status = db.Column(db.String(16), default='pending', nullable=False)  # one of WEBHOOK_STATUSES
+    error = db.Column(db.String(255))
+
+    __table_args__ = (
+        db.UniqueConstraint('provider', 'event_id', name='uq_webhook_provider_event'),
+        db.Index('ix_webhook_events_status_id', 'status', 'id'),
+    )
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<WebhookEvent {self.provider}:{self.event_id} {self.status}>"
@@ -12,7 +12,8 @@ from agrifarma.models.ecommerce import Product, Order, OrderItem, Review
 from agrifarma.models.blog import BlogPost, Comment
 from agrifarma.models.forum import Thread, Post
 from agrifarma.models.consultancy import Consultant
-from agrifarma.services import analytics
+from agrifarma.services import analytics, cohorts, date_ranges, forecast, funnel, sketches, tracking, user_stats
+from agrifarma.services import tags as tag_service
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -46,9 +47,9 @@ def dashboard():
 
     # Registration trend (last N days, default 14)
     trend_days = request.args.get('reg_days', 14, type=int)
-    start_window = datetime.now(UTC) - timedelta(days=trend_days - 1)
-    window_users = User.query.filter(User.join_date >= start_window).all()
-    reg_trend = analytics.registration_trend(window_users, trend_days) if window_users else analytics.registration_trend([], trend_days)
+    trend_days = max(trend_days, 1)
+    start_window = datetime.combine(datetime.now(UTC).date() - timedelta(days=trend_days - 1), datetime.min.time(), UTC)
+    reg_trend = analytics.as_series(*analytics.registration_counts(start_window))
 
     # Orders by status (pie)
     status_rows = db.session.query(Order.status, func.count(Order.id)).group_by(Order.status).all()
@@ -57,23 +58,11 @@ def dashboard():
     # Revenue over time (last 30 days) - consider Paid orders only
     days = 30
     start_revenue = datetime.now(UTC) - timedelta(days=days-1)
-    paid_orders = Order.query.filter(Order.created_at >= start_revenue).all()
-    revenue_series = {}
-    for o in paid_orders:
-        # Treat Confirmed/Paid as revenue; fall back to total_amount if present
-        if getattr(o, 'payment_status', None) == 'Paid' or getattr(o, 'status', '') in ('Confirmed', 'Completed'):
-            d = o.created_at.date().isoformat()
-            revenue_series[d] = float(revenue_series.get(d, 0.0) + float(getattr(o, 'total_amount', 0) or 0))
-    # Ensure contiguous days for charting
-    series_labels = []
-    series_values = []
-    cur_date = start_revenue.date()
-    end_date = datetime.now(UTC).date()
-    while cur_date <= end_date:
-        k = cur_date.isoformat()
-        series_labels.append(k)
-        series_values.append(round(revenue_series.get(k, 0.0), 2))
-        cur_date += timedelta(days=1)
+    # Treat Confirmed/Paid as revenue; contiguous days for charting
+    revenue_days, _, revenue = analytics.order_counts(start_revenue)
+    series_labels = [row['date'] for row in analytics.as_series(revenue_days, revenue)]
+    series_values = [round(v, 2) for v in revenue.tolist()]
+    series_avg = [round(v, 2) for v in analytics.rolling_mean(revenue, 7).tolist()]
 
     # Top products by revenue (last 30 days)
     top_rows = db.session.query(
@@ -85,6 +74,17 @@ def dashboard():
     top_rows = top_rows.group_by(Product.name).order_by(func.sum(OrderItem.quantity * OrderItem.unit_price).desc()).limit(5).all()
     top_products = [{'name': r[0], 'revenue': float(r[1] or 0)} for r in top_rows]
 
+    # Searches, product views and unique visitors (last 7 days) from the daily sketches,
+    # as of the workers' last flush
+    sketch_end = datetime.now(UTC).date() + timedelta(days=1)
+    sketch_start = sketch_end - timedelta(days=7)
+    visitors_by_day, visitors_total = sketches.distinct_by_day('visitors', sketch_start, sketch_end)
+    top_searches = sketches.top('searches', sketch_start, sketch_end, 10)
+    top_autocomplete = sketches.top('autocomplete', sketch_start, sketch_end, 10)
+    viewed = [(int(key), n) for key, n in sketches.top('products', sketch_start, sketch_end, 10)]
+    names = dict(db.session.query(Product.id, Product.name).filter(Product.id.in_([i for i, _ in viewed])).all()) if viewed else {}
+    most_viewed = [(i, names.get(i, f'#{i}'), n) for i, n in viewed]
+
     return render_template(
         'admin_analytics_dashboard.html',
         users_count=users_count,
@@ -102,7 +102,13 @@ def dashboard():
         orders_by_status=orders_by_status,
         revenue_labels=series_labels,
         revenue_values=series_values,
+        revenue_avg=series_avg,
         top_products=top_products,
+        visitors_by_day=visitors_by_day,
+        visitors_total=visitors_total,
+        top_searches=top_searches,
+        top_autocomplete=top_autocomplete,
+        most_viewed=most_viewed,
     )
 
 @bp.route('/users', methods=['GET','POST'])
@@ -155,8 +161,10 @@ def moderation():
             if not bpst:
                 abort(404)
             if action == 'approve':
-                bpst.approved = True
+                tag_service.set_approved(bpst, True)
             elif action == 'delete':
+                user_stats.on_blog_post_deleted(bpst)
+                tag_service.on_post_deleted(bpst)
                 db.session.delete(bpst)
             db.session.commit()
         flash('Moderation action applied.', 'success')
@@ -166,20 +174,22 @@ def moderation():
     pending_posts = BlogPost.query.filter_by(approved=False).order_by(BlogPost.created_at.desc()).all()
     return render_template('product_moderation.html', products=inactive_products, posts=pending_posts)
 
+def _report_range() -> date_ranges.DateRange:
+    """start/end query days of the report views as a half-open UTC range (400 when malformed)."""
+    try:
+        return date_ranges.from_args(request.args, 'start', 'end', default_days=30)
+    except ValueError:
+        abort(400)
+
+
 @bp.route('/reports')
 @login_required
 @admin_required
 def reports():
-    # Date range filters
-    fmt = '%Y-%m-%d'
-    today = datetime.now(UTC).date()
-    start_str = request.args.get('start', (today - timedelta(days=30)).strftime(fmt))
-    end_str = request.args.get('end', today.strftime(fmt))
-    try:
-        start = datetime.strptime(start_str, fmt).replace(tzinfo=UTC)
-        end = datetime.strptime(end_str, fmt).replace(tzinfo=UTC) + timedelta(days=1)
-    except ValueError:
-        abort(400)
+    # Date range filters (last 30 days by default)
+    dates = _report_range()
+    start, end = dates.start, dates.end
+    start_str, end_str = dates.strings()
 
     # Top selling products in range
     rows = db.session.query(
@@ -187,7 +197,7 @@ def reports():
         func.sum(OrderItem.quantity).label('units'),
         func.sum(OrderItem.quantity * OrderItem.unit_price).label('revenue')
     ).join(OrderItem, OrderItem.product_id == Product.id)
-    rows = rows.join(Order, OrderItem.order_id == Order.id).filter(Order.created_at >= start, Order.created_at < end)
+    rows = dates.apply(rows.join(Order, OrderItem.order_id == Order.id), Order.created_at)
     rows = rows.group_by(Product.id, Product.name).all()
     top_revenue = None
     top_units = None
@@ -204,40 +214,66 @@ def reports():
     if low_threshold is None:
         low_threshold = int(current_app.config.get('LOW_INVENTORY_THRESHOLD', 5))
     low_inventory = Product.query.filter(Product.inventory < low_threshold).order_by(Product.inventory.asc()).limit(50).all()
+    # Velocity-aware reorder list from the last forecast run (flask forecast refresh)
+    reorder = forecast.reorder_list(50)
+    forecast_run = forecast.latest_run()
 
     # New user registrations by date range (counts per day)
-    users_q = User.query.filter(User.join_date >= start, User.join_date < end, User.role == 'User').all()
-    reg_data = analytics.count_registrations_by_day(users_q) if users_q else None
+    reg_days, reg_counts = analytics.registration_counts(start, end, role='User')
+    reg_data = analytics.as_series(reg_days, reg_counts, nonzero=True) if reg_counts.any() else None
 
     # Order summaries and filter
     status = request.args.get('status','')
     customer = request.args.get('customer','').strip()
-    orders_query = Order.query.filter(Order.created_at >= start, Order.created_at < end)
+    orders_query = dates.apply(Order.query, Order.created_at)
     if status:
         orders_query = orders_query.filter(Order.status == status)
     if customer:
         orders_query = orders_query.join(User, User.id == Order.user_id).filter(User.email.ilike(f'%{customer}%'))
     orders = orders_query.order_by(Order.created_at.desc()).limit(200).all()
 
+    # Cohort retention (cells kept current by the flush thread / `flask cohorts refresh`) and funnel
+    cohort_metric = request.args.get('cohort_metric', 'active')
+    if cohort_metric not in cohorts.METRICS:
+        cohort_metric = 'active'
+    cohort_weeks = min(max(request.args.get('cohort_weeks', current_app.config.get('COHORT_REPORT_WEEKS', 12), type=int), 1), 260)
+    retention = cohorts.retention(cohort_metric, cohort_weeks)
+    funnel_rows = funnel.summary(start, end)
+
+    # Most viewed products and articles in range, from the daily view counters
+    most_viewed = {}
+    for kind, model, label in (('product', Product, 'name'), ('blog', BlogPost, 'title')):
+        counts = tracking.top(kind, 10, dates.first, dates.end_day)
+        names = dict(db.session.query(model.id, getattr(model, label))
+                     .filter(model.id.in_([i for i, _ in counts])).all()) if counts else {}
+        most_viewed[kind] = [(i, names.get(i, f'#{i}'), n) for i, n in counts]
+
     return render_template('reports.html',
                            start=start_str, end=end_str, status=status, customer=customer, low=low_threshold,
-                           top_revenue=top_revenue, top_units=top_units, low_inventory=low_inventory, reg_data=reg_data, orders=orders)
+                           top_revenue=top_revenue, top_units=top_units, low_inventory=low_inventory, reg_data=reg_data, orders=orders,
+                           retention=retention, cohort_metric=cohort_metric, cohort_weeks=cohort_weeks,
+                           cohort_metrics=cohorts.METRICS, funnel_rows=funnel_rows, most_viewed=most_viewed,
+                           reorder=reorder, forecast_run=forecast_run)
+
+
+@bp.route('/inventory-alerts')
+@login_required
+@admin_required
+def inventory_alerts():
+    """Feed of reorder alerts raised by the forecast job, newest first."""
+    show_resolved = request.args.get('resolved', '1') != '0'
+    alerts = forecast.alert_feed(100, include_resolved=show_resolved)
+    return render_template('inventory_alerts.html', alerts=alerts, show_resolved=show_resolved,
+                           forecast_run=forecast.latest_run())
 
 
 @bp.route('/reports/sales.csv')
 @login_required
 @admin_required
 def report_sales_csv():
-    # optional date range
-    fmt = '%Y-%m-%d'
-    today = datetime.now(UTC).date()
-    start_str = request.args.get('start', (today - timedelta(days=30)).strftime(fmt))
-    end_str = request.args.get('end', today.strftime(fmt))
-    try:
-        start = datetime.strptime(start_str, fmt).replace(tzinfo=UTC)
-        end = datetime.strptime(end_str, fmt).replace(tzinfo=UTC) + timedelta(days=1)
-    except ValueError:
-        abort(400)
+    # Date range filters (last 30 days by default)
+    dates = _report_range()
+    start_str, end_str = dates.strings()
 
     q = db.session.query(
         Order.id.label('order_id'),
@@ -250,7 +286,7 @@ def report_sales_csv():
         OrderItem.unit_price,
         (OrderItem.quantity * OrderItem.unit_price).label('line_total')
     ).join(OrderItem, OrderItem.order_id == Order.id).join(Product, Product.id == OrderItem.product_id)
-    q = q.filter(Order.created_at >= start, Order.created_at < end)
+    q = dates.apply(q, Order.created_at)
     rows = q.all()
 
     try:
@@ -281,16 +317,9 @@ def report_sales_csv():
 @login_required
 @admin_required
 def report_sales_xlsx():
-    # optional date range
-    fmt = '%Y-%m-%d'
-    today = datetime.now(UTC).date()
-    start_str = request.args.get('start', (today - timedelta(days=30)).strftime(fmt))
-    end_str = request.args.get('end', today.strftime(fmt))
-    try:
-        start = datetime.strptime(start_str, fmt).replace(tzinfo=UTC)
-        end = datetime.strptime(end_str, fmt).replace(tzinfo=UTC) + timedelta(days=1)
-    except ValueError:
-        abort(400)
+    # Date range filters (last 30 days by default)
+    dates = _report_range()
+    start_str, end_str = dates.strings()
 
     q = db.session.query(
         Order.id.label('order_id'),
@@ -303,7 +332,7 @@ def report_sales_xlsx():
         OrderItem.unit_price,
         (OrderItem.quantity * OrderItem.unit_price).label('line_total')
     ).join(OrderItem, OrderItem.order_id == Order.id).join(Product, Product.id == OrderItem.product_id)
-    q = q.filter(Order.created_at >= start, Order.created_at < end)
+    q = dates.apply(q, Order.created_at)
     rows = q.all()
 
     try:
@@ -5,8 +5,9 @@ from sqlalchemy import or_
 from agrifarma.extensions import db
 from agrifarma.models.ecommerce import Product
 from agrifarma.models.blog import BlogPost
-from agrifarma.models.forum import Thread, Post
+from agrifarma.models.forum import Thread
 from agrifarma.models.consultancy import Consultant
+from agrifarma.services import catalog
 
 bp = Blueprint('api', __name__, url_prefix='/api/v1')
 
@@ -51,7 +52,10 @@ def guard():
 def products():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
-    q = Product.query.filter(Product.status == 'Active').order_by(Product.created_at.desc())
+    sort = request.args.get('sort', 'new')
+    if sort not in catalog.SORTS:
+        sort = 'new'
+    q = catalog.order_by(Product.query.filter(Product.status == 'Active'), sort)
     items, total = paginate_query(q, page, per_page)
     data = [
         {
@@ -61,11 +65,13 @@ def products():
             'price': float(p.price or 0),
             'category': p.category,
             'inventory': p.inventory,
+            'rating_avg': round(p.rating_avg or 0, 2),
+            'rating_count': p.rating_count or 0,
             'images': p.image_list() if hasattr(p, 'image_list') else []
         }
         for p in items
     ]
-    return jsonify({'items': data, 'page': page, 'per_page': per_page, 'total': total})
+    return jsonify({'items': data, 'page': page, 'per_page': per_page, 'total': total, 'sort': sort})
 
 
 @bp.get('/blog_posts')
@@ -98,14 +104,13 @@ def forum_threads():
     items, total = paginate_query(q, page, per_page)
     data = []
     for t in items:
-        posts_count = Post.query.filter_by(thread_id=t.id).count()
         data.append({
             'id': t.id,
             'title': t.title,
             'category': t.category.name if t.category else None,
             'author': t.author.profile.name if t.author and t.author.profile else t.author.email if t.author else None,
             'created_at': t.created_at.isoformat() if t.created_at else None,
-            'posts_count': posts_count
+            'posts_count': t.post_count
         })
     return jsonify({'items': data, 'page': page, 'per_page': per_page, 'total': total})
 
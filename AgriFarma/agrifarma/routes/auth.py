@@ -12,6 +12,7 @@ from agrifarma.models.profile import Profile
 from agrifarma.models.password_reset import PasswordResetToken
 from agrifarma.forms.user import RegisterForm, LoginForm, EditProfileForm, ForgotPasswordForm, ResetPasswordForm
 from agrifarma.services import email as email_service
+from agrifarma.services import user_stats
 
 bp = Blueprint("auth", __name__)
 
@@ -56,6 +57,7 @@ def register():
             expertise_level=form.expertise_level.data or None,
         )
         db.session.add(profile)
+        user_stats.rebuild_user(user.id)  # renders only read the row, so create it with the account
         db.session.commit()
 
         login_user(user)
@@ -106,7 +108,9 @@ def profile_view(id: int):
     if not user:
         abort(404)
     # Permissions: allow viewing profiles; editing restricted separately
-    return render_template("profile_view.html", user=user, profile=user.profile)
+    # Counters and recent activity come from one user_stats row
+    stats = user_stats.stats_for(user.id)
+    return render_template("profile_view.html", user=user, profile=user.profile, stats=stats)
 
 
 @bp.route("/profile/edit", methods=["GET", "POST"])
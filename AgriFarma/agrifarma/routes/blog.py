@@ -4,7 +4,9 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from agrifarma.services.security import admin_required as admin_only
 from agrifarma.extensions import db, media
-from agrifarma.services import uploads
+from agrifarma.services import ranking, tracking, uploads, user_stats
+from agrifarma.services import tags as tag_service
+from agrifarma.services import likes as like_service
 from agrifarma.models.blog import BlogPost, Comment
 from agrifarma.models.likes import BlogLike
 from agrifarma.forms.blog import BlogPostForm, CommentForm
@@ -15,19 +17,25 @@ bp = Blueprint('blog', __name__, url_prefix='/blog')
 @bp.app_context_processor
 def inject_latest_trending():
     latest = BlogPost.query.filter_by(approved=True).order_by(BlogPost.created_at.desc()).limit(5).all()
-    # Trending stub: latest with most comments (simplified)
-    trending = BlogPost.query.filter_by(approved=True).outerjoin(Comment).group_by(BlogPost.id).order_by(db.func.count(Comment.id).desc()).limit(5).all()
+    # Trending: top of the decayed hot_score index (likes/comments weighted by recency)
+    trending = ranking.top('blog', 5)
     return dict(latest_blog_posts=latest, trending_blog_posts=trending)
 
 @bp.route('/')
 def list_posts():
     page = request.args.get('page', 1, type=int)
     q = request.args.get('q', '').strip()
+    active_tags = tag_service.parse(','.join(request.args.getlist('tag')))
     query = BlogPost.query.filter_by(approved=True)
     if q:
-        query = query.filter(or_(BlogPost.title.ilike(f'%{q}%'), BlogPost.tags.ilike(f'%{q}%')))
+        # free text matches titles, or a tag exactly (never a substring of one)
+        query = query.filter(or_(BlogPost.title.ilike(f'%{q}%'),
+                                 BlogPost.id.in_(tag_service.posts_with_all_tags([q]))))
+    if active_tags:
+        query = query.filter(BlogPost.id.in_(tag_service.posts_with_all_tags(active_tags)))
     pagination = query.order_by(BlogPost.created_at.desc()).paginate(page=page, per_page=10, error_out=False)
-    return render_template('blog_list.html', posts=pagination.items, pagination=pagination, search_query=q)
+    return render_template('blog_list.html', posts=pagination.items, pagination=pagination, search_query=q,
+                           active_tags=active_tags, tag_cloud=tag_service.tag_cloud())
 
 @bp.route('/post/<int:post_id>', methods=['GET','POST'])
 def detail(post_id):
@@ -43,11 +51,19 @@ def detail(post_id):
             return redirect(url_for('auth.login'))
         comment = Comment(blog_id=post.id, author_id=current_user.id, content=form.content.data)
         db.session.add(comment)
+        db.session.flush()
+        user_stats.on_comment_created(comment, post)
+        ranking.record('blog', post.id, 'comment')
         db.session.commit()
         flash('Comment posted.', 'success')
         return redirect(url_for('blog.detail', post_id=post.id))
     comments = Comment.query.filter_by(blog_id=post.id, approved=True).order_by(Comment.created_at.asc()).all()
-    return render_template('blog_detail.html', post=post, comments=comments, form=form)
+    viewer_id = current_user.id if current_user.is_authenticated else None
+    tracking.track('blog', post.id)
+    return render_template('blog_detail.html', post=post, comments=comments, form=form,
+                           view_count=tracking.view_count('blog', post.id),
+                           like_count=like_service.like_counts('blog', [post.id]).get(post.id, 0),
+                           user_liked=post.id in like_service.liked_ids('blog', viewer_id, [post.id]))
 
 @bp.route('/new', methods=['GET','POST'])
 @login_required
@@ -61,13 +77,16 @@ def new_post():
             content=form.content.data,
             category=form.category.data,
             author_id=current_user.id,
-            tags=form.tags.data or '',
             media_files=','.join(filenames) if filenames else ''
         )
         # Non-admin posts auto-approved (or set to False if moderation required)
         if current_user.role != 'Admin':
             post.approved = True
         db.session.add(post)
+        db.session.flush()
+        tag_service.set_post_tags(post, form.tags.data)
+        user_stats.on_blog_post_created(post)
+        ranking.record('blog', post.id, 'create')
         db.session.commit()
         flash('Blog post published.', 'success')
         return redirect(url_for('blog.detail', post_id=post.id))
@@ -81,7 +100,7 @@ def approve_post(post_id):
     post = db.session.get(BlogPost, post_id)
     if not post:
         abort(404)
-    post.approved = True
+    tag_service.set_approved(post, True)
     db.session.commit()
     flash('Post approved.', 'info')
     return redirect(url_for('blog.detail', post_id=post.id))
@@ -93,6 +112,8 @@ def delete_post(post_id):
     post = db.session.get(BlogPost, post_id)
     if not post:
         abort(404)
+    user_stats.on_blog_post_deleted(post)
+    tag_service.on_post_deleted(post)
     db.session.delete(post)
     db.session.commit()
     flash('Post deleted.', 'info')
@@ -106,6 +127,8 @@ def delete_comment(comment_id):
     if not comment:
         abort(404)
     post_id = comment.blog_id
+    user_stats.on_comment_deleted(comment)
+    ranking.record('blog', post_id, 'comment', delta=-1, at=comment.created_at)
     db.session.delete(comment)
     db.session.commit()
     flash('Comment deleted.', 'info')
@@ -120,15 +143,19 @@ def toggle_like_blog(post_id):
         abort(404)
 
     existing = BlogLike.query.filter_by(blog_id=post.id, user_id=current_user.id).first()
-    if existing:
+    liked = like_service.wanted_state(existing is not None, request.form.get('action'))
+    if existing and not liked:
+        ranking.record('blog', post.id, 'like', delta=-1, at=existing.created_at)
         db.session.delete(existing)
-        action = 'unliked'
-    else:
+    elif liked and not existing:
         db.session.add(BlogLike(blog_id=post.id, user_id=current_user.id))
-        action = 'liked'
-    db.session.commit()
+        ranking.record('blog', post.id, 'like')
+    if liked != (existing is not None):
+        db.session.commit()
+    like_service.record_toggle('blog', current_user.id, post.id, liked)
+    action = 'liked' if liked else 'unliked'
 
-    like_count = BlogLike.query.filter_by(blog_id=post.id).count()
+    like_count = like_service.like_counts('blog', [post.id]).get(post.id, 0)
     if request.is_json or request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'application/json':
         return jsonify({'action': action, 'like_count': like_count})
     flash(f'Blog {action}.', 'success')
@@ -1,19 +1,29 @@
 # -*- coding: utf-8 -*-
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify
 from flask_login import login_required, current_user
 from agrifarma.services.security import admin_required as admin_only
 from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
 
 from agrifarma.extensions import db
 from agrifarma.forms.consultancy import ConsultantRegisterForm
 from agrifarma.forms.message import MessageForm
 from agrifarma.models.consultancy import Consultant, CONSULTANT_CATEGORIES, APPROVAL_STATUSES
-from agrifarma.models.message import Message
+from agrifarma.models.message import Conversation, Message
 from agrifarma.models.user import User
+from agrifarma.services import inbox as inbox_service
 
 bp = Blueprint('consultancy', __name__)
 
 
+@bp.app_context_processor
+def inject_unread_messages():
+    # Maintained counter on user_stats: one primary-key read per page
+    if current_user.is_authenticated:
+        return dict(unread_messages=inbox_service.unread_total(current_user.id))
+    return dict(unread_messages=0)
+
+
 @bp.route('/consultant/register', methods=['GET', 'POST'])
 @login_required
 def consultant_register():
@@ -68,13 +78,7 @@ def send_message(consultant_id: int):
     
     form = MessageForm()
     if form.validate_on_submit():
-        message = Message(
-            sender_id=current_user.id,
-            receiver_id=consultant.user_id,
-            subject=form.subject.data,
-            content=form.content.data
-        )
-        db.session.add(message)
+        inbox_service.send(current_user.id, consultant.user_id, form.subject.data, form.content.data)
         db.session.commit()
         flash('Message sent successfully!', 'success')
     else:
@@ -87,17 +91,53 @@ def send_message(consultant_id: int):
 @bp.route('/consultancy/inbox')
 @login_required
 def inbox():
-    """View user's received messages"""
+    """View user's conversations, most recent first"""
     page = request.args.get('page', 1, type=int)
     per_page = 20
-    
-    messages = Message.query.filter_by(receiver_id=current_user.id).order_by(Message.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
-    
-    unread_count = Message.query.filter_by(receiver_id=current_user.id, read=False).count()
-    
-    return render_template('inbox.html', messages=messages, unread_count=unread_count)
+
+    conversations = inbox_service.inbox_page(current_user.id, page, per_page)
+    other_ids = {m.conversation.other_user_id(current_user.id) for m in conversations.items}
+    people = {u.id: u for u in User.query.options(selectinload(User.profile)).filter(User.id.in_(other_ids))} if other_ids else {}
+
+    return render_template('inbox.html', conversations=conversations, people=people,
+                           unread_count=inbox_service.unread_total(current_user.id))
+
+@bp.route('/consultancy/inbox/mark-read', methods=['POST'])
+@login_required
+def mark_read():
+    """Mark messages read in bulk: given conversations (conversation_id, repeatable) or everything"""
+    conversation_ids = request.form.getlist('conversation_id', type=int) or None
+    marked = inbox_service.mark_read(current_user.id, conversation_ids=conversation_ids)
+    db.session.commit()
+    if request.is_json or request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'application/json':
+        return jsonify({'marked': marked, 'unread': inbox_service.unread_total(current_user.id)})
+    flash(f'Marked {marked} message{"s" if marked != 1 else ""} as read.', 'info')
+    return redirect(url_for('consultancy.inbox'))
+
+@bp.route('/consultancy/conversation/<int:conversation_id>', methods=['GET', 'POST'])
+@login_required
+def conversation_view(conversation_id: int):
+    """A conversation's messages in order, with a reply form"""
+    conversation = db.session.get(Conversation, conversation_id)
+    if not conversation or current_user.id not in (conversation.user_low_id, conversation.user_high_id):
+        abort(404)
+    other = db.session.get(User, conversation.other_user_id(current_user.id))
+    form = MessageForm()
+    if form.validate_on_submit():
+        inbox_service.send(current_user.id, other.id, form.subject.data, form.content.data)
+        db.session.commit()
+        flash('Message sent successfully!', 'success')
+        return redirect(url_for('consultancy.conversation_view', conversation_id=conversation.id))
+    if request.method == 'GET' and conversation.last_subject:
+        subject = conversation.last_subject
+        form.subject.data = subject if subject.lower().startswith('re:') else f'Re: {subject}'
+
+    messages = inbox_service.messages_in(conversation)
+    # Opening the conversation reads it: one UPDATE for all of its unread messages
+    if inbox_service.mark_read(current_user.id, conversation_ids=[conversation.id]):
+        db.session.commit()
+    return render_template('conversation.html', conversation=conversation, other=other,
+                           messages=messages, form=form)
 
 @bp.route('/consultancy/message/<int:message_id>')
 @login_required
@@ -1,16 +1,31 @@
 # -*- coding: utf-8 -*-
 import math
-from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
+import secrets
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app, jsonify
 from flask_login import login_required, current_user
 from agrifarma.services.security import admin_required as admin_only
 from agrifarma.services import email as email_service
 from agrifarma.services import payment as payment_service
-from sqlalchemy import or_, func
+from agrifarma.services import inventory as inventory_service
+from agrifarma.services import idempotency
+from agrifarma.services import push
+from agrifarma.services import recommendations
+from agrifarma.services import catalog
+from agrifarma.services import date_ranges
+from agrifarma.services import funnel
+from agrifarma.services import product_import
+from agrifarma.services import reviews as review_service
+from agrifarma.services import seller_stats
+from agrifarma.services import tracking
+from agrifarma.services import user_stats
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 
 from agrifarma.extensions import db
 from agrifarma.models.ecommerce import Product, Review, CartItem, Order, OrderItem
-from agrifarma.forms.ecommerce import ProductForm, AddToCartForm, UpdateCartItemForm, CheckoutForm, ReviewForm
+from agrifarma.models.user import User
+from agrifarma.models.product_import import ProductImport
+from agrifarma.forms.ecommerce import ProductForm, ProductImportForm, AddToCartForm, UpdateCartItemForm, CheckoutForm, ReviewForm
 
 bp = Blueprint('shop', __name__)
 
@@ -22,36 +37,29 @@ def is_admin():
 # Product listing with search/sort/filter
 @bp.route('/shop')
 def shop_list():
-    category = request.args.get('category','').strip()
-    q = request.args.get('q','').strip()
-    sort = request.args.get('sort','name')  # name|price|new|featured
+    filters = catalog.CatalogFilters.from_args(request.args)
+    sort = request.args.get('sort', 'name')
+    if sort not in catalog.SORTS:
+        sort = 'name'
     page = request.args.get('page', 1, type=int)
     per_page = 12
 
-    base_query = Product.query.filter_by(status='Active')
-    if category:
-        base_query = base_query.filter(Product.category == category)
-    if q:
-        base_query = base_query.filter(or_(Product.name.ilike(f'%{q}%'), Product.description.ilike(f'%{q}%')))
-
-    # Sorting at the DB level when possible (name/new); fallback to Python where needed
-    if sort == 'new':
-        base_query = base_query.order_by(Product.created_at.desc())
-    elif sort == 'name':
-        base_query = base_query.order_by(Product.name.asc())
-
-    pagination = base_query.paginate(page=page, per_page=per_page, error_out=False)
+    # Counts come from the shared facet snapshot; the page is one indexed query
+    facets = catalog.facet_counts(filters)
+    query = catalog.order_by(filters.apply(Product.query.filter_by(status='Active')), sort)
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False, count=False)
     products = pagination.items
-
-    # Python-side sort for price/featured on the page subset
-    if products:
-        if sort == 'price':
-            products = sorted(products, key=lambda p: float(p.price))
-        elif sort == 'featured':
-            products = sorted(products, key=lambda p: (not p.featured, p.name.lower()))
+    # The snapshot can be CATALOG_FACETS_TTL old: trust the page itself where it says more
+    listed = (pagination.page - 1) * per_page + len(products)
+    if len(products) < per_page:
+        pagination.total = listed  # a short page is the last one
+    else:
+        pagination.total = max(facets.total, listed + 1)  # a full page always links to the next
 
     featured = [p for p in products if p.featured][:6]
-    return render_template('shop.html', products=products, featured=featured, selected_category=category, search_query=q, sort=sort, pagination=pagination)
+    tracking.track_many('impression', [p.id for p in products])
+    return render_template('shop.html', products=products, featured=featured, filters=filters, facets=facets,
+                           search_query=filters.q, sort=sort, pagination=pagination)
 
 @bp.route('/product/<int:product_id>', methods=['GET','POST'])
 def product_detail(product_id):
@@ -60,9 +68,10 @@ def product_detail(product_id):
         abort(404)
     add_form = AddToCartForm()
     review_form = ReviewForm()
-    # Reviews approved only
-    approved_reviews = Review.query.filter_by(product_id=product.id, approved=True).order_by(Review.created_at.desc()).all()
-    related = Product.query.filter(Product.category == product.category, Product.id != product.id, Product.status=='Active').limit(4).all()
+    # Approved reviews, one keyset page at a time; the summary comes from the product row
+    before = request.args.get('reviews_before', type=int)
+    approved_reviews, next_cursor = review_service.page(product, before, current_app.config['REVIEWS_PER_PAGE'])
+    related = recommendations.related_products(product, limit=4)
 
     if add_form.validate_on_submit() and 'quantity' in request.form:
         if not current_user.is_authenticated:
@@ -74,6 +83,7 @@ def product_detail(product_id):
             existing.quantity += qty
         else:
             db.session.add(CartItem(user_id=current_user.id, product_id=product.id, quantity=qty))
+        funnel.record('cart')
         db.session.commit()
         flash('Added to cart.', 'success')
         return redirect(url_for('shop.product_detail', product_id=product.id))
@@ -88,7 +98,11 @@ def product_detail(product_id):
         flash('Review submitted for approval.', 'info')
         return redirect(url_for('shop.product_detail', product_id=product.id))
 
-    return render_template('product_detail.html', product=product, add_form=add_form, review_form=review_form, reviews=approved_reviews, related=related)
+    # Buffered: the count shown is as of the last rollup, this view lands in the next one
+    tracking.track('product', product.id)
+    return render_template('product_detail.html', product=product, add_form=add_form, review_form=review_form, reviews=approved_reviews,
+                           reviews_next=next_cursor, reviews_paged=bool(before), related=related,
+                           view_count=tracking.view_count('product', product.id))
 
 @bp.route('/product/<int:product_id>/quick-add', methods=['POST'])
 @login_required
@@ -107,7 +121,7 @@ def quick_add_to_cart(product_id):
     else:
         db.session.add(CartItem(user_id=current_user.id, product_id=product.id, quantity=qty))
         flash(f'{product.name} added to cart!', 'success')
-    
+    funnel.record('cart')
     db.session.commit()
     
     # Return to previous page or shop list
@@ -117,7 +131,7 @@ def quick_add_to_cart(product_id):
 @bp.route('/cart')
 @login_required
 def cart_view():
-    items = CartItem.query.filter_by(user_id=current_user.id).all()
+    items = CartItem.query.options(joinedload(CartItem.product)).filter_by(user_id=current_user.id).all()
     total = sum([(i.product.price * i.quantity) for i in items]) if items else 0
     update_forms = {i.id: UpdateCartItemForm(quantity=i.quantity) for i in items}
     return render_template('cart.html', items=items, total=total, update_forms=update_forms)
@@ -144,11 +158,21 @@ def cart_update(item_id):
 @login_required
 def checkout():
     form = CheckoutForm()
-    items = CartItem.query.filter_by(user_id=current_user.id).all()
+    submitted = form.validate_on_submit()
+    claimed = None
+    if submitted:
+        # Double-clicks and proxy retries carry the same key: replay, don't re-run
+        key = request.headers.get('Idempotency-Key') or form.idempotency_key.data
+        claimed = idempotency.claim('checkout', key, current_user.id)
+        if claimed.replay:
+            return _replay_checkout(claimed)
+    # Load products with the cart rows so pricing doesn't lazy-load per item
+    items = CartItem.query.options(joinedload(CartItem.product)).filter_by(user_id=current_user.id).all()
     if not items:
+        idempotency.release(claimed)
         flash('Cart is empty.', 'warning')
         return redirect(url_for('shop.shop_list'))
-    if form.validate_on_submit():
+    if submitted:
         # Create order
         order = Order(
             user_id=current_user.id, 
@@ -159,6 +183,8 @@ def checkout():
         )
         db.session.add(order)
         db.session.flush()
+        user_stats.on_order_created(order)
+        funnel.record('checkout')
         
         # Add order items
         total = 0
@@ -172,24 +198,65 @@ def checkout():
             total += item.product.price * item.quantity
         
         order.total_amount = total
-        
-        # Process payment
-        payment_result = payment_service.process_order_payment(
-            order_id=order.id,
-            amount=total,
-            customer_email=current_user.email,
-            payment_method=form.payment_method.data
+
+        # Take stock for the whole order in one conditional UPDATE
+        reservation = inventory_service.reserve_order_stock(
+            order.id, [(item.product_id, item.quantity) for item in items]
         )
+        if not reservation.success:
+            db.session.rollback()
+            idempotency.release(claimed)
+            names = {item.product_id: item.product.name for item in items}
+            short = ', '.join(f'{names.get(pid, pid)} ({left} left)' for pid, left in reservation.shortages.items())
+            flash(f'Not enough stock for: {short}. Please update your cart.', 'warning')
+            return redirect(url_for('shop.cart_view'))
+        
+        # Process payment. The order and its reservation are already committed
+        # (claiming keys commits), so an error here must still fail the order
+        # and hand the stock back rather than leave it Pending for good.
+        order_id = order.id
+        try:
+            payment_result = payment_service.process_order_payment(
+                order_id=order_id,
+                amount=total,
+                customer_email=current_user.email,
+                payment_method=form.payment_method.data,
+                payment_token=form.payment_token.data or None,
+                mobile_number=form.mobile_number.data or None
+            )
+        except Exception:
+            current_app.logger.exception(f"Payment error for order {order_id}")
+            db.session.rollback()
+            order = db.session.get(Order, order_id)
+            if order is None:
+                # failed before anything was committed: the rollback undid the order and reservation
+                idempotency.release(claimed)
+                flash('Payment could not be processed. Please try again.', 'danger')
+                return redirect(url_for('shop.checkout'))
+            payment_result = payment_service.PaymentResult(success=False, message='Payment could not be processed')
+        # No response from the gateway: it may still have charged the card
+        unknown = bool(payment_result.data.get('outcome_unknown'))
+        idempotency.complete(claimed, {
+            'order_id': order.id,
+            'success': payment_result.success,
+            'pending': unknown,
+            'transaction_id': payment_result.transaction_id,
+            'message': payment_result.message,
+        })
+        # Keep a reference whatever the outcome so reconciliation and webhooks can find the charge
+        order.payment_transaction_id = payment_result.transaction_id or payment_service.order_payment_key(order.id)
         
         if payment_result.success:
             order.payment_status = 'Paid'
-            order.payment_transaction_id = payment_result.transaction_id
             order.status = 'Confirmed'
+            seller_stats.add_orders([order.id])
             
             # Clear cart
             for item in items:
                 db.session.delete(item)
             
+            push.notify_order(current_user.id, order.id, order.payment_status, order.status)
+            funnel.record('paid')
             db.session.commit()
             
             # Send order confirmation email
@@ -201,43 +268,86 @@ def checkout():
             )
             
             flash(f'🎉 Payment Successful! Your order has been placed. Order ID: #{order.id} | Transaction ID: {payment_result.transaction_id} | Total: ${total:.2f}', 'success')
+        elif unknown:
+            # Keep the order Pending with its stock; a webhook or reconciliation
+            # settles it through the stored reference
+            for item in items:
+                db.session.delete(item)
+            db.session.commit()
+            flash(f'We could not confirm your payment yet. Order #{order.id} stays pending and will be updated as soon as the payment provider responds.', 'warning')
         else:
             order.payment_status = 'Failed'
+            order.status = 'Cancelled'
+            inventory_service.release_order_stock(order.id)
+            push.notify_order(current_user.id, order.id, order.payment_status, order.status)
             db.session.commit()
             flash(f'Payment failed: {payment_result.message}. Please try again.', 'danger')
             return redirect(url_for('shop.checkout'))
         
         return redirect(url_for('shop.order_history'))
+    if not form.idempotency_key.data:
+        form.idempotency_key.data = secrets.token_urlsafe(24)
     cart_total = sum([(i.product.price * i.quantity) for i in items]) if items else 0
     return render_template('checkout.html', form=form, items=items, cart_total=cart_total)
 
+def _replay_checkout(claimed):
+    """Answer a repeated checkout submission from the stored outcome."""
+    if claimed.in_progress:
+        flash('Your order is already being processed.', 'info')
+        return redirect(url_for('shop.order_history'))
+    outcome = claimed.response or {}
+    if outcome.get('success'):
+        flash(f"Order #{outcome.get('order_id')} has already been placed.", 'info')
+        return redirect(url_for('shop.order_history'))
+    if outcome.get('pending'):
+        flash(f"Order #{outcome.get('order_id')} is waiting for payment confirmation.", 'info')
+        return redirect(url_for('shop.order_history'))
+    flash(f"Payment failed: {outcome.get('message') or 'this checkout was already submitted'}. Please try again.", 'danger')
+    return redirect(url_for('shop.checkout'))
+
 @bp.route('/orders')
 @login_required
 def order_history():
     """Order history with optional date range filtering."""
     page = request.args.get('page', 1, type=int)
     per_page = 20
-    date_from_str = request.args.get('date_from', '').strip()
-    date_to_str = request.args.get('date_to', '').strip()
-    date_from = None
-    date_to = None
     try:
-        if date_from_str:
-            date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
-        if date_to_str:
-            date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
+        dates = date_ranges.from_args(request.args, 'date_from', 'date_to')
     except ValueError:
-        date_from = None
-        date_to = None
-
-    base = Order.query.filter_by(user_id=current_user.id)
-    if date_from:
-        base = base.filter(func.date(Order.created_at) >= date_from)
-    if date_to:
-        base = base.filter(func.date(Order.created_at) <= date_to)
+        dates = date_ranges.DateRange()
 
+    # (user_id, created_at) index: the range is a slice of the user's orders, already in page order
+    base = dates.apply(Order.query.filter_by(user_id=current_user.id), Order.created_at)
     pagination = base.order_by(Order.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
-    return render_template('order_history.html', orders=pagination.items, pagination=pagination, date_from=date_from_str, date_to=date_to_str)
+    date_from, date_to = dates.strings()
+    return render_template('order_history.html', orders=pagination.items, pagination=pagination, date_from=date_from, date_to=date_to)
+
+# Seller dashboard
+@bp.route('/seller/dashboard')
+@login_required
+def seller_dashboard():
+    """A seller's paid sales, best sellers, low stock and open orders (admins may pass ?seller_id=)."""
+    seller_id = current_user.id
+    if is_admin():
+        seller_id = request.args.get('seller_id', current_user.id, type=int)
+    seller = db.session.get(User, seller_id)
+    if seller is None:
+        abort(404)
+    try:
+        dates = date_ranges.from_args(request.args, 'date_from', 'date_to', default_days=30)
+    except ValueError:
+        dates = date_ranges.from_args({}, default_days=30)
+
+    # per-day aggregates maintained when orders are paid: one row per day with sales
+    days = seller_stats.daily(seller_id, dates)
+    low_threshold = int(current_app.config.get('LOW_INVENTORY_THRESHOLD', 5))
+    date_from, date_to = dates.strings()
+    return render_template('seller_dashboard.html',
+                           seller=seller, days=days, totals=seller_stats.totals(days),
+                           top_products=seller_stats.top_products(seller_id, dates),
+                           low_stock=seller_stats.low_stock(seller_id, low_threshold), low=low_threshold,
+                           open_orders=seller_stats.open_orders(seller_id),
+                           date_from=date_from, date_to=date_to)
 
 # Admin product CRUD
 @bp.route('/admin/shop', methods=['GET','POST'])
@@ -247,26 +357,24 @@ def admin_dashboard():
     form = ProductForm()
     if form.validate_on_submit():
         featured_flag = form.featured.data == 'true'
-        product = Product(name=form.name.data, description=form.description.data, price=form.price.data, category=form.category.data, images=form.images.data, seller_id=current_user.id, status=form.status.data, featured=featured_flag, inventory=form.inventory.data or 0)
+        sku = (form.sku.data or '').strip() or None
+        if sku and Product.query.filter_by(sku=sku).first():
+            flash(f'SKU {sku} is already used by another product.', 'danger')
+            return redirect(url_for('shop.admin_dashboard'))
+        product = Product(name=form.name.data, sku=sku, description=form.description.data, price=form.price.data, category=form.category.data, images=form.images.data, seller_id=current_user.id, status=form.status.data, featured=featured_flag, inventory=form.inventory.data or 0)
         db.session.add(product)
+        db.session.flush()
+        inventory_service.record_adjustment(product.id, 0, product.inventory)
         db.session.commit()
         flash('Product created.', 'success')
         return redirect(url_for('shop.admin_dashboard'))
     products = Product.query.order_by(Product.created_at.desc()).limit(50).all()
 
     # Sales report with optional date filtering via GET args date_from/date_to
-    date_from_str = request.args.get('date_from', '').strip()
-    date_to_str = request.args.get('date_to', '').strip()
-    date_from = None
-    date_to = None
     try:
-        if date_from_str:
-            date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
-        if date_to_str:
-            date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
+        dates = date_ranges.from_args(request.args, 'date_from', 'date_to')
     except ValueError:
-        date_from = None
-        date_to = None
+        dates = date_ranges.DateRange()
 
     sales_query = db.session.query(
         Product.id,
@@ -275,11 +383,7 @@ def admin_dashboard():
         func.sum(OrderItem.quantity * OrderItem.unit_price)
     ).join(OrderItem, OrderItem.product_id == Product.id)\
      .join(Order, OrderItem.order_id == Order.id)
-
-    if date_from:
-        sales_query = sales_query.filter(func.date(Order.created_at) >= date_from)
-    if date_to:
-        sales_query = sales_query.filter(func.date(Order.created_at) <= date_to)
+    sales_query = dates.apply(sales_query, Order.created_at)
 
     sales_rows = sales_query.group_by(Product.id, Product.name).all()
     sales_data = None
@@ -291,7 +395,8 @@ def admin_dashboard():
         sales_data = analytics.top_n(prepared, 'revenue', n=10)
     # Pending reviews for moderation
     pending_reviews = Review.query.filter_by(approved=False).order_by(Review.created_at.desc()).limit(50).all()
-    return render_template('admin_dashboard.html', form=form, products=products, sales_data=sales_data, pending_reviews=pending_reviews, date_from=date_from_str, date_to=date_to_str)
+    date_from, date_to = dates.strings()
+    return render_template('admin_dashboard.html', form=form, products=products, sales_data=sales_data, pending_reviews=pending_reviews, date_from=date_from, date_to=date_to)
 
 @bp.route('/admin/product/<int:product_id>/edit', methods=['POST'])
 @login_required
@@ -302,6 +407,11 @@ def admin_edit_product(product_id):
         abort(404)
     form = ProductForm()
     if form.validate_on_submit():
+        sku = (form.sku.data or '').strip() or None
+        if sku and Product.query.filter(Product.sku == sku, Product.id != product.id).first():
+            flash(f'SKU {sku} is already used by another product.', 'danger')
+            return redirect(url_for('shop.admin_dashboard'))
+        product.sku = sku
         product.name = form.name.data
         product.description = form.description.data
         product.price = form.price.data
@@ -309,12 +419,69 @@ def admin_edit_product(product_id):
         product.images = form.images.data
         product.status = form.status.data
         product.featured = (form.featured.data == 'true')
-        if hasattr(form, 'inventory') and form.inventory.data is not None:
-            product.inventory = form.inventory.data
+        if 'inventory' in request.form and form.inventory.data is not None:
+            # the change the admin made to the count they saw, applied to the stock on hand now
+            seen = form.inventory_seen.data if form.inventory_seen.data is not None else product.inventory
+            inventory_service.adjust_stock({product.id: form.inventory.data - (seen or 0)})
         db.session.commit()
         flash('Product updated.', 'info')
     return redirect(url_for('shop.admin_dashboard'))
 
+@bp.route('/admin/shop/import', methods=['GET','POST'])
+@login_required
+@admin_only
+def admin_import():
+    """Upload a CSV/XLSX catalog file; it is processed by a background job."""
+    form = ProductImportForm()
+    if form.validate_on_submit():
+        try:
+            job = product_import.create_job(form.file.data, current_user.id, dry_run=form.dry_run.data)
+        except product_import.ImportFileError as exc:
+            flash(str(exc), 'danger')
+            return redirect(url_for('shop.admin_import'))
+        product_import.start(job)
+        return redirect(url_for('shop.admin_import_job', job_id=job.id))
+    jobs = ProductImport.query.order_by(ProductImport.id.desc()).limit(20).all()
+    return render_template('product_import.html', form=form, jobs=jobs, fields=product_import.FIELDS)
+
+def _import_job_or_404(job_id):
+    job = db.session.get(ProductImport, job_id)
+    if not job:
+        abort(404)
+    return job
+
+@bp.route('/admin/shop/import/<int:job_id>')
+@login_required
+@admin_only
+def admin_import_job(job_id):
+    job = _import_job_or_404(job_id)
+    return render_template('product_import_job.html', job=job)
+
+@bp.route('/admin/shop/import/<int:job_id>/progress')
+@login_required
+@admin_only
+def admin_import_progress(job_id):
+    """Polled by the job page while the import runs."""
+    job = _import_job_or_404(job_id)
+    return jsonify({
+        'status': job.status, 'percent': job.percent, 'processed': job.processed_rows, 'total': job.total_rows,
+        'created': job.created_count, 'updated': job.updated_count, 'unchanged': job.unchanged_count,
+        'errors': job.error_count, 'message': job.message,
+    })
+
+@bp.route('/admin/shop/import/<int:job_id>/apply', methods=['POST'])
+@login_required
+@admin_only
+def admin_import_apply(job_id):
+    """Run a finished dry run's file for real."""
+    job = _import_job_or_404(job_id)
+    if not job.dry_run or job.status != 'done':
+        flash('Only a finished dry run can be applied.', 'warning')
+        return redirect(url_for('shop.admin_import_job', job_id=job.id))
+    applied = product_import.apply(job, current_user.id)
+    product_import.start(applied)
+    return redirect(url_for('shop.admin_import_job', job_id=applied.id))
+
 @bp.route('/admin/product/<int:product_id>/delete', methods=['POST'])
 @login_required
 @admin_only
@@ -336,11 +503,11 @@ def admin_review_action(review_id, action):
     if not review:
         abort(404)
     if action == 'approve':
-        review.approved = True
+        review_service.set_approved(review, True)
     elif action == 'reject':
-        review.approved = False
+        review_service.set_approved(review, False)
     elif action == 'delete':
-        db.session.delete(review)
+        review_service.delete(review)
         db.session.commit()
         flash('Review deleted.', 'info')
         return redirect(url_for('shop.admin_dashboard'))
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""Server-sent event stream of the signed-in user's push channel."""
+from flask import Blueprint, abort, current_app, jsonify, request
+from flask_login import current_user, login_required
+
+from agrifarma.services import push
+from agrifarma.services.security import admin_required
+
+bp = Blueprint('events', __name__, url_prefix='/events')
+
+
+@bp.get('/stream')
+@login_required
+def stream():
+    cfg = current_app.config
+    if not cfg.get('PUSH_ENABLED'):
+        abort(404)
+    bus = push.get_bus()
+    # EventSource sends Last-Event-ID on reconnect; ?last_event_id covers manual clients
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        # everything the generator needs is captured here: it runs outside the request
+        sub = bus.subscribe(current_user.id, int(last_id) if last_id and last_id.isdigit() else None)
+    except push.TooManyConnections:
+        response = jsonify({'error': 'too many open streams'})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(int(cfg['PUSH_HEARTBEAT_SECONDS']))
+        return response
+    body = push.stream(bus, sub, cfg['PUSH_HEARTBEAT_SECONDS'], cfg['PUSH_STREAM_MAX_SECONDS'])
+    return current_app.response_class(body, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # keep nginx from buffering the stream
+        'X-Accel-Buffering': 'no',
+    })
+
+
+@bp.get('/stats')
+@admin_required
+def stats():
+    return jsonify(push.get_bus().stats())
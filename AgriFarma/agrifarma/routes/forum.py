@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify
+from flask import Blueprint, render_template, stream_template, stream_with_context, redirect, url_for, flash, request, abort, jsonify, current_app
 from flask_login import login_required, current_user
 from sqlalchemy import or_
 from sqlalchemy.orm import joinedload, selectinload
@@ -8,6 +8,10 @@ from agrifarma.extensions import db
 from agrifarma.models.forum import Category, Thread, Post
 from agrifarma.models.likes import PostLike
 from agrifarma.forms.forum import NewThreadForm, ReplyForm, MoveThreadForm
+from agrifarma.services import forum as forum_service
+from agrifarma.services import category_tree
+from agrifarma.services import likes as like_service
+from agrifarma.services import push, ranking, tracking, user_stats
 
 bp = Blueprint("forum", __name__, url_prefix="/forum")
 
@@ -24,15 +28,15 @@ def inject_latest_threads():
         .limit(10)
         .all()
     )
-    return dict(forum_latest_threads=latest)
+    return dict(forum_latest_threads=latest, forum_hot_threads=ranking.top("thread", 5))
 
 @bp.route("/")
 def index():
-    # Eager-load children and threads collections
+    # Counts and last activity are stored on the category rows; no thread loading
     categories = (
         Category.query.options(
             selectinload(Category.children),
-            selectinload(Category.threads)
+            selectinload(Category.last_thread)
         )
         .filter(Category.parent_id.is_(None))
         .order_by(Category.name.asc())
@@ -53,16 +57,39 @@ def category_view(category_id):
     if not category:
         abort(404)
     page = request.args.get("page", 1, type=int)
-    # Eager-load author for thread list to avoid N+1
+    sort = "hot" if request.args.get("sort") == "hot" else "new"
+    order = (Thread.hot_score.desc(), Thread.id.desc()) if sort == "hot" else (Thread.created_at.desc(),)
+    # Threads of this category and all its subcategories (closure table lookup);
+    # eager-load author for thread list to avoid N+1
     pagination = (
         Thread.query.options(
-            joinedload(Thread.author)
+            joinedload(Thread.author),
+            joinedload(Thread.category)
         )
-        .filter_by(category_id=category.id)
-        .order_by(Thread.created_at.desc())
+        .filter(Thread.category_id.in_(category_tree.subtree_ids_query(category.id)))
+        .order_by(*order)
         .paginate(page=page, per_page=10, error_out=False)
     )
-    return render_template("category_view.html", category=category, threads=pagination.items, pagination=pagination)
+    ancestors = category_tree.get_tree().ancestors(category.id)
+    return render_template("category_view.html", category=category, ancestors=ancestors,
+                           threads=pagination.items, pagination=pagination, sort=sort)
+
+def _stream_page(template, attach, **context):
+    """Stream a template whose context was loaded by the view."""
+    @stream_with_context
+    def generate():
+        # The view's session is closed once it returns; re-attach the loaded
+        # objects so lazy attributes still resolve while the page renders
+        for obj in attach:
+            db.session.add(obj)
+        yield from stream_template(template, **context)
+    return current_app.response_class(generate())
+
+def _post_url(post, **kwargs):
+    """Link to the page of its thread that shows this post"""
+    per_page = current_app.config['FORUM_POSTS_PER_PAGE']
+    page = forum_service.page_for(post.position or 1, per_page)
+    return url_for("forum.thread_view", thread_id=post.thread_id, page=page, _anchor=f"post-{post.id}", **kwargs)
 
 @bp.route("/thread/<int:thread_id>", methods=["GET", "POST"])
 def thread_view(thread_id):
@@ -74,33 +101,55 @@ def thread_view(thread_id):
         if not current_user.is_authenticated:
             flash("Please login to reply.", "warning")
             return redirect(url_for("auth.login"))
-        post = Post(thread_id=thread.id, author_id=current_user.id, content=form.content.data)
-        db.session.add(post)
+        forum_service.ensure_numbered(thread)
+        post = forum_service.add_post(thread, current_user.id, form.content.data)
+        user_stats.on_post_created(post, thread)
+        ranking.record("thread", thread.id, "reply")
+        if thread.author_id != current_user.id:
+            push.notify(thread.author_id, "reply", {
+                "thread_id": thread.id, "post_id": post.id, "title": thread.title, "url": _post_url(post),
+            })
         db.session.commit()
         flash("Reply posted.", "success")
-        return redirect(url_for("forum.thread_view", thread_id=thread.id))
+        return redirect(_post_url(post))
 
-    # Eager-load author on posts to avoid N+1 when rendering
-    posts = (
-        Post.query.options(
-            joinedload(Post.author)
-        )
-        .filter_by(thread_id=thread.id)
-        .order_by(Post.created_at.asc())
-        .all()
-    )
+    # ?post=<id> jump links: resolve the post's page by primary key
+    jump_to = request.args.get("post", type=int)
+    if jump_to:
+        target = db.session.get(Post, jump_to)
+        if not target or target.thread_id != thread.id:
+            abort(404)
+        forum_service.ensure_numbered(thread)
+        return redirect(_post_url(target))
+
+    # One page of posts by position range, authors eager-loaded
+    page = request.args.get("page", 1, type=int)
+    pagination = forum_service.paginate_posts(thread, page, current_app.config['FORUM_POSTS_PER_PAGE'])
+    posts = pagination.items
     move_form = None
     if current_user.is_authenticated and current_user.role == "Admin":
         move_form = MoveThreadForm()
         move_form.set_choices()
         if move_form.validate_on_submit() and move_form.category_id.data != thread.category_id:
-            thread.category_id = move_form.category_id.data
+            forum_service.move_thread(thread, move_form.category_id.data)
             db.session.commit()
             flash("Thread moved.", "info")
             return redirect(url_for("forum.thread_view", thread_id=thread.id))
 
-    categories = Category.query.filter(Category.parent_id.is_(None)).order_by(Category.name.asc()).all()
-    return render_template("thread_view.html", thread=thread, posts=posts, form=form, move_form=move_form, categories=categories)
+    categories = category_tree.get_tree().roots
+    # Like totals and the viewer's like state for this page: two queries, no collection walks
+    post_ids = [p.id for p in posts]
+    viewer_id = current_user.id if current_user.is_authenticated else None
+    tracking.track('thread', thread.id)
+    context = dict(thread=thread, posts=posts, pagination=pagination, form=form, move_form=move_form, categories=categories,
+                   view_count=tracking.view_count('thread', thread.id),
+                   like_counts=like_service.like_counts('post', post_ids),
+                   liked_ids=like_service.liked_ids('post', viewer_id, post_ids))
+    if current_app.config['FORUM_STREAM_THREADS']:
+        # Send the header and first posts while the rest of the page renders
+        attach = [thread, *posts] + ([current_user._get_current_object()] if current_user.is_authenticated else [])
+        return _stream_page("thread_view.html", attach, **context)
+    return render_template("thread_view.html", **context)
 
 @bp.route("/new", methods=["GET", "POST"])
 @login_required
@@ -111,8 +160,9 @@ def new_thread():
         thread = Thread(title=form.title.data, category_id=form.category_id.data, author_id=current_user.id)
         db.session.add(thread)
         db.session.flush()
-        first_post = Post(thread_id=thread.id, author_id=current_user.id, content=form.content.data)
-        db.session.add(first_post)
+        forum_service.add_post(thread, current_user.id, form.content.data)
+        user_stats.on_thread_created(thread)
+        ranking.record("thread", thread.id, "create")
         db.session.commit()
         flash("Thread created.", "success")
         return redirect(url_for("forum.thread_view", thread_id=thread.id))
@@ -126,7 +176,8 @@ def delete_thread(thread_id):
         abort(404)
     if current_user.role != "Admin" and current_user.id != thread.author_id:
         abort(403)
-    db.session.delete(thread)
+    user_stats.on_thread_deleted(thread)
+    forum_service.delete_thread(thread)
     db.session.commit()
     flash("Thread deleted.", "info")
     return redirect(url_for("forum.index"))
@@ -152,15 +203,20 @@ def toggle_like_post(post_id):
         abort(404)
     
     existing = PostLike.query.filter_by(post_id=post.id, user_id=current_user.id).first()
-    if existing:
+    liked = like_service.wanted_state(existing is not None, request.form.get('action'))
+    if existing and not liked:
+        ranking.record('thread', post.thread_id, 'like', delta=-1, at=existing.created_at)
         db.session.delete(existing)
-        action = 'unliked'
-    else:
+    elif liked and not existing:
         db.session.add(PostLike(post_id=post.id, user_id=current_user.id))
-        action = 'liked'
-    db.session.commit()
+        ranking.record('thread', post.thread_id, 'like')
+    if liked != (existing is not None):
+        user_stats.on_post_liked(post, current_user.id, 1 if liked else -1)
+        db.session.commit()
+    like_service.record_toggle('post', current_user.id, post.id, liked)
+    action = 'liked' if liked else 'unliked'
     
-    like_count = PostLike.query.filter_by(post_id=post.id).count()
+    like_count = like_service.like_counts('post', [post.id]).get(post.id, 0)
     # Return JSON for AJAX or redirect for non-AJAX
     if request.is_json or request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'application/json':
         return jsonify({'action': action, 'like_count': like_count})
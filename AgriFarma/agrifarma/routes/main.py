@@ -7,11 +7,27 @@ from agrifarma.models.blog import BlogPost
 from agrifarma.models.consultancy import Consultant
 from agrifarma.models.ecommerce import Product, Order
 from agrifarma.models.user import User
+from agrifarma.services import sketches
 from sqlalchemy import func
 
 bp = Blueprint("main", __name__)
 
 
+@bp.after_app_request
+def observe_request(response):
+    """Feed the visitor and product view sketches (in memory; no database work here)."""
+    if request.method != 'GET' or request.endpoint in (None, 'static') or response.status_code >= 400:
+        return response
+    if current_user.is_authenticated:
+        visitor = f'user:{current_user.id}'
+    else:
+        visitor = f"anon:{request.remote_addr}|{request.headers.get('User-Agent', '')}"
+    sketches.record('visitors', visitor)
+    if request.endpoint == 'shop.product_detail' and response.status_code == 200:
+        sketches.record('products', request.view_args['product_id'])
+    return response
+
+
 @bp.route("/")
 def index():
     """
@@ -10,6 +10,7 @@ from agrifarma.models.forum import Thread, Post
 from agrifarma.models.blog import BlogPost
 from agrifarma.models.ecommerce import Product
 from agrifarma.models.consultancy import Consultant
+from agrifarma.services import sketches
 
 bp = Blueprint('search', __name__, url_prefix='/search')
 
@@ -34,6 +35,7 @@ def global_search():
     
     if not query or len(query) < 2:
         return render_template('search_results.html', results=results, page=page)
+    sketches.record_search('searches', query)
     
     search_pattern = f'%{query}%'
     
@@ -141,6 +143,7 @@ def autocomplete():
     
     if not query or len(query) < 2:
         return {'suggestions': []}
+    sketches.record_search('autocomplete', query)
     
     search_pattern = f'%{query}%'
     suggestions = []
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""Inbound payment webhooks: verify, append, answer 200. Processing is async."""
+from flask import Blueprint, request, jsonify
+from agrifarma.extensions import csrf
+from agrifarma.services import webhooks as webhook_service
+
+bp = Blueprint('webhooks', __name__, url_prefix='/webhooks')
+csrf.exempt(bp)
+
+
+@bp.post('/<provider>')
+def receive(provider):
+    status, message = webhook_service.ingest(provider.lower(), request.get_data(cache=False), request.headers)
+    return jsonify({'status': message}), status
@@ -30,11 +30,19 @@ from agrifarma.extensions import db
 
 # Models
 from agrifarma.models.user import User
-from agrifarma.models.profile import Profile, PROFESSIONS, EXPERTISE_LEVELS
+from agrifarma.models.profile import Profile, UserStats, PROFESSIONS, EXPERTISE_LEVELS
 from agrifarma.models.consultancy import Consultant, CONSULTANT_CATEGORIES
-from agrifarma.models.ecommerce import Product, Review, Order, OrderItem
+from agrifarma.models.ecommerce import Product, Review, Order, OrderItem, PRODUCT_CATEGORIES as ECOMMERCE_CATEGORIES
 from agrifarma.models.forum import Category as ForumCategory, Thread, Post
-from agrifarma.models.blog import BlogPost, Comment, PREDEFINED_CATEGORIES
+from agrifarma.models.blog import BlogPost, BlogPostTag, Comment, Tag, PREDEFINED_CATEGORIES
+from agrifarma.models.message import Conversation, ConversationMember, Message
+from agrifarma.models.recommendation import ProductCopurchase, ProductRecommendation, RecommenderRun
+from agrifarma.models.cohort import CohortCell, CohortMember, CohortRun
+from agrifarma.models.tracking import EventDailyCount, EventRollup, EventTotal, TrackedEvent
+from agrifarma.models.sketch import SketchDay
+from agrifarma.models.seller import SellerDaily, SellerProductDaily
+from agrifarma.models.forecast import ForecastRun, InventoryAlert, ProductForecast
+from agrifarma.models.product_import import ProductImport
 
 try:
     from faker import Faker
@@ -49,10 +57,8 @@ fake.seed_instance(42)
 # -----------------------------
 
 CURRENCIES = ["USD", "INR", "EUR", "PKR"]
-PRODUCT_CATEGORIES = [
-    "Seeds", "Fertilizers", "Pesticides", "Irrigation", "Tools",
-    "Sensors", "Soil Amendments", "Greenhouse", "Machinery", "Packaging"
-]
+# "Other" stays a form-only fallback; seeded products use the real categories
+PRODUCT_CATEGORIES = [c for c in ECOMMERCE_CATEGORIES if c != "Other"]
 FORUM_CATEGORIES = [
     "Soil Health", "Irrigation", "Pests & Disease", "Market Rates",
     "Weather", "Machinery", "Sustainability", "Seed Selection"
@@ -224,11 +230,13 @@ def _create_reviews(products: List[Product], users: List[User]) -> None:
 def _create_orders(buyers: List[User], products: List[Product], n_orders=40) -> None:
     for _ in range(n_orders):
         buyer = random.choice(buyers)
+        status = random.choice(["Pending", "Paid", "Shipped"])
         order = Order(
             user_id=buyer.id,
             shipping_address=fake.address().replace('\n', ', '),
             payment_method=random.choice(["COD", "Card", "Wallet"]),
-            status=random.choice(["Pending", "Paid", "Shipped"]),
+            status=status,
+            payment_status='Pending' if status == 'Pending' else 'Paid',
             created_at=fake.date_time_between(start_date='-4M', end_date='now'),
             total_amount=Decimal('0.00'),
         )
@@ -286,7 +294,7 @@ def clear_all() -> None:
     """Drop all existing rows (development only)."""
     current_app.logger.warning("Clearing all data (development only)")
     # Order is important due to FKs
-    for model in [Comment, BlogPost, OrderItem, Order, Review, Product, Post, Thread, ForumCategory, Consultant, Profile, User]:
+    for model in [ProductImport, ForecastRun, InventoryAlert, ProductForecast, SellerProductDaily, SellerDaily, SketchDay, EventRollup, EventTotal, EventDailyCount, TrackedEvent, CohortRun, CohortCell, CohortMember, UserStats, ConversationMember, Message, Conversation, BlogPostTag, Tag, Comment, BlogPost, RecommenderRun, ProductRecommendation, ProductCopurchase, OrderItem, Order, Review, Product, Post, Thread, ForumCategory, Consultant, Profile, User]:
         db.session.query(model).delete()
     db.session.commit()
 
@@ -325,5 +333,19 @@ def seed_all(users_total: int | None = None, products_total: int | None = None)
     _create_blog(blog_authors, n_posts=35)
     db.session.commit()
 
+    # Seeded rows bypass the write-path hooks; number posts and materialize stats in one pass
+    from agrifarma.services import cohorts, forecast, forum as forum_service, ranking, recommendations, reviews as review_service, seller_stats, tags as tag_service, user_stats
+    forum_service.backfill_positions()
+    db.session.commit()
+    forum_service.repair_category_stats()
+    tag_service.rebuild_index()
+    ranking.rebuild_all()
+    recommendations.refresh(full=True)
+    review_service.rebuild()
+    cohorts.refresh(full=True)
+    user_stats.rebuild_all()
+    seller_stats.rebuild()
+    forecast.refresh()
+
     current_app.logger.info("Seeding complete: %s users, %s products, forum/blog/orders populated.",
                             len(everyone), len(products))
@@ -3,5 +3,30 @@
 Modules:
 - uploads: safe wrappers for handling file uploads.
 - email: simple email sending stub (can be wired to real provider later).
-- analytics: helpers for small aggregations used by reports.
+- analytics: NumPy bucketing, rolling averages and top-k over columns streamed for reports.
+- inventory: atomic stock reservation at checkout plus the stock ledger.
+- idempotency: replay-safe keys for checkout and payment calls.
+- http_client: pooled, timeout-bounded HTTP transport used by payment gateways.
+- reconciliation: batch job comparing order payment status with the gateway.
+- webhooks: signed webhook ingestion queue and the worker that applies it.
+- user_stats: materialized per-user activity counters for profile pages.
+- forum: stable post numbering and position-range paging for long threads.
+- likes: per-viewer liked-id lookups and like counts for a page of posts.
+- category_tree: closure-table backed forum category tree with a shared snapshot.
+- tags: normalized blog tags with exact-match filtering and incremental tag counts.
+- ranking: time-decayed hot scores behind trending posts and hot threads.
+- inbox: message conversations, per-user unread counters and bulk read-marking.
+- push: in-process pub/sub bus feeding the server-sent event stream.
+- recommendations: co-purchase cosine neighbours behind "related products".
+- catalog: shop facet filters with counts from a shared in-memory snapshot.
+- reviews: approved-review rating aggregates on products and keyset review pages.
+- cohorts: incremental join-week retention cells for posts and orders.
+- funnel: weekly view -> cart -> checkout -> paid stage counters.
+- counters: shared chunking and race-safe increments for the aggregate counter tables.
+- tracking: buffered page view/impression events rolled up into view counters.
+- sketches: mergeable daily Count-Min/top-k and HyperLogLog sketches for searches and visitors.
+- date_ranges: half-open, time-zone aware created_at filters for reports and order history.
+- seller_stats: per-seller daily sales aggregates maintained when orders are paid.
+- forecast: exponentially smoothed product demand, days of cover, reorder points and alerts.
+- product_import: streaming CSV/XLSX product import jobs with dry-run diffs and chunked upserts.
 """
@@ -1,12 +1,216 @@
 """Analytics helper functions.
 
-Currently provides small pure-Python aggregations so routes can stay thin.
-If growth warrants, move to dedicated reporting layer or materialized views.
+Aggregations run on NumPy arrays rather than per-object Python loops.
+Timestamps are turned into integer bucket numbers (days, Monday-aligned
+weeks or months since the epoch) and counted or summed with ``bincount``;
+top-k uses partial selection instead of sorting everything, and rolling
+averages come from a cumulative sum.
+
+The ``*_counts`` functions read only the columns they need straight from the
+database, streamed in batches, so reports never build ORM objects for every
+user or order. The original helpers (``count_registrations_by_day``,
+``registration_trend``, ``top_n``) keep their signatures and accept ORM
+objects or dicts as before.
 """
 from __future__ import annotations
-from collections import defaultdict
 from datetime import date, datetime, UTC, timedelta
-from typing import Iterable, Dict, List
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import Float, String, func, or_, select, type_coerce
+
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Order
+from agrifarma.models.user import User
+
+FREQUENCIES = ('day', 'week', 'month')
+# Orders counted as revenue (same rule as the admin dashboard)
+REVENUE_STATUSES = ('Confirmed', 'Completed')
+
+# Rows per streamed batch when loading columns
+BATCH_SIZE = 50000
+
+# 1970-01-01 was a Thursday; shifting by 3 days makes week buckets start on Monday
+_WEEK_SHIFT = 3
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _iso(v) -> str:
+    if v is None:
+        return 'NaT'
+    if isinstance(v, str):
+        return v
+    if isinstance(v, datetime) and v.tzinfo is not None:
+        v = v.astimezone(UTC).replace(tzinfo=None)
+    return v.isoformat()
+
+
+def to_datetime64(values: Iterable) -> np.ndarray:
+    """datetimes, dates or ISO strings as a ``datetime64[us]`` array.
+
+    Aware values are converted to naive UTC and None becomes NaT. NumPy
+    parses ISO strings in C, so text straight from the database is the fast
+    path; datetime objects are formatted first.
+    """
+    return np.array([_iso(v) for v in values], dtype='datetime64[us]')
+
+
+def bucket_numbers(ts: np.ndarray, freq: str) -> np.ndarray:
+    """Integer bucket of each timestamp: days, Monday-aligned weeks or months since the epoch."""
+    if freq not in FREQUENCIES:
+        raise ValueError(f"freq must be one of {FREQUENCIES}")
+    if freq == 'month':
+        return ts.astype('datetime64[M]').astype(np.int64)
+    days = ts.astype('datetime64[D]').astype(np.int64)
+    if freq == 'week':
+        return (days + _WEEK_SHIFT) // 7
+    return days
+
+
+def bucket_labels(numbers: np.ndarray, freq: str) -> np.ndarray:
+    """First day of each bucket number as ``datetime64[D]``."""
+    if freq == 'month':
+        return numbers.astype('datetime64[M]').astype('datetime64[D]')
+    if freq == 'week':
+        return (numbers * 7 - _WEEK_SHIFT).astype('datetime64[D]')
+    return numbers.astype('datetime64[D]')
+
+
+def bucket_counts(ts, first: Optional[date] = None, last: Optional[date] = None, freq: str = 'day',
+                  weights=None) -> Tuple[np.ndarray, np.ndarray]:
+    """Count (or sum ``weights``) per day/week/month bucket.
+
+    Returns ``(labels, values)``: ``labels`` are the bucket start dates
+    (``datetime64[D]``), contiguous from the bucket of ``first`` to the bucket
+    of ``last`` inclusive, zero-filled. Without bounds the range spans the
+    data. Timestamps outside the range and NaT are ignored.
+    """
+    ts = np.asarray(ts, dtype='datetime64[us]')
+    valid = ~np.isnat(ts)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=np.float64)[valid]
+    numbers = bucket_numbers(ts[valid], freq)
+    if first is None or last is None:
+        if not len(numbers):
+            return np.empty(0, dtype='datetime64[D]'), np.zeros(0, dtype=np.float64 if weights is not None else np.int64)
+    lo = bucket_numbers(np.array([first], dtype='datetime64[D]'), freq)[0] if first is not None else numbers.min()
+    hi = bucket_numbers(np.array([last], dtype='datetime64[D]'), freq)[0] if last is not None else numbers.max()
+    size = max(int(hi - lo) + 1, 0)
+    keep = (numbers >= lo) & (numbers <= hi)
+    values = np.bincount(numbers[keep] - lo, weights=None if weights is None else weights[keep], minlength=size)
+    return bucket_labels(np.arange(lo, lo + size), freq), values
+
+
+def cumulative(values) -> np.ndarray:
+    """Running total of a bucket series."""
+    return np.cumsum(np.asarray(values))
+
+
+def rolling_mean(values, window: int) -> np.ndarray:
+    """Trailing moving average over ``window`` buckets.
+
+    The first ``window - 1`` points average over the buckets available so far.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    window = max(int(window), 1)
+    sums = np.concatenate([[0.0], np.cumsum(values)])
+    idx = np.arange(1, len(values) + 1)
+    lo = np.maximum(idx - window, 0)
+    return (sums[idx] - sums[lo]) / (idx - lo)
+
+
+def top_k(values, k: int, largest: bool = True) -> np.ndarray:
+    """Indices of the ``k`` largest (or smallest) values, best first.
+
+    Uses ``np.partition`` (linear time) and only sorts the selected ``k``;
+    ties keep input order, like a stable sort.
+    """
+    keyed = np.asarray(values, dtype=np.float64)
+    keyed = -keyed if largest else keyed
+    n = len(keyed)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(keyed, kind='stable')
+    kth = np.partition(keyed, k - 1)[k - 1]
+    better = np.flatnonzero(keyed < kth)
+    ties = np.flatnonzero(keyed == kth)[:k - len(better)]
+    picked = np.sort(np.concatenate([better, ties]))
+    return picked[np.argsort(keyed[picked], kind='stable')]
+
+
+def as_series(labels: np.ndarray, values, key: str = 'count', nonzero: bool = False) -> List[Dict]:
+    """Bucket arrays as chart rows: [{'date': 'YYYY-MM-DD', key: N}, ...]."""
+    values = np.asarray(values)
+    if nonzero:
+        mask = values != 0
+        labels, values = labels[mask], values[mask]
+    cast = float if values.dtype.kind == 'f' else int
+    return [{'date': d, key: cast(v)} for d, v in zip(np.datetime_as_string(labels, unit='D').tolist(), values.tolist())]
+
+
+def load_columns(stmt, dtypes: Sequence, batch_size: int = BATCH_SIZE) -> List[np.ndarray]:
+    """Stream a Core select into one array per selected column.
+
+    ``dtypes`` gives each column's NumPy dtype; ``'datetime64[us]'`` columns
+    go through ``to_datetime64``. Select timestamps with
+    ``type_coerce(column, String)`` so SQLite hands back its stored ISO text
+    instead of building a datetime object per row.
+    """
+    parts: List[List[np.ndarray]] = [[] for _ in dtypes]
+    result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+    for rows in result.partitions():
+        for i, (column, dtype) in enumerate(zip(zip(*rows), dtypes)):
+            parts[i].append(to_datetime64(column) if dtype == 'datetime64[us]' else np.array(column, dtype=dtype))
+    return [np.concatenate(p) if p else np.empty(0, dtype=dtype) for p, dtype in zip(parts, dtypes)]
+
+
+def _range(start: datetime, end: Optional[datetime]) -> Tuple[date, date]:
+    """Inclusive first/last dates covered by the half-open ``[start, end)``."""
+    last = (end - timedelta(microseconds=1)).date() if end is not None else datetime.now(UTC).date()
+    return start.date(), last
+
+
+def registration_counts(start: datetime, end: Optional[datetime] = None, freq: str = 'day',
+                        role: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """New users per bucket for ``start <= join_date < end`` (end defaults to now)."""
+    stmt = select(type_coerce(User.join_date, String)).where(User.join_date >= start)
+    if end is not None:
+        stmt = stmt.where(User.join_date < end)
+    if role:
+        stmt = stmt.where(User.role == role)
+    (joined,) = load_columns(stmt, ('datetime64[us]',))
+    first, last = _range(start, end)
+    return bucket_counts(joined, first, last, freq)
+
+
+def order_counts(start: datetime, end: Optional[datetime] = None, freq: str = 'day',
+                 revenue_only: bool = True) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Orders and their total amount per bucket for ``start <= created_at < end``.
+
+    ``revenue_only`` keeps paid or confirmed/completed orders. Returns
+    ``(labels, orders, revenue)``.
+    """
+    stmt = (
+        select(type_coerce(Order.created_at, String), func.coalesce(type_coerce(Order.total_amount, Float), 0.0))
+        .where(Order.created_at >= start)
+    )
+    if end is not None:
+        stmt = stmt.where(Order.created_at < end)
+    if revenue_only:
+        stmt = stmt.where(or_(Order.payment_status == 'Paid', Order.status.in_(REVENUE_STATUSES)))
+    ts, amounts = load_columns(stmt, ('datetime64[us]', np.float64))
+    first, last = _range(start, end)
+    labels, orders = bucket_counts(ts, first, last, freq)
+    _, revenue = bucket_counts(ts, first, last, freq, weights=amounts)
+    return labels, orders, revenue
+
+
+def _join_days(users: Iterable) -> np.ndarray:
+    """Calendar day of each user's join_date (as ``join_date.date()`` gives it), missing ones dropped."""
+    ordinals = np.fromiter((jd.toordinal() for jd in (getattr(u, 'join_date', None) for u in users) if jd),
+                           dtype=np.int64)
+    return (ordinals - _EPOCH_ORDINAL).astype('datetime64[D]')
 
 
 def count_registrations_by_day(users: Iterable) -> List[Dict]:
@@ -15,15 +219,8 @@ def count_registrations_by_day(users: Iterable) -> List[Dict]:
     Returns sorted list of dicts: {'date': 'YYYY-MM-DD', 'count': N}.
     Ignores users missing join_date.
     """
-    counts: Dict[date, int] = defaultdict(int)
-    for u in users:
-        if getattr(u, 'join_date', None):
-            d = u.join_date.date()
-            counts[d] += 1
-    return [
-        {'date': d.isoformat(), 'count': counts[d]}
-        for d in sorted(counts.keys())
-    ]
+    labels, counts = bucket_counts(_join_days(users))
+    return as_series(labels, counts, nonzero=True)
 
 
 def registration_trend(users: Iterable, days: int = 14) -> List[Dict]:
@@ -36,20 +233,8 @@ def registration_trend(users: Iterable, days: int = 14) -> List[Dict]:
         days = 1
     end_date = datetime.now(UTC).date()
     start_date = end_date - timedelta(days=days - 1)
-    # Pre-aggregate counts for provided users
-    agg: Dict[date, int] = defaultdict(int)
-    for u in users:
-        jd = getattr(u, 'join_date', None)
-        if jd:
-            d = jd.date()
-            if start_date <= d <= end_date:
-                agg[d] += 1
-    series: List[Dict] = []
-    cur = start_date
-    while cur <= end_date:
-        series.append({'date': cur.isoformat(), 'count': agg.get(cur, 0)})
-        cur += timedelta(days=1)
-    return series
+    labels, counts = bucket_counts(_join_days(users), start_date, end_date)
+    return as_series(labels, counts)
 
 
 def top_n(items: Iterable[Dict], key: str, n: int = 10, reverse: bool = True) -> List[Dict]:
@@ -57,4 +242,5 @@ def top_n(items: Iterable[Dict], key: str, n: int = 10, reverse: bool = True) ->
     Example: top_n(product_rows, 'revenue', 5)
     """
     safe_items = [i for i in items if isinstance(i.get(key), (int, float))]
-    return sorted(safe_items, key=lambda x: x.get(key, 0), reverse=reverse)[:n]
+    picked = top_k([i[key] for i in safe_items], n, largest=reverse)
+    return [safe_items[i] for i in picked.tolist()]
@@ -0,0 +1,290 @@
+"""Faceted shop navigation.
+
+The listing itself is one query over the ``(status, category, name)`` /
+``(status, price)`` indexes with the selected filters applied. Facet counts
+(category, price bucket, seller, rating, in stock, featured) never touch the
+database per request: a snapshot of every active product's facet values is
+loaded with a single query into NumPy arrays and shared until a
+product or review is written (or ``CATALOG_FACETS_TTL`` passes, to pick up
+writes from other processes). Counts for a filter combination are then a
+few boolean masks and ``bincount`` calls over those arrays.
+
+Counts are disjunctive, as shoppers expect: each facet is counted with every
+*other* facet's selection applied, so picking "Seeds" still shows how many
+products the other categories would add. A text search adds one id lookup.
+"""
+from __future__ import annotations
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import and_, case, or_, select
+
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Product, catalog_version
+from agrifarma.models.profile import Profile
+from agrifarma.models.user import User
+
+# (key, label, low, high): low <= price < high
+PRICE_BUCKETS = (
+    ('0-25', 'Under $25', 0, 25),
+    ('25-100', '$25 to $100', 25, 100),
+    ('100-250', '$100 to $250', 100, 250),
+    ('250-500', '$250 to $500', 250, 500),
+    ('500-', '$500 & above', 500, None),
+)
+# "N stars & up" thresholds on the average approved rating
+RATING_LEVELS = (4, 3, 2, 1)
+SORTS = ('name', 'price', 'new', 'featured', 'rating')
+# Sellers beyond this many (by count) are left out of the facet unless selected
+SELLER_FACET_LIMIT = 10
+
+
+class CatalogFilters:
+    """Facet selections parsed from the shop query string"""
+
+    def __init__(self, categories: Sequence[str] = (), prices: Sequence[str] = (), sellers: Sequence[int] = (),
+                 rating: Optional[int] = None, in_stock: bool = False, featured: bool = False, q: str = ''):
+        self.categories = list(dict.fromkeys(categories))
+        self.prices = [key for key, *_ in PRICE_BUCKETS if key in prices]
+        self.sellers = list(dict.fromkeys(sellers))
+        self.rating = rating if rating in RATING_LEVELS else None
+        self.in_stock = in_stock
+        self.featured = featured
+        self.q = q
+
+    @classmethod
+    def from_args(cls, args) -> "CatalogFilters":
+        return cls(
+            categories=[c.strip() for c in args.getlist('category') if c.strip()],
+            prices=args.getlist('price'),
+            sellers=[int(s) for s in args.getlist('seller') if s.isdigit()],
+            rating=args.get('rating', type=int),
+            in_stock=args.get('in_stock') == '1',
+            featured=args.get('featured') == '1',
+            q=args.get('q', '').strip(),
+        )
+
+    @property
+    def active(self) -> bool:
+        return bool(self.categories or self.prices or self.sellers or self.rating or self.in_stock or self.featured)
+
+    def to_args(self, **extra) -> Dict:
+        """Query-string arguments for url_for (lists repeat the parameter)."""
+        args = {
+            'category': self.categories, 'price': self.prices, 'seller': self.sellers,
+            'rating': self.rating, 'in_stock': 1 if self.in_stock else None,
+            'featured': 1 if self.featured else None, 'q': self.q or None,
+        }
+        args.update(extra)
+        return {k: v for k, v in args.items() if v not in (None, [], '')}
+
+    def toggle(self, facet: str, value=None, **extra) -> Dict:
+        """Arguments with one facet value switched on or off (page resets to 1)."""
+        args = self.to_args(**extra)
+        if facet in ('category', 'price', 'seller'):
+            current = list(args.get(facet, []))
+            current = [v for v in current if v != value] if value in current else current + [value]
+            args[facet] = current
+        elif facet == 'rating':
+            args['rating'] = None if self.rating == value else value
+        else:  # in_stock / featured flags
+            args[facet] = None if args.get(facet) else 1
+        return {k: v for k, v in args.items() if v not in (None, [], '')}
+
+    def apply(self, query):
+        """Narrow a Product query to the selection (text search included)."""
+        if self.categories:
+            query = query.filter(Product.category.in_(self.categories))
+        if self.prices:
+            query = query.filter(or_(*[_price_clause(key) for key in self.prices]))
+        if self.sellers:
+            query = query.filter(Product.seller_id.in_(self.sellers))
+        if self.in_stock:
+            query = query.filter(Product.inventory > 0)
+        if self.featured:
+            query = query.filter(Product.featured.is_(True))
+        if self.rating:
+            query = query.filter(Product.rating_avg >= self.rating)
+        if self.q:
+            query = query.filter(_search_clause(self.q))
+        return query
+
+
+def _price_clause(key: str):
+    _, _, low, high = next(b for b in PRICE_BUCKETS if b[0] == key)
+    return and_(Product.price >= low, Product.price < high) if high is not None else Product.price >= low
+
+
+def _search_clause(q: str):
+    return or_(Product.name.ilike(f'%{q}%'), Product.description.ilike(f'%{q}%'))
+
+
+def order_by(query, sort: str):
+    """Apply a shop sort key in SQL (id breaks ties so pages are stable)."""
+    if sort == 'price':
+        return query.order_by(Product.price.asc(), Product.id.asc())
+    if sort == 'new':
+        return query.order_by(Product.created_at.desc(), Product.id.desc())
+    if sort == 'featured':
+        return query.order_by(Product.featured.desc(), Product.name.asc(), Product.id.asc())
+    if sort == 'rating':
+        return query.order_by(Product.rating_avg.desc(), Product.rating_count.desc(), Product.id.desc())
+    return query.order_by(Product.name.asc(), Product.id.asc())
+
+
+class FacetValue:
+    """One clickable facet entry"""
+    __slots__ = ('value', 'label', 'count', 'selected')
+
+    def __init__(self, value, label: str, count: int, selected: bool):
+        self.value = value
+        self.label = label
+        self.count = count
+        self.selected = selected
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<FacetValue {self.label}={self.count}{' *' if self.selected else ''}>"
+
+
+class FacetCounts:
+    """Counts for one filter combination: matching total plus values per facet"""
+
+    def __init__(self, total: int, facets: Dict[str, List[FacetValue]]):
+        self.total = total
+        self.facets = facets
+
+    def __getitem__(self, facet: str) -> List[FacetValue]:
+        return self.facets[facet]
+
+
+class FacetSnapshot:
+    """Facet values of every active product as parallel NumPy arrays"""
+
+    def __init__(self, rows, seller_names: Dict[int, str], version: int):
+        self.version = version
+        self.built_at = time.monotonic()
+        ids, categories, prices, inventory, featured, sellers, ratings = zip(*rows) if rows else ([],) * 7
+        self.ids = np.array(ids, dtype=np.int64)
+        self.category_labels, self.category_codes = np.unique(
+            np.array([c or '' for c in categories], dtype=object), return_inverse=True)
+        self.prices = np.array(prices, dtype=np.float64)
+        self.in_stock = np.array([(n or 0) > 0 for n in inventory], dtype=bool)
+        self.featured = np.array([bool(f) for f in featured], dtype=bool)
+        self.seller_ids, self.seller_codes = np.unique(np.array(sellers, dtype=np.int64), return_inverse=True)
+        self.seller_names = seller_names
+        self.ratings = np.array([r if r is not None else np.nan for r in ratings], dtype=np.float64)
+        edges = [low for _, _, low, _ in PRICE_BUCKETS[1:]]
+        self.price_buckets = np.digitize(self.prices, edges)  # index into PRICE_BUCKETS
+
+    def _masks(self, filters: CatalogFilters, search_ids: Optional[Sequence[int]]) -> Dict[str, np.ndarray]:
+        masks = {}
+        if filters.categories:
+            wanted = [i for i, label in enumerate(self.category_labels) if label in filters.categories]
+            masks['category'] = np.isin(self.category_codes, wanted)
+        if filters.prices:
+            wanted = [i for i, bucket in enumerate(PRICE_BUCKETS) if bucket[0] in filters.prices]
+            masks['price'] = np.isin(self.price_buckets, wanted)
+        if filters.sellers:
+            masks['seller'] = np.isin(self.seller_ids[self.seller_codes], filters.sellers)
+        if filters.rating:
+            with np.errstate(invalid='ignore'):
+                masks['rating'] = self.ratings >= filters.rating
+        if filters.in_stock:
+            masks['in_stock'] = self.in_stock
+        if filters.featured:
+            masks['featured'] = self.featured
+        if search_ids is not None:
+            masks['q'] = np.isin(self.ids, np.asarray(search_ids, dtype=np.int64))
+        return masks
+
+    def counts(self, filters: CatalogFilters, search_ids: Optional[Sequence[int]] = None) -> FacetCounts:
+        masks = self._masks(filters, search_ids)
+        everything = np.ones(len(self.ids), dtype=bool)
+
+        def others(facet: str) -> np.ndarray:
+            m = everything.copy()
+            for name, mask in masks.items():
+                if name != facet:
+                    m &= mask
+            return m
+
+        facets: Dict[str, List[FacetValue]] = {}
+        m = others('category')
+        per_category = np.bincount(self.category_codes[m], minlength=len(self.category_labels))
+        facets['category'] = [
+            FacetValue(label, label, int(n), label in filters.categories)
+            for label, n in sorted(zip(self.category_labels.tolist(), per_category.tolist()))
+            if label and (n or label in filters.categories)
+        ]
+        m = others('price')
+        per_bucket = np.bincount(self.price_buckets[m], minlength=len(PRICE_BUCKETS))
+        facets['price'] = [FacetValue(key, label, int(n), key in filters.prices)
+                           for (key, label, _, _), n in zip(PRICE_BUCKETS, per_bucket.tolist())]
+        m = others('seller')
+        per_seller = np.bincount(self.seller_codes[m], minlength=len(self.seller_ids))
+        ranked = sorted(((int(n), int(sid)) for sid, n in zip(self.seller_ids.tolist(), per_seller.tolist())),
+                        key=lambda t: (-t[0], self.seller_names.get(t[1], '').lower()))
+        facets['seller'] = [
+            FacetValue(sid, self.seller_names.get(sid, f'Seller #{sid}'), n, sid in filters.sellers)
+            for i, (n, sid) in enumerate(ranked)
+            if sid in filters.sellers or (n and i < SELLER_FACET_LIMIT)
+        ]
+        m = others('rating')
+        rated = self.ratings[m]
+        facets['rating'] = [FacetValue(level, f'{level}★ & up', int(np.sum(rated >= level)), filters.rating == level)
+                            for level in RATING_LEVELS]
+        facets['in_stock'] = [FacetValue(1, 'In stock', int(self.in_stock[others('in_stock')].sum()), filters.in_stock)]
+        facets['featured'] = [FacetValue(1, 'Featured', int(self.featured[others('featured')].sum()), filters.featured)]
+
+        total = everything
+        for mask in masks.values():
+            total = total & mask
+        return FacetCounts(int(total.sum()), facets)
+
+
+_lock = threading.Lock()
+
+
+def _load_snapshot(version: int) -> FacetSnapshot:
+    rows = db.session.execute(
+        select(Product.id, Product.category, Product.price, Product.inventory, Product.featured,
+               Product.seller_id, case((Product.rating_count > 0, Product.rating_avg)))
+        .where(Product.status == 'Active')
+    ).all()
+    seller_ids = {r.seller_id for r in rows}
+    names = {}
+    if seller_ids:
+        names = {
+            uid: name or (email or '').split('@')[0]
+            for uid, name, email in db.session.execute(
+                select(User.id, Profile.name, User.email).outerjoin(Profile, Profile.user_id == User.id)
+                .where(User.id.in_(seller_ids))
+            ).all()
+        }
+    return FacetSnapshot([tuple(r) for r in rows], names, version)
+
+
+def get_snapshot() -> FacetSnapshot:
+    """The shared facet snapshot, rebuilt after product/review writes or when the TTL passed."""
+    holder = current_app.extensions.setdefault('catalog_facets', {})
+    snapshot = holder.get('snapshot')
+    ttl = current_app.config.get('CATALOG_FACETS_TTL', 60)
+    if snapshot is not None and snapshot.version == catalog_version() and time.monotonic() - snapshot.built_at < ttl:
+        return snapshot
+    with _lock:
+        snapshot = _load_snapshot(catalog_version())
+        holder['snapshot'] = snapshot
+    return snapshot
+
+
+def facet_counts(filters: CatalogFilters) -> FacetCounts:
+    """Facet counts and matching total for a selection (one id query when searching)."""
+    search_ids = None
+    if filters.q:
+        search_ids = db.session.execute(
+            select(Product.id).where(Product.status == 'Active', _search_clause(filters.q))
+        ).scalars().all()
+    return get_snapshot().counts(filters, search_ids)
@@ -0,0 +1,142 @@
+"""Forum category tree.
+
+``categories`` stays a plain adjacency list (``parent_id``); the
+``category_closure`` table, maintained by mapper events in
+``models.forum``, holds every ancestor/descendant pair so "everything under
+Soil Health" or "all ancestors of Drip Irrigation" is one indexed lookup in
+SQL. For rendering, a read-only snapshot of the whole tree is built with a
+single query and shared by forms and views until a category changes (or
+``CATEGORY_TREE_TTL`` passes, to pick up edits made by other processes).
+The closure table is only filled in bulk by the migration and
+``flask forum rebuild-tree``; reads never write it.
+"""
+from __future__ import annotations
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import delete, insert, select
+
+from agrifarma.extensions import db
+from agrifarma.models.forum import Category, CategoryClosure, category_tree_version
+
+
+class CategoryNode:
+    """Immutable view of one category inside a snapshot"""
+    __slots__ = ('id', 'name', 'parent_id', 'depth', 'path', 'children')
+
+    def __init__(self, id: int, name: str, parent_id: Optional[int]):
+        self.id = id
+        self.name = name
+        self.parent_id = parent_id
+        self.depth = 0
+        self.path: Tuple[int, ...] = ()      # ids from the root down to this node
+        self.children: List["CategoryNode"] = []
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<CategoryNode {self.id} {self.name}>"
+
+
+class CategoryTree:
+    """Snapshot of the category hierarchy, sorted by name at every level"""
+
+    def __init__(self, rows: List[Tuple[int, str, Optional[int]]], version: int):
+        self.version = version
+        self.built_at = time.monotonic()
+        self.nodes: Dict[int, CategoryNode] = {cid: CategoryNode(cid, name, parent) for cid, name, parent in rows}
+        self.roots: List[CategoryNode] = []
+        for node in sorted(self.nodes.values(), key=lambda n: n.name.lower()):
+            parent = self.nodes.get(node.parent_id)
+            (parent.children if parent else self.roots).append(node)
+        self.ordered: List[CategoryNode] = []
+        stack = [(node, ()) for node in reversed(self.roots)]
+        while stack:
+            node, trail = stack.pop()
+            if node.id in trail:  # corrupt cycle in the adjacency list: stop descending
+                continue
+            node.path = trail + (node.id,)
+            node.depth = len(trail)
+            self.ordered.append(node)
+            stack.extend((child, node.path) for child in reversed(node.children))
+
+    def get(self, category_id: Optional[int]) -> Optional[CategoryNode]:
+        return self.nodes.get(category_id)
+
+    def ancestors(self, category_id: int) -> List[CategoryNode]:
+        """Root-first ancestors, excluding the category itself"""
+        node = self.nodes.get(category_id)
+        return [self.nodes[cid] for cid in node.path[:-1]] if node else []
+
+    def subtree_ids(self, category_id: int) -> List[int]:
+        """The category and every descendant"""
+        node = self.nodes.get(category_id)
+        if node is None:
+            return []
+        out, stack = [], [node]
+        while stack:
+            current = stack.pop()
+            out.append(current.id)
+            stack.extend(current.children)
+        return out
+
+    def choices(self) -> List[Tuple[int, str]]:
+        """(id, label) pairs for select fields, indented by depth"""
+        return [(n.id, f"{'— ' * n.depth}{n.name}") for n in self.ordered]
+
+
+_lock = threading.Lock()
+
+
+def get_tree() -> CategoryTree:
+    """The shared snapshot, rebuilt when categories changed or the TTL passed."""
+    holder = current_app.extensions.setdefault('category_tree', {})
+    tree = holder.get('tree')
+    ttl = current_app.config.get('CATEGORY_TREE_TTL', 300)
+    if tree is not None and tree.version == category_tree_version() and time.monotonic() - tree.built_at < ttl:
+        return tree
+    with _lock:
+        version = category_tree_version()
+        rows = [tuple(r) for r in db.session.execute(select(Category.id, Category.name, Category.parent_id)).all()]
+        tree = CategoryTree(rows, version)
+        holder['tree'] = tree
+    return tree
+
+
+def subtree_ids_query(category_id: int):
+    """Scalar subquery of ids under (and including) category_id, for IN filters"""
+    return select(CategoryClosure.descendant_id).where(CategoryClosure.ancestor_id == category_id)
+
+
+def ancestor_ids(category_id: Optional[int]) -> List[int]:
+    """category_id followed by its ancestors, nearest first (one indexed query).
+
+    Never writes: a category missing from the closure table (a database not
+    yet migrated, see ``flask forum rebuild-tree``) is answered from the
+    snapshot instead.
+    """
+    if category_id is None:
+        return []
+    ids = list(db.session.execute(
+        select(CategoryClosure.ancestor_id).where(CategoryClosure.descendant_id == category_id)
+        .order_by(CategoryClosure.depth)
+    ).scalars())
+    if not ids:
+        node = get_tree().get(category_id)
+        ids = list(reversed(node.path)) if node else []
+    return ids
+
+
+def rebuild_closure() -> int:
+    """Recompute category_closure from parent_id links; returns rows written (no commit)."""
+    rows = db.session.execute(select(Category.id, Category.name, Category.parent_id)).all()
+    tree = CategoryTree([tuple(r) for r in rows], category_tree_version())
+    links = []
+    for node in tree.ordered:
+        for depth, ancestor in enumerate(reversed(node.path)):
+            links.append({'ancestor_id': ancestor, 'descendant_id': node.id, 'depth': depth})
+    db.session.execute(delete(CategoryClosure))
+    if links:
+        db.session.execute(insert(CategoryClosure), links)
+    db.session.flush()
+    return len(links)
@@ -0,0 +1,222 @@
+"""Weekly cohort retention.
+
+Users are grouped by the week they joined (Monday-aligned, UTC). A cohort's
+retention row counts, for each week since joining, how many of its users
+were active: wrote a forum post, placed an order, or either. The counts live
+in ``cohort_cells``, a few rows per cohort and week of age, so the report
+reads a small matrix however many years of users, posts and orders exist.
+
+``refresh`` is incremental, like the recommender: it reads only users, posts
+and orders above the last run's id watermarks. Each member keeps bitmaps of
+the weeks they were active in, so a user posting ten times in a week still
+counts once and the cells only ever grow by users seen for the first time.
+Activity is counted when first seen; a deleted post or order is not
+withdrawn until ``refresh(full=True)``. Each worker's tracking flush thread
+runs it every ``COHORT_REFRESH_SECONDS`` and ``flask cohorts refresh`` runs
+it on demand; the report only reads the cells.
+"""
+from __future__ import annotations
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, UTC
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import String, delete, func, insert, select, type_coerce
+
+from agrifarma.extensions import db
+from agrifarma.models.cohort import CohortCell, CohortMember, CohortRun
+from agrifarma.models.ecommerce import Order
+from agrifarma.models.forum import Post
+from agrifarma.models.user import User
+from agrifarma.services import analytics, counters
+
+METRICS = ('active', 'posts', 'orders')
+
+
+def week_start(value) -> date:
+    """Monday of the (UTC) week containing a date or datetime."""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(UTC)
+        value = value.date()
+    return value - timedelta(days=value.weekday())
+
+
+def _week_date(number: int) -> date:
+    return analytics.bucket_labels(np.array([number], dtype=np.int64), 'week')[0].astype(object)
+
+
+def _week_number(day: date) -> int:
+    return int(analytics.bucket_numbers(np.array([day], dtype='datetime64[D]'), 'week')[0])
+
+
+def _bits(blob: bytes) -> int:
+    return int.from_bytes(blob or b'', 'little')
+
+
+def _blob(bits: int) -> bytes:
+    return bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+
+def watermarks(before: Optional[int] = None) -> Tuple[int, int, int]:
+    """(user, post, order) ids already counted (by runs older than ``before``, if given)."""
+    stmt = select(CohortRun).order_by(CohortRun.id.desc()).limit(1)
+    if before is not None:
+        stmt = stmt.where(CohortRun.id < before)
+    run = db.session.execute(stmt).scalar()
+    return (run.last_user_id, run.last_post_id, run.last_order_id) if run else (0, 0, 0)
+
+
+def _add_members(after_id: int, upto_id: int) -> Counter:
+    """Create member rows for users in (after_id, upto_id]; returns new users per cohort week number."""
+    ids, joined = analytics.load_columns(
+        select(User.id, type_coerce(User.join_date, String)).where(User.id > after_id, User.id <= upto_id),
+        (np.int64, 'datetime64[us]'),
+    )
+    valid = ~np.isnat(joined)  # users without a join date belong to no cohort
+    ids, weeks = ids[valid], analytics.bucket_numbers(joined[valid], 'week')
+    if len(ids):
+        labels = {int(w): _week_date(int(w)) for w in np.unique(weeks).tolist()}
+        db.session.execute(insert(CohortMember), [
+            {'user_id': u, 'cohort_week': labels[w], 'post_weeks': b'', 'order_weeks': b''}
+            for u, w in zip(ids.tolist(), weeks.tolist())
+        ])
+    return Counter(dict(zip(*(a.tolist() for a in np.unique(weeks, return_counts=True)))))
+
+
+def _activity(id_col, user_col, created_col, after_id: int, upto_id: int) -> np.ndarray:
+    """Distinct (user id, week number) pairs of rows with ids in (after_id, upto_id]."""
+    users, created = analytics.load_columns(
+        select(user_col, type_coerce(created_col, String)).where(id_col > after_id, id_col <= upto_id),
+        (np.int64, 'datetime64[us]'),
+    )
+    valid = ~np.isnat(created)
+    pairs = np.column_stack([users[valid], analytics.bucket_numbers(created[valid], 'week')])
+    return np.unique(pairs, axis=0) if len(pairs) else pairs.reshape(0, 2)
+
+
+def _apply_activity(activity: Dict[str, np.ndarray]) -> Counter:
+    """Set member bits for new (user, week) activity; returns cell increments for first-time bits."""
+    cells: Counter = Counter()
+    users = np.unique(np.concatenate([pairs[:, 0] for pairs in activity.values()])).tolist()
+    members, numbers = {}, {}
+    for chunk in counters.chunks(users):
+        for user_id, cohort_week, post_weeks, order_weeks in db.session.execute(
+            select(CohortMember.user_id, CohortMember.cohort_week, CohortMember.post_weeks, CohortMember.order_weeks)
+            .where(CohortMember.user_id.in_(chunk))
+        ):
+            if cohort_week not in numbers:
+                numbers[cohort_week] = _week_number(cohort_week)
+            members[user_id] = (numbers[cohort_week], {'posts': _bits(post_weeks), 'orders': _bits(order_weeks)})
+    changed = set()
+    for metric, pairs in activity.items():
+        for user_id, week in pairs.tolist():
+            entry = members.get(user_id)
+            if entry is None:
+                continue
+            cohort, bits = entry
+            age = max(week - cohort, 0)  # backdated/imported activity counts in the join week
+            bit = 1 << age
+            if bits[metric] & bit:
+                continue
+            if not (bits['posts'] | bits['orders']) & bit:
+                cells[('active', cohort, age)] += 1
+            bits[metric] |= bit
+            cells[(metric, cohort, age)] += 1
+            changed.add(user_id)
+    if changed:
+        db.session.execute(
+            CohortMember.__table__.update().where(CohortMember.user_id == db.bindparam('uid')).values(
+                post_weeks=db.bindparam('posts'), order_weeks=db.bindparam('orders')),
+            [{'uid': u, 'posts': _blob(members[u][1]['posts']), 'orders': _blob(members[u][1]['orders'])}
+             for u in changed],
+        )
+    return cells
+
+
+def _add_cells(cells: Counter) -> None:
+    """Add increments to cohort_cells."""
+    labels = {w: _week_date(w) for w in {w for _, w, _ in cells}}
+    counters.add(db.session, CohortCell.__table__, ('metric', 'cohort_week', 'age'), {
+        (metric, labels[week], age): {'users': n} for (metric, week, age), n in cells.items()
+    })
+
+
+def _newest_ids() -> Tuple[int, int, int]:
+    """Highest (user, post, order) ids in the database."""
+    return tuple(db.session.scalar(select(func.max(col))) or 0 for col in (User.id, Post.id, Order.id))
+
+
+def refresh(full: bool = False) -> Optional[CohortRun]:
+    """Fold users, posts and orders added since the last run into the cohort cells (commits).
+
+    Returns None, without writing anything, when no watermark would move.
+    ``full`` drops members and cells and recounts everything. The run row is
+    written before counting: on SQLite that takes the write lock, so a
+    concurrent refresh waits and then starts from this run's watermarks
+    instead of counting the same rows twice (or, finding nothing left, rolls
+    its run back).
+    """
+    started = time.perf_counter()
+    if not full and all(u <= a for u, a in zip(_newest_ids(), watermarks())):
+        return None
+    run = CohortRun(full=full)
+    db.session.add(run)
+    db.session.flush()
+    after_user, after_post, after_order = (0, 0, 0) if full else watermarks(before=run.id)
+    upto_user, upto_post, upto_order = _newest_ids()
+    if not full and upto_user <= after_user and upto_post <= after_post and upto_order <= after_order:
+        db.session.rollback()  # another refresh counted them while we waited for the lock
+        return None
+    if full:
+        db.session.execute(delete(CohortCell))
+        db.session.execute(delete(CohortMember))
+
+    joined = _add_members(after_user, upto_user)
+    cells = Counter({('joined', week, 0): n for week, n in joined.items()})
+    activity = {
+        'posts': _activity(Post.id, Post.author_id, Post.created_at, after_post, upto_post),
+        'orders': _activity(Order.id, Order.user_id, Order.created_at, after_order, upto_order),
+    }
+    cells.update(_apply_activity(activity))
+    _add_cells(cells)
+
+    run.last_user_id = max(upto_user, after_user)
+    run.last_post_id = max(upto_post, after_post)
+    run.last_order_id = max(upto_order, after_order)
+    run.rows_processed = sum(joined.values()) + sum(len(p) for p in activity.values())
+    run.seconds = time.perf_counter() - started
+    db.session.commit()
+    return run
+
+
+def retention(metric: str = 'active', cohorts: int = 12, today: Optional[date] = None) -> List[Dict]:
+    """Retention grid for the latest ``cohorts`` join weeks, newest last.
+
+    Each row is ``{'week': date, 'size': n, 'cells': [(users, percent), ...]}``
+    for weeks 0, 1, ... since joining, up to the current week.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {METRICS}")
+    this_week = week_start(today or datetime.now(UTC))
+    first = this_week - timedelta(weeks=cohorts - 1)
+    sizes = np.zeros(cohorts, dtype=np.int64)
+    grid = np.zeros((cohorts, cohorts), dtype=np.int64)
+    for kind, week, age, users in db.session.execute(
+        select(CohortCell.metric, CohortCell.cohort_week, CohortCell.age, CohortCell.users)
+        .where(CohortCell.metric.in_(('joined', metric)), CohortCell.cohort_week >= first,
+               CohortCell.cohort_week <= this_week)
+    ):
+        row = (week - first).days // 7
+        if kind == 'joined':
+            sizes[row] = users
+        elif age < cohorts:
+            grid[row, age] = users
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pct = np.where(sizes[:, None] > 0, np.round(100.0 * grid / sizes[:, None], 1), 0.0)
+    return [
+        {'week': first + timedelta(weeks=i), 'size': int(sizes[i]),
+         'cells': list(zip(grid[i, :cohorts - i].tolist(), pct[i, :cohorts - i].tolist()))}
+        for i in range(cohorts)
+    ]
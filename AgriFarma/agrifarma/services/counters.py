@@ -0,0 +1,89 @@
+"""Increments for the aggregate tables maintained alongside writes.
+
+Recommendation co-purchases, cohort cells, view counters and seller sales
+are all tables of running totals keyed by their primary key. ``add`` folds a
+batch of deltas into such a table with one executemany ``UPDATE`` for the
+keys that exist and one ``INSERT`` for the rest. The insert runs in a
+savepoint: when another transaction created one of those keys in the
+meantime (two first-of-the-day orders for one seller, say) the savepoint is
+rolled back and the new keys are applied one at a time, the way
+``funnel.bump`` handles a week's first row, instead of failing the caller's
+transaction with an ``IntegrityError``.
+"""
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.exc import IntegrityError
+
+from agrifarma.extensions import db
+
+# ids (or keys) per IN (...) list
+CHUNK_SIZE = 500
+
+
+def chunks(items: Iterable, size: int = CHUNK_SIZE) -> Iterator[List]:
+    """Lists of up to ``size`` consecutive items (any iterable, consumed lazily)."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def add(executor, table, keys: Sequence[str], deltas: Dict[Tuple, Dict[str, Any]]) -> None:
+    """
+    Add increments to a counter table on a Session or Connection (not committed)
+
+    Args:
+        executor: Session or Connection to write with
+        table: Table whose primary key is ``keys``
+        keys: Key column names, in the order of each delta's key tuple
+        deltas: Key tuple -> {column: increment}; every entry names the same columns
+    """
+    deltas = {key: values for key, values in deltas.items() if any(values.values())}
+    if not deltas:
+        return
+    columns = [table.c[k] for k in keys]
+    names = list(next(iter(deltas.values())))
+    existing = set()
+    for chunk in chunks(deltas):
+        existing.update(tuple(r) for r in executor.execute(
+            select(*columns).where(tuple_(*columns).in_(chunk))
+        ))
+    increment = (
+        table.update()
+        .where(*(c == db.bindparam(f'k_{c.name}') for c in columns))
+        .values({n: table.c[n] + db.bindparam(f'd_{n}') for n in names})
+    )
+
+    def update_params(key, values):
+        return {**{f'k_{k}': v for k, v in zip(keys, key)}, **{f'd_{n}': values[n] for n in names}}
+
+    updates = [update_params(key, values) for key, values in deltas.items() if key in existing]
+    inserts = [(key, values) for key, values in deltas.items() if key not in existing]
+    if updates:
+        executor.execute(increment, updates)
+    if not inserts:
+        return
+    savepoint = executor.begin_nested()
+    try:
+        executor.execute(table.insert(), [{**dict(zip(keys, key)), **values} for key, values in inserts])
+        savepoint.commit()
+        return
+    except IntegrityError:
+        # another transaction created some of these keys first
+        savepoint.rollback()
+    for key, values in inserts:
+        if executor.execute(increment, update_params(key, values)).rowcount:
+            continue
+        savepoint = executor.begin_nested()
+        try:
+            executor.execute(table.insert().values({**dict(zip(keys, key)), **values}))
+            savepoint.commit()
+        except IntegrityError:
+            savepoint.rollback()
+            executor.execute(increment, update_params(key, values))
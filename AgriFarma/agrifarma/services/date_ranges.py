@@ -0,0 +1,100 @@
+"""Date range filters shared by reports and order history.
+
+Users pick calendar days (``YYYY-MM-DD``, both ends inclusive) as seen in
+the site's time zone (``REPORT_TIMEZONE``). ``DateRange`` turns them into a
+half-open ``[start, end)`` pair of UTC instants, local midnight of the first
+day up to local midnight after the last, and filters the raw column:
+``created_at >= :start AND created_at < :end``. Unlike
+``date(created_at) <= :day`` that comparison can use the ``(user_id,
+created_at)`` / ``(status, created_at)`` indexes on orders, keeps orders
+placed late on the last day, and stays right across DST changes because
+each bound is converted on its own date.
+"""
+from __future__ import annotations
+from datetime import date, datetime, time, timedelta, tzinfo, UTC
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from flask import current_app
+
+DAY_FORMAT = '%Y-%m-%d'
+
+
+def timezone() -> tzinfo:
+    """The zone report dates are entered in (``REPORT_TIMEZONE``, default UTC)."""
+    return ZoneInfo(current_app.config.get('REPORT_TIMEZONE') or 'UTC')
+
+
+def parse_day(value: Optional[str]) -> Optional[date]:
+    """A ``YYYY-MM-DD`` string as a date; blank is None, anything else raises ValueError."""
+    value = (value or '').strip()
+    return datetime.strptime(value, DAY_FORMAT).date() if value else None
+
+
+def local_day(at: datetime, tz: tzinfo) -> date:
+    """Calendar day of a stored timestamp (naive values are UTC) in ``tz``."""
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=UTC)
+    return at.astimezone(tz).date()
+
+
+class DateRange:
+    """Inclusive calendar days ``first``..``last`` (either may be open) in a time zone"""
+
+    def __init__(self, first: Optional[date] = None, last: Optional[date] = None, tz: Optional[tzinfo] = None):
+        if first and last and last < first:
+            raise ValueError("end date is before start date")
+        self.first = first
+        self.last = last
+        self.tz = tz or UTC
+
+    def _midnight(self, day: date) -> datetime:
+        return datetime.combine(day, time.min, tzinfo=self.tz).astimezone(UTC)
+
+    @property
+    def start(self) -> Optional[datetime]:
+        """Inclusive lower bound (aware UTC), or None when open."""
+        return self._midnight(self.first) if self.first else None
+
+    @property
+    def end(self) -> Optional[datetime]:
+        """Exclusive upper bound (aware UTC): local midnight after the last day, or None when open."""
+        return self._midnight(self.last + timedelta(days=1)) if self.last else None
+
+    @property
+    def end_day(self) -> Optional[date]:
+        """Day after ``last``, for tables keyed by day."""
+        return self.last + timedelta(days=1) if self.last else None
+
+    def apply(self, query, column):
+        """Narrow a Query or select to ``start <= column < end``."""
+        if self.first:
+            query = query.where(column >= self.start)
+        if self.last:
+            query = query.where(column < self.end)
+        return query
+
+    def strings(self) -> Tuple[str, str]:
+        """First and last day as form values ('' when open)."""
+        return tuple(day.strftime(DAY_FORMAT) if day else '' for day in (self.first, self.last))
+
+    def __bool__(self) -> bool:
+        return bool(self.first or self.last)
+
+    def __repr__(self):  # pragma: no cover - debug helper
+        return f"<DateRange {self.first}..{self.last} {self.tz}>"
+
+
+def from_args(args, first_key: str = 'start', last_key: str = 'end', default_days: Optional[int] = None) -> DateRange:
+    """Range from query-string days in the report time zone.
+
+    With ``default_days`` a missing end defaults to today and a missing start
+    to ``default_days`` before it; otherwise missing ends stay open. Malformed
+    dates, or an end before the start, raise ValueError.
+    """
+    tz = timezone()
+    first, last = parse_day(args.get(first_key)), parse_day(args.get(last_key))
+    if default_days is not None:
+        last = last or datetime.now(tz).date()
+        first = first or last - timedelta(days=default_days)
+    return DateRange(first, last, tz)
@@ -0,0 +1,187 @@
+"""Demand forecasts, days of cover and reorder alerts.
+
+A static ``LOW_INVENTORY_THRESHOLD`` flags a slow seller holding four units
+and misses a best seller holding forty. ``refresh`` (``flask forecast
+refresh``) instead reads the paid units per product per day from
+``seller_product_daily`` (see ``services.seller_stats``) for the last
+``FORECAST_HISTORY_DAYS`` complete days, as one products x days NumPy
+matrix, and fits simple exponential smoothing to every product at once:
+
+    level = level + alpha * (units_today - level)
+
+The final level is the expected units per day; the root mean square of the
+one-day-ahead errors measures how erratic demand is. From those:
+
+- days of cover = inventory / daily demand
+- reorder point = demand over the restock lead time plus safety stock,
+  ``z * error * sqrt(lead time)``, rounded up
+
+A product's series starts on the day it was listed, so new products are
+not dragged towards zero by days before they existed. Results replace the
+``product_forecasts`` rows; products at or below their reorder point get an
+open ``inventory_alerts`` row (the alert feed), which the first later run
+that finds them restocked resolves. Reports and the feed only read these
+precomputed rows.
+"""
+from __future__ import annotations
+import math
+import time
+from datetime import datetime, timedelta, UTC
+from typing import List, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import joinedload
+
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Product
+from agrifarma.models.forecast import ForecastRun, InventoryAlert, ProductForecast
+from agrifarma.models.seller import SellerProductDaily
+from agrifarma.services import date_ranges
+
+CHUNK_SIZE = 500
+# Below this many units per day a product counts as not selling (no cover, no alert)
+MIN_DEMAND = 1e-3
+
+
+def _now() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def smooth(sales: np.ndarray, starts: np.ndarray, alpha: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Simple exponential smoothing of every row of a products x days matrix
+
+    Args:
+        sales: Units sold, one row per product, oldest day first
+        starts: Index of each row's first day (earlier days are ignored)
+        alpha: Smoothing factor in (0, 1]; higher follows recent days more
+
+    Returns:
+        (level after the last day, RMS one-day-ahead error) per row
+    """
+    sales = np.asarray(sales, dtype=np.float64)
+    n, days = sales.shape
+    level = np.zeros(n)
+    sq_error = np.zeros(n)
+    errors = np.zeros(n)
+    for t in range(days):
+        x = sales[:, t]
+        first = starts == t
+        active = starts < t
+        error = np.where(active, x - level, 0.0)
+        sq_error += error * error
+        errors += active
+        level = np.where(first, x, level + alpha * error)
+    rmse = np.sqrt(np.divide(sq_error, errors, out=np.zeros(n), where=errors > 0))
+    return level, rmse
+
+
+def _sales_matrix(first_day, days: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(product ids, inventory, series start index, units matrix) for active products."""
+    products = db.session.execute(
+        select(Product.id, Product.inventory, Product.created_at).where(Product.status == 'Active').order_by(Product.id)
+    ).all()
+    ids = np.array([p[0] for p in products], dtype=np.int64)
+    inventory = np.array([p[1] or 0 for p in products], dtype=np.int64)
+    tz = date_ranges.timezone()
+    listed = [(date_ranges.local_day(p[2], tz) - first_day).days if p[2] else 0 for p in products]
+    starts = np.clip(np.array(listed, dtype=np.int64), 0, max(days - 1, 0))
+
+    sales = np.zeros((len(ids), days))
+    if len(ids):
+        rows = np.array([
+            (product_id, (day - first_day).days, units)
+            for product_id, day, units in db.session.execute(
+                select(SellerProductDaily.product_id, SellerProductDaily.day, func.sum(SellerProductDaily.units))
+                .where(SellerProductDaily.day >= first_day, SellerProductDaily.day < first_day + timedelta(days=days))
+                .group_by(SellerProductDaily.product_id, SellerProductDaily.day)
+            )
+        ], dtype=np.int64).reshape(-1, 3)
+        pos = np.searchsorted(ids, rows[:, 0])
+        known = (pos < len(ids)) & (ids[np.minimum(pos, len(ids) - 1)] == rows[:, 0])
+        np.add.at(sales, (pos[known], rows[known, 1]), rows[known, 2])
+        # units sold before the listing date (e.g. a relisted product) start the series earlier
+        sold = np.where(sales > 0, np.arange(days), days).min(axis=1)
+        starts = np.minimum(starts, sold)
+    return ids, inventory, starts, sales
+
+
+def refresh() -> ForecastRun:
+    """Forecast every active product, replace the stored forecasts and update alerts (commits)."""
+    cfg = current_app.config
+    started = time.perf_counter()
+    history = max(int(cfg.get('FORECAST_HISTORY_DAYS', 90)), 1)
+    alpha = float(cfg.get('FORECAST_ALPHA', 0.3))
+    lead_time = float(cfg.get('FORECAST_LEAD_TIME_DAYS', 7))
+    z = float(cfg.get('FORECAST_SERVICE_Z', 1.65))
+    today = datetime.now(date_ranges.timezone()).date()
+
+    ids, inventory, starts, sales = _sales_matrix(today - timedelta(days=history), history)
+    demand, error = smooth(sales, starts, alpha)
+    selling = demand >= MIN_DEMAND
+    cover = np.divide(inventory, demand, out=np.full(len(ids), np.nan), where=selling)
+    reorder_point = np.ceil(demand * lead_time + z * error * math.sqrt(lead_time) - 1e-9).astype(np.int64)
+    needs_reorder = selling & (inventory <= reorder_point)
+
+    now = _now()
+    db.session.execute(delete(ProductForecast))
+    rows = [
+        {'product_id': p, 'daily_demand': d, 'demand_std': e, 'inventory': i,
+         'days_of_cover': None if math.isnan(c) else c, 'reorder_point': r, 'needs_reorder': flag, 'computed_at': now}
+        for p, d, e, i, c, r, flag in zip(ids.tolist(), demand.tolist(), error.tolist(), inventory.tolist(),
+                                          cover.tolist(), reorder_point.tolist(), needs_reorder.tolist())
+    ]
+    for i in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(insert(ProductForecast), rows[i:i + CHUNK_SIZE])
+
+    # alert feed: open alerts for products newly at their reorder point, resolve the restocked ones
+    open_ids = set(db.session.execute(
+        select(InventoryAlert.product_id).where(InventoryAlert.resolved_at.is_(None))
+    ).scalars())
+    flagged = {row['product_id']: row for row in rows if row['needs_reorder']}
+    raised = [
+        {'product_id': p, 'raised_at': now, 'inventory': row['inventory'],
+         'days_of_cover': row['days_of_cover'], 'reorder_point': row['reorder_point']}
+        for p, row in flagged.items() if p not in open_ids
+    ]
+    if raised:
+        db.session.execute(insert(InventoryAlert), raised)
+    resolved = sorted(open_ids - set(flagged))
+    for i in range(0, len(resolved), CHUNK_SIZE):
+        db.session.execute(
+            update(InventoryAlert)
+            .where(InventoryAlert.product_id.in_(resolved[i:i + CHUNK_SIZE]), InventoryAlert.resolved_at.is_(None))
+            .values(resolved_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+    run = ForecastRun(history_days=history, products=len(rows), alerts_raised=len(raised),
+                      alerts_resolved=len(resolved), seconds=time.perf_counter() - started)
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+
+def latest_run() -> Optional[ForecastRun]:
+    return db.session.execute(select(ForecastRun).order_by(ForecastRun.id.desc()).limit(1)).scalar()
+
+
+def reorder_list(limit: int = 50) -> List[ProductForecast]:
+    """Products at or below their reorder point, least cover first."""
+    return list(db.session.execute(
+        select(ProductForecast).options(joinedload(ProductForecast.product))
+        .where(ProductForecast.needs_reorder.is_(True))
+        .order_by(ProductForecast.days_of_cover.asc(), ProductForecast.product_id).limit(limit)
+    ).scalars())
+
+
+def alert_feed(limit: int = 50, include_resolved: bool = True) -> List[InventoryAlert]:
+    """Newest alerts first; open ones only unless ``include_resolved``."""
+    stmt = select(InventoryAlert).options(joinedload(InventoryAlert.product))
+    if not include_resolved:
+        stmt = stmt.where(InventoryAlert.resolved_at.is_(None))
+    return list(db.session.execute(
+        stmt.order_by(InventoryAlert.raised_at.desc(), InventoryAlert.id.desc()).limit(limit)
+    ).scalars())
@@ -0,0 +1,214 @@
+"""Forum thread paging.
+
+Every post gets a 1-based ``position`` inside its thread, handed out by
+bumping ``threads.post_count`` in the same transaction as the insert. Pages
+are position ranges read through the ``(thread_id, position)`` index rather
+than growing OFFSET scans, post numbers never shift, and ``?post=<id>``
+links resolve to a page with one primary-key lookup.
+
+Categories carry thread/post counts and the latest post (time and thread)
+for themselves plus all subcategories. Posting bumps the whole ancestor
+chain (read from the category closure table) with one ``UPDATE``; deletes and moves subtract and re-derive the
+latest post; ``repair_category_stats`` recomputes everything from scratch.
+"""
+from __future__ import annotations
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from agrifarma.extensions import db
+from agrifarma.models.forum import Category, Post, Thread
+from agrifarma.services import category_tree
+
+
+class ThreadPostPagination(Pagination):
+    """Flask-SQLAlchemy style pagination over a thread's post positions"""
+
+    def _query_items(self) -> list:
+        thread = self._query_args["thread"]
+        lo = self._query_offset + 1
+        return (
+            Post.query.options(joinedload(Post.author))
+            .filter(Post.thread_id == thread.id, Post.position.between(lo, lo + self.per_page - 1))
+            .order_by(Post.position)
+            .all()
+        )
+
+    def _query_count(self) -> int:
+        return self._query_args["thread"].post_count or 0
+
+
+def page_for(position: int, per_page: int) -> int:
+    return max(1, (position - 1) // per_page + 1)
+
+
+def add_post(thread: Thread, author_id: int, content: str) -> Post:
+    """Create the next post in a thread (flushed, not committed)."""
+    db.session.execute(
+        update(Thread).where(Thread.id == thread.id).values(post_count=Thread.post_count + 1)
+        .execution_options(synchronize_session=False)
+    )
+    # The UPDATE holds the row/write lock, so this read can't race another reply
+    position = db.session.execute(select(Thread.post_count).where(Thread.id == thread.id)).scalar_one()
+    set_committed_value(thread, 'post_count', position)
+    post = Post(thread_id=thread.id, author_id=author_id, content=content, position=position)
+    db.session.add(post)
+    db.session.flush()
+    _bump_categories(thread.category_id, threads=1 if position == 1 else 0, posts=1,
+                     last_at=post.created_at, last_thread_id=thread.id)
+    return post
+
+
+def delete_thread(thread: Thread) -> None:
+    """Delete a thread and take it out of its categories' aggregates (not committed)."""
+    category_id, posts = thread.category_id, _thread_posts(thread)
+    db.session.delete(thread)
+    db.session.flush()
+    chain = _bump_categories(category_id, threads=-1, posts=-posts)
+    refresh_last_post(chain)
+
+
+def move_thread(thread: Thread, category_id: Optional[int]) -> None:
+    """Re-home a thread, shifting its counts between category chains (not committed)."""
+    if thread.category_id == category_id:
+        return
+    posts = _thread_posts(thread)
+    old_chain = _bump_categories(thread.category_id, threads=-1, posts=-posts)
+    thread.category_id = category_id
+    db.session.flush()
+    new_chain = _bump_categories(category_id, threads=1, posts=posts)
+    refresh_last_post(set(old_chain) | set(new_chain))
+
+
+def _thread_posts(thread: Thread) -> int:
+    if thread.post_count:
+        return thread.post_count
+    return db.session.execute(select(func.count(Post.id)).where(Post.thread_id == thread.id)).scalar_one()
+
+
+def _bump_categories(category_id: Optional[int], threads: int = 0, posts: int = 0,
+                     last_at: Optional[datetime] = None, last_thread_id: Optional[int] = None) -> List[int]:
+    chain = category_tree.ancestor_ids(category_id)
+    values = {}
+    if threads:
+        values['thread_count'] = Category.thread_count + threads
+    if posts:
+        values['post_count'] = Category.post_count + posts
+    if last_at is not None:
+        values['last_post_at'] = last_at.replace(tzinfo=None)
+        values['last_thread_id'] = last_thread_id
+    if chain and values:
+        db.session.execute(update(Category).where(Category.id.in_(chain)).values(**values))
+    return chain
+
+
+def refresh_last_post(category_ids: Iterable[int]) -> None:
+    """Re-derive last_post_at/last_thread_id after posts left these categories."""
+    category_ids = list(category_ids)
+    if not category_ids:
+        return
+    for cid in category_ids:
+        latest = db.session.execute(
+            select(Post.created_at, Post.thread_id).join(Thread, Thread.id == Post.thread_id)
+            .where(Thread.category_id.in_(category_tree.subtree_ids_query(cid)))
+            .order_by(Post.created_at.desc(), Post.id.desc()).limit(1)
+        ).first()
+        db.session.execute(update(Category).where(Category.id == cid).values(
+            last_post_at=latest[0] if latest else None, last_thread_id=latest[1] if latest else None,
+        ))
+
+
+def repair_category_stats() -> int:
+    """
+    Recompute every category's aggregates from threads and posts
+
+    Returns:
+        Number of categories whose stored values were wrong (commits the fix)
+    """
+    own_threads = dict(db.session.execute(
+        select(Thread.category_id, func.count(Thread.id)).group_by(Thread.category_id)
+    ).all())
+    own_posts = dict(db.session.execute(
+        select(Thread.category_id, func.count(Post.id)).join(Post, Post.thread_id == Thread.id).group_by(Thread.category_id)
+    ).all())
+    rn = func.row_number().over(partition_by=Thread.category_id, order_by=(Post.created_at.desc(), Post.id.desc()))
+    latest_sub = (
+        select(Thread.category_id.label('cid'), Post.created_at.label('at'), Post.thread_id.label('tid'), rn.label('rn'))
+        .join(Post, Post.thread_id == Thread.id).subquery()
+    )
+    own_latest = {cid: (at, tid) for cid, at, tid in db.session.execute(
+        select(latest_sub.c.cid, latest_sub.c.at, latest_sub.c.tid).where(latest_sub.c.rn == 1)
+    ).all()}
+
+    updates = []
+    current = {row[0]: tuple(row[1:]) for row in db.session.execute(
+        select(Category.id, Category.thread_count, Category.post_count, Category.last_post_at, Category.last_thread_id)
+    ).all()}
+    tree = category_tree.get_tree()
+    for cid in tree.nodes:
+        subtree = tree.subtree_ids(cid)
+        latest = max((own_latest[c] for c in subtree if c in own_latest), default=(None, None), key=lambda x: x[0])
+        wanted = (
+            sum(own_threads.get(c, 0) for c in subtree),
+            sum(own_posts.get(c, 0) for c in subtree),
+            latest[0],
+            latest[1],
+        )
+        if current.get(cid) != wanted:
+            updates.append({'id': cid, 'thread_count': wanted[0], 'post_count': wanted[1],
+                            'last_post_at': wanted[2], 'last_thread_id': wanted[3]})
+    if updates:
+        db.session.execute(update(Category), updates)
+    db.session.commit()
+    return len(updates)
+
+
+def paginate_posts(thread: Thread, page: int, per_page: int) -> ThreadPostPagination:
+    ensure_numbered(thread)
+    return ThreadPostPagination(page=page, per_page=per_page, max_per_page=None, error_out=False, thread=thread)
+
+
+def ensure_numbered(thread: Thread) -> None:
+    """Number legacy/seeded posts the first time their thread is shown."""
+    if thread.post_count:
+        return
+    if db.session.execute(select(Post.id).where(Post.thread_id == thread.id).limit(1)).first():
+        backfill_positions([thread.id])
+        db.session.commit()
+
+
+def backfill_positions(thread_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Number unnumbered posts by (created_at, id) and sync threads.post_count
+
+    Threads that already have numbered posts keep their numbers; new numbers
+    continue after the highest one. Does not commit.
+
+    Returns:
+        Number of posts updated
+    """
+    stmt = select(Post.thread_id).where(Post.position.is_(None)).distinct()
+    if thread_ids is not None:
+        stmt = stmt.where(Post.thread_id.in_(list(thread_ids)))
+    pending = list(db.session.execute(stmt).scalars())
+    if not pending:
+        return 0
+    base = dict(db.session.execute(
+        select(Post.thread_id, func.max(Post.position)).where(Post.thread_id.in_(pending)).group_by(Post.thread_id)
+    ).all())
+    rn = func.row_number().over(partition_by=Post.thread_id, order_by=(Post.created_at, Post.id))
+    rows = db.session.execute(
+        select(Post.id, Post.thread_id, rn).where(Post.thread_id.in_(pending), Post.position.is_(None))
+    ).all()
+    updates = [{'id': pid, 'position': (base.get(tid) or 0) + n} for pid, tid, n in rows]
+    db.session.execute(update(Post), updates)
+    highest = {}
+    for row, (_, tid, _n) in zip(updates, rows):
+        highest[tid] = max(highest.get(tid, 0), row['position'])
+    db.session.execute(update(Thread), [{'id': tid, 'post_count': n} for tid, n in highest.items()])
+    db.session.expire_all()
+    return len(updates)
@@ -0,0 +1,73 @@
+"""Weekly purchase funnel: product view -> add to cart -> checkout -> paid.
+
+Stage counts are kept per (UTC, Monday) week in ``funnel_weeks``. Cart,
+checkout and paid events are written by the transaction that caused them,
+one ``UPDATE`` (or the week's first ``INSERT``) alongside the cart or order
+write, so they roll back with it. Views happen on read requests, so they go
+through the buffered event tracker instead: ``services.tracking`` adds the
+product views of each rollup to the 'view' stage.
+"""
+from __future__ import annotations
+from datetime import date, datetime, UTC
+from typing import Dict, List
+
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from agrifarma.extensions import db
+from agrifarma.models.cohort import FunnelWeek
+from agrifarma.services.cohorts import week_start
+
+STAGES = ('view', 'cart', 'checkout', 'paid')
+
+
+def bump(executor, week: date, stage: str, n: int) -> None:
+    """Add n events to a week's stage on a Session or Connection."""
+    stmt = (update(FunnelWeek).where(FunnelWeek.week == week, FunnelWeek.stage == stage)
+            .values(events=FunnelWeek.events + n))
+    if executor.execute(stmt).rowcount:
+        return
+    savepoint = executor.begin_nested()
+    try:
+        executor.execute(insert(FunnelWeek).values(week=week, stage=stage, events=n))
+        savepoint.commit()
+    except IntegrityError:
+        # another worker inserted the week's row first
+        savepoint.rollback()
+        executor.execute(stmt)
+
+
+def record(stage: str, n: int = 1) -> None:
+    """Count n cart/checkout/paid events this week (in the current transaction, not committed)."""
+    if stage not in STAGES:
+        raise ValueError(f"stage must be one of {STAGES}")
+    if stage == 'view':
+        raise ValueError("product views are counted by services.tracking")
+    if n <= 0:
+        return
+    bump(db.session, week_start(datetime.now(UTC)), stage, n)
+
+
+def summary(start: datetime, end: datetime) -> List[Dict]:
+    """Stage totals for the weeks overlapping ``[start, end)``.
+
+    Each row has the stage, its events, the conversion from the previous
+    stage and from views, in percent (None when the base is zero).
+    """
+    totals = dict(db.session.execute(
+        select(FunnelWeek.stage, func.sum(FunnelWeek.events))
+        .where(FunnelWeek.week >= week_start(start), FunnelWeek.week < end.date())
+        .group_by(FunnelWeek.stage)
+    ).all())
+    rows, previous = [], None
+    first = int(totals.get(STAGES[0]) or 0)
+    for stage in STAGES:
+        events = int(totals.get(stage) or 0)
+        rows.append({
+            'stage': stage,
+            'events': events,
+            'step_rate': round(100.0 * events / previous, 1) if previous else None,
+            'overall_rate': round(100.0 * events / first, 1) if first and stage != STAGES[0] else None,
+        })
+        previous = events
+    return rows
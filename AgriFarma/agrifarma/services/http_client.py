@@ -0,0 +1,258 @@
+"""Outbound HTTP transport for payment gateways.
+
+Built on the standard library so gateways don't pull in another dependency:
+
+- ``ConnectionPool`` keeps keep-alive ``http.client`` connections per host and
+  is shared by every gateway of an app (one TLS handshake per connection, not
+  per checkout).
+- ``CircuitBreaker`` stops calling a gateway that keeps failing and lets a
+  single probe through after a cool-down.
+- ``GatewayTransport`` ties both together with per-gateway timeouts and
+  retries using exponential backoff with full jitter.
+"""
+from __future__ import annotations
+import http.client
+import json
+import random
+import socket
+import ssl
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+RETRYABLE_STATUSES = frozenset({429, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+
+
+class TransportError(Exception):
+    """Raised when a gateway could not be reached or kept failing."""
+
+
+class CircuitOpenError(TransportError):
+    """Raised without touching the network while a gateway's circuit is open."""
+
+
+class HttpResponse:
+    """Fully-read response (the connection goes straight back to the pool)."""
+    def __init__(self, status: int, headers: Dict[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    def json(self) -> Dict:
+        return json.loads(self.body.decode('utf-8')) if self.body else {}
+
+
+class ConnectionPool:
+    """Thread-safe keep-alive pool keyed by (scheme, host, port)."""
+
+    def __init__(self, maxsize: int = 10):
+        self.maxsize = maxsize
+        self._idle: Dict[Tuple[str, str, int], Deque[http.client.HTTPConnection]] = defaultdict(deque)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, scheme: str, host: str, port: int, timeout: float,
+                fresh: bool = False) -> Tuple[http.client.HTTPConnection, bool]:
+        """Return ``(connection, reused)``; ``fresh`` skips idle connections."""
+        key = (scheme, host, port)
+        with self._lock:
+            idle = self._idle[key]
+            if idle and not fresh:
+                self.reused += 1
+                conn = idle.pop()
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+            self.created += 1
+        if scheme == 'https':
+            return http.client.HTTPSConnection(host, port, timeout=timeout, context=ssl.create_default_context()), False
+        return http.client.HTTPConnection(host, port, timeout=timeout), False
+
+    def release(self, scheme: str, host: str, port: int, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle[(scheme, host, port)]
+            if len(idle) < self.maxsize:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            for idle in self._idle.values():
+                while idle:
+                    idle.pop().close()
+
+
+class CircuitBreaker:
+    """Closed -> open after ``failure_threshold`` consecutive failures,
+    half-open (one probe) after ``reset_timeout`` seconds."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class GatewayTransport:
+    """HTTP client for one gateway base URL.
+
+    Args:
+        base_url: e.g. ``https://api.stripe.com``
+        pool: Shared ConnectionPool
+        timeout: Socket timeout (seconds) for connect and each read
+        max_retries: Extra attempts for connection errors / retryable statuses
+        backoff_base: First backoff ceiling in seconds (doubles per attempt)
+        backoff_max: Upper bound for any single backoff
+        breaker: CircuitBreaker for this gateway (one is created if omitted)
+    """
+
+    def __init__(self, base_url: str, pool: ConnectionPool, timeout: float = 10.0, max_retries: int = 2,
+                 backoff_base: float = 0.2, backoff_max: float = 2.0, breaker: CircuitBreaker = None,
+                 default_headers: Dict[str, str] = None):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or 'https'
+        self.host = parts.hostname or ''
+        self.port = parts.port or (443 if self.scheme == 'https' else 80)
+        self.base_path = parts.path.rstrip('/')
+        self.pool = pool
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.default_headers = default_headers or {}
+
+    def _backoff(self, attempt: int) -> float:
+        # "Full jitter": uniform in [0, min(cap, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _send(self, method: str, path: str, body: Optional[bytes], headers: Dict[str, str]) -> HttpResponse:
+        conn, reused = self.pool.acquire(self.scheme, self.host, self.port, self.timeout)
+        try:
+            conn.request(method, self.base_path + path, body=body, headers=headers)
+            resp = conn.getresponse()
+            data = resp.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            # The server may have read (and acted on) the request before the
+            # socket dropped, so only resend what is safe to repeat; anything
+            # else goes back to request(), which knows whether it may retry.
+            if not reused or not (method in IDEMPOTENT_METHODS or 'Idempotency-Key' in headers):
+                raise
+            # Almost always the server closing an idle keep-alive socket before
+            # reading our request; retry once on a brand-new connection.
+            conn, _ = self.pool.acquire(self.scheme, self.host, self.port, self.timeout, fresh=True)
+            try:
+                conn.request(method, self.base_path + path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except Exception:
+                conn.close()
+                raise
+        except Exception:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self.pool.release(self.scheme, self.host, self.port, conn)
+        return HttpResponse(resp.status, {k.lower(): v for k, v in resp.getheaders()}, data)
+
+    def request(self, method: str, path: str, json_body: Dict = None, form: Dict = None,
+                headers: Dict[str, str] = None, idempotency_key: str = None) -> HttpResponse:
+        """Send a request, retrying only when a repeat can't double-charge.
+
+        POSTs are retried only when an ``idempotency_key`` is supplied (it is
+        sent as the ``Idempotency-Key`` header).
+        """
+        method = method.upper()
+        hdrs = dict(self.default_headers)
+        hdrs.update(headers or {})
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode('utf-8')
+            hdrs.setdefault('Content-Type', 'application/json')
+        elif form is not None:
+            body = urlencode(form).encode('utf-8')
+            hdrs.setdefault('Content-Type', 'application/x-www-form-urlencoded')
+        if idempotency_key:
+            hdrs['Idempotency-Key'] = idempotency_key
+        retryable = method in IDEMPOTENT_METHODS or bool(idempotency_key)
+        attempts = 1 + (self.max_retries if retryable else 0)
+
+        last_error: Optional[str] = None
+        for attempt in range(attempts):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"circuit open for {self.host}")
+            try:
+                resp = self._send(method, path, body, hdrs)
+            except (OSError, socket.timeout, http.client.HTTPException) as exc:
+                self.breaker.record_failure()
+                last_error = f"{type(exc).__name__}: {exc}"
+            else:
+                if resp.status in RETRYABLE_STATUSES or resp.status >= 500:
+                    self.breaker.record_failure()
+                    last_error = f"HTTP {resp.status}"
+                    if resp.status not in RETRYABLE_STATUSES or attempt == attempts - 1:
+                        return resp
+                else:
+                    self.breaker.record_success()
+                    return resp
+            if attempt < attempts - 1:
+                time.sleep(self._backoff(attempt))
+        raise TransportError(last_error or "request failed")
+
+
+def get_pool(app) -> ConnectionPool:
+    """Return the app-wide pool, creating it on first use."""
+    pool = app.extensions.get('http_pool')
+    if pool is None:
+        pool = app.extensions.setdefault('http_pool', ConnectionPool(maxsize=int(app.config.get('PAYMENT_HTTP_POOL_SIZE', 10))))
+    return pool
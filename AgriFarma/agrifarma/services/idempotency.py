@@ -0,0 +1,110 @@
+"""Idempotency-key store.
+
+A client (or the checkout form) sends a key with a request. The first request
+claims the key and later stores its result; any retry carrying the same key
+inside the replay window gets that stored result back instead of running the
+work again. Claims are committed immediately so a concurrent duplicate hits
+the unique constraint on (scope, key) rather than racing the first request.
+"""
+from __future__ import annotations
+from datetime import datetime, timedelta, UTC
+from typing import Dict, Optional
+
+from flask import current_app
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+
+from agrifarma.extensions import db
+from agrifarma.models.idempotency import IdempotencyKey
+
+DEFAULT_WINDOW_SECONDS = 24 * 60 * 60
+MAX_KEY_LENGTH = 128
+
+
+def _now() -> datetime:
+    # Naive UTC to match what SQLite hands back for DateTime columns
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def _window() -> timedelta:
+    return timedelta(seconds=int(current_app.config.get('IDEMPOTENCY_WINDOW_SECONDS', DEFAULT_WINDOW_SECONDS)))
+
+
+class Claim:
+    """Result of trying to claim a key.
+
+    ``replay`` is True when the key was already used: ``response`` then holds
+    the stored result, or is None while the first request is still running.
+    """
+    def __init__(self, record: Optional[IdempotencyKey], replay: bool = False):
+        self.record = record
+        self.replay = replay
+
+    @property
+    def in_progress(self) -> bool:
+        return self.replay and self.record is not None and self.record.status == 'in_progress'
+
+    @property
+    def response(self) -> Optional[Dict]:
+        return self.record.response if self.record is not None else None
+
+
+def claim(scope: str, key: str | None, user_id: int | None = None) -> Claim:
+    """Claim ``key`` within ``scope`` or return the earlier outcome.
+
+    A missing key yields a no-op claim so callers can treat idempotency as
+    optional. Keys past their window are recycled.
+    """
+    if not key:
+        return Claim(None)
+    key = key[:MAX_KEY_LENGTH]
+    now = _now()
+    record = IdempotencyKey(scope=scope, key=key, user_id=user_id, status='in_progress',
+                            created_at=now, expires_at=now + _window())
+    db.session.add(record)
+    try:
+        db.session.commit()
+        return Claim(record)
+    except IntegrityError:
+        db.session.rollback()
+
+    existing = IdempotencyKey.query.filter_by(scope=scope, key=key).first()
+    if existing is None:
+        # Lost a race with a purge; just try once more
+        return claim(scope, key, user_id)
+    if existing.user_id is not None and user_id is not None and existing.user_id != user_id:
+        # Someone else's key: never leak their result, and don't run twice either
+        current_app.logger.warning(f"Idempotency key reuse across users in scope {scope}")
+        return Claim(None, replay=True)
+    if existing.expires_at <= now:
+        existing.status = 'in_progress'
+        existing.response = None
+        existing.user_id = user_id
+        existing.created_at = now
+        existing.expires_at = now + _window()
+        db.session.commit()
+        return Claim(existing)
+    return Claim(existing, replay=True)
+
+
+def complete(claimed: Optional[Claim], response: Dict) -> None:
+    """Store the result for a claimed key (caller commits)."""
+    if claimed is None or claimed.record is None or claimed.replay:
+        return
+    claimed.record.status = 'completed'
+    claimed.record.response = response
+
+
+def release(claimed: Optional[Claim]) -> None:
+    """Forget a claim whose work was abandoned so the key can be retried."""
+    if claimed is None or claimed.record is None or claimed.replay:
+        return
+    db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.id == claimed.record.id))
+    db.session.commit()
+
+
+def purge_expired() -> int:
+    """Delete keys older than their window; returns number of rows removed."""
+    result = db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= _now()))
+    db.session.commit()
+    return result.rowcount or 0
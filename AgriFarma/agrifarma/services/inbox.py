@@ -0,0 +1,242 @@
+"""Conversations and unread counters for user <-> consultant messaging.
+
+Messages between two users are grouped into one ``conversations`` row that
+carries a copy of the latest message (subject, snippet, time, sender). Each
+participant has a ``conversation_members`` row with their unread count and
+the conversation's last-message time, so an inbox page is one range of the
+``(user_id, last_message_at)`` index, and the total unread badge is the
+``user_stats.unread_messages`` counter (a primary-key read). Sending adjusts
+all of these in the sender's transaction; marking read is a single
+``UPDATE ... RETURNING`` over the ``(receiver_id, read, created_at)`` index
+followed by counter decrements for the conversations it touched.
+``rebuild`` re-derives everything from the message table.
+"""
+from __future__ import annotations
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, case, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+
+from agrifarma.extensions import db
+from agrifarma.models.message import Conversation, ConversationMember, Message
+from agrifarma.models.profile import UserStats
+from agrifarma.services import push, user_stats
+
+SNIPPET_LENGTH = 160
+
+
+def _pair(a: int, b: int):
+    return (a, b) if a <= b else (b, a)
+
+
+def _snippet(content: str) -> str:
+    text = ' '.join((content or '').split())
+    return text if len(text) <= SNIPPET_LENGTH else text[:SNIPPET_LENGTH - 1] + '…'
+
+
+def conversation_between(user_a: int, user_b: int, create: bool = True) -> Optional[Conversation]:
+    """The conversation for a pair of users, created with both member rows if missing."""
+    low, high = _pair(user_a, user_b)
+    convo = Conversation.query.filter_by(user_low_id=low, user_high_id=high).first()
+    if convo is not None or not create:
+        return convo
+    savepoint = db.session.begin_nested()
+    try:
+        convo = Conversation(user_low_id=low, user_high_id=high, message_count=0)
+        db.session.add(convo)
+        db.session.flush()
+        db.session.add_all([ConversationMember(conversation_id=convo.id, user_id=uid, unread_count=0)
+                            for uid in {low, high}])
+        savepoint.commit()
+    except IntegrityError:
+        # the other participant opened it at the same moment
+        savepoint.rollback()
+        convo = Conversation.query.filter_by(user_low_id=low, user_high_id=high).one()
+    return convo
+
+
+def send(sender_id: int, receiver_id: int, subject: str, content: str) -> Message:
+    """Store a message and update conversation, member and unread counters (not committed)."""
+    convo = conversation_between(sender_id, receiver_id)
+    message = Message(sender_id=sender_id, receiver_id=receiver_id, conversation_id=convo.id,
+                      subject=subject, content=content)
+    db.session.add(message)
+    db.session.flush()
+    at = message.created_at
+    db.session.execute(
+        update(Conversation).where(Conversation.id == convo.id).values(
+            message_count=Conversation.message_count + 1,
+            last_message_id=message.id, last_message_at=at, last_sender_id=sender_id,
+            last_subject=subject, last_snippet=_snippet(content),
+        ).execution_options(synchronize_session='fetch')
+    )
+    db.session.execute(
+        update(ConversationMember).where(ConversationMember.conversation_id == convo.id).values(
+            last_message_at=at,
+            unread_count=ConversationMember.unread_count + case((ConversationMember.user_id == receiver_id, 1), else_=0),
+        ).execution_options(synchronize_session='fetch')
+    )
+    user_stats.bump(receiver_id, touch=False, unread_messages=1)
+    user_stats.touch(sender_id)
+    push.notify(receiver_id, 'message', {
+        'conversation_id': convo.id, 'message_id': message.id, 'sender_id': sender_id,
+        'subject': subject, 'snippet': _snippet(content),
+    })
+    return message
+
+
+def mark_read(user_id: int, conversation_ids: Optional[Iterable[int]] = None,
+              message_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Mark a user's unread messages as read in one UPDATE (not committed)
+
+    Args:
+        user_id: The receiver whose messages are marked
+        conversation_ids: Limit to these conversations
+        message_ids: Limit to these messages
+        (neither: everything in the user's inbox)
+
+    Returns:
+        Number of messages that changed from unread to read
+    """
+    stmt = update(Message).where(Message.receiver_id == user_id, Message.read.is_(False))
+    if conversation_ids is not None:
+        stmt = stmt.where(Message.conversation_id.in_(list(conversation_ids)))
+    if message_ids is not None:
+        stmt = stmt.where(Message.id.in_(list(message_ids)))
+    changed = db.session.execute(
+        stmt.values(read=True).returning(Message.conversation_id)
+        .execution_options(synchronize_session='fetch')
+    ).scalars().all()
+    if not changed:
+        return 0
+    per_conversation = Counter(cid for cid in changed if cid is not None)
+    if per_conversation:
+        members = ConversationMember.__table__
+        db.session.execute(
+            members.update()
+            .where(and_(members.c.conversation_id == db.bindparam('cid'), members.c.user_id == user_id))
+            .values(unread_count=case((members.c.unread_count > db.bindparam('n'),
+                                       members.c.unread_count - db.bindparam('n')), else_=0)),
+            [{'cid': cid, 'n': n} for cid, n in per_conversation.items()],
+        )
+        _expire_members(user_id, per_conversation)
+    user_stats.bump(user_id, touch=False, unread_messages=-len(changed))
+    return len(changed)
+
+
+def _expire_members(user_id: int, conversation_ids: Iterable[int]) -> None:
+    """Core executemany bypasses the identity map; drop loaded copies of the rows it changed."""
+    for cid in conversation_ids:
+        member = db.session.identity_map.get(db.inspect(ConversationMember).identity_key_from_primary_key((cid, user_id)))
+        if member is not None:
+            db.session.expire(member, ['unread_count'])
+
+
+def unread_total(user_id: int) -> int:
+    """The unread badge: the user_stats counter, or for a user without a row
+    yet one SUM over their conversation members (never the full ``compute``)."""
+    row = db.session.get(UserStats, user_id)
+    if row is not None:
+        return row.unread_messages
+    return db.session.execute(
+        select(func.coalesce(func.sum(ConversationMember.unread_count), 0))
+        .where(ConversationMember.user_id == user_id)
+    ).scalar()
+
+
+def inbox_page(user_id: int, page: int, per_page: int = 20):
+    """The user's conversations, most recent first (Flask-SQLAlchemy pagination of members)."""
+    return (
+        ConversationMember.query.options(joinedload(ConversationMember.conversation))
+        .filter(ConversationMember.user_id == user_id, ConversationMember.last_message_at.isnot(None))
+        .order_by(ConversationMember.last_message_at.desc(), ConversationMember.conversation_id.desc())
+        .paginate(page=page, per_page=per_page, error_out=False)
+    )
+
+
+def messages_in(conversation: Conversation, before: Optional[datetime] = None, limit: int = 50) -> List[Message]:
+    """Up to ``limit`` messages of a conversation ending just before ``before``, oldest first."""
+    query = (
+        Message.query.options(joinedload(Message.sender))
+        .filter(Message.conversation_id == conversation.id)
+    )
+    if before is not None:
+        query = query.filter(Message.created_at < before)
+    newest = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit).all()
+    return list(reversed(newest))
+
+
+def rebuild() -> int:
+    """Assign conversations to loose messages and recompute all derived state (commits).
+
+    Returns the number of conversations.
+    """
+    loose = db.session.execute(
+        select(Message.sender_id, Message.receiver_id).where(Message.conversation_id.is_(None)).distinct()
+    ).all()
+    for pair in {_pair(a, b) for a, b in loose}:
+        convo = conversation_between(*pair)
+        low, high = pair
+        db.session.execute(
+            update(Message).where(
+                Message.conversation_id.is_(None),
+                ((Message.sender_id == low) & (Message.receiver_id == high))
+                | ((Message.sender_id == high) & (Message.receiver_id == low)),
+            ).values(conversation_id=convo.id).execution_options(synchronize_session=False)
+        )
+
+    # Latest message per conversation via ROW_NUMBER()
+    rn = func.row_number().over(partition_by=Message.conversation_id,
+                                order_by=(Message.created_at.desc(), Message.id.desc())).label('rn')
+    ranked = select(Message.conversation_id, Message.id, Message.created_at, Message.sender_id,
+                    Message.subject, Message.content, rn).where(Message.conversation_id.isnot(None)).subquery()
+    latest = {row.conversation_id: row for row in db.session.execute(select(ranked).where(ranked.c.rn == 1))}
+    counts = dict(db.session.execute(
+        select(Message.conversation_id, func.count(Message.id)).where(Message.conversation_id.isnot(None))
+        .group_by(Message.conversation_id)
+    ).all())
+    unread: Dict[tuple, int] = {
+        (cid, uid): n for cid, uid, n in db.session.execute(
+            select(Message.conversation_id, Message.receiver_id, func.count(Message.id))
+            .where(Message.conversation_id.isnot(None), Message.read.is_(False))
+            .group_by(Message.conversation_id, Message.receiver_id)
+        )
+    }
+    conversations = db.session.execute(select(Conversation.id, Conversation.user_low_id, Conversation.user_high_id)).all()
+    convo_rows, member_rows = [], []
+    for cid, low, high in conversations:
+        last = latest.get(cid)
+        convo_rows.append({
+            'id': cid, 'message_count': counts.get(cid, 0),
+            'last_message_id': last.id if last else None,
+            'last_message_at': last.created_at if last else None,
+            'last_sender_id': last.sender_id if last else None,
+            'last_subject': last.subject if last else None,
+            'last_snippet': _snippet(last.content) if last else None,
+        })
+        for uid in {low, high}:
+            member_rows.append({'conversation_id': cid, 'user_id': uid, 'unread_count': unread.get((cid, uid), 0),
+                                'last_message_at': last.created_at if last else None})
+    if convo_rows:
+        db.session.execute(update(Conversation), convo_rows)
+    existing = set(db.session.execute(select(ConversationMember.conversation_id, ConversationMember.user_id)).all())
+    missing = [m for m in member_rows if (m['conversation_id'], m['user_id']) not in existing]
+    if missing:
+        db.session.execute(insert(ConversationMember), missing)
+    present = [m for m in member_rows if (m['conversation_id'], m['user_id']) in existing]
+    if present:
+        db.session.execute(update(ConversationMember), present)
+
+    # Per-user totals live in user_stats; only rows that exist need correcting
+    totals = Counter()
+    for (cid, uid), n in unread.items():
+        totals[uid] += n
+    stats = db.session.execute(select(UserStats.user_id)).scalars().all()
+    if stats:
+        db.session.execute(update(UserStats), [{'user_id': uid, 'unread_messages': totals.get(uid, 0)} for uid in stats])
+    db.session.commit()
+    return len(conversations)
@@ -0,0 +1,186 @@
+"""Inventory reservation service.
+
+Stock is taken with a single conditional ``UPDATE products ... WHERE
+inventory >= qty`` per order, so concurrent buyers can never drive inventory
+below zero no matter how requests interleave. Every change is mirrored in the
+append-only ``stock_movements`` ledger, which is also what releases read back
+to know how much to return. Manual changes (admin edits, imports) are applied
+the same way, as ``inventory = inventory + delta``, so they never overwrite
+sales committed since the form or file was read.
+"""
+from __future__ import annotations
+from collections import defaultdict
+from datetime import datetime, UTC
+from typing import Dict, Iterable, Mapping, Tuple
+
+from flask import current_app
+from sqlalchemy import case, func, insert, select, update
+
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Product, StockMovement
+
+
+class ReservationResult:
+    """Outcome of a stock reservation for one order"""
+    def __init__(self, success: bool, message: str = "", shortages: Dict[int, int] = None):
+        self.success = success
+        self.message = message
+        # product_id -> units actually available at the time of the attempt
+        self.shortages = shortages or {}
+
+
+def _merge_lines(lines: Iterable[Tuple[int, int]]) -> Dict[int, int]:
+    """Collapse (product_id, quantity) pairs so each product appears once."""
+    merged: Dict[int, int] = defaultdict(int)
+    for product_id, qty in lines:
+        if qty and qty > 0:
+            merged[int(product_id)] += int(qty)
+    return dict(merged)
+
+
+def _record(order_id: int | None, deltas: Mapping[int, int], reason: str) -> None:
+    now = datetime.now(UTC)
+    rows = [
+        {'product_id': pid, 'order_id': order_id, 'delta': delta, 'reason': reason, 'created_at': now}
+        for pid, delta in deltas.items() if delta
+    ]
+    if rows:
+        db.session.execute(insert(StockMovement), rows)
+
+
+def reserve_order_stock(order_id: int, lines: Iterable[Tuple[int, int]]) -> ReservationResult:
+    """Atomically take stock for every line of an order.
+
+    Runs one ``UPDATE`` for all products of the order. The update only
+    matches rows that still have enough stock, so if fewer rows than products
+    are touched some line is short and the savepoint is rolled back: either the
+    whole order is reserved or nothing is.
+
+    Args:
+        order_id: Order the stock is being reserved for
+        lines: Iterable of (product_id, quantity) pairs
+
+    Returns:
+        ReservationResult; ``shortages`` lists products that could not be filled
+    """
+    wanted = _merge_lines(lines)
+    if not wanted:
+        return ReservationResult(success=True, message="Nothing to reserve")
+
+    qty = case(wanted, value=Product.id, else_=0)
+    stmt = (
+        update(Product)
+        .where(Product.id.in_(wanted.keys()), Product.inventory >= qty)
+        .values(inventory=Product.inventory - qty)
+        .execution_options(synchronize_session=False)
+    )
+    savepoint = db.session.begin_nested()
+    updated = db.session.execute(stmt).rowcount
+    if updated != len(wanted):
+        savepoint.rollback()
+        available = dict(db.session.execute(
+            select(Product.id, Product.inventory).where(Product.id.in_(wanted.keys()))
+        ).all())
+        shortages = {
+            pid: int(available.get(pid) or 0)
+            for pid, q in wanted.items() if (available.get(pid) or 0) < q
+        }
+        current_app.logger.info(f"Stock reservation failed for order {order_id}: {shortages}")
+        return ReservationResult(success=False, message="Insufficient stock", shortages=shortages)
+
+    _record(order_id, {pid: -q for pid, q in wanted.items()}, 'reserve')
+    savepoint.commit()
+    _expire_products(wanted.keys())
+    return ReservationResult(success=True, message="Stock reserved")
+
+
+def release_order_stock(order_id: int) -> Dict[int, int]:
+    """Return whatever stock an order still holds (e.g. after a failed payment).
+
+    The amount is derived from the ledger, so calling this twice is harmless.
+
+    Returns:
+        Mapping of product_id -> units returned to inventory
+    """
+    held_rows = db.session.execute(
+        select(StockMovement.product_id, func.sum(StockMovement.delta))
+        .where(StockMovement.order_id == order_id)
+        .group_by(StockMovement.product_id)
+    ).all()
+    held = {pid: -int(total) for pid, total in held_rows if total and total < 0}
+    if not held:
+        return {}
+
+    qty = case(held, value=Product.id, else_=0)
+    db.session.execute(
+        update(Product)
+        .where(Product.id.in_(held.keys()))
+        .values(inventory=Product.inventory + qty)
+        .execution_options(synchronize_session=False)
+    )
+    _record(order_id, held, 'release')
+    _expire_products(held.keys())
+    return held
+
+
+def record_adjustment(product_id: int, old_inventory: int | None, new_inventory: int | None) -> None:
+    """Log a manual inventory change (admin create/edit) in the ledger."""
+    delta = int(new_inventory or 0) - int(old_inventory or 0)
+    if delta:
+        _record(None, {product_id: delta}, 'adjust')
+
+
+def record_adjustments(deltas: Mapping[int, int]) -> None:
+    """Log many manual inventory changes ({product_id: delta}, e.g. a bulk import) in one insert."""
+    _record(None, deltas, 'adjust')
+
+
+def adjust_stock(deltas: Mapping[int, int]) -> Dict[int, int]:
+    """Apply manual inventory changes relative to the stock on hand now and log them.
+
+    One ``UPDATE`` adds each delta to the current inventory. A decrease larger
+    than what is left (stock sold since the caller read the product) empties
+    the product instead of going negative.
+
+    Args:
+        deltas: Mapping of product_id -> units to add (negative to remove)
+
+    Returns:
+        Mapping of product_id -> units actually added, as logged in the ledger
+    """
+    deltas = {int(pid): int(delta) for pid, delta in deltas.items() if delta}
+    if not deltas:
+        return {}
+    qty = case(deltas, value=Product.id, else_=0)
+    done = set(db.session.execute(
+        update(Product)
+        .where(Product.id.in_(deltas.keys()), Product.inventory + qty >= 0)
+        .values(inventory=Product.inventory + qty)
+        .returning(Product.id)
+        .execution_options(synchronize_session=False)
+    ).scalars())
+    applied = {pid: delta for pid, delta in deltas.items() if pid in done}
+    short = [pid for pid in deltas if pid not in done]
+    if short:
+        on_hand = dict(db.session.execute(
+            select(Product.id, Product.inventory).where(Product.id.in_(short)).with_for_update()
+        ).all())
+        if on_hand:
+            db.session.execute(
+                update(Product)
+                .where(Product.id.in_(on_hand.keys()))
+                .values(inventory=0)
+                .execution_options(synchronize_session=False)
+            )
+            applied.update({pid: -int(n or 0) for pid, n in on_hand.items()})
+    _record(None, applied, 'adjust')
+    _expire_products(applied.keys())
+    return applied
+
+
+def _expire_products(product_ids: Iterable[int]) -> None:
+    """Bulk UPDATEs bypass the identity map; refresh any loaded Product rows."""
+    ids = set(product_ids)
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Product) and obj.id in ids:
+            db.session.expire(obj, ['inventory'])
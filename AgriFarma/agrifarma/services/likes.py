@@ -0,0 +1,130 @@
+"""Per-viewer like state for forum posts and blog posts.
+
+Pages ask "which of these ids has the viewer liked?" once, with a single
+``WHERE user_id = ? AND post_id IN (...)`` query served by the
+``(user_id, post_id)`` index, instead of loading every like row per item in
+the template. Answers are remembered per user in a small in-process cache
+(``LIKE_STATE_CACHE_TTL`` seconds, 0 disables) that the toggle endpoints
+update in place, so paging back and forth costs no queries at all.
+
+The cache is per process: a toggle served by another worker is only seen
+here once the entry expires, which is why the TTL is a few seconds. The
+buttons post the action they displayed (``wanted_state``) and the endpoints
+apply it against the like row in the database, so a page drawn from a stale
+entry can never flip a like the wrong way.
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set
+
+from flask import current_app
+from sqlalchemy import func, select
+
+from agrifarma.extensions import db
+from agrifarma.models.likes import BlogLike, PostLike
+
+# kind -> (like model, column holding the liked object's id)
+KINDS = {
+    'post': (PostLike, PostLike.post_id),
+    'blog': (BlogLike, BlogLike.blog_id),
+}
+
+
+class LikeStateCache:
+    """LRU of (kind, user_id) -> {object id: liked?} with a TTL per user entry"""
+
+    def __init__(self, ttl: float = 5, max_users: int = 2048):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def known(self, kind: str, user_id: int) -> Dict[int, bool]:
+        with self._lock:
+            entry = self._entries.get((kind, user_id))
+            if entry is None or entry[0] < time.monotonic():
+                return {}
+            self._entries.move_to_end((kind, user_id))
+            return dict(entry[1])
+
+    def store(self, kind: str, user_id: int, states: Dict[int, bool]) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            key = (kind, user_id)
+            entry = self._entries.get(key)
+            current = entry[1] if entry and entry[0] >= time.monotonic() else {}
+            current.update(states)
+            self._entries[key] = (time.monotonic() + self.ttl, current)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def set_state(self, kind: str, user_id: int, obj_id: int, liked: bool) -> None:
+        with self._lock:
+            entry = self._entries.get((kind, user_id))
+            if entry is not None:
+                entry[1][obj_id] = liked
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def get_cache() -> LikeStateCache:
+    cache = current_app.extensions.get('like_state')
+    if cache is None:
+        cache = current_app.extensions.setdefault(
+            'like_state', LikeStateCache(ttl=current_app.config.get('LIKE_STATE_CACHE_TTL', 5))
+        )
+    return cache
+
+
+def liked_ids(kind: str, user_id: Optional[int], ids: Iterable[int]) -> Set[int]:
+    """Return the subset of ``ids`` the user has liked (empty for anonymous viewers)."""
+    ids = [i for i in ids if i is not None]
+    if not user_id or not ids:
+        return set()
+    model, col = KINDS[kind]
+    cache = get_cache()
+    known = cache.known(kind, user_id)
+    missing = [i for i in ids if i not in known]
+    if missing:
+        found = set(db.session.execute(
+            select(col).where(model.user_id == user_id, col.in_(missing))
+        ).scalars())
+        fresh = {i: i in found for i in missing}
+        cache.store(kind, user_id, fresh)
+        known.update(fresh)
+    return {i for i in ids if known.get(i)}
+
+
+def like_counts(kind: str, ids: Iterable[int]) -> Dict[int, int]:
+    """Like totals for a page of ids in one grouped query."""
+    ids = list(ids)
+    if not ids:
+        return {}
+    model, col = KINDS[kind]
+    return dict(db.session.execute(
+        select(col, func.count(model.id)).where(col.in_(ids)).group_by(col)
+    ).all())
+
+
+def wanted_state(currently_liked: bool, requested: Optional[str]) -> bool:
+    """Whether the object should end up liked.
+
+    ``requested`` is the action the button displayed ('like' / 'unlike');
+    repeating it is a no-op. Without one (older clients) the like toggles.
+    """
+    if requested == 'like':
+        return True
+    if requested == 'unlike':
+        return False
+    return not currently_liked
+
+
+def record_toggle(kind: str, user_id: int, obj_id: int, liked: bool) -> None:
+    """Keep the viewer's cached state in step with a like/unlike they just made."""
+    get_cache().set_state(kind, user_id, obj_id, liked)
@@ -2,14 +2,23 @@
 """
 Payment Service
 Handles payment processing with support for multiple gateways
-Currently implements mock/simulation mode for testing
+Mock gateway for development; Stripe and JazzCash go through the pooled
+HTTP transport in ``services/http_client.py``
 """
 from __future__ import annotations
 from typing import Dict, Optional
 from decimal import Decimal
-from datetime import datetime, UTC
+from datetime import datetime, timedelta, UTC
 from flask import current_app
+import hashlib
+import hmac
+import json
 import secrets
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode
+
+from agrifarma.services import http_client
 
 
 class PaymentResult:
@@ -20,6 +29,26 @@ class PaymentResult:
         self.message = message
         self.data = data or {}
         self.timestamp = datetime.now(UTC)
+        self.replayed = False
+
+    def to_dict(self) -> Dict:
+        return {
+            'success': self.success,
+            'transaction_id': self.transaction_id,
+            'message': self.message,
+            'data': self.data,
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Dict) -> 'PaymentResult':
+        result = cls(
+            success=bool(payload.get('success')),
+            transaction_id=payload.get('transaction_id'),
+            message=payload.get('message', ''),
+            data=payload.get('data') or {}
+        )
+        result.replayed = True
+        return result
 
 
 class PaymentGateway:
@@ -39,6 +68,28 @@ class PaymentGateway:
     def refund_payment(self, transaction_id: str, amount: Decimal = None) -> PaymentResult:
         """Refund a payment transaction"""
         raise NotImplementedError
+    
+    def parse_webhook(self, body: bytes, headers: Dict[str, str]) -> Optional[Dict]:
+        """
+        Verify and normalise an inbound webhook
+        
+        Returns None when the signature doesn't check out, otherwise a dict with
+        ``event_id``, ``event_type``, ``payment_status`` (Paid/Failed/Refunded or
+        None), ``transaction_id`` and ``order_id``. Raises ValueError for bodies
+        that are signed correctly but can't be understood.
+        """
+        raise NotImplementedError
+
+
+def _hmac_hex(secret: str, message: bytes) -> str:
+    return hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+def _int_or_none(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
 
 
 class MockPaymentGateway(PaymentGateway):
@@ -99,51 +150,379 @@ class MockPaymentGateway(PaymentGateway):
             success=False,
             message="Cannot refund: Invalid transaction ID"
         )
+    
+    def parse_webhook(self, body: bytes, headers: Dict[str, str]) -> Optional[Dict]:
+        """
+        Mock webhooks: JSON body signed with ``X-Webhook-Signature`` =
+        hex HMAC-SHA256(webhook_secret or MOCK_WEBHOOK_SECRET, body). Nothing
+        verifies while neither is set.
+        """
+        secret = self.config.get('webhook_secret') or current_app.config.get('MOCK_WEBHOOK_SECRET', '')
+        signature = headers.get('X-Webhook-Signature', '')
+        if not secret or not signature or not hmac.compare_digest(signature, _hmac_hex(secret, body)):
+            return None
+        event = json.loads(body.decode('utf-8'))
+        if not event.get('id'):
+            raise ValueError("event id missing")
+        statuses = {'payment.succeeded': 'Paid', 'payment.failed': 'Failed', 'payment.refunded': 'Refunded'}
+        return {
+            'event_id': str(event['id']),
+            'event_type': event.get('type', ''),
+            'payment_status': statuses.get(event.get('type')),
+            'transaction_id': event.get('transaction_id'),
+            'order_id': _int_or_none(event.get('order_id')),
+        }
 
 
-class StripeGateway(PaymentGateway):
-    """Stripe payment gateway (skeleton for future implementation)"""
+class HttpPaymentGateway(PaymentGateway):
+    """Base for gateways reached over HTTP
+    
+    The transport is built lazily from the gateway config (``base_url``,
+    ``timeout``, ``max_retries``, ``breaker_threshold``, ``breaker_reset``)
+    on top of the app-wide keep-alive pool. Gateway instances are cached per
+    app by ``get_payment_gateway``, so the transport and its circuit breaker
+    are shared by all requests.
+    """
+    default_base_url = ''
+    default_timeout = 10.0
+    
+    def __init__(self, config: Dict = None):
+        super().__init__(config)
+        self._transport = None
+        self._transport_lock = threading.Lock()
+    
+    @property
+    def transport(self) -> http_client.GatewayTransport:
+        if self._transport is None:
+            with self._transport_lock:
+                if self._transport is None:
+                    self._transport = http_client.GatewayTransport(
+                        self.config.get('base_url') or self.default_base_url,
+                        pool=http_client.get_pool(current_app._get_current_object()),
+                        timeout=float(self.config.get('timeout', self.default_timeout)),
+                        max_retries=int(self.config.get('max_retries', 2)),
+                        backoff_base=float(self.config.get('backoff_base', 0.2)),
+                        breaker=http_client.CircuitBreaker(
+                            failure_threshold=int(self.config.get('breaker_threshold', 5)),
+                            reset_timeout=float(self.config.get('breaker_reset', 30.0)),
+                        ),
+                        default_headers=self.default_headers(),
+                    )
+        return self._transport
+    
+    def default_headers(self) -> Dict[str, str]:
+        return {'Accept': 'application/json'}
+    
+    def _unreachable(self, exc: Exception, transaction_id: Optional[str] = None) -> PaymentResult:
+        """Result for a request that got no usable response.
+
+        Unless the circuit breaker refused to send it, the request may have
+        reached the provider, so a charge's outcome is unknown
+        (``outcome_unknown``) rather than failed; ``transaction_id`` is then a
+        reference ``verify_payment`` can look the charge up by.
+        """
+        current_app.logger.error(f"[{type(self).__name__}] transport error: {exc}")
+        return PaymentResult(
+            success=False,
+            transaction_id=transaction_id,
+            message=f"Payment provider unavailable ({exc})",
+            data={'transport_error': True, 'outcome_unknown': not isinstance(exc, http_client.CircuitOpenError)}
+        )
+
+    def _payload(self, resp: http_client.HttpResponse) -> Optional[Dict]:
+        """Decoded JSON body, or None when the provider sent something else (e.g. a proxy error page)"""
+        try:
+            payload = resp.json()
+        except ValueError:
+            current_app.logger.error(f"[{type(self).__name__}] non-JSON response (HTTP {resp.status})")
+            return None
+        return payload if isinstance(payload, dict) else None
+
+    def _missing(self, field: str, what: str) -> PaymentResult:
+        """Refuse a charge whose customer input is absent instead of sending a placeholder"""
+        return PaymentResult(
+            success=False,
+            message=f"{what} is required for this payment method",
+            data={'missing': field}
+        )
+
+    def _unreadable(self, resp: http_client.HttpResponse, **data) -> PaymentResult:
+        return PaymentResult(
+            success=False,
+            message=f"Payment provider sent an unreadable response (HTTP {resp.status})",
+            data={'http_status': resp.status, 'unreadable': True, **data}
+        )
+
+
+def _minor_units(amount: Decimal) -> int:
+    """Convert e.g. Decimal('12.34') to 1234 for APIs that take integer amounts."""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1')))
+
+
+class StripeGateway(HttpPaymentGateway):
+    """Stripe payment gateway (PaymentIntents API)"""
+    default_base_url = 'https://api.stripe.com'
+    
+    def default_headers(self) -> Dict[str, str]:
+        headers = super().default_headers()
+        if self.config.get('api_key'):
+            headers['Authorization'] = f"Bearer {self.config['api_key']}"
+        return headers
     
     def process_payment(self, amount: Decimal, currency: str = "PKR", **kwargs) -> PaymentResult:
         """
         Process payment via Stripe
-        Note: Requires Stripe API key configuration
+        Note: Requires Stripe API key configuration and the customer's
+        PaymentMethod id (``payment_token``) from Stripe's card element
         """
-        # TODO: Implement Stripe integration
-        # import stripe
-        # stripe.api_key = self.config.get('api_key')
-        # charge = stripe.Charge.create(...)
-        
+        if not kwargs.get('payment_token'):
+            return self._missing('payment_token', "Card details")
+        form = {
+            'amount': _minor_units(amount),
+            'currency': currency.lower(),
+            'confirm': 'true',
+            'payment_method': kwargs['payment_token'],
+        }
+        if kwargs.get('order_id') is not None:
+            form['metadata[order_id]'] = kwargs['order_id']
+        if kwargs.get('idempotency_key'):
+            # lets verify_payment find the intent when the response never arrives
+            form['metadata[idempotency_key]'] = kwargs['idempotency_key']
+        if kwargs.get('customer_email'):
+            form['receipt_email'] = kwargs['customer_email']
+        try:
+            resp = self.transport.request('POST', '/v1/payment_intents', form=form,
+                                          idempotency_key=kwargs.get('idempotency_key'))
+        except http_client.TransportError as exc:
+            return self._unreachable(exc, transaction_id=kwargs.get('idempotency_key'))
+        payload = self._payload(resp)
+        if payload is None:
+            return self._unreadable(resp, gateway='stripe')
+        if resp.ok and payload.get('status') == 'succeeded':
+            return PaymentResult(
+                success=True,
+                transaction_id=payload.get('id'),
+                message="Payment processed successfully",
+                data={'amount': float(amount), 'currency': currency, 'gateway': 'stripe', 'order_id': kwargs.get('order_id')}
+            )
+        error = payload.get('error') or {}
         return PaymentResult(
             success=False,
-            message="Stripe integration not yet implemented"
+            transaction_id=payload.get('id'),
+            message=error.get('message') or f"Payment {payload.get('status', 'failed')}",
+            data={'gateway': 'stripe', 'http_status': resp.status}
         )
+    
+    def verify_payment(self, transaction_id: str) -> PaymentResult:
+        """Look up a PaymentIntent and report whether it completed
+
+        ``transaction_id`` is a PaymentIntent id, or the idempotency key of a
+        charge whose response never arrived (searched for in the intents'
+        metadata; the result then carries the intent's id).
+        """
+        by_key = not transaction_id.startswith('pi_')
+        if by_key:
+            key = transaction_id.replace("'", "\\'")
+            query = f"metadata['idempotency_key']:'{key}'"
+            path = '/v1/payment_intents/search?' + urlencode({'query': query})
+        else:
+            path = f'/v1/payment_intents/{transaction_id}'
+        try:
+            resp = self.transport.request('GET', path)
+        except http_client.TransportError as exc:
+            return self._unreachable(exc)
+        payload = self._payload(resp)
+        if payload is None:
+            return self._unreadable(resp)
+        if by_key and resp.ok:
+            matches = payload.get('data') or []
+            if not matches:
+                return PaymentResult(success=False, transaction_id=transaction_id,
+                                     message="Payment not found", data={'status': 'not_found'})
+            payload = matches[0]
+        status = payload.get('status', 'unknown')
+        return PaymentResult(
+            success=resp.ok and status == 'succeeded',
+            transaction_id=payload.get('id') or transaction_id,
+            message=f"Payment {status}",
+            data={'status': 'completed' if status == 'succeeded' else status}
+        )
+    
+    def refund_payment(self, transaction_id: str, amount: Decimal = None) -> PaymentResult:
+        """Refund a PaymentIntent (fully, or ``amount`` of it)"""
+        form = {'payment_intent': transaction_id}
+        if amount is not None:
+            form['amount'] = _minor_units(amount)
+        try:
+            resp = self.transport.request('POST', '/v1/refunds', form=form,
+                                          idempotency_key=f"refund-{transaction_id}-{form.get('amount', 'full')}")
+        except http_client.TransportError as exc:
+            return self._unreachable(exc)
+        payload = self._payload(resp)
+        if payload is None:
+            return self._unreadable(resp, original_transaction=transaction_id)
+        return PaymentResult(
+            success=resp.ok and payload.get('status') in ('succeeded', 'pending'),
+            transaction_id=payload.get('id'),
+            message=f"Refund {payload.get('status', 'failed')}",
+            data={'original_transaction': transaction_id}
+        )
+
+
+    # payment_intent / charge events we act on
+    WEBHOOK_STATUSES = {
+        'payment_intent.succeeded': 'Paid',
+        'payment_intent.payment_failed': 'Failed',
+        'charge.refunded': 'Refunded',
+    }
+    
+    def parse_webhook(self, body: bytes, headers: Dict[str, str]) -> Optional[Dict]:
+        """
+        Verify ``Stripe-Signature`` (``t=<ts>,v1=<hmac>`` over ``"<ts>.<body>"``)
+        and reject events older than ``webhook_tolerance`` seconds
+        """
+        secret = self.config.get('webhook_secret', '')
+        parts = dict(
+            item.split('=', 1) for item in headers.get('Stripe-Signature', '').split(',') if '=' in item
+        )
+        timestamp = parts.get('t', '')
+        if not secret or not timestamp.isdigit() or 'v1' not in parts:
+            return None
+        expected = _hmac_hex(secret, timestamp.encode('utf-8') + b'.' + body)
+        if not hmac.compare_digest(parts['v1'], expected):
+            return None
+        if abs(time.time() - int(timestamp)) > int(self.config.get('webhook_tolerance', 300)):
+            return None
+        event = json.loads(body.decode('utf-8'))
+        if not event.get('id'):
+            raise ValueError("event id missing")
+        obj = (event.get('data') or {}).get('object') or {}
+        return {
+            'event_id': event['id'],
+            'event_type': event.get('type', ''),
+            'payment_status': self.WEBHOOK_STATUSES.get(event.get('type')),
+            'transaction_id': obj.get('payment_intent') or obj.get('id'),
+            'order_id': _int_or_none((obj.get('metadata') or {}).get('order_id')),
+        }
 
 
-class JazzCashGateway(PaymentGateway):
-    """JazzCash payment gateway for Pakistan (skeleton)"""
+class JazzCashGateway(HttpPaymentGateway):
+    """JazzCash payment gateway for Pakistan (REST API v2.0, mobile wallet)"""
+    default_base_url = 'https://sandbox.jazzcash.com.pk'
+    
+    def secure_hash(self, fields: Dict) -> str:
+        """pp_SecureHash: HMAC-SHA256 over the salt and the sorted non-empty pp_ values"""
+        salt = self.config.get('integrity_salt', '')
+        values = [str(fields[k]) for k in sorted(fields) if k.startswith('pp_') and k != 'pp_SecureHash' and fields[k] not in (None, '')]
+        message = '&'.join([salt] + values)
+        return hmac.new(salt.encode('utf-8'), message.encode('utf-8'), hashlib.sha256).hexdigest().upper()
+    
+    def _signed(self, fields: Dict) -> Dict:
+        fields = dict(fields, pp_MerchantID=self.config.get('merchant_id', ''), pp_Password=self.config.get('password', ''))
+        fields['pp_SecureHash'] = self.secure_hash(fields)
+        return fields
     
     def process_payment(self, amount: Decimal, currency: str = "PKR", **kwargs) -> PaymentResult:
         """
         Process payment via JazzCash
-        Note: Requires JazzCash merchant credentials
+        Note: Requires JazzCash merchant credentials and the customer's
+        wallet number (``mobile_number``)
         """
-        # TODO: Implement JazzCash integration
-        # Integration points:
-        # 1. Generate transaction hash
-        # 2. Send request to JazzCash API
-        # 3. Handle callback/webhook
-        
+        if not kwargs.get('mobile_number'):
+            return self._missing('mobile_number', "A JazzCash mobile number")
+        now = datetime.now(UTC)
+        ref = kwargs.get('idempotency_key') or f"T{now:%Y%m%d%H%M%S}{secrets.token_hex(3).upper()}"
+        fields = self._signed({
+            'pp_Version': '2.0',
+            'pp_TxnType': 'MWALLET',
+            'pp_Language': 'EN',
+            'pp_TxnRefNo': ref[:20],
+            'pp_Amount': _minor_units(amount),
+            'pp_TxnCurrency': currency,
+            'pp_TxnDateTime': f"{now:%Y%m%d%H%M%S}",
+            'pp_TxnExpiryDateTime': f"{now + timedelta(hours=1):%Y%m%d%H%M%S}",
+            'pp_BillReference': f"order{kwargs.get('order_id', '')}",
+            'pp_Description': f"AgriFarma order {kwargs.get('order_id', '')}",
+            'pp_MobileNumber': kwargs['mobile_number'],
+        })
+        try:
+            # pp_TxnRefNo makes the request safe to retry: JazzCash rejects duplicates
+            resp = self.transport.request('POST', '/ApplicationAPI/API/2.0/Purchase/DoMWalletTransaction',
+                                          json_body=fields, idempotency_key=fields['pp_TxnRefNo'])
+        except http_client.TransportError as exc:
+            return self._unreachable(exc, transaction_id=fields['pp_TxnRefNo'])
+        payload = self._payload(resp)
+        if payload is None:
+            result = self._unreadable(resp, gateway='jazzcash')
+            result.transaction_id = fields['pp_TxnRefNo']
+            return result
+        if resp.ok and payload.get('pp_ResponseCode') == '000':
+            return PaymentResult(
+                success=True,
+                transaction_id=payload.get('pp_TxnRefNo', fields['pp_TxnRefNo']),
+                message="Payment processed successfully",
+                data={'amount': float(amount), 'currency': currency, 'gateway': 'jazzcash', 'order_id': kwargs.get('order_id')}
+            )
         return PaymentResult(
             success=False,
-            message="JazzCash integration not yet implemented"
+            transaction_id=fields['pp_TxnRefNo'],
+            message=payload.get('pp_ResponseMessage') or "Payment declined",
+            data={'gateway': 'jazzcash', 'response_code': payload.get('pp_ResponseCode'), 'http_status': resp.status}
         )
+    
+    def verify_payment(self, transaction_id: str) -> PaymentResult:
+        """Ask JazzCash for the status of a transaction reference"""
+        fields = self._signed({'pp_TxnRefNo': transaction_id})
+        try:
+            resp = self.transport.request('POST', '/ApplicationAPI/API/PaymentInquiry/Inquire',
+                                          json_body=fields, idempotency_key=f"inq-{transaction_id}")
+        except http_client.TransportError as exc:
+            return self._unreachable(exc)
+        payload = self._payload(resp)
+        if payload is None:
+            return self._unreadable(resp)
+        completed = resp.ok and payload.get('pp_ResponseCode') == '000' and payload.get('pp_PaymentResponseCode') == '121'
+        return PaymentResult(
+            success=completed,
+            transaction_id=transaction_id,
+            message=payload.get('pp_ResponseMessage') or '',
+            data={'status': 'completed' if completed else (payload.get('pp_Status') or 'unknown').lower()}
+        )
+
+
+    def parse_webhook(self, body: bytes, headers: Dict[str, str]) -> Optional[Dict]:
+        """
+        JazzCash posts the transaction fields back (form or JSON) with
+        ``pp_SecureHash``; it has no event id, so reference + response code is used
+        """
+        if headers.get('Content-Type', '').startswith('application/json'):
+            fields = json.loads(body.decode('utf-8'))
+        else:
+            fields = dict(parse_qsl(body.decode('utf-8')))
+        signature = fields.get('pp_SecureHash', '')
+        if not signature or not hmac.compare_digest(signature.upper(), self.secure_hash(fields)):
+            return None
+        ref = fields.get('pp_TxnRefNo')
+        code = fields.get('pp_ResponseCode')
+        if not ref or not code:
+            raise ValueError("pp_TxnRefNo / pp_ResponseCode missing")
+        bill_ref = fields.get('pp_BillReference', '')
+        return {
+            'event_id': f"{ref}:{code}",
+            'event_type': 'transaction',
+            'payment_status': 'Paid' if code == '000' else 'Failed',
+            'transaction_id': ref,
+            'order_id': _int_or_none(bill_ref[5:] if bill_ref.startswith('order') else None),
+        }
 
 
 def get_payment_gateway(gateway_type: str = None) -> PaymentGateway:
     """
     Factory function to get payment gateway instance
     
+    Instances are cached per app (in ``app.extensions``) so HTTP gateways
+    reuse their pooled connections and circuit breaker across requests.
+    
     Args:
         gateway_type: 'mock', 'stripe', 'jazzcash', etc.
     
@@ -153,6 +532,12 @@ def get_payment_gateway(gateway_type: str = None) -> PaymentGateway:
     if gateway_type is None:
         # Get from config or default to mock
         gateway_type = current_app.config.get('PAYMENT_GATEWAY', 'mock')
+    gateway_type = gateway_type.lower()
+    
+    cache = current_app.extensions.setdefault('payment_gateways', {})
+    gateway = cache.get(gateway_type)
+    if gateway is not None:
+        return gateway
     
     gateways = {
         'mock': MockPaymentGateway,
@@ -160,16 +545,63 @@ def get_payment_gateway(gateway_type: str = None) -> PaymentGateway:
         'jazzcash': JazzCashGateway,
     }
     
-    gateway_class = gateways.get(gateway_type.lower(), MockPaymentGateway)
+    gateway_class = gateways.get(gateway_type, MockPaymentGateway)
     
     # Get gateway-specific config
     config = current_app.config.get(f'PAYMENT_{gateway_type.upper()}_CONFIG', {})
     
-    return gateway_class(config)
+    return cache.setdefault(gateway_type, gateway_class(config))
+
+
+def charge_once(gateway: PaymentGateway, idempotency_key: str, amount: Decimal,
+                currency: str = "PKR", **kwargs) -> PaymentResult:
+    """
+    Call ``gateway.process_payment`` at most once per idempotency key
+    
+    A retry with the same key inside the replay window returns the stored
+    result without contacting the gateway. The key is also forwarded to the
+    gateway so providers that support it (e.g. Stripe) dedupe on their side.
+    A result whose outcome is unknown (no response) is not stored: a retry
+    asks the gateway again, which answers for the same key.
+    Note: claiming the key commits the current session, so any pending order
+    row is persisted before the gateway is contacted.
+    
+    Args:
+        gateway: Gateway instance to charge through
+        idempotency_key: Caller-chosen key identifying this charge
+        amount: Payment amount
+        currency: Currency code
+    
+    Returns:
+        PaymentResult object (``replayed`` is True for stored results)
+    """
+    from agrifarma.services import idempotency
+    scope = f"payment:{type(gateway).__name__}"
+    claimed = idempotency.claim(scope, idempotency_key)
+    if claimed.replay:
+        if claimed.response:
+            return PaymentResult.from_dict(claimed.response)
+        return PaymentResult(success=False, message="Payment already in progress")
+    try:
+        result = gateway.process_payment(amount=amount, currency=currency, idempotency_key=idempotency_key, **kwargs)
+    except Exception:
+        idempotency.release(claimed)
+        raise
+    if result.data.get('outcome_unknown'):
+        idempotency.release(claimed)
+        return result
+    idempotency.complete(claimed, result.to_dict())
+    return result
+
+
+def order_payment_key(order_id: int) -> str:
+    """Default idempotency key for an order's charge (also its reference until the gateway returns one)."""
+    return f"order-{order_id}"
 
 
 def process_order_payment(order_id: int, amount: Decimal, customer_email: str, 
-                         payment_method: str = 'card') -> PaymentResult:
+                         payment_method: str = 'card', idempotency_key: str = None,
+                         payment_token: str = None, mobile_number: str = None) -> PaymentResult:
     """
     Process payment for an order
     
@@ -178,6 +610,9 @@ def process_order_payment(order_id: int, amount: Decimal, customer_email: str,
         amount: Payment amount
         customer_email: Customer email
         payment_method: Payment method (card, wallet, cod, etc.)
+        idempotency_key: Key for the gateway charge; defaults to one per order
+        payment_token: Card token from the provider's checkout widget (Stripe)
+        mobile_number: Wallet number (JazzCash)
     
     Returns:
         PaymentResult object
@@ -198,13 +633,17 @@ def process_order_payment(order_id: int, amount: Decimal, customer_email: str,
     # Get appropriate payment gateway
     gateway = get_payment_gateway()
     
-    # Process payment
-    result = gateway.process_payment(
+    # Process payment (at most once per order / key)
+    result = charge_once(
+        gateway,
+        idempotency_key or order_payment_key(order_id),
         amount=amount,
         currency='PKR',
         customer_email=customer_email,
         order_id=order_id,
-        payment_method=payment_method
+        payment_method=payment_method,
+        payment_token=payment_token,
+        mobile_number=mobile_number
     )
     
     # Log result
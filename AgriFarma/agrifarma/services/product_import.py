@@ -0,0 +1,375 @@
+"""Bulk product import and price/inventory updates from CSV or XLSX.
+
+An upload is stored and becomes a ``product_imports`` job; a background
+thread (or ``flask catalog import``) runs it. The file is streamed, never
+loaded whole: ``csv.reader`` over the open file, or openpyxl in read-only
+mode, ``CATALOG_IMPORT_CHUNK_SIZE`` rows at a time. For each chunk:
+
+1. Existing products are looked up by SKU, or by exact name for rows
+   without one, in one query.
+2. Each row is merged over the product it matches (blank cells keep the
+   current value; new products get the form defaults) and validated with
+   ``ProductForm``, so imports follow the same rules as the admin form.
+3. Valid rows are diffed against the stored values. Only changed columns
+   are kept.
+4. Unless it is a dry run, new products go in with one multi-row
+   ``INSERT``. Changes go out as one executemany ``UPDATE`` per set of
+   changed columns, except inventory: the difference between the file and
+   the stock read in step 1 is added to the stock on hand
+   (``inventory.adjust_stock``), so sales made while the import runs are
+   kept. Inventory changes are logged in the stock ledger.
+   The chunk commits together with the job's progress counters.
+
+A dry run does everything except step 4. Its report (capped at
+``CATALOG_IMPORT_REPORT_LIMIT`` entries; the counters are exact) lists
+what would be created or changed and which rows fail validation, and it
+can then be applied as a new job over the same file. Rows that fail
+validation are skipped and reported, never half-written. If a job dies,
+chunks already committed stay applied, and re-running the file is safe
+because unchanged rows are no-ops.
+"""
+from __future__ import annotations
+import csv
+import os
+import threading
+import uuid
+from datetime import datetime, UTC
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import insert, or_, select, update
+from werkzeug.datastructures import MultiDict
+
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import PRODUCT_STATUSES, Product
+from agrifarma.models.product_import import ProductImport
+from agrifarma.services import counters
+from agrifarma.services import inventory as inventory_service
+
+EXTENSIONS = ("csv", "xlsx")
+# Columns read from the file (header names are case-insensitive); anything else is ignored
+FIELDS = ("sku", "name", "description", "price", "category", "images", "inventory", "status", "featured")
+TRUE_VALUES = {"true", "yes", "y", "1"}
+FALSE_VALUES = {"false", "no", "n", "0"}
+# Values a brand-new product starts from before the row is applied
+NEW_PRODUCT_DEFAULTS = {"status": "Active", "featured": "false", "inventory": "0"}
+
+
+class ImportFileError(ValueError):
+    """The upload is not a CSV/XLSX file with a usable header row."""
+
+
+def _now() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+# --- reading ---------------------------------------------------------------
+
+def _cell(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))  # spreadsheets store 12 as 12.0
+    return str(value).strip()
+
+
+def _header(values) -> List[str]:
+    header = [_cell(v).lower().replace(' ', '_') for v in values]
+    if 'name' not in header and 'sku' not in header:
+        raise ImportFileError("the header row needs a 'sku' or 'name' column")
+    return header
+
+
+def _csv_rows(path: str) -> Iterator[List]:
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        yield from csv.reader(f)
+
+
+def _xlsx_rows(path: str) -> Iterator[List]:
+    try:
+        from openpyxl import load_workbook  # type: ignore
+    except Exception:
+        raise ImportFileError("openpyxl is required to import Excel files")
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _raw_rows(path: str) -> Iterator[List]:
+    ext = path.rsplit('.', 1)[-1].lower()
+    if ext == 'csv':
+        return _csv_rows(path)
+    if ext == 'xlsx':
+        return _xlsx_rows(path)
+    raise ImportFileError(f"unsupported file type .{ext}; use one of {', '.join(EXTENSIONS)}")
+
+
+def read_rows(path: str) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Stream ``(sheet row number, {field: text})`` for each non-blank data row."""
+    rows = _raw_rows(path)
+    header = _header(next(rows, None) or [])
+    for number, values in enumerate(rows, start=2):
+        record = {key: _cell(v) for key, v in zip(header, values) if key in FIELDS}
+        if any(record.values()):
+            yield number, record
+
+
+def count_rows(path: str) -> int:
+    return sum(1 for _ in read_rows(path))
+
+
+# --- validation and diff ---------------------------------------------------
+
+def _form_values(product) -> Dict[str, str]:
+    """A stored product as form input, the base a row is merged over."""
+    return {
+        'sku': product.sku or '', 'name': product.name or '', 'description': product.description or '',
+        'price': str(product.price if product.price is not None else ''), 'category': product.category or '',
+        'images': product.images or '', 'inventory': str(product.inventory or 0),
+        'status': product.status or 'Active', 'featured': 'true' if product.featured else 'false',
+    }
+
+
+def _normalise(record: Dict[str, str]) -> Dict[str, str]:
+    record = dict(record)
+    featured = record.get('featured', '').lower()
+    if featured in TRUE_VALUES:
+        record['featured'] = 'true'
+    elif featured in FALSE_VALUES:
+        record['featured'] = 'false'
+    status = record.get('status', '')
+    for choice in PRODUCT_STATUSES:
+        if status.lower() == choice.lower():
+            record['status'] = choice
+    return record
+
+
+def validate(record: Dict[str, str], current=None) -> Tuple[Optional[Dict], Dict[str, List[str]]]:
+    """
+    Check one row with ``ProductForm``
+
+    Args:
+        record: Field -> text from the file (blank means "keep")
+        current: Stored product the row updates, or None for a new one
+
+    Returns:
+        (column values ready to store, None on errors), errors by field
+    """
+    from agrifarma.forms.ecommerce import ProductForm
+
+    merged = dict(_form_values(current)) if current is not None else dict(NEW_PRODUCT_DEFAULTS)
+    merged.update({k: v for k, v in _normalise(record).items() if v != ''})
+    form = ProductForm(formdata=MultiDict(merged), meta={'csrf': False})
+    if not form.validate():
+        return None, {k: list(v) for k, v in form.errors.items()}
+    price = form.price.data
+    try:
+        price = Decimal(price).quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError):
+        return None, {'price': ['Not a valid decimal value.']}
+    return {
+        'sku': (form.sku.data or '').strip() or None,
+        'name': form.name.data.strip(),
+        'description': form.description.data or None,
+        'price': price,
+        'category': form.category.data,
+        'images': form.images.data or None,
+        'inventory': form.inventory.data or 0,
+        'status': form.status.data,
+        'featured': form.featured.data == 'true',
+    }, {}
+
+
+def _stored(product) -> Dict:
+    return {
+        'sku': product.sku, 'name': product.name, 'description': product.description or None,
+        'price': Decimal(str(product.price if product.price is not None else 0)).quantize(Decimal('0.01')),
+        'category': product.category, 'images': product.images or None, 'inventory': product.inventory or 0,
+        'status': product.status, 'featured': bool(product.featured),
+    }
+
+
+def _json(value):
+    return str(value) if isinstance(value, Decimal) else value
+
+
+def diff(current, values: Dict) -> Dict[str, List]:
+    """Changed columns as ``{field: [old, new]}`` (JSON-safe)."""
+    old = _stored(current)
+    return {k: [_json(old[k]), _json(v)] for k, v in values.items() if old[k] != v}
+
+
+# --- jobs ------------------------------------------------------------------
+
+class _Run:
+    """Counters and report of a running job"""
+
+    def __init__(self, job: ProductImport, limit: int):
+        self.job = job
+        self.limit = limit
+        self.report: List[Dict] = list(job.report or [])
+        self.seen: Dict[str, int] = {}  # match key -> first row number, to catch duplicates
+
+    def note(self, entry: Dict) -> None:
+        if len(self.report) < self.limit:
+            self.report.append(entry)
+
+    def error(self, number: int, key: str, errors: Dict[str, List[str]]) -> None:
+        self.job.error_count += 1
+        self.note({'row': number, 'action': 'error', 'key': key, 'errors': errors})
+
+
+def _existing(chunk: List[Tuple[int, Dict]]):
+    """Stored products matching the chunk's SKUs and names, indexed both ways."""
+    skus = {r['sku'] for _, r in chunk if r.get('sku')}
+    names = {r['name'] for _, r in chunk if r.get('name')}
+    conditions = []
+    if skus:
+        conditions.append(Product.sku.in_(skus))
+    if names:
+        conditions.append(Product.name.in_(names))
+    by_sku, by_name = {}, {}
+    if conditions:
+        for product in db.session.execute(select(Product).where(or_(*conditions))).scalars():
+            if product.sku:
+                by_sku[product.sku] = product
+            by_name.setdefault(product.name, []).append(product)
+    return by_sku, by_name
+
+
+def _match(record: Dict, by_sku, by_name) -> Tuple[Optional[Product], Optional[str]]:
+    """The product a row updates (None = create), or an error message."""
+    sku, name = record.get('sku'), record.get('name')
+    if sku and sku in by_sku:
+        return by_sku[sku], None
+    candidates = by_name.get(name, []) if name else []
+    if sku:
+        # a new SKU may be given to an existing product that has none yet
+        candidates = [p for p in candidates if not p.sku]
+    if len(candidates) > 1:
+        return None, f"name matches {len(candidates)} products; add a SKU"
+    return (candidates[0] if candidates else None), None
+
+
+def _process_chunk(run: _Run, chunk: List[Tuple[int, Dict]]) -> None:
+    job = run.job
+    by_sku, by_name = _existing(chunk)
+    creates, updates, stock, touched = [], [], {}, []
+    for number, record in chunk:
+        key = record.get('sku') or record.get('name') or ''
+        match_key = f"sku:{record['sku']}" if record.get('sku') else f"name:{record.get('name')}"
+        if match_key in run.seen:
+            run.error(number, key, {'row': [f"duplicate of row {run.seen[match_key]}"]})
+            continue
+        run.seen[match_key] = number
+        current, problem = _match(record, by_sku, by_name)
+        if problem:
+            run.error(number, key, {'name': [problem]})
+            continue
+        values, errors = validate(record, current)
+        if errors:
+            run.error(number, key, errors)
+            continue
+        if current is None:
+            job.created_count += 1
+            run.note({'row': number, 'action': 'create', 'key': key,
+                      'changes': {k: [None, _json(v)] for k, v in values.items() if v not in (None, '')}})
+            creates.append({**values, 'seller_id': job.user_id})
+            continue
+        changes = diff(current, values)
+        if not changes:
+            job.unchanged_count += 1
+            continue
+        job.updated_count += 1
+        run.note({'row': number, 'action': 'update', 'key': key, 'product_id': current.id, 'changes': changes})
+        if 'inventory' in changes:
+            stock[current.id] = values['inventory'] - (current.inventory or 0)
+        columns = {k: values[k] for k in changes if k != 'inventory'}
+        if columns:
+            updates.append({'id': current.id, **columns})
+            touched.append(current)
+
+    if not job.dry_run:
+        if creates:
+            inventory_service.record_adjustments(dict(db.session.execute(
+                insert(Product).returning(Product.id, Product.inventory), creates
+            ).all()))
+        if updates:
+            db.session.execute(update(Product), updates)
+            for product in touched:  # bulk updates bypass loaded objects
+                db.session.expire(product)
+        inventory_service.adjust_stock(stock)
+    job.processed_rows += len(chunk)
+    job.report = list(run.report)
+
+
+def create_job(upload, user_id: int, dry_run: bool = True) -> ProductImport:
+    """Store an uploaded file (a FileStorage) and queue a job for it (commits)."""
+    filename = os.path.basename(upload.filename or '')
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if ext not in EXTENSIONS:
+        raise ImportFileError(f"upload a {' or '.join(e.upper() for e in EXTENSIONS)} file")
+    folder = os.path.join(current_app.config['UPLOADED_MEDIA_DEST'], 'imports')
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{uuid.uuid4().hex}.{ext}")
+    upload.save(path)
+    return queue(path, filename, user_id, dry_run)
+
+
+def queue(path: str, filename: str, user_id: int, dry_run: bool = True) -> ProductImport:
+    job = ProductImport(user_id=user_id, filename=filename[:255], path=path, dry_run=dry_run, status='queued')
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def apply(job: ProductImport, user_id: int) -> ProductImport:
+    """Queue a real import of a dry run's file."""
+    return queue(job.path, job.filename, user_id, dry_run=False)
+
+
+def run(job_id: int) -> Optional[ProductImport]:
+    """Process a queued job to the end, committing after every chunk."""
+    job = db.session.get(ProductImport, job_id)
+    if job is None or job.status != 'queued':
+        return job
+    cfg = current_app.config
+    job.status = 'running'
+    job.started_at = _now()
+    db.session.commit()
+    try:
+        job.total_rows = count_rows(job.path)
+        db.session.commit()
+        progress = _Run(job, int(cfg.get('CATALOG_IMPORT_REPORT_LIMIT', 1000)))
+        for chunk in counters.chunks(read_rows(job.path), max(int(cfg.get('CATALOG_IMPORT_CHUNK_SIZE', 500)), 1)):
+            _process_chunk(progress, chunk)
+            db.session.commit()
+        job.status = 'done'
+    except Exception as exc:
+        db.session.rollback()
+        current_app.logger.exception(f"[import {job_id}] failed")
+        job = db.session.get(ProductImport, job_id)
+        job.status = 'failed'
+        job.message = str(exc)[:1000]
+    job.finished_at = _now()
+    db.session.commit()
+    return job
+
+
+def _run_in_app(app, job_id: int) -> None:
+    with app.app_context():
+        try:
+            run(job_id)
+        finally:
+            db.session.remove()
+
+
+def start(job: ProductImport) -> None:
+    """Run a queued job on a background thread (tests call ``run`` themselves)."""
+    if current_app.testing:
+        return
+    app = current_app._get_current_object()
+    threading.Thread(target=_run_in_app, args=(app, job.id), name=f"product-import-{job.id}", daemon=True).start()
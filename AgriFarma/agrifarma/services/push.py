@@ -0,0 +1,191 @@
+"""Server-sent event push for new messages, forum replies and order updates.
+
+Write paths call ``notify(user_id, event, data)`` inside their transaction.
+Notifications wait in ``session.info`` and are handed to the in-process
+``EventBus`` only after the transaction commits (a rollback drops them), so
+clients never hear about rows that do not exist. The bus keeps one bounded
+queue per open connection, grouped into per-user channels, plus a short
+replay buffer per user so a reconnecting ``EventSource`` (``Last-Event-ID``)
+gets what it missed.
+
+``routes/events.py`` streams a channel as ``text/event-stream``: one
+long-lived response per browser tab with a comment heartbeat every
+``PUSH_HEARTBEAT_SECONDS`` that keeps proxies from closing the socket.
+Each stream occupies a worker thread, so the bus caps open connections at
+``PUSH_MAX_CONNECTIONS`` (answering 503 beyond it) and streams end after
+``PUSH_STREAM_MAX_SECONDS`` to let the browser reconnect and threads recycle.
+The bus is per process: with several worker processes, a user only hears
+events raised by the process their stream is connected to. Push is therefore
+off unless ``PUSH_ENABLED`` is set, which is only safe on a single process
+serving many concurrent requests (threads or gevent); while it is off,
+``notify`` drops events, the stream answers 404 and pages don't load push.js.
+"""
+from __future__ import annotations
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from agrifarma.extensions import db
+
+EVENTS = ('message', 'reply', 'order')
+
+
+class Subscription:
+    """One open stream: a bounded queue of (id, event, data) for one user"""
+
+    def __init__(self, user_id: int, maxsize: int):
+        self.user_id = user_id
+        self.queue: "queue.Queue[Tuple[int, str, Dict[str, Any]]]" = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.opened_at = time.monotonic()
+
+    def put(self, item) -> None:
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            # a stalled reader loses its oldest event rather than blocking publishers
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:  # pragma: no cover - raced with the reader
+                pass
+            self.dropped += 1
+            self.queue.put_nowait(item)
+
+    def get(self, timeout: float):
+        """Next item, or None when ``timeout`` passes without one (time for a heartbeat)."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class TooManyConnections(Exception):
+    """Raised by EventBus.subscribe when the connection cap is reached"""
+
+
+class EventBus:
+    """Thread-safe in-process pub/sub with per-user channels"""
+
+    def __init__(self, max_connections: int = 200, queue_size: int = 100, replay_size: int = 50):
+        self.max_connections = max_connections
+        self.queue_size = queue_size
+        self.replay_size = replay_size
+        self._channels: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._recent: Dict[int, Deque[Tuple[int, str, Dict[str, Any]]]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, user_id: int, last_event_id: Optional[int] = None) -> Subscription:
+        """Open a subscription, pre-filled with events after ``last_event_id`` if given."""
+        with self._lock:
+            if self.connection_count() >= self.max_connections:
+                raise TooManyConnections()
+            sub = Subscription(user_id, self.queue_size)
+            if last_event_id is not None:
+                for item in self._recent.get(user_id, ()):
+                    if item[0] > last_event_id:
+                        sub.put(item)
+            self._channels[user_id].add(sub)
+            return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            channel = self._channels.get(sub.user_id)
+            if channel is not None:
+                channel.discard(sub)
+                if not channel:
+                    del self._channels[sub.user_id]
+
+    def publish(self, user_id: int, name: str, data: Dict[str, Any]) -> int:
+        """Deliver an event to every open stream of a user; returns the event id."""
+        with self._lock:
+            item = (next(self._ids), name, data)
+            recent = self._recent.get(user_id)
+            if recent is None:
+                recent = self._recent[user_id] = deque(maxlen=self.replay_size)
+                if len(self._recent) > self.max_connections * 10:
+                    # forget replay buffers of long-gone users first (dict keeps insertion order)
+                    self._recent.pop(next(iter(self._recent)))
+            recent.append(item)
+            subs = list(self._channels.get(user_id, ()))
+            self.published += 1
+        for sub in subs:
+            sub.put(item)
+        return item[0]
+
+    def connection_count(self) -> int:
+        return sum(len(subs) for subs in self._channels.values())
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'connections': self.connection_count(),
+                'users': len(self._channels),
+                'published': self.published,
+            }
+
+
+def get_bus() -> EventBus:
+    bus = current_app.extensions.get('push_bus')
+    if bus is None:
+        cfg = current_app.config
+        bus = current_app.extensions.setdefault('push_bus', EventBus(
+            max_connections=cfg.get('PUSH_MAX_CONNECTIONS', 200),
+            queue_size=cfg.get('PUSH_QUEUE_SIZE', 100),
+        ))
+    return bus
+
+
+def notify(user_id: Optional[int], name: str, data: Dict[str, Any]) -> None:
+    """Queue an event for a user; it is published when the current transaction commits."""
+    if name not in EVENTS:
+        raise ValueError(f"unknown push event {name}")
+    if not user_id or not current_app.config.get('PUSH_ENABLED'):
+        return
+    pending: List = db.session.info.setdefault('push_pending', [])
+    pending.append((get_bus(), user_id, name, data))
+
+
+def notify_order(user_id: int, order_id: int, payment_status: Optional[str], status: Optional[str] = None) -> None:
+    """Queue an 'order' event for the buyer after a payment or status change."""
+    notify(user_id, 'order', {'order_id': order_id, 'payment_status': payment_status, 'status': status})
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_committed(session):
+    for bus, user_id, name, data in session.info.pop('push_pending', ()):
+        bus.publish(user_id, name, data)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_rolled_back(session):
+    session.info.pop('push_pending', None)
+
+
+def format_event(item: Tuple[int, str, Dict[str, Any]]) -> str:
+    event_id, name, data = item
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def stream(bus: EventBus, sub: Subscription, heartbeat: float, max_seconds: float) -> Iterator[str]:
+    """SSE body for one subscription; unsubscribes when the client goes away or time is up."""
+    try:
+        yield f"retry: {int(heartbeat * 1000)}\n\n"
+        deadline = time.monotonic() + max_seconds
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            item = sub.get(timeout=min(heartbeat, remaining))
+            yield format_event(item) if item is not None else ": heartbeat\n\n"
+    finally:
+        bus.unsubscribe(sub)
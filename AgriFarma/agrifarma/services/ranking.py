@@ -0,0 +1,181 @@
+"""Time-decayed "hot" scores for blog posts and forum threads.
+
+Every engagement event (creation, like, comment, reply) adds a weight that
+halves every ``HOT_SCORE_HALF_LIFE_HOURS``. Rather than decaying every row
+on every tick, scores are stored relative to a per-kind epoch::
+
+    hot_score = sum(weight * exp((event_time - epoch) / tau))
+
+so an event is one ``UPDATE ... SET hot_score = hot_score + x`` on its own
+row and the order of rows never changes as time passes. Because all rows
+share the epoch, "trending"/"hot" is a plain top-K read of the
+``hot_score`` index. ``redecay`` periodically moves the epoch forward,
+multiplying every score by the same factor in one statement, which keeps
+the numbers small (it also runs on its own before they could overflow).
+``rebuild`` recomputes scores from the raw likes/comments/posts.
+"""
+from __future__ import annotations
+import math
+from datetime import datetime, UTC
+from typing import Dict, Iterable, List, Optional
+
+from flask import current_app
+from sqlalchemy import case, select, update
+
+from agrifarma.extensions import db
+from agrifarma.models.blog import BlogPost, Comment
+from agrifarma.models.forum import Post, Thread
+from agrifarma.models.likes import BlogLike, PostLike
+from agrifarma.models.ranking import RankingEpoch
+
+KINDS = {'blog': BlogPost, 'thread': Thread}
+
+# Relative weight of each event before decay
+WEIGHTS = {
+    'create': 1.0,
+    'like': 1.0,
+    'comment': 2.0,
+    'reply': 2.0,
+}
+
+# Rebase before exp() factors pass ~e^45, long before float overflow (e^709)
+REBASE_AFTER_HALF_LIVES = 64
+
+
+def _now() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def _naive(at: Optional[datetime]) -> datetime:
+    if at is None:
+        return _now()
+    return at.astimezone(UTC).replace(tzinfo=None) if at.tzinfo else at
+
+
+def tau_seconds() -> float:
+    """Decay time constant: the half-life expressed as an e-folding time."""
+    return current_app.config.get('HOT_SCORE_HALF_LIFE_HOURS', 36) * 3600 / math.log(2)
+
+
+def _epoch_row(kind: str) -> RankingEpoch:
+    row = db.session.get(RankingEpoch, kind)
+    if row is None:
+        row = RankingEpoch(kind=kind, epoch=_now())
+        db.session.add(row)
+        db.session.flush()
+    return row
+
+
+def _exponent(epoch: datetime, at: datetime) -> float:
+    return (at - epoch).total_seconds() / tau_seconds()
+
+
+def record(kind: str, obj_id: int, event: str, delta: int = 1, at: Optional[datetime] = None) -> None:
+    """Add (delta=1) or withdraw (delta=-1) one event's decayed weight (not committed).
+
+    ``at`` is when the event happened; withdrawals should pass the original
+    time (e.g. the like's created_at) so exactly what was added is removed.
+    """
+    model = KINDS[kind]
+    at = min(_naive(at), _now())
+    epoch = _epoch_row(kind)
+    if _exponent(epoch.epoch, _now()) > REBASE_AFTER_HALF_LIVES * math.log(2):
+        redecay(kind)
+    amount = delta * WEIGHTS[event] * math.exp(_exponent(epoch.epoch, at))
+    new_score = model.hot_score + amount
+    db.session.execute(
+        update(model).where(model.id == obj_id)
+        # withdrawals can leave float residue just below zero
+        .values(hot_score=case((new_score > 0, new_score), else_=0.0))
+        .execution_options(synchronize_session='fetch')
+    )
+
+
+def redecay(kind: Optional[str] = None, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Move the epoch of one or all kinds to ``now``, rescaling every score (not committed).
+
+    Returns the number of rows rescaled per kind.
+    """
+    now = _naive(now)
+    touched = {}
+    for name in ([kind] if kind else list(KINDS)):
+        model = KINDS[name]
+        epoch = _epoch_row(name)
+        factor = math.exp(-_exponent(epoch.epoch, now))
+        result = db.session.execute(
+            update(model).where(model.hot_score != 0)
+            .values(hot_score=model.hot_score * factor)
+            .execution_options(synchronize_session=False)
+        )
+        epoch.epoch = now
+        touched[name] = result.rowcount
+    db.session.flush()
+    return touched
+
+
+def current_score(kind: str, stored: float, now: Optional[datetime] = None) -> float:
+    """A stored hot_score expressed as today's decayed weight (for display)."""
+    epoch = _epoch_row(kind)
+    return stored * math.exp(-_exponent(epoch.epoch, _naive(now)))
+
+
+def top(kind: str, limit: int = 10, query=None) -> List:
+    """The ``limit`` hottest rows, read in index order (``query`` narrows the candidates)."""
+    model = KINDS[kind]
+    if query is None:
+        query = model.query.filter_by(approved=True) if kind == 'blog' else model.query
+    return query.order_by(model.hot_score.desc(), model.id.desc()).limit(limit).all()
+
+
+def _events(kind: str, ids: Optional[List[int]]):
+    """(object id, event, time) for every contribution, straight from the source tables."""
+    def scoped(stmt, col):
+        return stmt.where(col.in_(ids)) if ids is not None else stmt
+
+    if kind == 'blog':
+        yield from ((i, 'create', t) for i, t in db.session.execute(
+            scoped(select(BlogPost.id, BlogPost.created_at), BlogPost.id)))
+        yield from ((i, 'comment', t) for i, t in db.session.execute(
+            scoped(select(Comment.blog_id, Comment.created_at), Comment.blog_id)))
+        yield from ((i, 'like', t) for i, t in db.session.execute(
+            scoped(select(BlogLike.blog_id, BlogLike.created_at), BlogLike.blog_id)))
+    else:
+        yield from ((i, 'create', t) for i, t in db.session.execute(
+            scoped(select(Thread.id, Thread.created_at), Thread.id)))
+        # the opening post is the thread itself; numbered replies start at 2
+        yield from ((i, 'reply', t) for i, t in db.session.execute(
+            scoped(select(Post.thread_id, Post.created_at).where(Post.position > 1), Post.thread_id)))
+        yield from ((i, 'like', t) for i, t in db.session.execute(
+            scoped(select(Post.thread_id, PostLike.created_at).join(Post, Post.id == PostLike.post_id),
+                   Post.thread_id)))
+
+
+def rebuild(kind: str, ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute scores from likes/comments/replies (all rows, or just ``ids``); no commit.
+
+    A full rebuild also resets the epoch to now. Returns rows written.
+    """
+    model = KINDS[kind]
+    ids = list(ids) if ids is not None else None
+    now = _now()
+    epoch_row = _epoch_row(kind)
+    if ids is None:
+        epoch_row.epoch = now
+    epoch = epoch_row.epoch
+    scores: Dict[int, float] = {}
+    for obj_id, event, at in _events(kind, ids):
+        at = min(_naive(at), now) if at else now
+        scores[obj_id] = scores.get(obj_id, 0.0) + WEIGHTS[event] * math.exp(_exponent(epoch, at))
+    target_ids = ids if ids is not None else list(db.session.execute(select(model.id)).scalars())
+    rows = [{'id': i, 'hot_score': scores.get(i, 0.0)} for i in target_ids]
+    if rows:
+        db.session.execute(update(model), rows)
+    return len(rows)
+
+
+def rebuild_all() -> Dict[str, int]:
+    """Recompute every kind's scores from scratch (commits)."""
+    written = {kind: rebuild(kind) for kind in KINDS}
+    db.session.commit()
+    return written
+
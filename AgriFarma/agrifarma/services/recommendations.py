@@ -0,0 +1,228 @@
+"""Item-to-item product recommendations from order history.
+
+Every order is a 0/1 vector over products. The co-purchase matrix
+``C = XᵀX`` (orders containing both i and j; the diagonal is the number of
+orders containing i) is stored sparsely in ``product_copurchases`` and the
+similarity of two products is the cosine of their purchase vectors::
+
+    cosine(i, j) = C[i, j] / sqrt(C[i, i] * C[j, j])
+
+``refresh`` is incremental: it reads only order lines above the last run's
+watermark, expands each basket into its product pairs with vectorized NumPy
+(no per-pair Python loop), adds those counts to the stored matrix and then
+recomputes neighbour lists only for products whose scores can have moved,
+i.e. the products in the new orders and everything ever bought with them.
+The top ``RECOMMENDATIONS_PER_PRODUCT`` neighbours of each product go to
+``product_recommendations``, which the product page reads by primary key.
+
+Orders are counted once, when first seen; a payment that fails later is not
+withdrawn until ``refresh(full=True)`` recounts everything. Run refreshes
+from a single scheduler: two concurrent runs would count the same orders.
+"""
+from __future__ import annotations
+import time
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, func, insert, or_, select
+
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Order, OrderItem, Product
+from agrifarma.models.recommendation import ProductCopurchase, ProductRecommendation, RecommenderRun
+from agrifarma.services import counters
+
+# Orders in these payment states never count as purchases
+EXCLUDED_PAYMENT_STATUSES = ('Failed', 'Refunded')
+
+# Rows per streamed batch of order lines
+BATCH_SIZE = 20000
+
+
+def copurchase_pairs(order_ids, product_ids, max_basket: int = 50) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Co-purchase counts for (order id, product id) rows.
+
+    Returns ``(left, right, count)`` arrays covering both directions of every
+    pair plus the diagonal. A product bought twice in one order counts once;
+    baskets with more than ``max_basket`` distinct products are skipped
+    (bulk orders say little about which products go together).
+    """
+    rows = np.column_stack([np.asarray(order_ids, dtype=np.int64), np.asarray(product_ids, dtype=np.int64)])
+    empty = np.empty(0, dtype=np.int64)
+    if not len(rows):
+        return empty, empty, empty
+    rows = np.unique(rows, axis=0)  # de-duplicates and sorts by order
+    _, sizes = np.unique(rows[:, 0], return_counts=True)
+    rows = rows[np.repeat(sizes <= max_basket, sizes)]
+    sizes = sizes[sizes <= max_basket]
+    if not len(rows):
+        return empty, empty, empty
+    products = rows[:, 1]
+    starts = np.cumsum(sizes) - sizes
+
+    # Row r of a basket of size k pairs with every row of that basket (itself
+    # included, which yields the diagonal): repeat r k times and walk the basket.
+    row_size = np.repeat(sizes, sizes)
+    row_start = np.repeat(starts, sizes)
+    left_rows = np.repeat(np.arange(len(products)), row_size)
+    block_starts = np.repeat(np.cumsum(row_size) - row_size, row_size)
+    right_rows = np.repeat(row_start, row_size) + (np.arange(row_size.sum()) - block_starts)
+
+    base = int(products.max()) + 1
+    keys, counts = np.unique(products[left_rows] * base + products[right_rows], return_counts=True)
+    return keys // base, keys % base, counts.astype(np.int64)
+
+
+def _baskets(after_id: int, upto_id: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """(order ids, product ids) of countable orders in (after_id, upto_id], in batches of whole orders."""
+    stmt = (
+        select(OrderItem.order_id, OrderItem.product_id)
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(Order.id > after_id, Order.id <= upto_id,
+               or_(Order.payment_status.is_(None), Order.payment_status.notin_(EXCLUDED_PAYMENT_STATUSES)))
+        .order_by(OrderItem.order_id)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    carry = np.empty((0, 2), dtype=np.int64)
+    for part in db.session.execute(stmt).partitions():
+        block = np.vstack([carry, np.array([tuple(r) for r in part], dtype=np.int64).reshape(-1, 2)])
+        # the last order's lines may continue in the next batch
+        cut = int(np.searchsorted(block[:, 0], block[-1, 0]))
+        carry = block[cut:]
+        if cut:
+            yield block[:cut, 0], block[:cut, 1]
+    if len(carry):
+        yield carry[:, 0], carry[:, 1]
+
+
+def _count_new_orders(after_id: int, upto_id: int, max_basket: int):
+    """Summed co-purchase counts of the orders in the range, plus how many orders were read."""
+    keys, counts, orders = [], [], 0
+    base = (db.session.scalar(select(func.max(Product.id))) or 0) + 1
+    for order_ids, product_ids in _baskets(after_id, upto_id):
+        orders += len(np.unique(order_ids))
+        left, right, n = copurchase_pairs(order_ids, product_ids, max_basket)
+        keys.append(left * base + right)
+        counts.append(n)
+    if not keys:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, 0
+    merged, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    totals = np.bincount(inverse, weights=np.concatenate(counts)).astype(np.int64)
+    return merged // base, merged % base, totals, orders
+
+
+def _add_counts(left: np.ndarray, right: np.ndarray, counts: np.ndarray) -> None:
+    """Add count deltas to product_copurchases."""
+    counters.add(db.session, ProductCopurchase.__table__, ('product_id', 'other_id'), {
+        (l, r): {'orders': n} for l, r, n in zip(left.tolist(), right.tolist(), counts.tolist())
+    })
+
+
+def _affected(touched: Sequence[int]) -> List[int]:
+    """Products whose neighbour lists change when the counts of ``touched`` change."""
+    affected = set(touched)
+    for chunk in counters.chunks(touched):
+        affected.update(db.session.execute(
+            select(ProductCopurchase.product_id).where(ProductCopurchase.other_id.in_(chunk)).distinct()
+        ).scalars())
+    return sorted(affected)
+
+
+def _rank_neighbours(product_ids: Sequence[int], top_n: int) -> int:
+    """Recompute and store the top-N cosine neighbours of ``product_ids``; returns rows written."""
+    diag = np.array(db.session.execute(
+        select(ProductCopurchase.product_id, ProductCopurchase.orders)
+        .where(ProductCopurchase.product_id == ProductCopurchase.other_id)
+        .order_by(ProductCopurchase.product_id)
+    ).all(), dtype=np.int64).reshape(-1, 2)
+    written = 0
+    for chunk in counters.chunks(product_ids):
+        db.session.execute(delete(ProductRecommendation).where(ProductRecommendation.product_id.in_(chunk)))
+        pairs = np.array(db.session.execute(
+            select(ProductCopurchase.product_id, ProductCopurchase.other_id, ProductCopurchase.orders)
+            .where(ProductCopurchase.product_id.in_(chunk), ProductCopurchase.product_id != ProductCopurchase.other_id)
+        ).all(), dtype=np.int64).reshape(-1, 3)
+        if not len(pairs) or not len(diag):
+            continue
+        left, right, counts = pairs[:, 0], pairs[:, 1], pairs[:, 2]
+        norms = diag[np.searchsorted(diag[:, 0], np.concatenate([left, right])), 1].astype(np.float64)
+        scores = counts / np.sqrt(norms[:len(left)] * norms[len(left):])
+
+        # best first within each product: score, then co-purchase count, then id
+        order = np.lexsort((right, -counts, -scores, left))
+        left, right, counts, scores = left[order], right[order], counts[order], scores[order]
+        _, first, sizes = np.unique(left, return_index=True, return_counts=True)
+        rank = np.arange(len(left)) - np.repeat(first, sizes)
+        keep = rank < top_n
+        rows = [
+            {'product_id': p, 'rank': k + 1, 'recommended_id': r, 'score': s, 'copurchases': c}
+            for p, k, r, s, c in zip(left[keep].tolist(), rank[keep].tolist(), right[keep].tolist(),
+                                     scores[keep].tolist(), counts[keep].tolist())
+        ]
+        if rows:
+            db.session.execute(insert(ProductRecommendation), rows)
+            written += len(rows)
+    return written
+
+
+def watermark() -> int:
+    """Highest order id already counted."""
+    return db.session.scalar(select(func.max(RecommenderRun.last_order_id))) or 0
+
+
+def refresh(full: bool = False) -> RecommenderRun:
+    """Count orders placed since the last run and re-rank the affected products (commits).
+
+    ``full`` drops the stored counts and recomputes everything from all orders.
+    """
+    cfg = current_app.config
+    started = time.perf_counter()
+    after_id = 0 if full else watermark()
+    upto_id = db.session.scalar(select(func.max(Order.id))) or 0
+    if full:
+        db.session.execute(delete(ProductRecommendation))
+        db.session.execute(delete(ProductCopurchase))
+
+    left, right, counts, orders = _count_new_orders(after_id, upto_id, cfg.get('RECOMMENDATIONS_MAX_BASKET', 50))
+    _add_counts(left, right, counts)
+    affected = _affected(np.unique(left).tolist())
+    _rank_neighbours(affected, cfg.get('RECOMMENDATIONS_PER_PRODUCT', 10))
+
+    run = RecommenderRun(full=full, last_order_id=max(upto_id, after_id), orders_processed=orders,
+                         products_refreshed=len(affected), seconds=time.perf_counter() - started)
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+
+def related_products(product: Product, limit: int = 4) -> List[Product]:
+    """Active products most often bought with ``product``, topped up from its category.
+
+    The category fill-in covers new or rarely ordered products.
+    """
+    related = (
+        Product.query.join(ProductRecommendation, ProductRecommendation.recommended_id == Product.id)
+        .filter(ProductRecommendation.product_id == product.id, Product.status == 'Active')
+        .order_by(ProductRecommendation.rank)
+        .limit(limit)
+        .all()
+    )
+    if len(related) < limit:
+        seen = [product.id] + [p.id for p in related]
+        related += (
+            Product.query.filter(Product.category == product.category, Product.id.notin_(seen),
+                                 Product.status == 'Active')
+            .limit(limit - len(related))
+            .all()
+        )
+    return related
+
+
+def neighbours(product_id: int) -> Dict[int, float]:
+    """Stored neighbour scores of a product ({recommended id: cosine}), best first."""
+    return dict(db.session.execute(
+        select(ProductRecommendation.recommended_id, ProductRecommendation.score)
+        .where(ProductRecommendation.product_id == product_id)
+        .order_by(ProductRecommendation.rank)
+    ).all())
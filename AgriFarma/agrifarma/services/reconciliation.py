@@ -0,0 +1,231 @@
+"""Payment reconciliation job.
+
+Walks orders in keyset batches (``id > last_id``), asks the gateway about each
+transaction through a bounded thread pool and writes corrections back with
+one bulk ``UPDATE`` per target status per batch. Used by
+``flask payments reconcile``.
+"""
+from __future__ import annotations
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from flask import current_app
+from sqlalchemy import select, update
+
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Order, OrderItem
+from agrifarma.services import funnel
+from agrifarma.services import inventory as inventory_service
+from agrifarma.services import push
+from agrifarma.services import seller_stats
+from agrifarma.services.payment import PaymentGateway, get_payment_gateway
+
+RECONCILABLE_STATUSES = ("Pending", "Paid", "Failed")
+# Paid orders that could not get their stock back; an admin decides what to do
+ON_HOLD_STATUS = "On Hold"
+
+
+class ReconcileReport:
+    """Counters and mismatches collected over a run"""
+    def __init__(self, dry_run: bool = False):
+        self.dry_run = dry_run
+        self.scanned = 0
+        self.verified = 0
+        self.skipped = 0   # COD or no transaction id
+        self.errors = 0    # gateway unreachable / raised
+        self.batches = 0
+        self.mismatches: List[Tuple[int, str, str]] = []  # (order_id, recorded, actual)
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self) -> float:
+        return self.verified / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'scanned': self.scanned,
+            'verified': self.verified,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'batches': self.batches,
+            'mismatches': len(self.mismatches),
+            'elapsed': round(self.elapsed, 3),
+            'throughput': round(self.throughput, 1),
+            'dry_run': self.dry_run,
+        }
+
+
+def iter_order_batches(statuses: Sequence[str], since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       batch_size: int = 500) -> Iterable[List[Tuple[int, Optional[str], str]]]:
+    """Yield lists of (order_id, transaction_id, payment_status) using keyset pagination."""
+    last_id = 0
+    while True:
+        stmt = (
+            select(Order.id, Order.payment_transaction_id, Order.payment_status)
+            .where(Order.id > last_id, Order.payment_status.in_(statuses))
+            .order_by(Order.id)
+            .limit(batch_size)
+        )
+        if since is not None:
+            stmt = stmt.where(Order.created_at >= since)
+        if until is not None:
+            stmt = stmt.where(Order.created_at < until)
+        rows = db.session.execute(stmt).all()
+        if not rows:
+            return
+        yield [tuple(r) for r in rows]
+        last_id = rows[-1][0]
+
+
+def _actual_status(result) -> Optional[str]:
+    """Map a verify_payment result to an Order.payment_status, or None if unknown."""
+    if result is None or result.data.get('transport_error') or result.data.get('unreadable'):
+        return None
+    if result.success:
+        return 'Paid'
+    status = (result.data or {}).get('status')
+    if status in ('processing', 'pending', 'requires_action'):
+        return 'Pending'
+    return 'Failed'
+
+
+def _retake_stock(order_ids: Iterable[int]) -> Set[int]:
+    """Reserve stock again for orders whose failed payment released it.
+
+    Returns the orders that could not be filled (they go on hold for review).
+    """
+    lines: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+    for order_id, product_id, quantity in db.session.execute(
+        select(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity).where(OrderItem.order_id.in_(order_ids))
+    ):
+        lines[order_id].append((product_id, quantity))
+    short = set()
+    for order_id in order_ids:
+        if not inventory_service.reserve_order_stock(order_id, lines[order_id]).success:
+            current_app.logger.warning(f"[payments] order {order_id} paid after failing but stock is gone; on hold")
+            short.add(order_id)
+    return short
+
+
+def _set_order_status(ids: Iterable[int], status: str, from_statuses: Sequence[str]) -> Set[int]:
+    ids = list(ids)
+    if not ids:
+        return set()
+    return set(db.session.execute(
+        update(Order).where(Order.id.in_(ids), Order.status.in_(from_statuses)).values(status=status)
+        .returning(Order.id)
+        .execution_options(synchronize_session=False)
+    ).scalars())
+
+
+def apply_payment_statuses(fixes: Dict[str, List[int]]) -> None:
+    """Bulk-write new payment statuses ({status: [order ids]}) and commit.
+
+    Orders becoming Paid are confirmed and counted in the funnel. A failed
+    payment already gave its stock back, so a Failed order turning Paid
+    reserves it again first; if the stock is gone it goes On Hold for manual
+    review instead of being confirmed. Orders becoming Failed release stock
+    and are cancelled. Seller aggregates gain orders entering Paid and lose
+    orders leaving it.
+    Each buyer gets an 'order' push event once the commit lands.
+    """
+    for new_status, ids in fixes.items():
+        previous = dict(db.session.execute(
+            select(Order.id, Order.payment_status).where(Order.id.in_(ids))
+        ).all())
+        was_paid = {order_id for order_id, status in previous.items() if status == 'Paid'}
+        buyers = db.session.execute(
+            update(Order).where(Order.id.in_(ids)).values(payment_status=new_status)
+            .returning(Order.id, Order.user_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        order_status: Dict[int, str] = {}
+        if new_status == 'Paid':
+            seller_stats.add_orders(order_id for order_id, _ in buyers if order_id not in was_paid)
+            funnel.record('paid', len(buyers))
+            failed = [order_id for order_id, status in previous.items() if status == 'Failed']
+            on_hold = _retake_stock(failed) if failed else set()
+            for order_id in _set_order_status(on_hold, ON_HOLD_STATUS, ('Pending', 'Cancelled')):
+                order_status[order_id] = ON_HOLD_STATUS
+            revived = set(failed) - on_hold
+            for order_id in _set_order_status([i for i in ids if i not in on_hold], 'Confirmed', ('Pending',)):
+                order_status[order_id] = 'Confirmed'
+            for order_id in _set_order_status(revived, 'Confirmed', ('Cancelled',)):
+                order_status[order_id] = 'Confirmed'
+        else:
+            seller_stats.add_orders(was_paid, sign=-1)
+            if new_status == 'Failed':
+                for order_id in ids:
+                    inventory_service.release_order_stock(order_id)
+                for order_id in _set_order_status(ids, 'Cancelled', ('Pending', 'Confirmed')):
+                    order_status[order_id] = 'Cancelled'
+        for order_id, user_id in buyers:
+            push.notify_order(user_id, order_id, new_status, order_status.get(order_id))
+    db.session.commit()
+
+
+def reconcile_payments(statuses: Sequence[str] = RECONCILABLE_STATUSES, since: Optional[datetime] = None,
+                       until: Optional[datetime] = None, batch_size: int = 500, workers: int = 8,
+                       gateway: Optional[PaymentGateway] = None, dry_run: bool = False) -> ReconcileReport:
+    """
+    Compare recorded payment status with the gateway and fix drift
+
+    Args:
+        statuses: Order.payment_status values to scan
+        since/until: Optional created_at window (half-open)
+        batch_size: Orders per keyset page
+        workers: Max concurrent verify_payment calls
+        gateway: Gateway to verify against (defaults to the configured one)
+        dry_run: Report mismatches without writing
+
+    Returns:
+        ReconcileReport
+    """
+    app = current_app._get_current_object()
+    gateway = gateway or get_payment_gateway()
+    report = ReconcileReport(dry_run=dry_run)
+
+    def verify(txn_id: str):
+        with app.app_context():
+            try:
+                return gateway.verify_payment(txn_id)
+            except Exception as exc:  # gateway bugs must not kill the run
+                app.logger.error(f"[reconcile] verify {txn_id} failed: {exc}")
+                return None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for batch in iter_order_batches(statuses, since, until, batch_size):
+            report.batches += 1
+            report.scanned += len(batch)
+            todo = [(oid, txn, recorded) for oid, txn, recorded in batch if txn and not txn.startswith('COD_')]
+            report.skipped += len(batch) - len(todo)
+            results = pool.map(verify, [txn for _, txn, _ in todo])
+            fixes: Dict[str, List[int]] = defaultdict(list)
+            references: Dict[int, str] = {}
+            for (oid, txn, recorded), result in zip(todo, results):
+                actual = _actual_status(result)
+                if actual is None:
+                    report.errors += 1
+                    continue
+                report.verified += 1
+                if result.transaction_id and result.transaction_id != txn:
+                    # found by its idempotency key: keep the gateway's own id from now on
+                    references[oid] = result.transaction_id
+                if actual != recorded:
+                    report.mismatches.append((oid, recorded, actual))
+                    fixes[actual].append(oid)
+            if references and not dry_run:
+                db.session.execute(update(Order), [
+                    {'id': oid, 'payment_transaction_id': txn[:128]} for oid, txn in references.items()
+                ])
+            if (fixes or references) and not dry_run:
+                apply_payment_statuses(fixes)
+            else:
+                # end the read transaction so the next page sees fresh data
+                db.session.rollback()
+    report.elapsed = time.perf_counter() - started
+    return report
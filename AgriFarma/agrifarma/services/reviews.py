@@ -0,0 +1,128 @@
+"""Product review aggregates and review pages.
+
+Only approved reviews count. Each product carries ``rating_count``, a 1–5
+star histogram (``rating_1`` … ``rating_5``) and ``rating_avg`` derived from
+it, so the detail page shows a summary without reading reviews and "top
+rated" is an ordinary index on ``(status, rating_avg, rating_count)``.
+Moderation goes through ``set_approved``/``delete``, which adjust the
+aggregates with one ``UPDATE`` whenever a review enters or leaves the
+approved set; both decide from the row as the statement changing it finds it
+(a conditional update of the flag, ``DELETE ... RETURNING``), never from a
+possibly stale loaded copy. ``rebuild`` recomputes them from the review table.
+
+Reviews on the detail page are keyset-paginated, newest first, over the
+``(product_id, approved, created_at, id)`` index: a page after a cursor
+review is ``WHERE (created_at, id) < (cursor's created_at, cursor id)``.
+"""
+from __future__ import annotations
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Float, case, cast, func, select, tuple_, update
+from sqlalchemy import delete as sql_delete
+
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Product, Review
+
+STARS = (1, 2, 3, 4, 5)
+
+
+def _histogram_column(stars: int):
+    return getattr(Product, f'rating_{stars}')
+
+
+def _adjust(product_id: int, rating: int, delta: int) -> None:
+    """Add (delta=1) or remove (delta=-1) one approved rating from a product (not committed)."""
+    if rating not in STARS:
+        return
+    count = Product.rating_count + delta
+    # SET expressions see the old row, so the new total is built from old values plus delta
+    total = sum(stars * _histogram_column(stars) for stars in STARS) + rating * delta
+    db.session.execute(
+        update(Product).where(Product.id == product_id).values({
+            _histogram_column(rating): _histogram_column(rating) + delta,
+            Product.rating_count: count,
+            Product.rating_avg: case((count > 0, cast(total, Float) / count), else_=0.0),
+        }).execution_options(synchronize_session='fetch')
+    )
+
+
+def set_approved(review: Review, approved: bool) -> bool:
+    """Approve or reject a review, keeping the product aggregates in step (not committed).
+
+    Returns False when the review already had that state. The flag is flipped
+    with a conditional ``UPDATE`` on the old value, so when two moderators act
+    on the same review at once only the one whose update matched adjusts the
+    aggregates.
+    """
+    if bool(review.approved) == approved:
+        return False
+    old = Review.approved.is_not(True) if approved else Review.approved.is_(True)
+    result = db.session.execute(
+        update(Review).where(Review.id == review.id, old).values(approved=approved)
+        .execution_options(synchronize_session='fetch')
+    )
+    if result.rowcount != 1:
+        db.session.expire(review, ['approved'])
+        return False
+    _adjust(review.product_id, review.rating, 1 if approved else -1)
+    return True
+
+
+def delete(review: Review) -> None:
+    """Delete a review, withdrawing its rating if it was approved (not committed).
+
+    ``DELETE ... RETURNING approved`` reads the flag in the statement that
+    removes the row, so a concurrent reject (or delete) by another moderator
+    can't make the rating be withdrawn twice.
+    """
+    deleted = db.session.execute(
+        sql_delete(Review).where(Review.id == review.id).returning(Review.approved)
+        .execution_options(synchronize_session='fetch')
+    ).first()
+    if deleted is not None and deleted.approved:
+        _adjust(review.product_id, review.rating, -1)
+
+
+def page(product: Product, before_id: Optional[int] = None, per_page: int = 10) -> Tuple[List[Review], Optional[int]]:
+    """One page of a product's approved reviews, newest first.
+
+    ``before_id`` is the last review of the previous page. Returns the reviews
+    and the cursor for the next page (None on the last page).
+    """
+    query = (
+        Review.query.filter(Review.product_id == product.id, Review.approved.is_(True))
+        .order_by(Review.created_at.desc(), Review.id.desc())
+    )
+    if before_id:
+        cursor = select(Review.created_at).where(Review.id == before_id).scalar_subquery()
+        query = query.filter(tuple_(Review.created_at, Review.id) < tuple_(cursor, before_id))
+    rows = query.limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    return rows, (rows[-1].id if more else None)
+
+
+def rebuild() -> int:
+    """Recompute every product's rating aggregates from approved reviews (commits).
+
+    Returns the number of products written.
+    """
+    per_star = {}
+    for product_id, rating, n in db.session.execute(
+        select(Review.product_id, Review.rating, func.count(Review.id))
+        .where(Review.approved.is_(True), Review.rating.in_(STARS))
+        .group_by(Review.product_id, Review.rating)
+    ):
+        per_star.setdefault(product_id, {})[rating] = n
+    rows = []
+    for product_id in db.session.execute(select(Product.id)).scalars():
+        hist = per_star.get(product_id, {})
+        count = sum(hist.values())
+        row = {'id': product_id, 'rating_count': count,
+               'rating_avg': sum(s * n for s, n in hist.items()) / count if count else 0.0}
+        row.update({f'rating_{stars}': hist.get(stars, 0) for stars in STARS})
+        rows.append(row)
+    if rows:
+        db.session.execute(update(Product), rows)
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,173 @@
+"""Per-seller sales aggregates.
+
+Sellers' numbers used to need ``order_items -> orders -> products`` joined
+over every order in the shop. Instead, whenever orders become Paid (checkout,
+reconciliation, payment webhooks) ``add_orders`` folds their lines into two
+small tables in the same transaction: ``seller_daily`` (orders, units and
+revenue per seller per day) and ``seller_product_daily`` (the same per
+product, for top sellers). Orders leaving Paid (refunds, reconciliation
+corrections) are added back with ``sign=-1``. Days are calendar days in
+``REPORT_TIMEZONE`` of the order's ``created_at``, matching the date filters
+in ``services.date_ranges``, so a seller's dashboard reads one row per day
+(and per product sold) however many orders the shop takes.
+``flask sellers rebuild`` recomputes the tables from Paid orders.
+"""
+from __future__ import annotations
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, func, select
+
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Order, OrderItem, Product
+from agrifarma.models.seller import SellerDaily, SellerProductDaily
+from agrifarma.services import counters, date_ranges
+
+# Orders still to be fulfilled, listed on the dashboard
+OPEN_ORDER_STATUSES = ("Pending", "Confirmed", "On Hold")
+
+
+class _Deltas:
+    """Increments for both aggregate tables, built from order lines"""
+
+    def __init__(self):
+        self.daily: Dict[Tuple[int, date], Dict] = defaultdict(lambda: {'orders': 0, 'units': 0, 'revenue': Decimal('0')})
+        self.products: Dict[Tuple[int, date, int], Dict] = defaultdict(lambda: {'units': 0, 'revenue': Decimal('0')})
+        self._orders = set()
+
+    def add(self, order_id: int, day: date, seller_id: int, product_id: int, units: int, revenue, sign: int) -> None:
+        revenue = Decimal(str(revenue or 0)) * sign
+        units = int(units or 0) * sign
+        seller = self.daily[(seller_id, day)]
+        if (order_id, seller_id) not in self._orders:
+            self._orders.add((order_id, seller_id))
+            seller['orders'] += sign
+        seller['units'] += units
+        seller['revenue'] += revenue
+        line = self.products[(seller_id, day, product_id)]
+        line['units'] += units
+        line['revenue'] += revenue
+
+
+def _lines(order_ids: Optional[Sequence[int]] = None):
+    """(order id, created_at, seller id, product id, units, revenue) per order and product."""
+    stmt = (
+        select(Order.id, Order.created_at, Product.seller_id, OrderItem.product_id,
+               func.sum(OrderItem.quantity), func.sum(OrderItem.quantity * OrderItem.unit_price))
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .join(Product, Product.id == OrderItem.product_id)
+        .group_by(Order.id, Order.created_at, Product.seller_id, OrderItem.product_id)
+    )
+    if order_ids is None:
+        return db.session.execute(stmt.where(Order.payment_status == 'Paid').execution_options(yield_per=counters.CHUNK_SIZE))
+    return db.session.execute(stmt.where(Order.id.in_(order_ids)))
+
+
+def _write(deltas: _Deltas) -> None:
+    counters.add(db.session, SellerDaily.__table__, ('seller_id', 'day'), deltas.daily)
+    counters.add(db.session, SellerProductDaily.__table__, ('seller_id', 'day', 'product_id'), deltas.products)
+
+
+def add_orders(order_ids: Iterable[int], sign: int = 1) -> None:
+    """
+    Count orders into their sellers' aggregates inside the caller's transaction
+
+    Call once per payment transition, after the orders and their items are
+    flushed: ``sign=1`` when they become Paid, ``-1`` when a Paid order is
+    refunded or corrected.
+    """
+    ids = sorted(set(order_ids))
+    if not ids:
+        return
+    tz = date_ranges.timezone()
+    deltas = _Deltas()
+    for chunk in counters.chunks(ids):
+        for order_id, created_at, seller_id, product_id, units, revenue in _lines(chunk):
+            deltas.add(order_id, date_ranges.local_day(created_at, tz), seller_id, product_id, units, revenue, sign)
+    _write(deltas)
+
+
+def rebuild(seller_ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute the aggregates from Paid orders (all sellers, or some) and commit; returns rows written."""
+    ids = set(seller_ids) if seller_ids is not None else None
+    for model in (SellerDaily, SellerProductDaily):
+        stmt = delete(model)
+        if ids is not None:
+            stmt = stmt.where(model.seller_id.in_(ids))
+        db.session.execute(stmt)
+    tz = date_ranges.timezone()
+    deltas = _Deltas()
+    for order_id, created_at, seller_id, product_id, units, revenue in _lines():
+        if ids is None or seller_id in ids:
+            deltas.add(order_id, date_ranges.local_day(created_at, tz), seller_id, product_id, units, revenue, 1)
+    _write(deltas)
+    db.session.commit()
+    return len(deltas.daily) + len(deltas.products)
+
+
+# --- dashboard reads -------------------------------------------------------
+
+def _in_days(stmt, model, dates: date_ranges.DateRange):
+    if dates.first:
+        stmt = stmt.where(model.day >= dates.first)
+    if dates.last:
+        stmt = stmt.where(model.day < dates.end_day)
+    return stmt
+
+
+def daily(seller_id: int, dates: date_ranges.DateRange) -> List[SellerDaily]:
+    """The seller's day rows in range, oldest first (days without paid orders are absent)."""
+    stmt = _in_days(select(SellerDaily).where(SellerDaily.seller_id == seller_id), SellerDaily, dates)
+    return list(db.session.execute(stmt.order_by(SellerDaily.day)).scalars())
+
+
+def totals(rows: Sequence[SellerDaily]) -> Dict:
+    return {
+        'orders': sum(r.orders for r in rows),
+        'units': sum(r.units for r in rows),
+        'revenue': sum((r.revenue or Decimal('0') for r in rows), Decimal('0')),
+    }
+
+
+def top_products(seller_id: int, dates: date_ranges.DateRange, n: int = 10) -> List[Tuple[int, str, int, Decimal]]:
+    """Best sellers in range as ``(product id, name, units, revenue)``, by revenue."""
+    units = func.sum(SellerProductDaily.units)
+    revenue = func.sum(SellerProductDaily.revenue)
+    stmt = select(SellerProductDaily.product_id, units, revenue).where(SellerProductDaily.seller_id == seller_id)
+    stmt = _in_days(stmt, SellerProductDaily, dates).group_by(SellerProductDaily.product_id)
+    rows = db.session.execute(
+        stmt.having(units > 0).order_by(revenue.desc(), SellerProductDaily.product_id).limit(n)
+    ).all()
+    names = dict(db.session.execute(
+        select(Product.id, Product.name).where(Product.id.in_([r[0] for r in rows]))
+    ).all()) if rows else {}
+    return [(pid, names.get(pid, f'#{pid}'), int(u or 0), Decimal(str(r or 0))) for pid, u, r in rows]
+
+
+def low_stock(seller_id: int, threshold: int, limit: int = 50) -> List[Product]:
+    return list(db.session.execute(
+        select(Product).where(Product.seller_id == seller_id, Product.inventory < threshold)
+        .order_by(Product.inventory.asc(), Product.id).limit(limit)
+    ).scalars())
+
+
+def open_orders(seller_id: int, limit: int = 50) -> List[Tuple[Order, int, Decimal]]:
+    """Unfulfilled orders containing the seller's products, newest first, as ``(order, units, revenue)``.
+
+    Only the seller's own lines are counted; orders whose payment failed are skipped.
+    """
+    units = func.sum(OrderItem.quantity)
+    revenue = func.sum(OrderItem.quantity * OrderItem.unit_price)
+    rows = db.session.execute(
+        select(Order, units, revenue)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .join(Product, Product.id == OrderItem.product_id)
+        .where(Product.seller_id == seller_id, Order.status.in_(OPEN_ORDER_STATUSES),
+               Order.payment_status.notin_(('Failed', 'Refunded')))
+        .group_by(Order.id)
+        .order_by(Order.created_at.desc(), Order.id.desc())
+        .limit(limit)
+    ).all()
+    return [(order, int(u or 0), Decimal(str(r or 0))) for order, u, r in rows]
@@ -0,0 +1,330 @@
+"""Streaming sketches for search terms, product views and distinct visitors.
+
+Counting every search term or visitor exactly would mean a growing table of
+keys and a write per request. Sketches answer the dashboard's questions in
+fixed memory instead:
+
+- ``CountMinSketch``: approximate frequency of any key. A ``depth`` x
+  ``width`` table of counters; a key's estimate is the smallest of its
+  ``depth`` counters, never below the true count and (with the defaults)
+  over by at most ~0.13% of all events, 98% of the time.
+- ``TopK``: a Count-Min sketch plus a min-heap of the ``k`` keys with the
+  highest estimates seen so far (heavy hitters).
+- ``HyperLogLog``: approximate number of distinct keys in 4 KB of registers
+  (about 1.6% standard error).
+
+Each worker keeps today's sketches in memory (``record``); the tracking
+writer thread merges them into the day's ``sketch_days`` row (``flush``).
+All three merge losslessly, counters by addition and registers by maximum,
+so rows from many workers and many days combine into one sketch for any
+date range. Keys are hashed with BLAKE2b rather than ``hash()`` so every
+process agrees on where a key lands.
+"""
+from __future__ import annotations
+import hashlib
+import heapq
+import json
+import math
+import struct
+import threading
+import zlib
+from datetime import date, datetime, timedelta, UTC
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from agrifarma.extensions import db
+from agrifarma.models.sketch import SketchDay
+
+WIDTH = 2048
+DEPTH = 4
+TOP_K = 50
+HLL_PRECISION = 12
+# Longest search term kept, after normalising case and whitespace
+MAX_TERM_LENGTH = 100
+
+
+def _digest(key: str, size: int) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=size).digest(), 'little')
+
+
+class CountMinSketch:
+    """Approximate per-key counts in a fixed ``depth`` x ``width`` counter table"""
+
+    def __init__(self, width: int = WIDTH, depth: int = DEPTH, table: Optional[np.ndarray] = None):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else np.zeros((depth, width), dtype=np.uint32)
+        self._rows = np.arange(depth)
+
+    def _columns(self, key: str) -> List[int]:
+        # double hashing: one 128-bit digest gives every row's column
+        h = _digest(key, 16)
+        h1, h2 = h & 0xFFFFFFFFFFFFFFFF, (h >> 64) | 1
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key: str, n: int = 1) -> int:
+        """Count a key; returns its new estimate."""
+        cells = (self._rows, self._columns(key))
+        self.table[cells] += n
+        return int(self.table[cells].min())
+
+    def estimate(self, key: str) -> int:
+        return int(self.table[self._rows, self._columns(key)].min())
+
+    @property
+    def total(self) -> int:
+        return int(self.table[0].sum())
+
+    def merge(self, other: "CountMinSketch") -> None:
+        if self.table.shape != other.table.shape:
+            raise ValueError("cannot merge sketches of different dimensions")
+        self.table += other.table
+
+    def to_bytes(self) -> bytes:
+        return struct.pack('<II', self.width, self.depth) + self.table.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "CountMinSketch":
+        width, depth = struct.unpack_from('<II', data)
+        table = np.frombuffer(data, dtype=np.uint32, offset=8).reshape(depth, width).copy()
+        return cls(width, depth, table)
+
+
+class TopK:
+    """Heavy hitters: a Count-Min sketch plus the ``k`` keys with the highest estimates"""
+
+    def __init__(self, k: int = TOP_K, cms: Optional[CountMinSketch] = None):
+        self.k = k
+        self.cms = cms or CountMinSketch()
+        self.counts: Dict[str, int] = {}
+        self._heap: List[Tuple[int, str]] = []  # (estimate, key), stale entries skipped lazily
+
+    def add(self, key: str, n: int = 1) -> None:
+        self._offer(key, self.cms.add(key, n))
+
+    def _offer(self, key: str, estimate: int) -> None:
+        if key not in self.counts and len(self.counts) >= self.k:
+            floor, smallest = self._smallest()
+            if estimate <= floor:
+                return
+            heapq.heappop(self._heap)
+            del self.counts[smallest]
+        self.counts[key] = estimate
+        heapq.heappush(self._heap, (estimate, key))
+        if len(self._heap) > 4 * self.k:
+            self._rebuild()
+
+    def _smallest(self) -> Tuple[int, str]:
+        while True:
+            estimate, key = self._heap[0]
+            if self.counts.get(key) == estimate:
+                return estimate, key
+            heapq.heappop(self._heap)
+
+    def _rebuild(self) -> None:
+        self._heap = [(n, key) for key, n in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def top(self, n: int = 10) -> List[Tuple[str, int]]:
+        """The ``n`` heaviest keys as ``(key, estimated count)``, highest first."""
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+
+    def merge(self, other: "TopK") -> None:
+        """Add another sketch's counts; candidates from both are re-ranked on the merged counters."""
+        self.cms.merge(other.cms)
+        keys = set(self.counts) | set(other.counts)
+        ranked = sorted(((self.cms.estimate(key), key) for key in keys), key=lambda t: (-t[0], t[1]))
+        self.counts = {key: n for n, key in ranked[:self.k]}
+        self._rebuild()
+
+    def to_bytes(self) -> bytes:
+        cms = self.cms.to_bytes()
+        keys = json.dumps(self.counts, separators=(',', ':')).encode('utf-8')
+        return struct.pack('<II', self.k, len(cms)) + cms + keys
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TopK":
+        k, size = struct.unpack_from('<II', data)
+        sketch = cls(k, CountMinSketch.from_bytes(data[8:8 + size]))
+        sketch.counts = json.loads(data[8 + size:].decode('utf-8'))
+        sketch._rebuild()
+        return sketch
+
+
+class HyperLogLog:
+    """Approximate distinct count in ``2 ** precision`` one-byte registers"""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, key: str) -> None:
+        h = _digest(key, 8)
+        bits = 64 - self.precision
+        index, rest = h >> bits, h & ((1 << bits) - 1)
+        rank = bits - rest.bit_length() + 1  # position of the first 1 bit
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting is more accurate for small sets
+        return int(round(estimate))
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if self.precision != other.precision:
+            raise ValueError("cannot merge sketches of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def to_bytes(self) -> bytes:
+        return struct.pack('<B', self.precision) + self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        (precision,) = struct.unpack_from('<B', data)
+        return cls(precision, np.frombuffer(data, dtype=np.uint8, offset=1).copy())
+
+
+# sketch name -> type; 'products' and 'visitors' are fed by the request hook in routes.main
+SKETCHES = {
+    'searches': TopK,
+    'autocomplete': TopK,
+    'products': TopK,
+    'visitors': HyperLogLog,
+}
+
+
+def dumps(sketch) -> bytes:
+    return zlib.compress(sketch.to_bytes())
+
+
+def loads(name: str, data: bytes):
+    return SKETCHES[name].from_bytes(zlib.decompress(data))
+
+
+class PendingSketches:
+    """One worker's not yet persisted sketches, per (name, day)"""
+
+    def __init__(self):
+        self._sketches: Dict[Tuple[str, date], object] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, key: str) -> None:
+        day = datetime.now(UTC).date()
+        with self._lock:
+            sketch = self._sketches.get((name, day))
+            if sketch is None:
+                sketch = self._sketches[(name, day)] = SKETCHES[name]()
+            sketch.add(key)
+
+    def drain(self) -> Dict[Tuple[str, date], object]:
+        with self._lock:
+            sketches, self._sketches = self._sketches, {}
+        return sketches
+
+
+_lock = threading.Lock()
+
+
+def _pending() -> PendingSketches:
+    pending = current_app.extensions.get('sketches')
+    if pending is None:
+        with _lock:
+            pending = current_app.extensions.get('sketches')
+            if pending is None:
+                from agrifarma.services import tracking
+                tracking.get_tracker()  # its writer thread flushes these too
+                pending = current_app.extensions['sketches'] = PendingSketches()
+    return pending
+
+
+def normalize_term(text: str) -> str:
+    return ' '.join((text or '').lower().split())[:MAX_TERM_LENGTH]
+
+
+def record(name: str, key) -> None:
+    """Count one occurrence of a key in today's sketch (in memory until the next flush)."""
+    if name not in SKETCHES:
+        raise ValueError(f"sketch must be one of {tuple(SKETCHES)}")
+    _pending().add(name, str(key))
+
+
+def record_search(name: str, text: str) -> None:
+    """Count a search term, case and whitespace normalised."""
+    term = normalize_term(text)
+    if term:
+        record(name, term)
+
+
+def _merge_into(conn, name: str, day: date, sketch) -> None:
+    """Merge a sketch into the stored day row, creating it if needed (on a Connection)."""
+    now = datetime.now(UTC).replace(tzinfo=None)
+    claim = update(SketchDay).where(SketchDay.name == name, SketchDay.day == day).values(updated_at=now)
+    if not conn.execute(claim).rowcount:
+        savepoint = conn.begin_nested()
+        try:
+            conn.execute(insert(SketchDay).values(name=name, day=day, data=dumps(sketch), updated_at=now))
+            savepoint.commit()
+            return
+        except IntegrityError:
+            # another worker stored the day first
+            savepoint.rollback()
+            conn.execute(claim)
+    # the UPDATE above holds the write lock, so nobody merges in between
+    stored = loads(name, conn.scalar(select(SketchDay.data).where(SketchDay.name == name, SketchDay.day == day)))
+    stored.merge(sketch)
+    conn.execute(update(SketchDay).where(SketchDay.name == name, SketchDay.day == day).values(data=dumps(stored)))
+
+
+def flush() -> int:
+    """Merge this worker's pending sketches into their day rows (own transaction); returns rows touched."""
+    pending = _pending().drain()
+    if not pending:
+        return 0
+    with db.engine.begin() as conn:
+        for (name, day), sketch in sorted(pending.items(), key=lambda item: item[0]):
+            _merge_into(conn, name, day, sketch)
+    return len(pending)
+
+
+def load(name: str, start: date, end: date):
+    """One sketch for days in ``[start, end)``, merged from the stored day rows."""
+    merged = SKETCHES[name]()
+    for data in db.session.execute(
+        select(SketchDay.data).where(SketchDay.name == name, SketchDay.day >= start, SketchDay.day < end)
+    ).scalars():
+        merged.merge(loads(name, data))
+    return merged
+
+
+def top(name: str, start: date, end: date, n: int = 10) -> List[Tuple[str, int]]:
+    """Heaviest keys of a top-k sketch over ``[start, end)``."""
+    return load(name, start, end).top(n)
+
+
+def distinct_by_day(name: str, start: date, end: date) -> Tuple[List[Tuple[date, int]], int]:
+    """Distinct keys per day in ``[start, end)`` (zero-filled) and over the whole range."""
+    rows = dict(db.session.execute(
+        select(SketchDay.day, SketchDay.data).where(SketchDay.name == name, SketchDay.day >= start, SketchDay.day < end)
+    ).all())
+    merged = SKETCHES[name]()
+    days = []
+    day = start
+    while day < end:
+        count = 0
+        if day in rows:
+            sketch = loads(name, rows[day])
+            count = sketch.count()
+            merged.merge(sketch)
+        days.append((day, count))
+        day += timedelta(days=1)
+    return days, merged.count()
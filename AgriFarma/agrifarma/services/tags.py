@@ -0,0 +1,193 @@
+"""Normalized blog tags.
+
+``blog_posts.tags`` keeps the comma-separated form for display, but filtering
+goes through ``tags``/``blog_post_tags``: a tag name is one unique-index
+lookup and "posts tagged X" is a range of the ``(tag_id, blog_id)`` index,
+so "soil" no longer matches "topsoil" and nothing scans the posts table.
+``tags.post_count`` counts approved posts only and is adjusted in SQL whenever
+a post's tags or its approval change, which keeps the tag cloud a single
+top-K read that never advertises moderated-out posts. Multi-tag filters start from the
+rarest tag and probe the others per candidate post, so their cost follows
+the smallest tag rather than the size of the blog.
+"""
+from __future__ import annotations
+import math
+import re
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, exists, false, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+from agrifarma.extensions import db
+from agrifarma.models.blog import BlogPost, BlogPostTag, Tag
+
+MAX_TAG_LENGTH = 64
+CLOUD_WEIGHTS = 5  # tag cloud font steps
+
+_spaces = re.compile(r'\s+')
+
+
+def normalize(name: Optional[str]) -> str:
+    """Canonical tag name: trimmed, lower-cased, single-spaced, no leading '#'."""
+    name = _spaces.sub(' ', (name or '').strip().lstrip('#').strip()).lower()
+    return name[:MAX_TAG_LENGTH]
+
+
+def parse(raw: Optional[str]) -> List[str]:
+    """Split a comma-separated tag string into unique normalized names, keeping order."""
+    seen: List[str] = []
+    for part in (raw or '').split(','):
+        name = normalize(part)
+        if name and name not in seen:
+            seen.append(name)
+    return seen
+
+
+def _tag_ids(names: List[str], create: bool = True) -> Dict[str, int]:
+    """name -> id for the given normalized names, inserting missing tags when create is set."""
+    if not names:
+        return {}
+    found = dict(db.session.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+    missing = [n for n in names if n not in found]
+    if missing and create:
+        savepoint = db.session.begin_nested()
+        try:
+            db.session.execute(insert(Tag), [{'name': n, 'post_count': 0} for n in missing])
+            savepoint.commit()
+        except IntegrityError:
+            # another request created one of them first; fall through and re-read
+            savepoint.rollback()
+            for name in missing:
+                if db.session.execute(select(Tag.id).where(Tag.name == name)).scalar() is None:
+                    db.session.add(Tag(name=name, post_count=0))
+            db.session.flush()
+        found = dict(db.session.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+    return found
+
+
+def _bump(tag_ids: Iterable[int], delta: int) -> None:
+    tag_ids = list(tag_ids)
+    if tag_ids:
+        db.session.execute(
+            update(Tag).where(Tag.id.in_(tag_ids)).values(post_count=Tag.post_count + delta)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def set_post_tags(post: BlogPost, raw: Optional[str]) -> List[str]:
+    """Replace a (flushed) post's tags with those in ``raw``; returns the normalized names.
+
+    Only the difference against the current links is written, and the
+    affected tag counters move by one each (unapproved posts aren't
+    counted). Does not commit.
+    """
+    names = parse(raw)
+    wanted = set(_tag_ids(names).values())
+    current = set(db.session.execute(
+        select(BlogPostTag.tag_id).where(BlogPostTag.blog_id == post.id)
+    ).scalars())
+    added, removed = wanted - current, current - wanted
+    if removed:
+        db.session.execute(delete(BlogPostTag).where(
+            BlogPostTag.blog_id == post.id, BlogPostTag.tag_id.in_(removed)
+        ))
+    if added:
+        db.session.execute(insert(BlogPostTag), [{'blog_id': post.id, 'tag_id': t} for t in added])
+    if post.approved:
+        _bump(added, 1)
+        _bump(removed, -1)
+    post.tags = ','.join(names)
+    return names
+
+
+def set_approved(post: BlogPost, approved: bool) -> None:
+    """Approve or withdraw a post, moving its tags' counters with it (not committed)."""
+    if bool(post.approved) == approved:
+        return
+    post.approved = approved
+    _bump(db.session.execute(select(BlogPostTag.tag_id).where(BlogPostTag.blog_id == post.id)).scalars(),
+          1 if approved else -1)
+
+
+def on_post_deleted(post: BlogPost) -> None:
+    """Drop a post's tag links before the post itself is deleted (not committed)."""
+    tag_ids = list(db.session.execute(
+        select(BlogPostTag.tag_id).where(BlogPostTag.blog_id == post.id)
+    ).scalars())
+    if tag_ids:
+        db.session.execute(delete(BlogPostTag).where(BlogPostTag.blog_id == post.id))
+        if post.approved:
+            _bump(tag_ids, -1)
+
+
+def posts_with_all_tags(names: Iterable[str]):
+    """Select of blog ids carrying every tag in ``names`` (for ``BlogPost.id.in_``).
+
+    Starts from the rarest tag's slice of the ``(tag_id, blog_id)`` index and
+    checks each remaining tag with a primary-key probe per candidate.
+    Unknown tags short-circuit to an empty result.
+    """
+    names = list(dict.fromkeys(n for n in (normalize(n) for n in names) if n))
+    if not names:
+        return select(BlogPostTag.blog_id).where(false())
+    rows = db.session.execute(
+        select(Tag.id, Tag.post_count).where(Tag.name.in_(names)).order_by(Tag.post_count, Tag.id)
+    ).all()
+    if len(rows) < len(names):
+        return select(BlogPostTag.blog_id).where(false())
+    base = aliased(BlogPostTag)
+    stmt = select(base.blog_id).where(base.tag_id == rows[0].id)
+    for tag_id, _count in rows[1:]:
+        other = aliased(BlogPostTag)
+        stmt = stmt.where(exists().where(other.blog_id == base.blog_id, other.tag_id == tag_id))
+    return stmt
+
+
+def tag_cloud(limit: int = 30) -> List[dict]:
+    """The most used tags, alphabetical, each with a 1..CLOUD_WEIGHTS weight on a log scale."""
+    rows = db.session.execute(
+        select(Tag.name, Tag.post_count).where(Tag.post_count > 0)
+        .order_by(Tag.post_count.desc(), Tag.name).limit(limit)
+    ).all()
+    if not rows:
+        return []
+    low, high = math.log(rows[-1].post_count), math.log(rows[0].post_count)
+    span = (high - low) or 1.0
+    cloud = [
+        {'name': name, 'count': count,
+         'weight': 1 + int(round((math.log(count) - low) / span * (CLOUD_WEIGHTS - 1)))}
+        for name, count in rows
+    ]
+    return sorted(cloud, key=lambda t: t['name'])
+
+
+def rebuild_index() -> int:
+    """Re-derive blog_post_tags and tag counts from the CSV column.
+
+    Used to backfill databases created before the tag tables existed and to
+    repair drift. Also rewrites each CSV in normalized form. Returns the
+    number of posts that carry tags (commits).
+    """
+    posts = db.session.execute(select(BlogPost.id, BlogPost.tags)).all()
+    parsed = {pid: parse(raw) for pid, raw in posts}
+    all_names = sorted({n for names in parsed.values() for n in names})
+    ids: Dict[str, int] = {}
+    for start in range(0, len(all_names), 500):
+        ids.update(_tag_ids(all_names[start:start + 500]))
+    db.session.execute(delete(BlogPostTag))
+    links = [{'blog_id': pid, 'tag_id': ids[n]} for pid, names in parsed.items() for n in names]
+    if links:
+        db.session.execute(insert(BlogPostTag), links)
+    fixed_csv = [{'id': pid, 'tags': ','.join(parsed[pid])} for pid, raw in posts
+                 if (raw or '') != ','.join(parsed[pid])]
+    if fixed_csv:
+        db.session.execute(update(BlogPost), fixed_csv)
+    counted = (
+        select(func.count()).select_from(BlogPostTag)
+        .join(BlogPost, BlogPost.id == BlogPostTag.blog_id)
+        .where(BlogPostTag.tag_id == Tag.id, BlogPost.approved.is_(True)).scalar_subquery()
+    )
+    db.session.execute(update(Tag).values(post_count=counted).execution_options(synchronize_session=False))
+    db.session.commit()
+    return sum(1 for names in parsed.values() if names)
@@ -0,0 +1,306 @@
+"""Buffered page view and impression tracking.
+
+Writing a row per page view from the request would put a write transaction
+on every read, which SQLite serialises. Instead ``track`` only appends to an
+in-memory ring buffer owned by the worker process; a background thread
+drains it every ``TRACKING_FLUSH_SECONDS`` (sooner once a batch has piled
+up) and appends the events to the ``events`` table, ``TRACKING_BATCH_SIZE``
+rows per ``executemany``.
+
+Memory is bounded: the buffer holds at most ``TRACKING_BUFFER_SIZE`` events
+and, when the database cannot keep up, the oldest pending events are
+overwritten and counted as dropped rather than blocking requests. A batch
+that fails to insert is dropped and logged too. View counts are analytics,
+not ledger data, so losing a burst under overload is the intended trade-off.
+
+After each flush, events above the rollup watermark are folded into
+``event_daily_counts`` and ``event_totals`` (and product views into the
+purchase funnel's 'view' stage). The watermark row is claimed with an
+``UPDATE`` first, so on SQLite a second worker rolling up at the same time
+waits for the lock and then starts from the advanced watermark: every event
+is counted exactly once however many workers flush.
+"""
+from __future__ import annotations
+import atexit
+import os
+import threading
+import time
+from collections import Counter, deque
+from datetime import date, datetime, timedelta, UTC
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app
+from flask_login import current_user
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from agrifarma.extensions import db
+from agrifarma.models.tracking import EventDailyCount, EventRollup, EventTotal, TrackedEvent
+from agrifarma.services import counters, funnel
+from agrifarma.services.cohorts import week_start
+
+# impression: a product card shown on a shop listing page
+KINDS = ('product', 'impression', 'blog', 'thread')
+
+
+class EventBuffer:
+    """Bounded ring buffer of pending events; when full the oldest are overwritten and counted as dropped"""
+
+    def __init__(self, size: int):
+        self._items: deque = deque(maxlen=max(int(size), 1))
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.dropped = 0
+
+    def append(self, item: Dict) -> None:
+        with self._lock:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self.accepted += 1
+
+    def drain(self, limit: int) -> List[Dict]:
+        """Remove and return up to ``limit`` of the oldest events."""
+        with self._lock:
+            return [self._items.popleft() for _ in range(min(limit, len(self._items)))]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class Tracker:
+    """One worker's event buffer plus the thread that writes it (and the worker's sketches) out
+
+    The same thread refreshes the cohort cells every ``cohort_seconds`` (0 turns that off), so
+    the reports page never has to write.
+    """
+
+    def __init__(self, app, buffer_size: int = 10000, batch_size: int = 500, flush_seconds: float = 5,
+                 cohort_seconds: float = 300):
+        self.app = app
+        self.pid = os.getpid()
+        self.buffer = EventBuffer(buffer_size)
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_seconds = flush_seconds
+        self.cohort_seconds = cohort_seconds
+        self.written = 0
+        self.failed = 0
+        self._dropped_logged = 0
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def track(self, kind: str, entity_id: int, user_id: Optional[int] = None) -> None:
+        self.buffer.append({
+            'kind': kind, 'entity_id': entity_id, 'user_id': user_id,
+            'created_at': datetime.now(UTC).replace(tzinfo=None),
+        })
+        if len(self.buffer) >= self.batch_size:
+            self._wake.set()
+
+    def start(self) -> None:
+        """Start the background flush thread (once); pending events are also flushed at exit."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='event-tracking-flush', daemon=True)
+        self._thread.start()
+        atexit.register(self._flush_in_app)
+
+    def _run(self) -> None:
+        next_cohorts = time.monotonic() + self.cohort_seconds
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self._flush_in_app()
+            if self.cohort_seconds and time.monotonic() >= next_cohorts:
+                next_cohorts = time.monotonic() + self.cohort_seconds
+                self._refresh_cohorts()
+
+    def _refresh_cohorts(self) -> None:
+        from agrifarma.services import cohorts
+        with self.app.app_context():
+            try:
+                cohorts.refresh()
+            except Exception as exc:  # the next interval retries from the same watermarks
+                db.session.rollback()
+                self.app.logger.error(f"[tracking] cohort refresh failed: {exc}")
+
+    def _flush_in_app(self) -> None:
+        from agrifarma.services import sketches
+        with self.app.app_context():
+            try:
+                self.flush()
+            except Exception as exc:  # keep the thread alive; the next tick retries the rollup
+                self.app.logger.error(f"[tracking] flush failed: {exc}")
+            try:
+                sketches.flush()
+            except Exception as exc:
+                self.app.logger.error(f"[tracking] sketch flush failed: {exc}")
+
+    def flush(self) -> int:
+        """Write buffered events in batches, then roll them up; returns the number written."""
+        with self._flush_lock:
+            written = 0
+            while True:
+                batch = self.buffer.drain(self.batch_size)
+                if not batch:
+                    break
+                try:
+                    with db.engine.begin() as conn:
+                        conn.execute(insert(TrackedEvent), batch)
+                except SQLAlchemyError as exc:
+                    # leave the rest buffered for the next tick; the ring bounds what waits
+                    self.failed += len(batch)
+                    current_app.logger.warning(f"[tracking] dropped a batch of {len(batch)} events: {exc}")
+                    break
+                written += len(batch)
+            self.written += written
+            if self.buffer.dropped > self._dropped_logged:
+                current_app.logger.warning(
+                    f"[tracking] buffer full: {self.buffer.dropped - self._dropped_logged} events dropped")
+                self._dropped_logged = self.buffer.dropped
+            if written:
+                with db.engine.begin() as conn:
+                    rollup(conn)
+            return written
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pending': len(self.buffer),
+            'accepted': self.buffer.accepted,
+            'dropped': self.buffer.dropped,
+            'written': self.written,
+            'failed': self.failed,
+        }
+
+
+_lock = threading.Lock()
+
+
+def get_tracker() -> Tracker:
+    """This process's tracker (a forked worker gets its own buffer and thread)."""
+    tracker = current_app.extensions.get('tracking')
+    if tracker is not None and tracker.pid == os.getpid():
+        return tracker
+    with _lock:
+        tracker = current_app.extensions.get('tracking')
+        if tracker is None or tracker.pid != os.getpid():
+            cfg = current_app.config
+            tracker = Tracker(
+                current_app._get_current_object(),
+                buffer_size=cfg.get('TRACKING_BUFFER_SIZE', 10000),
+                batch_size=cfg.get('TRACKING_BATCH_SIZE', 500),
+                flush_seconds=cfg.get('TRACKING_FLUSH_SECONDS', 5),
+                cohort_seconds=cfg.get('COHORT_REFRESH_SECONDS', 300),
+            )
+            if not current_app.testing:  # tests flush explicitly
+                tracker.start()
+            current_app.extensions['tracking'] = tracker
+    return tracker
+
+
+def track(kind: str, entity_id: int) -> None:
+    """Record a view of an entity by the current visitor (buffered, never touches the database)."""
+    track_many(kind, (entity_id,))
+
+
+def track_many(kind: str, entity_ids: Iterable[int]) -> None:
+    """Record one event per entity, e.g. the product cards on a listing page."""
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {KINDS}")
+    user_id = current_user.id if current_user and current_user.is_authenticated else None
+    tracker = get_tracker()
+    for entity_id in entity_ids:
+        tracker.track(kind, entity_id, user_id)
+
+
+def flush() -> int:
+    """Write out this worker's pending events now (the flush thread does this every few seconds)."""
+    return get_tracker().flush()
+
+
+def _claim(conn) -> int:
+    """Lock the rollup row (creating it on first use); returns the watermark."""
+    now = datetime.now(UTC).replace(tzinfo=None)
+    stmt = update(EventRollup).where(EventRollup.id == 1).values(updated_at=now)
+    if not conn.execute(stmt).rowcount:
+        savepoint = conn.begin_nested()
+        try:
+            conn.execute(insert(EventRollup).values(id=1, last_event_id=0, updated_at=now))
+            savepoint.commit()
+        except IntegrityError:
+            # another worker created it first
+            savepoint.rollback()
+            conn.execute(stmt)
+    return conn.scalar(select(EventRollup.last_event_id).where(EventRollup.id == 1))
+
+
+def rollup(conn) -> int:
+    """Fold events above the watermark into the counters, on a Connection (the caller commits).
+
+    Returns the number of events counted.
+    """
+    after = _claim(conn)
+    upto = conn.scalar(select(func.max(TrackedEvent.id))) or 0
+    if upto <= after:
+        return 0
+    day = func.date(TrackedEvent.created_at)
+    daily: Counter = Counter()
+    for kind, entity_id, value, n in conn.execute(
+        select(TrackedEvent.kind, TrackedEvent.entity_id, day, func.count())
+        .where(TrackedEvent.id > after, TrackedEvent.id <= upto)
+        .group_by(TrackedEvent.kind, TrackedEvent.entity_id, day)
+    ):
+        daily[(kind, entity_id, date.fromisoformat(value))] += n
+    totals: Counter = Counter()
+    views: Counter = Counter()
+    for (kind, entity_id, value), n in daily.items():
+        totals[(kind, entity_id)] += n
+        if kind == 'product':
+            views[week_start(value)] += n
+    counters.add(conn, EventDailyCount.__table__, ('kind', 'entity_id', 'day'),
+                 {key: {'count': n} for key, n in daily.items()})
+    counters.add(conn, EventTotal.__table__, ('kind', 'entity_id'),
+                 {key: {'count': n} for key, n in totals.items()})
+    for week, n in sorted(views.items()):
+        funnel.bump(conn, week, 'view', n)
+    conn.execute(update(EventRollup).where(EventRollup.id == 1).values(last_event_id=upto))
+    return sum(daily.values())
+
+
+def view_count(kind: str, entity_id: int) -> int:
+    """All-time events for an entity, as of the last rollup."""
+    return db.session.scalar(
+        select(EventTotal.count).where(EventTotal.kind == kind, EventTotal.entity_id == entity_id)
+    ) or 0
+
+
+def top(kind: str, limit: int = 10, start: Optional[date] = None, end: Optional[date] = None) -> List[Tuple[int, int]]:
+    """Most viewed entities as ``(entity_id, count)``, all time or for days in ``[start, end)``."""
+    if start is None and end is None:
+        stmt = (select(EventTotal.entity_id, EventTotal.count).where(EventTotal.kind == kind)
+                .order_by(EventTotal.count.desc(), EventTotal.entity_id.asc()))
+    else:
+        total = func.sum(EventDailyCount.count)
+        stmt = select(EventDailyCount.entity_id, total).where(EventDailyCount.kind == kind)
+        if start is not None:
+            stmt = stmt.where(EventDailyCount.day >= start)
+        if end is not None:
+            stmt = stmt.where(EventDailyCount.day < end)
+        stmt = stmt.group_by(EventDailyCount.entity_id).order_by(total.desc(), EventDailyCount.entity_id.asc())
+    return [(entity_id, int(n)) for entity_id, n in db.session.execute(stmt.limit(limit)).all()]
+
+
+def prune(days: int) -> int:
+    """Delete rolled-up events older than ``days`` days (commits); the counters keep their totals.
+
+    The newest rolled-up event is always kept so SQLite never hands its id
+    out again to an event that would then sit below the watermark.
+    """
+    cutoff = datetime.now(UTC).replace(tzinfo=None) - timedelta(days=days)
+    watermark = db.session.scalar(select(EventRollup.last_event_id).where(EventRollup.id == 1)) or 0
+    deleted = db.session.execute(
+        delete(TrackedEvent).where(TrackedEvent.id < watermark, TrackedEvent.created_at < cutoff)
+    ).rowcount
+    db.session.commit()
+    return deleted
@@ -0,0 +1,276 @@
+"""Materialized per-user activity stats.
+
+Profile pages used to count posts, join likes to posts and fetch the latest
+posts on every render. Those numbers now live in one ``user_stats`` row per
+user that the write paths (forum, blog, likes, checkout) adjust with
+``col = col + delta`` updates in the same transaction as the write itself,
+alongside a small newest-first activity list. Reading a profile is a primary
+key lookup that never writes; ``flask stats rebuild`` recomputes everything
+from source tables with grouped queries (backfilling missing rows) if the
+counters ever drift.
+"""
+from __future__ import annotations
+from collections import defaultdict
+from datetime import datetime, UTC
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+
+from agrifarma.extensions import db
+from agrifarma.models.blog import BlogPost, Comment
+from agrifarma.models.ecommerce import Order
+from agrifarma.models.forum import Post, Thread
+from agrifarma.models.likes import PostLike
+from agrifarma.models.message import Message
+from agrifarma.models.profile import LATEST_ACTIVITY_SIZE, UserStats
+from agrifarma.models.user import User
+
+COUNTERS = (
+    "posts_count",
+    "threads_count",
+    "likes_received",
+    "blog_posts_count",
+    "comments_count",
+    "orders_count",
+    "unread_messages",
+)
+
+# Activity kinds and the page their ``ref`` points at
+FORUM_KINDS = ("thread", "post")    # ref = thread id
+BLOG_KINDS = ("blog", "comment")    # ref = blog post id
+
+
+def _now() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def _activity(kind: str, obj_id: int, ref: int, title: str, at: Optional[datetime]) -> Dict:
+    at = (at or _now()).replace(tzinfo=None)
+    return {'kind': kind, 'id': obj_id, 'ref': ref, 'title': title or '', 'at': at.isoformat()}
+
+
+def stats_for(user_id: int) -> UserStats:
+    """Return the stats row for a user.
+
+    Called while rendering (profiles, the unread badge on every page), so it
+    never writes: a user without a row yet gets an unsaved row computed from
+    the source tables. The row is stored by that user's next write (``bump``)
+    or by ``flask stats rebuild``.
+    """
+    row = db.session.get(UserStats, user_id)
+    if row is None:
+        values = compute([user_id]).get(user_id) or _empty(user_id)
+        row = UserStats(**values)  # transient: not added to the session
+    return row
+
+
+def bump(user_id: int, activity: Optional[Dict] = None, forget: Optional[tuple] = None,
+         touch: bool = True, **deltas: int) -> None:
+    """
+    Adjust one user's counters inside the caller's transaction
+
+    Args:
+        user_id: Whose stats to change
+        activity: Entry to push onto the latest-activity list
+        forget: (kinds, ref) - drop list entries of those kinds pointing at ref
+        touch: Update last_active (False when someone else's action is recorded)
+        deltas: Counter name -> increment, e.g. posts_count=1
+    """
+    # Flush first so a missing row is rebuilt from data that includes this write
+    db.session.flush()
+    row = db.session.get(UserStats, user_id)
+    if row is None:
+        rebuild_user(user_id)
+        return
+    for name, delta in deltas.items():
+        if name not in COUNTERS:
+            raise ValueError(f"unknown counter {name}")
+        if delta:
+            # SQL-side increment: concurrent writers can't lose each other's updates
+            setattr(row, name, getattr(UserStats, name) + delta)
+    if touch:
+        row.last_active = _now()
+    if activity is not None or forget is not None:
+        latest = list(row.latest or [])
+        if forget is not None:
+            kinds, ref = forget
+            latest = [a for a in latest if not (a['kind'] in kinds and a['ref'] == ref)]
+        if activity is not None:
+            latest = [activity] + [a for a in latest if (a['kind'], a['id']) != (activity['kind'], activity['id'])]
+        row.latest = latest[:LATEST_ACTIVITY_SIZE]
+
+
+def touch(user_id: int) -> None:
+    bump(user_id)
+
+
+# --- write-path hooks (call after adding/flushing, before commit) ---------
+
+def on_thread_created(thread: Thread) -> None:
+    """A new thread and its opening post"""
+    bump(thread.author_id, threads_count=1, posts_count=1,
+         activity=_activity('thread', thread.id, thread.id, thread.title, thread.created_at))
+
+
+def on_post_created(post: Post, thread: Thread) -> None:
+    bump(post.author_id, posts_count=1,
+         activity=_activity('post', post.id, thread.id, thread.title, post.created_at))
+
+
+def on_thread_deleted(thread: Thread) -> None:
+    """Call before deleting a thread; its posts and their likes go with it."""
+    posts = dict(db.session.execute(
+        select(Post.author_id, func.count(Post.id)).where(Post.thread_id == thread.id).group_by(Post.author_id)
+    ).all())
+    likes = dict(db.session.execute(
+        select(Post.author_id, func.count(PostLike.id)).join(PostLike, PostLike.post_id == Post.id)
+        .where(Post.thread_id == thread.id).group_by(Post.author_id)
+    ).all())
+    for user_id in set(posts) | set(likes) | {thread.author_id}:
+        bump(user_id, touch=False, forget=(FORUM_KINDS, thread.id),
+             posts_count=-posts.get(user_id, 0), likes_received=-likes.get(user_id, 0),
+             threads_count=-1 if user_id == thread.author_id else 0)
+
+
+def on_post_liked(post: Post, liker_id: int, delta: int) -> None:
+    """delta is +1 for a like, -1 for an unlike"""
+    bump(post.author_id, touch=False, likes_received=delta)
+    touch(liker_id)
+
+
+def on_blog_post_created(post: BlogPost) -> None:
+    bump(post.author_id, blog_posts_count=1,
+         activity=_activity('blog', post.id, post.id, post.title, post.created_at))
+
+
+def on_blog_post_deleted(post: BlogPost) -> None:
+    """Call before deleting a blog post; its comments go with it."""
+    comments = dict(db.session.execute(
+        select(Comment.author_id, func.count(Comment.id)).where(Comment.blog_id == post.id).group_by(Comment.author_id)
+    ).all())
+    for user_id in set(comments) | {post.author_id}:
+        bump(user_id, touch=False, forget=(BLOG_KINDS, post.id),
+             comments_count=-comments.get(user_id, 0),
+             blog_posts_count=-1 if user_id == post.author_id else 0)
+
+
+def on_comment_created(comment: Comment, post: BlogPost) -> None:
+    bump(comment.author_id, comments_count=1,
+         activity=_activity('comment', comment.id, post.id, post.title, comment.created_at))
+
+
+def on_comment_deleted(comment: Comment) -> None:
+    bump(comment.author_id, touch=False, comments_count=-1)
+    row = db.session.get(UserStats, comment.author_id)
+    if row is not None and row.latest:
+        row.latest = [a for a in row.latest if (a['kind'], a['id']) != ('comment', comment.id)]
+
+
+def on_order_created(order: Order) -> None:
+    bump(order.user_id, orders_count=1)
+
+
+# --- rebuild ---------------------------------------------------------------
+
+def _grouped(stmt, key_col, user_ids: Optional[List[int]]):
+    if user_ids is not None:
+        stmt = stmt.where(key_col.in_(user_ids))
+    return db.session.execute(stmt.group_by(key_col)).all()
+
+
+def _latest(stmt, key_col, order_col, user_ids: Optional[List[int]]):
+    """Top LATEST_ACTIVITY_SIZE rows per user via ROW_NUMBER()"""
+    rn = func.row_number().over(partition_by=key_col, order_by=order_col.desc()).label('rn')
+    if user_ids is not None:
+        stmt = stmt.where(key_col.in_(user_ids))
+    sub = stmt.add_columns(rn).subquery()
+    return db.session.execute(select(sub).where(sub.c.rn <= LATEST_ACTIVITY_SIZE)).all()
+
+
+def compute(user_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict]:
+    """Recompute stats rows from source tables (one grouped query per source)."""
+    ids = list(user_ids) if user_ids is not None else None
+    stmt = select(User.id)
+    if ids is not None:
+        stmt = stmt.where(User.id.in_(ids))
+    rows = {uid: _empty(uid) for uid in db.session.execute(stmt).scalars()}
+
+    def seen(uid, at):
+        if uid in rows and at is not None:
+            cur = rows[uid]['last_active']
+            rows[uid]['last_active'] = at if cur is None or at > cur else cur
+
+    sources = (
+        ('posts_count', Post.author_id, Post.id, Post.created_at),
+        ('threads_count', Thread.author_id, Thread.id, Thread.created_at),
+        ('blog_posts_count', BlogPost.author_id, BlogPost.id, BlogPost.created_at),
+        ('comments_count', Comment.author_id, Comment.id, Comment.created_at),
+        ('orders_count', Order.user_id, Order.id, Order.created_at),
+    )
+    for counter, key_col, id_col, at_col in sources:
+        for uid, n, at in _grouped(select(key_col, func.count(id_col), func.max(at_col)), key_col, ids):
+            if uid in rows:
+                rows[uid][counter] = n
+                seen(uid, at)
+    # Receiving messages is not activity of the receiver, so it doesn't move last_active
+    for uid, n in _grouped(select(Message.receiver_id, func.count(Message.id)).where(Message.read.is_(False)),
+                           Message.receiver_id, ids):
+        if uid in rows:
+            rows[uid]['unread_messages'] = n
+    for uid, at in _grouped(select(PostLike.user_id, func.max(PostLike.created_at)), PostLike.user_id, ids):
+        seen(uid, at)
+    for uid, n in _grouped(select(Post.author_id, func.count(PostLike.id)).join(PostLike, PostLike.post_id == Post.id),
+                           Post.author_id, ids):
+        if uid in rows:
+            rows[uid]['likes_received'] = n
+
+    # Opening posts are represented by their thread entry
+    first_post = select(func.min(Post.id)).where(Post.thread_id == Thread.id).correlate(Thread).scalar_subquery()
+    latest = defaultdict(list)
+    feeds = (
+        ('thread', select(Thread.author_id.label('uid'), Thread.id, Thread.id.label('ref'), Thread.title,
+                          Thread.created_at), Thread.author_id, Thread.created_at),
+        ('post', select(Post.author_id.label('uid'), Post.id, Thread.id.label('ref'), Thread.title, Post.created_at)
+                 .join(Thread, Thread.id == Post.thread_id).where(Post.id != first_post), Post.author_id, Post.created_at),
+        ('blog', select(BlogPost.author_id.label('uid'), BlogPost.id, BlogPost.id.label('ref'), BlogPost.title,
+                        BlogPost.created_at), BlogPost.author_id, BlogPost.created_at),
+        ('comment', select(Comment.author_id.label('uid'), Comment.id, BlogPost.id.label('ref'), BlogPost.title,
+                           Comment.created_at).join(BlogPost, BlogPost.id == Comment.blog_id),
+         Comment.author_id, Comment.created_at),
+    )
+    for kind, stmt, key_col, at_col in feeds:
+        for uid, obj_id, ref, title, at, _rn in _latest(stmt, key_col, at_col, ids):
+            latest[uid].append(_activity(kind, obj_id, ref, title, at))
+    for uid, items in latest.items():
+        if uid in rows:
+            items.sort(key=lambda a: a['at'], reverse=True)
+            rows[uid]['latest'] = items[:LATEST_ACTIVITY_SIZE]
+    return rows
+
+
+def _empty(user_id: int) -> Dict:
+    return dict({c: 0 for c in COUNTERS}, user_id=user_id, last_active=None, latest=[])
+
+
+def rebuild_user(user_id: int) -> UserStats:
+    """Recompute one user's row (does not commit)."""
+    values = compute([user_id]).get(user_id) or _empty(user_id)
+    row = db.session.get(UserStats, user_id)
+    if row is None:
+        row = UserStats(user_id=user_id)
+        db.session.add(row)
+    for name, value in values.items():
+        setattr(row, name, value)
+    db.session.flush()
+    return row
+
+
+def rebuild_all(batch_size: int = 1000) -> int:
+    """Replace every stats row from source tables; returns the number of users."""
+    rows = list(compute().values())
+    db.session.execute(delete(UserStats))
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(insert(UserStats), rows[start:start + batch_size])
+    db.session.commit()
+    db.session.expire_all()
+    return len(rows)
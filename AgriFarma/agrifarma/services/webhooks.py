@@ -0,0 +1,202 @@
+"""Inbound payment webhook queue.
+
+The HTTP endpoint only verifies the signature, appends the raw delivery to
+``webhook_events`` and answers 200, so gateway connections are never held
+open by order processing. ``process_pending`` (run by ``flask webhooks work``)
+drains the table in id order, dedupes by event id (enforced by the unique
+constraint at insert) and applies payment state transitions with bulk
+updates, reporting ingestion-to-apply lag. Each batch is first claimed with
+a conditional ``UPDATE ... SET status='processing' WHERE status='pending'``,
+so concurrent workers never apply the same event twice; a claim left behind
+by a crashed worker is taken over after ``CLAIM_TIMEOUT``. An order that failed and is then
+paid takes its stock back (or goes on hold) in ``apply_payment_statuses``.
+"""
+from __future__ import annotations
+from collections import defaultdict
+from datetime import datetime, timedelta, UTC
+from typing import Dict, List, Tuple
+
+from flask import current_app
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Order
+from agrifarma.models.webhook import WebhookEvent
+from agrifarma.services.payment import get_payment_gateway
+from agrifarma.services.reconciliation import apply_payment_statuses
+
+PROVIDERS = ("stripe", "jazzcash", "mock")
+
+# How long a worker's claim on a batch lasts before another worker may take it over
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+# (current payment_status, webhook target) pairs we accept; anything else is
+# a late or out-of-order delivery and is ignored.
+ALLOWED_TRANSITIONS = {
+    ('Pending', 'Paid'),
+    ('Pending', 'Failed'),
+    ('Failed', 'Paid'),
+    ('Paid', 'Refunded'),
+}
+
+
+def _now() -> datetime:
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def provider_enabled(provider: str) -> bool:
+    if provider not in PROVIDERS:
+        return False
+    if provider == 'mock':
+        # only when mock payments are in use and a dedicated signing secret is configured
+        return (current_app.config.get('PAYMENT_GATEWAY', 'mock').lower() == 'mock'
+                and bool(current_app.config.get('MOCK_WEBHOOK_SECRET')))
+    return True
+
+
+def ingest(provider: str, body: bytes, headers: Dict[str, str]) -> Tuple[int, str]:
+    """
+    Verify and store one delivery
+
+    Returns:
+        (http_status, message) for the endpoint to send back
+    """
+    if not provider_enabled(provider):
+        return 404, 'unknown provider'
+    try:
+        event = get_payment_gateway(provider).parse_webhook(body, headers)
+    except (ValueError, KeyError, UnicodeDecodeError) as exc:
+        current_app.logger.warning(f"[webhook:{provider}] malformed payload: {exc}")
+        return 400, 'malformed payload'
+    if event is None:
+        current_app.logger.warning(f"[webhook:{provider}] bad signature")
+        return 400, 'invalid signature'
+
+    db.session.add(WebhookEvent(
+        provider=provider,
+        event_id=str(event['event_id'])[:128],
+        event_type=(event.get('event_type') or '')[:64],
+        payment_status=event.get('payment_status'),
+        transaction_id=event.get('transaction_id'),
+        order_id=event.get('order_id'),
+        payload=body.decode('utf-8', errors='replace'),
+        received_at=_now(),
+    ))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return 200, 'duplicate'
+    return 200, 'queued'
+
+
+def _claim(batch_size: int) -> List[WebhookEvent]:
+    """Mark up to ``batch_size`` pending events as this worker's (commits); returns them in id order."""
+    now = _now()
+    claimable = or_(
+        WebhookEvent.status == 'pending',
+        and_(WebhookEvent.status == 'processing', WebhookEvent.processed_at < now - CLAIM_TIMEOUT),
+    )
+    ids = db.session.execute(
+        select(WebhookEvent.id).where(claimable).order_by(WebhookEvent.id).limit(batch_size)
+    ).scalars().all()
+    if not ids:
+        return []
+    # re-checked in the UPDATE: rows another worker claimed in the meantime don't match
+    claimed = db.session.execute(
+        update(WebhookEvent).where(WebhookEvent.id.in_(ids), claimable)
+        .values(status='processing', processed_at=now)
+        .returning(WebhookEvent.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.session.commit()
+    if not claimed:
+        return []
+    return WebhookEvent.query.filter(WebhookEvent.id.in_(claimed)).order_by(WebhookEvent.id).all()
+
+
+def process_pending(batch_size: int = 200) -> Dict:
+    """
+    Apply one batch of pending events
+
+    Returns:
+        Stats dict: processed, applied, ignored, errors, max_lag, avg_lag (seconds)
+    """
+    stats = {'processed': 0, 'applied': 0, 'ignored': 0, 'errors': 0, 'max_lag': 0.0, 'avg_lag': 0.0}
+    events = _claim(batch_size)
+    if not events:
+        return stats
+
+    # Resolve orders for events that only carry a transaction id (one query)
+    missing = {e.transaction_id for e in events if e.order_id is None and e.transaction_id}
+    by_txn = dict(db.session.execute(
+        select(Order.payment_transaction_id, Order.id).where(Order.payment_transaction_id.in_(missing))
+    ).all()) if missing else {}
+    order_ids = {e.order_id or by_txn.get(e.transaction_id) for e in events} - {None}
+    current = dict(db.session.execute(
+        select(Order.id, Order.payment_status).where(Order.id.in_(order_ids))
+    ).all()) if order_ids else {}
+
+    # Walk events in arrival order against an in-memory copy of the state
+    state = dict(current)
+    outcome: Dict[str, List[int]] = defaultdict(list)
+    errors: Dict[int, str] = {}
+    transaction_ids: Dict[int, str] = {}
+    for e in events:
+        order_id = e.order_id or by_txn.get(e.transaction_id)
+        if order_id not in state:
+            outcome['error'].append(e.id)
+            errors[e.id] = 'order not found'
+            continue
+        target = e.payment_status
+        if target and (state[order_id], target) in ALLOWED_TRANSITIONS:
+            state[order_id] = target
+            outcome['applied'].append(e.id)
+            if e.transaction_id:
+                transaction_ids[order_id] = e.transaction_id
+        else:
+            outcome['ignored'].append(e.id)
+
+    fixes: Dict[str, List[int]] = defaultdict(list)
+    for order_id, status in state.items():
+        if status != current[order_id]:
+            fixes[status].append(order_id)
+
+    now = _now()
+    for status, ids in outcome.items():
+        db.session.execute(
+            update(WebhookEvent).where(WebhookEvent.id.in_(ids))
+            .values(status=status, processed_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    for event_id, message in errors.items():
+        db.session.execute(update(WebhookEvent).where(WebhookEvent.id == event_id).values(error=message))
+    if transaction_ids:
+        # the gateway's id replaces whatever reference checkout stored, so refunds and reconciliation can use it
+        db.session.execute(update(Order), [
+            {'id': order_id, 'payment_transaction_id': txn[:128]} for order_id, txn in transaction_ids.items()
+        ])
+    apply_payment_statuses(fixes)  # commits the orders, their stock and the event markers
+
+    lags = [max(0.0, (now - e.received_at).total_seconds()) for e in events]
+    stats.update(
+        processed=len(events),
+        applied=len(outcome['applied']),
+        ignored=len(outcome['ignored']),
+        errors=len(outcome['error']),
+        max_lag=round(max(lags), 3),
+        avg_lag=round(sum(lags) / len(lags), 3),
+    )
+    return stats
+
+
+def lag_metrics() -> Dict:
+    """Queue depth and how long the oldest pending event has been waiting."""
+    pending, oldest = db.session.execute(
+        select(func.count(WebhookEvent.id), func.min(WebhookEvent.received_at)).where(WebhookEvent.status == 'pending')
+    ).one()
+    return {
+        'pending': int(pending or 0),
+        'oldest_pending_seconds': round((_now() - oldest).total_seconds(), 3) if oldest else 0.0,
+    }
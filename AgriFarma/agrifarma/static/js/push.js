@@ -0,0 +1,53 @@
+// Live notifications for AgriFarma: new messages, forum replies, order updates
+(function(){
+  const script = document.currentScript;
+  if (!script || !window.EventSource) return;
+  const streamUrl = script.dataset.stream;
+  const links = { message: script.dataset.inbox, order: script.dataset.orders };
+  const toasts = document.getElementById('af-toasts');
+  const badge = document.getElementById('af-unread-badge');
+
+  function toast(text, href, tone){
+    if (!toasts) return;
+    const el = document.createElement(href ? 'a' : 'div');
+    el.className = 'af-alert af-alert-' + (tone || 'info');
+    el.textContent = text;
+    if (href) el.href = href;
+    toasts.appendChild(el);
+    setTimeout(function(){ el.remove(); }, 8000);
+  }
+
+  function bumpBadge(){
+    if (!badge) return;
+    badge.textContent = String((parseInt(badge.textContent, 10) || 0) + 1);
+    badge.classList.remove('d-none');
+  }
+
+  function parse(e){
+    try { return JSON.parse(e.data); } catch (err) { return {}; }
+  }
+
+  // EventSource reconnects on its own (after the server's retry: hint) and
+  // resends Last-Event-ID, so missed events are replayed by the server.
+  const source = new EventSource(streamUrl);
+
+  source.addEventListener('message', function(e){
+    const d = parse(e);
+    bumpBadge();
+    toast('New message: ' + (d.subject || ''), links.message, 'info');
+  });
+
+  source.addEventListener('reply', function(e){
+    const d = parse(e);
+    toast('New reply in "' + (d.title || 'your thread') + '"', d.url, 'success');
+  });
+
+  source.addEventListener('order', function(e){
+    const d = parse(e);
+    const failed = d.payment_status === 'Failed';
+    toast('Order #' + d.order_id + ': payment ' + (d.payment_status || 'updated').toLowerCase(),
+          links.order, failed ? 'danger' : 'success');
+  });
+
+  window.addEventListener('beforeunload', function(){ source.close(); });
+})();
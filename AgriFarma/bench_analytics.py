@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Benchmark for the vectorized analytics helpers.
+
+Compares the old per-object Python aggregations against the NumPy versions
+on synthetic data, then times the database-backed variants, which stream only
+the timestamp/amount columns, against loading full ORM objects.
+
+Usage:
+  python bench_analytics.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, UTC
+from types import SimpleNamespace
+
+from sqlalchemy import insert
+
+from agrifarma import create_app
+from agrifarma.extensions import db
+from agrifarma.models.user import User
+from agrifarma.models.ecommerce import Order
+from agrifarma.services import analytics
+
+
+def build_app(db_path):
+    class BenchConfig:
+        TESTING = True
+        SECRET_KEY = "bench"
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+    return create_app(BenchConfig)
+
+
+def legacy_by_day(users):
+    counts = defaultdict(int)
+    for u in users:
+        if getattr(u, 'join_date', None):
+            counts[u.join_date.date()] += 1
+    return [{'date': d.isoformat(), 'count': counts[d]} for d in sorted(counts)]
+
+
+def legacy_top_n(items, key, n):
+    safe = [i for i in items if isinstance(i.get(key), (int, float))]
+    return sorted(safe, key=lambda x: x.get(key, 0), reverse=True)[:n]
+
+
+def timed(label, fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    print(f"  {label:<44} {time.perf_counter() - started:8.3f}s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="users and orders to generate")
+    parser.add_argument("--days", type=int, default=365, help="spread of the timestamps")
+    parser.add_argument("--skip-db", action="store_true", help="only run the in-memory comparison")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    now = datetime.now(UTC).replace(tzinfo=None)
+    stamps = [now - timedelta(seconds=rng.randrange(args.days * 86400)) for _ in range(args.rows)]
+    users = [SimpleNamespace(join_date=ts) for ts in stamps]
+    rows = [{'product_id': i, 'revenue': rng.random() * 1000} for i in range(args.rows)]
+
+    print(f"In memory, {args.rows:,} rows")
+    old = timed("per-day counts (python loop)", legacy_by_day, users)
+    new = timed("per-day counts (count_registrations_by_day)", analytics.count_registrations_by_day, users)
+    assert old == new
+    ts = timed("to_datetime64", analytics.to_datetime64, stamps)
+    timed("bincount by day", analytics.bucket_counts, ts)
+    timed("bincount by week", analytics.bucket_counts, ts, freq='week')
+    timed("bincount by month", analytics.bucket_counts, ts, freq='month')
+    _, daily = analytics.bucket_counts(ts)
+    timed("7-day rolling mean", analytics.rolling_mean, daily, 7)
+    old = timed("top 10 (full sort)", legacy_top_n, rows, 'revenue', 10)
+    new = timed("top 10 (top_n, partial selection)", analytics.top_n, rows, 'revenue', 10)
+    assert old == new
+    values = [r['revenue'] for r in rows]
+    timed("top 10 indices (top_k on a list)", analytics.top_k, values, 10)
+
+    if args.skip_db:
+        return
+    fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        app = build_app(db_path)
+        with app.app_context():
+            print(f"\nSQLite, {args.rows:,} users and orders")
+            started = time.perf_counter()
+            db.session.execute(insert(User), [
+                {'email': f'bench{i}@example.com', 'password_hash': 'x', 'role': 'User', 'join_date': ts}
+                for i, ts in enumerate(stamps)
+            ])
+            db.session.execute(insert(Order), [
+                {'user_id': 1, 'shipping_address': 'x', 'payment_method': 'COD', 'payment_status': 'Paid',
+                 'status': 'Pending', 'total_amount': round(rng.random() * 500, 2), 'created_at': ts}
+                for ts in stamps
+            ])
+            db.session.commit()
+            print(f"  {'(seeding)':<44} {time.perf_counter() - started:8.3f}s")
+
+            start = datetime.combine(now.date() - timedelta(days=args.days), datetime.min.time(), UTC)
+            old = timed("ORM users + count_registrations_by_day",
+                        lambda: analytics.count_registrations_by_day(User.query.filter(User.join_date >= start).all()))
+            db.session.expunge_all()
+            labels, counts = timed("registration_counts (streamed column)", analytics.registration_counts, start)
+            assert {r['date']: r['count'] for r in old} == {r['date']: r['count'] for r in analytics.as_series(labels, counts, nonzero=True)}
+            timed("registration_counts by month", analytics.registration_counts, start, freq='month')
+            _, orders, revenue = timed("order_counts (streamed columns)", analytics.order_counts, start)
+            assert int(orders.sum()) == args.rows
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == "__main__":
+    main()
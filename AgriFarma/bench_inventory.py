@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Contention benchmark for checkout stock reservation.
+
+Spawns many threads that all try to buy the same products at once against a
+file-backed SQLite database and checks that no unit is ever oversold.
+
+Usage:
+  python bench_inventory.py --threads 16 --attempts 200 --stock 500
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+from werkzeug.security import generate_password_hash
+
+from agrifarma import create_app
+from agrifarma.extensions import db
+from agrifarma.models.user import User
+from agrifarma.models.ecommerce import Product, Order, StockMovement
+from agrifarma.services import inventory
+
+
+def build_app(db_path):
+    class BenchConfig:
+        TESTING = True
+        SECRET_KEY = "bench"
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        SQLALCHEMY_ENGINE_OPTIONS = {"connect_args": {"timeout": 30, "check_same_thread": False}}
+    return create_app(BenchConfig)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--attempts", type=int, default=200, help="orders attempted per thread")
+    parser.add_argument("--stock", type=int, default=500, help="starting units per product")
+    parser.add_argument("--products", type=int, default=3)
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    app = build_app(db_path)
+    with app.app_context():
+        buyer = User(email="bench@example.com", password_hash=generate_password_hash("x"), role="User")
+        db.session.add(buyer)
+        db.session.flush()
+        product_ids = []
+        for i in range(args.products):
+            p = Product(name=f"Bench {i}", price=1, seller_id=buyer.id, inventory=args.stock, status="Active")
+            db.session.add(p)
+            db.session.flush()
+            product_ids.append(p.id)
+        db.session.commit()
+        buyer_id = buyer.id
+
+    stats = {"ok": 0, "short": 0, "busy": 0}
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        with app.app_context():
+            for _ in range(args.attempts):
+                lines = [(pid, rng.randint(1, 3)) for pid in rng.sample(product_ids, rng.randint(1, len(product_ids)))]
+                try:
+                    order = Order(user_id=buyer_id, shipping_address="bench", payment_method="COD")
+                    db.session.add(order)
+                    db.session.flush()
+                    res = inventory.reserve_order_stock(order.id, lines)
+                    if res.success:
+                        db.session.commit()
+                        key = "ok"
+                    else:
+                        db.session.rollback()
+                        key = "short"
+                except OperationalError:
+                    db.session.rollback()
+                    key = "busy"
+                with lock:
+                    stats[key] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        remaining = {p.id: p.inventory for p in Product.query.all()}
+        ledger = dict(
+            db.session.query(StockMovement.product_id, db.func.sum(StockMovement.delta))
+            .group_by(StockMovement.product_id).all()
+        )
+        db.engine.dispose()
+    os.remove(db_path)
+
+    attempts = args.threads * args.attempts
+    print("=" * 60)
+    print(f"Threads: {args.threads}  Attempts: {attempts}  Elapsed: {elapsed:.2f}s")
+    print(f"Throughput: {attempts / elapsed:,.0f} reservations/s")
+    print(f"Reserved: {stats['ok']}  Short: {stats['short']}  Lock timeouts: {stats['busy']}")
+    oversold = False
+    for pid in product_ids:
+        sold = -int(ledger.get(pid) or 0)
+        left = remaining[pid]
+        oversold |= left < 0 or sold + left != args.stock
+        print(f"  product {pid}: sold={sold} left={left}")
+    print("❌ OVERSOLD" if oversold else "✅ No oversell")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
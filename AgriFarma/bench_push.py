@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Connection benchmark for the server-sent event push stream.
+
+Starts the app on a threaded WSGI server, opens many concurrent
+/events/stream connections for one signed-in user, publishes events onto the
+bus and measures how long delivery takes to every stream. Also checks that
+the connection cap answers 503 instead of tying up another worker thread.
+
+Usage:
+  python bench_push.py --connections 100 --events 50
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+
+from agrifarma import create_app
+from agrifarma.extensions import db
+from agrifarma.models.user import User
+from agrifarma.services import push
+
+
+def build_app(db_path, connections):
+    class BenchConfig:
+        TESTING = True
+        SECRET_KEY = "bench"
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        SQLALCHEMY_ENGINE_OPTIONS = {"connect_args": {"timeout": 30, "check_same_thread": False}}
+        PUSH_MAX_CONNECTIONS = connections
+        PUSH_HEARTBEAT_SECONDS = 5
+        PUSH_STREAM_MAX_SECONDS = 600
+    return create_app(BenchConfig)
+
+
+def login(port):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    body = urlencode({"email": "bench@example.com", "password": "x"})
+    conn.request("POST", "/login", body, {"Content-Type": "application/x-www-form-urlencoded"})
+    resp = conn.getresponse()
+    resp.read()
+    cookie = resp.getheader("Set-Cookie", "").split(";", 1)[0]
+    conn.close()
+    return cookie
+
+
+def open_stream(port, cookie):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    conn.request("GET", "/events/stream", headers={"Cookie": cookie, "Accept": "text/event-stream"})
+    return conn, conn.getresponse()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.01, help="seconds between published events")
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    app = build_app(db_path, args.connections)
+    with app.app_context():
+        user = User(email="bench@example.com", password_hash=generate_password_hash("x"), role="User")
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        bus = push.get_bus()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    port = server.server_port
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cookie = login(port)
+
+    latencies, lock = [], threading.Lock()
+    received = [0] * args.connections
+    ready = threading.Barrier(args.connections + 1)
+    connect_times = []
+
+    def reader(idx):
+        started = time.perf_counter()
+        conn, resp = open_stream(port, cookie)
+        with lock:
+            connect_times.append(time.perf_counter() - started)
+        ready.wait()
+        try:
+            while received[idx] < args.events:
+                line = resp.readline()
+                if not line:
+                    break
+                if line.startswith(b"data: "):
+                    sent = json.loads(line[6:])["sent"]
+                    with lock:
+                        latencies.append(time.perf_counter() - sent)
+                    received[idx] += 1
+        finally:
+            conn.close()
+
+    readers = [threading.Thread(target=reader, args=(i,), daemon=True) for i in range(args.connections)]
+    for t in readers:
+        t.start()
+    ready.wait()
+    open_streams = bus.stats()["connections"]
+
+    # one more stream than the cap allows must be refused, not queued
+    conn, resp = open_stream(port, cookie)
+    refused = resp.status
+    conn.close()
+
+    started = time.perf_counter()
+    for _ in range(args.events):
+        bus.publish(user_id, "message", {"sent": time.perf_counter()})
+        time.sleep(args.interval)
+    for t in readers:
+        t.join(timeout=30)
+    elapsed = time.perf_counter() - started
+
+    server.shutdown()
+    with app.app_context():
+        db.engine.dispose()
+    os.remove(db_path)
+
+    expected = args.connections * args.events
+    delivered = sum(received)
+    latencies.sort()
+    print("=" * 60)
+    print(f"Streams: {args.connections} (open on bus: {open_streams})  Events: {args.events}  Elapsed: {elapsed:.2f}s")
+    print(f"Connect: median {statistics.median(connect_times) * 1000:.1f} ms  max {max(connect_times) * 1000:.1f} ms")
+    print(f"Delivered: {delivered}/{expected} ({delivered / elapsed:,.0f} events/s)")
+    if latencies:
+        p50 = latencies[len(latencies) // 2]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"Latency: p50 {p50 * 1000:.2f} ms  p95 {p95 * 1000:.2f} ms  max {latencies[-1] * 1000:.2f} ms")
+    print(f"Over-cap stream answered: {refused}")
+    ok = delivered == expected and refused == 503
+    print("✅ All events delivered, cap enforced" if ok else "❌ Lost events or cap not enforced")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
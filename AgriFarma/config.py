@@ -30,19 +30,98 @@ class Config:
     # Payment Configuration
     PAYMENT_GATEWAY = os.getenv('PAYMENT_GATEWAY', 'mock')  # mock, stripe, jazzcash
     
+    # HMAC key for /webhooks/mock deliveries; mock webhooks are refused while it is unset
+    MOCK_WEBHOOK_SECRET = os.getenv('MOCK_WEBHOOK_SECRET', '')
+    
     # Stripe Configuration (if using Stripe)
     PAYMENT_STRIPE_CONFIG = {
         'api_key': os.getenv('STRIPE_SECRET_KEY', ''),
-        'publishable_key': os.getenv('STRIPE_PUBLISHABLE_KEY', '')
+        'publishable_key': os.getenv('STRIPE_PUBLISHABLE_KEY', ''),
+        'base_url': os.getenv('STRIPE_BASE_URL', 'https://api.stripe.com'),
+        'timeout': float(os.getenv('STRIPE_TIMEOUT', 10)),
+        'max_retries': int(os.getenv('STRIPE_MAX_RETRIES', 2)),
+        'webhook_secret': os.getenv('STRIPE_WEBHOOK_SECRET', ''),
     }
     
     # JazzCash Configuration (if using JazzCash)
     PAYMENT_JAZZCASH_CONFIG = {
         'merchant_id': os.getenv('JAZZCASH_MERCHANT_ID', ''),
         'password': os.getenv('JAZZCASH_PASSWORD', ''),
-        'integrity_salt': os.getenv('JAZZCASH_INTEGRITY_SALT', '')
+        'integrity_salt': os.getenv('JAZZCASH_INTEGRITY_SALT', ''),
+        'base_url': os.getenv('JAZZCASH_BASE_URL', 'https://sandbox.jazzcash.com.pk'),
+        'timeout': float(os.getenv('JAZZCASH_TIMEOUT', 15)),
+        'max_retries': int(os.getenv('JAZZCASH_MAX_RETRIES', 2)),
     }
     
+    # Keep-alive connections kept per gateway host (shared by all gateways)
+    PAYMENT_HTTP_POOL_SIZE = int(os.getenv('PAYMENT_HTTP_POOL_SIZE', 10))
+    
+    # How long checkout/payment idempotency keys replay their stored result
+    IDEMPOTENCY_WINDOW_SECONDS = int(os.getenv('IDEMPOTENCY_WINDOW_SECONDS', 24 * 60 * 60))
+    
+    # Forum thread pages; streaming sends the first posts before the page is fully rendered
+    FORUM_POSTS_PER_PAGE = int(os.getenv('FORUM_POSTS_PER_PAGE', 25))
+    FORUM_STREAM_THREADS = os.getenv('FORUM_STREAM_THREADS', 'False').lower() in ('true', '1', 'yes')
+    
+    # Seconds the in-process forum category tree snapshot may be reused (other processes' edits)
+    CATEGORY_TREE_TTL = int(os.getenv('CATEGORY_TREE_TTL', 300))
+    
+    # Seconds a viewer's liked-post ids stay cached in-process (0 disables); kept short
+    # because other worker processes don't see this process's toggles
+    LIKE_STATE_CACHE_TTL = int(os.getenv('LIKE_STATE_CACHE_TTL', 5))
+    
+    # Hours for a like/comment/reply to lose half its weight in "hot" and trending rankings
+    HOT_SCORE_HALF_LIFE_HOURS = float(os.getenv('HOT_SCORE_HALF_LIFE_HOURS', 36))
+    
+    # Server-sent event push. Off by default: every open tab holds a worker for up to
+    # PUSH_STREAM_MAX_SECONDS, and the event bus lives in one process, so only enable it
+    # on a single threaded or gevent worker (see README "Live notifications").
+    PUSH_ENABLED = os.getenv('PUSH_ENABLED', 'False').lower() in ('true', '1', 'yes')
+    # Heartbeat interval, open-stream cap (each holds a worker thread), stream
+    # lifetime before the browser reconnects, per-stream queue
+    PUSH_HEARTBEAT_SECONDS = float(os.getenv('PUSH_HEARTBEAT_SECONDS', 15))
+    PUSH_MAX_CONNECTIONS = int(os.getenv('PUSH_MAX_CONNECTIONS', 200))
+    PUSH_STREAM_MAX_SECONDS = float(os.getenv('PUSH_STREAM_MAX_SECONDS', 300))
+    PUSH_QUEUE_SIZE = int(os.getenv('PUSH_QUEUE_SIZE', 100))
+    
+    # Product recommendations: neighbours stored per product, and the largest
+    # basket (distinct products) that still counts as a co-purchase signal
+    RECOMMENDATIONS_PER_PRODUCT = int(os.getenv('RECOMMENDATIONS_PER_PRODUCT', 10))
+    RECOMMENDATIONS_MAX_BASKET = int(os.getenv('RECOMMENDATIONS_MAX_BASKET', 50))
+    
+    # Seconds the shop facet snapshot may serve counts before a rebuild, to pick
+    # up product writes made by other processes (own writes invalidate it at once)
+    CATALOG_FACETS_TTL = int(os.getenv('CATALOG_FACETS_TTL', 60))
+    
+    # Approved reviews shown per page on the product detail page
+    REVIEWS_PER_PAGE = int(os.getenv('REVIEWS_PER_PAGE', 10))
+    
+    # IANA time zone report and order-history dates are entered in (e.g. Asia/Karachi)
+    REPORT_TIMEZONE = os.getenv('REPORT_TIMEZONE', 'UTC')
+    
+    # Join-week cohorts shown in the retention grid on /admin/reports
+    COHORT_REPORT_WEEKS = int(os.getenv('COHORT_REPORT_WEEKS', 12))
+    # Seconds between cohort refreshes run by each worker's tracking flush thread (0 = CLI only)
+    COHORT_REFRESH_SECONDS = float(os.getenv('COHORT_REFRESH_SECONDS', 300))
+    
+    # View tracking: events each worker buffers in memory before the oldest are
+    # dropped, rows per insert batch, and seconds between background flushes
+    TRACKING_BUFFER_SIZE = int(os.getenv('TRACKING_BUFFER_SIZE', 10000))
+    TRACKING_BATCH_SIZE = int(os.getenv('TRACKING_BATCH_SIZE', 500))
+    TRACKING_FLUSH_SECONDS = float(os.getenv('TRACKING_FLUSH_SECONDS', 5))
+    
+    # Demand forecasting (flask forecast refresh): days of paid sales fitted, exponential
+    # smoothing factor, restock lead time in days and the safety-stock z-score (1.65 ~ 95%)
+    FORECAST_HISTORY_DAYS = int(os.getenv('FORECAST_HISTORY_DAYS', 90))
+    FORECAST_ALPHA = float(os.getenv('FORECAST_ALPHA', 0.3))
+    FORECAST_LEAD_TIME_DAYS = float(os.getenv('FORECAST_LEAD_TIME_DAYS', 7))
+    FORECAST_SERVICE_Z = float(os.getenv('FORECAST_SERVICE_Z', 1.65))
+    
+    # Bulk product import: rows validated and written per transaction, and the most
+    # diff/error entries kept in a job's report (counts are always complete)
+    CATALOG_IMPORT_CHUNK_SIZE = int(os.getenv('CATALOG_IMPORT_CHUNK_SIZE', 500))
+    CATALOG_IMPORT_REPORT_LIMIT = int(os.getenv('CATALOG_IMPORT_REPORT_LIMIT', 1000))
+    
     # Low inventory threshold for alerts
     LOW_INVENTORY_THRESHOLD = int(os.getenv('LOW_INVENTORY_THRESHOLD', 5))
 
@@ -0,0 +1,35 @@
+"""
+Database Migration: Index blog post tags in normalized tags / blog_post_tags tables
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from agrifarma.services import tags as tag_service
+from config import DevelopmentConfig
+
+def migrate_blog_tags():
+    """Create the tag tables (via create_all) and backfill them from blog_posts.tags"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            try:
+                tables = {row[0] for row in conn.execute(db.text("SELECT name FROM sqlite_master WHERE type='table'"))}
+                for table in ("tags", "blog_post_tags"):
+                    if table not in tables:
+                        raise RuntimeError(f"{table} table is missing; create_all should have created it")
+                    print(f"✓ {table} table present")
+                conn.execute(db.text("CREATE INDEX IF NOT EXISTS ix_blog_post_tags_tag_blog ON blog_post_tags (tag_id, blog_id)"))
+                conn.execute(db.text("CREATE INDEX IF NOT EXISTS ix_tags_post_count ON tags (post_count)"))
+                print("✓ Tag indexes present")
+                conn.commit()
+            except Exception as e:
+                print(f"\n❌ Migration failed: {str(e)}")
+                conn.rollback()
+                raise
+
+        tagged = tag_service.rebuild_index()
+        print(f"✓ Indexed tags for {tagged} blog posts")
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_blog_tags()
@@ -0,0 +1,48 @@
+"""
+Database Migration: Index products for faceted browsing and normalize legacy categories
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import PRODUCT_CATEGORIES
+from config import DevelopmentConfig
+
+INDEXES = [
+    ("ix_products_status_category_name", "products (status, category, name)"),
+    ("ix_products_status_price", "products (status, price)"),
+]
+
+# Values the old ProductForm offered, mapped onto the catalog categories
+LEGACY_CATEGORIES = {
+    "equipment": "Machinery",
+    "bio": "Soil Amendments",
+}
+
+def migrate_catalog_facets():
+    """Create the listing indexes and rewrite product categories to the canonical names"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            try:
+                for name, target in INDEXES:
+                    conn.execute(db.text(f"CREATE INDEX IF NOT EXISTS {name} ON {target}"))
+                    print(f"✓ {name} present")
+
+                mapping = dict(LEGACY_CATEGORIES)
+                mapping.update({c.lower(): c for c in PRODUCT_CATEGORIES})
+                for old, new in mapping.items():
+                    result = conn.execute(
+                        db.text("UPDATE products SET category = :new WHERE lower(category) = :old AND category != :new"),
+                        {"old": old, "new": new},
+                    )
+                    if result.rowcount:
+                        print(f"✓ Renamed {result.rowcount} products from '{old}' to '{new}'")
+                conn.commit()
+            except Exception as e:
+                print(f"\n❌ Migration failed: {str(e)}")
+                conn.rollback()
+                raise
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_catalog_facets()
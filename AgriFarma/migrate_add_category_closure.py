@@ -0,0 +1,32 @@
+"""
+Database Migration: Category closure table and thread listing index
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from agrifarma.services import category_tree
+from config import DevelopmentConfig
+
+def migrate_category_closure():
+    """Index threads by (category_id, created_at) and fill category_closure"""
+    app = create_app(DevelopmentConfig)  # create_all adds the category_closure table
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            try:
+                conn.execute(db.text(
+                    "CREATE INDEX IF NOT EXISTS ix_threads_category_created ON threads (category_id, created_at)"
+                ))
+                conn.commit()
+                print("✓ Index ix_threads_category_created in place")
+            except Exception as e:
+                print(f"\n❌ Migration failed: {str(e)}")
+                conn.rollback()
+                raise
+
+        links = category_tree.rebuild_closure()
+        db.session.commit()
+        print(f"✓ Wrote {links} category closure rows")
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_category_closure()
@@ -0,0 +1,42 @@
+"""
+Database Migration: Add rolled-up thread/post aggregates to forum categories
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from agrifarma.services import forum as forum_service
+from config import DevelopmentConfig
+
+COLUMNS = [
+    ("thread_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("post_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("last_post_at", "DATETIME"),
+    ("last_thread_id", "INTEGER"),
+]
+
+def migrate_category_stats():
+    """Add the aggregate columns to categories and fill them"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            try:
+                columns = {row[1] for row in conn.execute(db.text("PRAGMA table_info(categories)"))}
+                for name, ddl in COLUMNS:
+                    if name not in columns:
+                        print(f"Adding {name} column to categories table...")
+                        conn.execute(db.text(f"ALTER TABLE categories ADD COLUMN {name} {ddl}"))
+                        print(f"✓ Added {name} column")
+                    else:
+                        print(f"✓ {name} column already exists")
+                conn.commit()
+            except Exception as e:
+                print(f"\n❌ Migration failed: {str(e)}")
+                conn.rollback()
+                raise
+
+        fixed = forum_service.repair_category_stats()
+        print(f"✓ Filled aggregates for {fixed} categories")
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_category_stats()
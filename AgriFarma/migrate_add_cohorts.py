@@ -0,0 +1,30 @@
+"""
+Database Migration: Add cohort retention cells and weekly purchase funnel counters
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from agrifarma.services import cohorts
+from config import DevelopmentConfig
+
+TABLES = ["cohort_members", "cohort_cells", "cohort_runs", "funnel_weeks"]
+
+def migrate_cohorts():
+    """Create the cohort/funnel tables (via create_all) and fold existing users, posts and orders in"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        existing = set(db.inspect(db.engine).get_table_names())
+        for table in TABLES:
+            if table in existing:
+                print(f"✓ {table} table present")
+            else:
+                print(f"❌ {table} table missing after create_all")
+                raise SystemExit(1)
+
+        # first run counts everything; re-running only picks up new rows
+        run = cohorts.refresh(full=not any(cohorts.watermarks()))
+        print(f"✓ Counted {run.rows_processed} users and activity weeks")
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_cohorts()
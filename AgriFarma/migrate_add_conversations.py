@@ -0,0 +1,55 @@
+"""
+Database Migration: Group messages into conversations with unread counters
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from agrifarma.services import inbox
+from config import DevelopmentConfig
+
+COLUMNS = [
+    # (table, column, DDL)
+    ("message", "conversation_id", "INTEGER REFERENCES conversations (id) ON DELETE CASCADE"),
+    ("user_stats", "unread_messages", "INTEGER NOT NULL DEFAULT 0"),
+]
+
+INDEXES = [
+    ("ix_message_receiver_read_created", "message", "receiver_id, read, created_at"),
+    ("ix_message_conversation_created", "message", "conversation_id, created_at"),
+]
+
+# Covered by ix_message_receiver_read_created (receiver_id leads)
+DROPPED_INDEXES = ["ix_message_receiver_id"]
+
+def migrate_conversations():
+    """Add conversation columns and indexes, then thread existing messages"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            try:
+                for table, name, ddl in COLUMNS:
+                    columns = {row[1] for row in conn.execute(db.text(f"PRAGMA table_info({table})"))}
+                    if name not in columns:
+                        print(f"Adding {name} column to {table} table...")
+                        conn.execute(db.text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                        print(f"✓ Added {name} column")
+                    else:
+                        print(f"✓ {table}.{name} column already exists")
+                for name, table, columns in INDEXES:
+                    conn.execute(db.text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+                    print(f"✓ {name} on {table}({columns})")
+                for name in DROPPED_INDEXES:
+                    conn.execute(db.text(f"DROP INDEX IF EXISTS {name}"))
+                    print(f"✓ Dropped {name}")
+                conn.commit()
+            except Exception as e:
+                print(f"\n❌ Migration failed: {str(e)}")
+                conn.rollback()
+                raise
+
+        conversations = inbox.rebuild()
+        print(f"✓ Rebuilt {conversations} conversations and unread counters")
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_conversations()
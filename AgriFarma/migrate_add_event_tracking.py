@@ -0,0 +1,30 @@
+"""
+Database Migration: Add the page view / impression events table and its rollup counters
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from agrifarma.services import tracking
+from config import DevelopmentConfig
+
+TABLES = ["events", "event_daily_counts", "event_totals", "event_rollups"]
+
+def migrate_event_tracking():
+    """Create the tracking tables (via create_all) and roll up any events not yet counted"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        existing = set(db.inspect(db.engine).get_table_names())
+        for table in TABLES:
+            if table in existing:
+                print(f"✓ {table} table present")
+            else:
+                print(f"❌ {table} table missing after create_all")
+                raise SystemExit(1)
+
+        with db.engine.begin() as conn:
+            counted = tracking.rollup(conn)
+        print(f"✓ Rolled up {counted} events")
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_event_tracking()
@@ -0,0 +1,29 @@
+"""
+Database Migration: Add demand forecasts and inventory alerts
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from config import DevelopmentConfig
+
+TABLES = ["product_forecasts", "inventory_alerts", "forecast_runs"]
+
+def migrate_forecasts():
+    """Create the forecast tables (via create_all) and run a first forecast"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        existing = set(db.inspect(db.engine).get_table_names())
+        for table in TABLES:
+            if table in existing:
+                print(f"✓ {table} table present")
+            else:
+                print(f"❌ {table} table missing after create_all")
+                raise SystemExit(1)
+
+        from agrifarma.services import forecast
+        run = forecast.refresh()
+        print(f"✓ Forecast {run.products} products ({run.alerts_raised} alerts raised)")
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_forecasts()
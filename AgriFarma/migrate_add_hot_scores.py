@@ -0,0 +1,44 @@
+"""
+Database Migration: Add time-decayed hot scores to blog posts and forum threads
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from agrifarma.services import ranking
+from config import DevelopmentConfig
+
+TABLES = [
+    # (table, index on hot_score)
+    ("blog_posts", "ix_blog_posts_hot_score"),
+    ("threads", "ix_threads_hot_score"),
+]
+
+def migrate_hot_scores():
+    """Add hot_score columns and indexes, then compute scores from existing activity"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            try:
+                for table, index in TABLES:
+                    columns = {row[1] for row in conn.execute(db.text(f"PRAGMA table_info({table})"))}
+                    if "hot_score" not in columns:
+                        print(f"Adding hot_score column to {table} table...")
+                        conn.execute(db.text(f"ALTER TABLE {table} ADD COLUMN hot_score FLOAT NOT NULL DEFAULT 0"))
+                        print("✓ Added hot_score column")
+                    else:
+                        print(f"✓ {table}.hot_score column already exists")
+                    conn.execute(db.text(f"CREATE INDEX IF NOT EXISTS {index} ON {table} (hot_score)"))
+                    print(f"✓ {index} present")
+                conn.commit()
+            except Exception as e:
+                print(f"\n❌ Migration failed: {str(e)}")
+                conn.rollback()
+                raise
+
+        written = ranking.rebuild_all()
+        for kind, count in written.items():
+            print(f"✓ Scored {count} {kind} rows")
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_hot_scores()
@@ -0,0 +1,33 @@
+"""
+Database Migration: Index likes by (user_id, object id) for per-viewer like state
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from config import DevelopmentConfig
+
+INDEXES = [
+    # (new composite index, table, columns, single-column index it replaces)
+    ("ix_post_likes_user_post", "post_likes", "user_id, post_id", "ix_post_likes_user_id"),
+    ("ix_blog_likes_user_blog", "blog_likes", "user_id, blog_id", "ix_blog_likes_user_id"),
+]
+
+def migrate_like_indexes():
+    """Create the composite like indexes and drop the user_id-only ones they cover"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            try:
+                for name, table, columns, replaced in INDEXES:
+                    conn.execute(db.text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+                    conn.execute(db.text(f"DROP INDEX IF EXISTS {replaced}"))
+                    print(f"✓ {name} on {table}({columns}); dropped {replaced}")
+                conn.commit()
+                print("\n✅ Database migration completed successfully!")
+            except Exception as e:
+                print(f"\n❌ Migration failed: {str(e)}")
+                conn.rollback()
+                raise
+
+if __name__ == "__main__":
+    migrate_like_indexes()
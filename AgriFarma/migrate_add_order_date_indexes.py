@@ -0,0 +1,36 @@
+"""
+Database Migration: Composite (user_id, created_at) and (status, created_at) indexes on orders
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from config import DevelopmentConfig
+
+INDEXES = [
+    ("ix_orders_user_created", "orders (user_id, created_at)"),
+    ("ix_orders_status_created", "orders (status, created_at)"),
+]
+# covered by the leading column of the composites above
+REPLACED = ["ix_orders_user_id", "ix_orders_status"]
+
+def migrate_order_date_indexes():
+    """Create the composite order indexes and drop the single-column ones they replace"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            try:
+                for name, target in INDEXES:
+                    conn.execute(db.text(f"CREATE INDEX IF NOT EXISTS {name} ON {target}"))
+                    print(f"✓ {name} present")
+                for name in REPLACED:
+                    conn.execute(db.text(f"DROP INDEX IF EXISTS {name}"))
+                    print(f"✓ {name} dropped")
+                conn.commit()
+            except Exception as e:
+                print(f"\n❌ Migration failed: {str(e)}")
+                conn.rollback()
+                raise
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_order_date_indexes()
@@ -0,0 +1,49 @@
+"""
+Database Migration: Add stable post numbering for paginated threads
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from agrifarma.services import forum as forum_service
+from config import DevelopmentConfig
+
+def migrate_post_positions():
+    """Add posts.position / threads.post_count, index them and number existing posts"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            try:
+                post_columns = {row[1] for row in conn.execute(db.text("PRAGMA table_info(posts)"))}
+                thread_columns = {row[1] for row in conn.execute(db.text("PRAGMA table_info(threads)"))}
+
+                if 'position' not in post_columns:
+                    print("Adding position column to posts table...")
+                    conn.execute(db.text("ALTER TABLE posts ADD COLUMN position INTEGER"))
+                    print("✓ Added position column")
+                else:
+                    print("✓ position column already exists")
+
+                if 'post_count' not in thread_columns:
+                    print("Adding post_count column to threads table...")
+                    conn.execute(db.text("ALTER TABLE threads ADD COLUMN post_count INTEGER NOT NULL DEFAULT 0"))
+                    print("✓ Added post_count column")
+                else:
+                    print("✓ post_count column already exists")
+
+                conn.execute(db.text(
+                    "CREATE INDEX IF NOT EXISTS ix_posts_thread_position ON posts (thread_id, position)"
+                ))
+                conn.commit()
+                print("✓ Index ix_posts_thread_position in place")
+            except Exception as e:
+                print(f"\n❌ Migration failed: {str(e)}")
+                conn.rollback()
+                raise
+
+        numbered = forum_service.backfill_positions()
+        db.session.commit()
+        print(f"✓ Numbered {numbered} existing posts")
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_post_positions()
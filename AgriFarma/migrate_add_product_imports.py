@@ -0,0 +1,45 @@
+"""
+Database Migration: Add product SKUs and bulk import jobs
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from config import DevelopmentConfig
+
+TABLES = ["product_imports"]
+INDEXES = [
+    ("ix_products_sku", "products (sku)"),
+]
+
+def migrate_product_imports():
+    """Add the optional unique sku column to products and check the import job table (via create_all)"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        existing = set(db.inspect(db.engine).get_table_names())
+        for table in TABLES:
+            if table in existing:
+                print(f"✓ {table} table present")
+            else:
+                print(f"❌ {table} table missing after create_all")
+                raise SystemExit(1)
+        with db.engine.connect() as conn:
+            try:
+                columns = {row[1] for row in conn.execute(db.text("PRAGMA table_info(products)"))}
+                if 'sku' not in columns:
+                    print("Adding sku column to products table...")
+                    conn.execute(db.text("ALTER TABLE products ADD COLUMN sku VARCHAR(64)"))
+                    print("✓ Added sku column")
+                else:
+                    print("✓ sku column already exists")
+                for name, target in INDEXES:
+                    conn.execute(db.text(f"CREATE UNIQUE INDEX IF NOT EXISTS {name} ON {target}"))
+                    print(f"✓ {name} present")
+                conn.commit()
+            except Exception as e:
+                print(f"\n❌ Migration failed: {str(e)}")
+                conn.rollback()
+                raise
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_product_imports()
@@ -0,0 +1,47 @@
+"""
+Database Migration: Materialize product rating aggregates and index review pages
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from agrifarma.services import reviews as review_service
+from config import DevelopmentConfig
+
+COLUMNS = [
+    ("rating_avg", "FLOAT NOT NULL DEFAULT 0"),
+    ("rating_count", "INTEGER NOT NULL DEFAULT 0"),
+] + [(f"rating_{stars}", "INTEGER NOT NULL DEFAULT 0") for stars in review_service.STARS]
+
+INDEXES = [
+    ("ix_products_status_rating", "products (status, rating_avg, rating_count)"),
+    ("ix_reviews_product_approved_created", "reviews (product_id, approved, created_at, id)"),
+]
+
+def migrate_rating_aggregates():
+    """Add the rating columns and indexes, then recompute ratings from approved reviews"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        with db.engine.connect() as conn:
+            try:
+                existing = {row[1] for row in conn.execute(db.text("PRAGMA table_info(products)"))}
+                for name, ddl in COLUMNS:
+                    if name in existing:
+                        print(f"✓ products.{name} already exists")
+                        continue
+                    conn.execute(db.text(f"ALTER TABLE products ADD COLUMN {name} {ddl}"))
+                    print(f"✓ Added products.{name}")
+                for name, target in INDEXES:
+                    conn.execute(db.text(f"CREATE INDEX IF NOT EXISTS {name} ON {target}"))
+                    print(f"✓ {name} present")
+                conn.commit()
+            except Exception as e:
+                print(f"\n❌ Migration failed: {str(e)}")
+                conn.rollback()
+                raise
+
+        written = review_service.rebuild()
+        print(f"✓ Rating aggregates computed for {written} products")
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_rating_aggregates()
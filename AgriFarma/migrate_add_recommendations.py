@@ -0,0 +1,31 @@
+"""
+Database Migration: Add product co-purchase counts and precomputed recommendations
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from agrifarma.services import recommendations
+from config import DevelopmentConfig
+
+TABLES = ["product_copurchases", "product_recommendations", "recommender_runs"]
+
+def migrate_recommendations():
+    """Create the recommender tables (via create_all) and count existing orders"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        existing = set(db.inspect(db.engine).get_table_names())
+        for table in TABLES:
+            if table in existing:
+                print(f"✓ {table} table present")
+            else:
+                print(f"❌ {table} table missing after create_all")
+                raise SystemExit(1)
+
+        # first run counts every order; re-running only picks up new ones
+        run = recommendations.refresh(full=not recommendations.watermark())
+        print(f"✓ Counted {run.orders_processed} orders")
+        print(f"✓ Ranked neighbours for {run.products_refreshed} products")
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_recommendations()
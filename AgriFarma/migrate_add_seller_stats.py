@@ -0,0 +1,42 @@
+"""
+Database Migration: Add per-seller daily sales aggregates
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from config import DevelopmentConfig
+
+TABLES = ["seller_daily", "seller_product_daily"]
+INDEXES = [
+    ("ix_order_items_product_order", "order_items (product_id, order_id)"),
+]
+
+def migrate_seller_stats():
+    """Create the aggregate tables (via create_all), index order lines by product and backfill from paid orders"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        existing = set(db.inspect(db.engine).get_table_names())
+        for table in TABLES:
+            if table in existing:
+                print(f"✓ {table} table present")
+            else:
+                print(f"❌ {table} table missing after create_all")
+                raise SystemExit(1)
+        with db.engine.connect() as conn:
+            try:
+                for name, target in INDEXES:
+                    conn.execute(db.text(f"CREATE INDEX IF NOT EXISTS {name} ON {target}"))
+                    print(f"✓ {name} present")
+                conn.commit()
+            except Exception as e:
+                print(f"\n❌ Migration failed: {str(e)}")
+                conn.rollback()
+                raise
+
+        from agrifarma.services import seller_stats
+        rows = seller_stats.rebuild()
+        print(f"✓ Backfilled {rows} seller aggregate rows")
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_seller_stats()
@@ -0,0 +1,25 @@
+"""
+Database Migration: Add daily search/visitor sketches
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from config import DevelopmentConfig
+
+TABLES = ["sketch_days"]
+
+def migrate_sketches():
+    """Create the sketch table (via create_all); sketches fill in as traffic arrives"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        existing = set(db.inspect(db.engine).get_table_names())
+        for table in TABLES:
+            if table in existing:
+                print(f"✓ {table} table present")
+            else:
+                print(f"❌ {table} table missing after create_all")
+                raise SystemExit(1)
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_sketches()
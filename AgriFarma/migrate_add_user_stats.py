@@ -0,0 +1,29 @@
+"""
+Database Migration: Add materialized per-user activity stats
+"""
+from agrifarma import create_app
+from agrifarma.extensions import db
+from config import DevelopmentConfig
+
+TABLES = ["user_stats"]
+
+def migrate_user_stats():
+    """Create the user_stats table (via create_all) and backfill one row per user"""
+    app = create_app(DevelopmentConfig)
+
+    with app.app_context():
+        existing = set(db.inspect(db.engine).get_table_names())
+        for table in TABLES:
+            if table in existing:
+                print(f"✓ {table} table present")
+            else:
+                print(f"❌ {table} table missing after create_all")
+                raise SystemExit(1)
+
+        from agrifarma.services import user_stats
+        users = user_stats.rebuild_all()
+        print(f"✓ Backfilled stats for {users} users")
+        print("\n✅ Database migration completed successfully!")
+
+if __name__ == "__main__":
+    migrate_user_stats()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Local stand-in for the Stripe and JazzCash HTTP APIs.
+
+Speaks just enough of both APIs for the gateways in
+``agrifarma/services/payment.py`` and can inject latency, 5xx failures and
+declines, so the transport (pooling, timeouts, retries, circuit breaker) can
+be exercised without network access.
+
+Usage:
+  python payment_standin.py --port 8765 --latency 0.05 --failure-rate 0.1
+
+Then point the app at it, e.g.:
+  PAYMENT_GATEWAY=stripe STRIPE_BASE_URL=http://127.0.0.1:8765 flask run
+"""
+import argparse
+import json
+import random
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+class StandinState:
+    """Shared knobs and bookkeeping for one stand-in server."""
+
+    def __init__(self, latency=0.0, failure_rate=0.0, decline_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.decline_rate = decline_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.transactions = {}   # id -> dict (Stripe-style payload or JazzCash fields)
+        self.idempotent = {}     # Idempotency-Key -> (status, payload)
+
+    def roll(self, rate):
+        with self.lock:
+            return self.rng.random() < rate
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so client pooling is observable
+
+    def setup(self):
+        super().setup()
+        with self.server.state.lock:
+            self.server.state.connections += 1
+
+    def log_message(self, format, *args):  # quiet by default
+        pass
+
+    # --- helpers -------------------------------------------------------
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            return json.loads(raw or b'{}')
+        return dict(parse_qsl(raw.decode('utf-8')))
+
+    def _prelude(self):
+        state = self.server.state
+        with state.lock:
+            state.requests += 1
+        if state.latency:
+            time.sleep(state.latency)
+        if state.roll(state.failure_rate):
+            self._reply(503, {'error': {'message': 'simulated outage'}})
+            return False
+        return True
+
+    # --- routes --------------------------------------------------------
+    def do_GET(self):
+        if not self._prelude():
+            return
+        state = self.server.state
+        if self.path.startswith('/v1/payment_intents/search?'):
+            # only the metadata['idempotency_key']:'<key>' query the gateway sends
+            query = dict(parse_qsl(urlsplit(self.path).query)).get('query', '')
+            key = query.split(':', 1)[-1].strip("'")
+            matches = [pi for pi in state.transactions.values()
+                       if (pi.get('metadata') or {}).get('idempotency_key') == key]
+            return self._reply(200, {'object': 'search_result', 'data': matches})
+        if self.path.startswith('/v1/payment_intents/'):
+            pi = state.transactions.get(self.path.rsplit('/', 1)[-1])
+            if pi is None:
+                return self._reply(404, {'error': {'message': 'No such payment_intent'}})
+            return self._reply(200, pi)
+        self._reply(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        data = self._body()
+        if not self._prelude():
+            return
+        state = self.server.state
+        key = self.headers.get('Idempotency-Key')
+        if key and key in state.idempotent and not self.path.endswith('/Inquire'):
+            status, payload = state.idempotent[key]
+            return self._reply(status, payload)
+
+        if self.path == '/v1/payment_intents':
+            declined = state.roll(state.decline_rate)
+            pi = {
+                'id': f"pi_{secrets.token_hex(8)}",
+                'object': 'payment_intent',
+                'amount': int(data.get('amount', 0)),
+                'currency': data.get('currency'),
+                'metadata': {'order_id': data.get('metadata[order_id]'),
+                             'idempotency_key': data.get('metadata[idempotency_key]')},
+                'status': 'requires_payment_method' if declined else 'succeeded',
+            }
+            state.transactions[pi['id']] = pi
+            status, payload = (402, dict(pi, error={'message': 'Your card was declined.'})) if declined else (200, pi)
+        elif self.path == '/v1/refunds':
+            status, payload = 200, {'id': f"re_{secrets.token_hex(8)}", 'status': 'succeeded',
+                                    'payment_intent': data.get('payment_intent')}
+        elif self.path.endswith('/DoMWalletTransaction'):
+            declined = state.roll(state.decline_rate)
+            ref = data.get('pp_TxnRefNo')
+            state.transactions[ref] = dict(data, pp_Status='Failed' if declined else 'Completed')
+            status, payload = 200, {
+                'pp_TxnRefNo': ref,
+                'pp_ResponseCode': '999' if declined else '000',
+                'pp_ResponseMessage': 'Transaction declined' if declined else 'Thank you for Using JazzCash',
+            }
+        elif self.path.endswith('/Inquire'):
+            txn = state.transactions.get(data.get('pp_TxnRefNo'))
+            if txn is None:
+                status, payload = 200, {'pp_ResponseCode': '110', 'pp_ResponseMessage': 'Transaction not found'}
+            else:
+                ok = txn.get('pp_Status') == 'Completed'
+                status, payload = 200, {'pp_ResponseCode': '000', 'pp_PaymentResponseCode': '121' if ok else '157',
+                                        'pp_Status': txn.get('pp_Status'), 'pp_ResponseMessage': txn.get('pp_Status')}
+        else:
+            status, payload = 404, {'error': {'message': 'not found'}}
+
+        if key:
+            state.idempotent[key] = (status, payload)
+        self._reply(status, payload)
+
+
+class StandinServer:
+    """Threaded stand-in server; use as a context manager in tests.
+
+    >>> with StandinServer(latency=0.01) as srv:
+    ...     app.config['PAYMENT_STRIPE_CONFIG'] = {'base_url': srv.url}
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, **knobs):
+        self.state = StandinState(**knobs)
+        self.httpd = ThreadingHTTPServer((host, port), StandinHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='share of requests answered with 503')
+    parser.add_argument('--decline-rate', type=float, default=0.0, help='share of payments declined')
+    args = parser.parse_args()
+    srv = StandinServer(args.host, args.port, latency=args.latency,
+                        failure_rate=args.failure_rate, decline_rate=args.decline_rate)
+    print(f"💳 Payment stand-in listening on {srv.url} (Ctrl+C to stop)")
+    try:
+        srv.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,7 @@ from werkzeug.security import generate_password_hash
 from agrifarma import create_app
 from run import DefaultConfig
 from agrifarma.extensions import db
+from agrifarma.services import tags as tag_service
 
 from agrifarma.models.user import User
 from agrifarma.models.profile import Profile
@@ -52,8 +53,10 @@ with app.app_context():
     # Blog post
     post = BlogPost.query.filter_by(title='Soil Health Basics').first()
     if not post:
-        post = BlogPost(title='Soil Health Basics', content='A short article on improving soil.', category='Agronomy', author_id=admin.id, tags='soil,health', approved=True)
+        post = BlogPost(title='Soil Health Basics', content='A short article on improving soil.', category='Agronomy', author_id=admin.id, approved=True)
         db.session.add(post)
+        db.session.flush()
+        tag_service.set_post_tags(post, 'soil,health')
 
     # Consultant (approved)
     consultant = Consultant.query.filter_by(user_id=admin.id).first()
@@ -0,0 +1,69 @@
+import random
+from datetime import date, datetime, timedelta, UTC
+from types import SimpleNamespace
+
+import numpy as np
+from werkzeug.security import generate_password_hash
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Order
+from agrifarma.models.user import User
+from agrifarma.services import analytics
+
+
+def test_buckets_rolling_mean_and_top_k():
+    ts = analytics.to_datetime64([datetime(2024, 1, 1, 5, tzinfo=UTC), datetime(2024, 1, 7, 23), datetime(2024, 1, 8),
+                                  None, date(2024, 2, 3)])
+    labels, counts = analytics.bucket_counts(ts, freq='week')
+    assert labels[:2].astype(str).tolist() == ['2024-01-01', '2024-01-08']  # Monday-aligned
+    assert counts.tolist() == [2, 1, 0, 0, 1]
+    labels, counts = analytics.bucket_counts(ts, freq='month')
+    assert labels.astype(str).tolist() == ['2024-01-01', '2024-02-01'] and counts.tolist() == [3, 1]
+    labels, counts = analytics.bucket_counts(ts, date(2024, 1, 6), date(2024, 1, 9))
+    assert counts.tolist() == [0, 1, 1, 0]
+    assert analytics.cumulative(counts).tolist() == [0, 1, 2, 2]
+
+    assert analytics.rolling_mean([1, 2, 3, 4, 5], 3).tolist() == [1, 1.5, 2, 3, 4]
+
+    rng = random.Random(7)
+    rows = [{'id': i, 'revenue': rng.choice([1, 2, 3, 5, 8])} for i in range(500)] + [{'id': 'x'}]
+    for n in (0, 1, 10, 499, 600):
+        for reverse in (True, False):
+            expected = sorted([r for r in rows if 'revenue' in r], key=lambda r: r['revenue'], reverse=reverse)[:n]
+            assert analytics.top_n(rows, 'revenue', n, reverse) == expected
+
+
+def test_legacy_helpers_match_per_day_counts():
+    today = datetime.now(UTC)
+    users = [SimpleNamespace(join_date=today - timedelta(days=d, hours=h)) for d, h in ((0, 0), (0, 1), (2, 0), (20, 0))]
+    users.append(SimpleNamespace(join_date=None))
+    by_day = analytics.count_registrations_by_day(users)
+    assert [r['count'] for r in by_day] == [1, 1, 2] and by_day[-1]['date'] == today.date().isoformat()
+    trend = analytics.registration_trend(users, 3)
+    assert [r['count'] for r in trend] == [1, 0, 2]
+
+
+def test_database_counts_feed_dashboard_and_reports(client, app):
+    now = datetime.now(UTC)
+    with app.app_context():
+        admin = User(email='admin@example.com', password_hash=generate_password_hash('adminpass'), role='Admin')
+        db.session.add(admin)
+        for i, days in enumerate((0, 0, 1, 9, 40)):
+            db.session.add(User(email=f'u{i}@example.com', password_hash='x', role='User', join_date=now - timedelta(days=days)))
+        db.session.flush()
+        for days, amount, payment, status in ((0, 10, 'Paid', 'Pending'), (1, 5, 'Pending', 'Confirmed'),
+                                              (1, 7, 'Failed', 'Pending'), (2, 20, 'Paid', 'Pending')):
+            db.session.add(Order(user_id=admin.id, shipping_address='x', payment_method='COD', payment_status=payment,
+                                 status=status, total_amount=amount, created_at=now - timedelta(days=days)))
+        db.session.commit()
+
+        start = datetime.combine(now.date() - timedelta(days=13), datetime.min.time(), UTC)
+        labels, counts = analytics.registration_counts(start, role='User')
+        assert len(labels) == 14 and counts[-1] == 2 and counts[-2] == 1 and counts.sum() == 4
+        labels, orders, revenue = analytics.order_counts(start)
+        assert orders[-3:].tolist() == [1, 1, 1] and revenue[-3:].tolist() == [20.0, 5.0, 10.0]
+        weekly_labels, weekly = analytics.registration_counts(start, freq='week', role='User')
+        assert weekly.sum() == 4 and np.all(weekly_labels.astype('datetime64[D]').view('int64') % 7 == 4)
+
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'adminpass'}, follow_redirects=True)
+    page = client.get('/admin/').data.decode()
+    assert 'const revenueAvg = [' in page
@@ -1,7 +1,9 @@
+import re
 from werkzeug.security import generate_password_hash
 from agrifarma.extensions import db
-from agrifarma.models.blog import BlogPost, Comment
+from agrifarma.models.blog import BlogPost, Comment, Tag
 from agrifarma.models.user import User
+from agrifarma.services import tags as tag_service
 
 
 def register_user(client, email='blogger@example.com'):
@@ -66,3 +68,65 @@ def test_blog_admin_moderation(client, app):
     # delete it via admin endpoint
     res = client.post(f'/blog/admin/post/{target_id}/delete', follow_redirects=True)
     assert b'Post deleted' in res.data
+
+
+def test_tag_index_exact_match_intersection_and_counts(client, app):
+    register_user(client, email='tagger@example.com')
+    for title, tags in [('Topsoil Guide', 'Topsoil, compost'),
+                        ('Soil Moisture', 'soil,irrigation, Soil'),
+                        ('Drip Soil Plan', '#soil,irrigation,compost')]:
+        client.post('/blog/new', data={'title': title, 'category': 'Soil Health', 'tags': tags,
+                                       'content': 'Long enough article body.'}, follow_redirects=True)
+    with app.app_context():
+        counts = dict(db.session.query(Tag.name, Tag.post_count).all())
+        assert counts == {'topsoil': 1, 'compost': 2, 'soil': 2, 'irrigation': 2}
+        assert db.session.get(BlogPost, 2).tags == 'soil,irrigation'
+        cloud = {t['name']: t['weight'] for t in tag_service.tag_cloud()}
+        assert cloud['soil'] > cloud['topsoil']
+
+    def listed(url):
+        # article cards only; the sidebar lists the latest posts regardless of filters
+        return set(re.findall(r'h5 mb-1 kb-title">([^<]+)<', client.get(url).data.decode()))
+
+    assert listed('/blog/?tag=soil') == {'Soil Moisture', 'Drip Soil Plan'}
+    assert listed('/blog/?tag=soil&tag=compost') == {'Drip Soil Plan'}
+    assert listed('/blog/?q=Compost') == {'Topsoil Guide', 'Drip Soil Plan'}
+    assert b'No articles found' in client.get('/blog/?tag=soil&tag=unknown').data
+
+    with app.app_context():
+        admin = User(email='tagadmin@example.com', password_hash=generate_password_hash('adminpass'), role='Admin')
+        db.session.add(admin)
+        db.session.commit()
+    client.get('/logout')
+    client.post('/login', data={'email': 'tagadmin@example.com', 'password': 'adminpass'})
+    client.post('/blog/admin/post/3/delete')
+    with app.app_context():
+        counts = dict(db.session.query(Tag.name, Tag.post_count).all())
+        assert counts['compost'] == 1 and counts['soil'] == 1 and counts['irrigation'] == 1
+        # a rebuild from the CSV column agrees with the incremental counts
+        assert tag_service.rebuild_index() == 2
+        assert dict(db.session.query(Tag.name, Tag.post_count).all()) == counts
+
+
+def test_tag_counts_cover_approved_posts_only(client, app):
+    with app.app_context():
+        admin = User(email='tagmod@example.com', password_hash=generate_password_hash('adminpass'), role='Admin')
+        db.session.add(admin)
+        db.session.flush()
+        pending = BlogPost(title='Awaiting Review', content='Moderated body.', category='Techniques',
+                           author_id=admin.id, approved=False)
+        db.session.add(pending)
+        db.session.flush()
+        tag_service.set_post_tags(pending, 'mulch, compost')
+        db.session.commit()
+        pending_id = pending.id
+        assert dict(db.session.query(Tag.name, Tag.post_count).all()) == {'mulch': 0, 'compost': 0}
+        assert tag_service.tag_cloud() == []
+        tag_service.rebuild_index()
+        assert dict(db.session.query(Tag.name, Tag.post_count).all()) == {'mulch': 0, 'compost': 0}
+
+    client.post('/login', data={'email': 'tagmod@example.com', 'password': 'adminpass'})
+    client.post(f'/blog/admin/post/{pending_id}/approve')
+    with app.app_context():
+        assert dict(db.session.query(Tag.name, Tag.post_count).all()) == {'mulch': 1, 'compost': 1}
+        assert [t['name'] for t in tag_service.tag_cloud()] == ['compost', 'mulch']
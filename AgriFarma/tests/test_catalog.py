@@ -0,0 +1,135 @@
+import re
+
+from sqlalchemy import event
+from werkzeug.datastructures import MultiDict
+from werkzeug.security import generate_password_hash
+from agrifarma.extensions import db
+from agrifarma.forms.ecommerce import ProductForm
+from agrifarma.models.ecommerce import Product, Review, PRODUCT_CATEGORIES
+from agrifarma.models.user import User
+from agrifarma.seed_data import PRODUCT_CATEGORIES as SEEDED_CATEGORIES
+from agrifarma.services import catalog, reviews as review_service
+
+
+def seed_catalog(app):
+    with app.app_context():
+        sellers = [User(email=f'seller{i}@example.com', password_hash=generate_password_hash('pw'), role='User')
+                   for i in range(2)]
+        db.session.add_all(sellers)
+        db.session.flush()
+        rows = [
+            # name, category, price, inventory, featured, seller, ratings
+            ('Wheat seed', 'Seeds', 12, 40, True, 0, [5, 4]),
+            ('Maize seed', 'Seeds', 30, 0, False, 1, [3]),
+            ('Urea', 'Fertilizers', 45, 10, False, 0, []),
+            ('DAP', 'Fertilizers', 120, 5, True, 1, [5]),
+            ('Tractor', 'Machinery', 900, 2, False, 1, [2, 3]),
+        ]
+        for name, category, price, stock, featured, seller, ratings in rows:
+            p = Product(name=name, category=category, price=price, inventory=stock, featured=featured,
+                        seller_id=sellers[seller].id, status='Active')
+            db.session.add(p)
+            db.session.flush()
+            for r in ratings:
+                db.session.add(Review(product_id=p.id, user_id=sellers[0].id, rating=r, approved=True))
+        db.session.add(Product(name='Hidden hoe', category='Tools', price=5, inventory=3,
+                               seller_id=sellers[0].id, status='Inactive'))
+        db.session.commit()
+        review_service.rebuild()
+        return [s.id for s in sellers]
+
+
+def filters(**args):
+    return catalog.CatalogFilters.from_args(MultiDict(
+        [(k, v) for k, vs in args.items() for v in (vs if isinstance(vs, list) else [vs])]))
+
+
+def counts(facet_counts, facet):
+    return {v.label: v.count for v in facet_counts[facet]}
+
+
+def test_disjunctive_counts_agree_with_sql(app):
+    seller_a, seller_b = seed_catalog(app)
+    with app.test_request_context('/shop'):
+        fc = catalog.facet_counts(filters(category='Seeds'))
+        assert fc.total == 2
+        # other categories still show what they would add; other facets are narrowed to Seeds
+        assert counts(fc, 'category') == {'Fertilizers': 2, 'Machinery': 1, 'Seeds': 2}
+        assert counts(fc, 'price')['Under $25'] == 1 and counts(fc, 'price')['$25 to $100'] == 1
+        assert counts(fc, 'in_stock') == {'In stock': 1}
+        assert counts(fc, 'rating')['4★ & up'] == 1
+
+        combos = [
+            {}, {'category': ['Seeds', 'Machinery']}, {'price': ['25-100', '500-'], 'in_stock': '1'},
+            {'rating': '3', 'seller': str(seller_b)}, {'featured': '1', 'q': 'seed'}, {'rating': '4', 'category': 'Fertilizers'},
+        ]
+        for args in combos:
+            f = filters(**args)
+            expected = f.apply(Product.query.filter_by(status='Active')).count()
+            assert catalog.facet_counts(f).total == expected, args
+
+
+def test_snapshot_invalidated_by_product_writes(app):
+    seed_catalog(app)
+    with app.test_request_context('/shop'):
+        before = catalog.get_snapshot()
+        assert catalog.get_snapshot() is before
+        assert counts(catalog.facet_counts(filters()), 'in_stock') == {'In stock': 4}
+        product = Product.query.filter_by(name='Urea').one()
+        product.category = 'Seeds'
+        db.session.commit()
+        assert counts(catalog.facet_counts(filters()), 'category')['Seeds'] == 3
+        # bulk stock updates (checkout reservations) invalidate it too
+        db.session.execute(db.update(Product).where(Product.name == 'Wheat seed').values(inventory=0))
+        db.session.commit()
+        assert counts(catalog.facet_counts(filters()), 'in_stock') == {'In stock': 3}
+
+
+def test_filter_change_is_one_products_query(client, app):
+    seed_catalog(app)
+    client.get('/shop')  # warm the snapshot
+    statements = []
+
+    def capture(conn, cursor, statement, *args):
+        if 'products' in statement:
+            statements.append(statement)
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            page = client.get('/shop?category=Seeds&category=Fertilizers&price=25-100&sort=price').data.decode()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+    assert len(statements) == 1 and 'count(' not in statements[0].lower()
+    assert re.search(r'2 items', page)
+    assert page.index('>Maize seed<') < page.index('>Urea<')
+
+
+def test_stale_snapshot_total_never_hides_a_page(client, app, monkeypatch):
+    seller_id = seed_catalog(app)[0]
+    with app.app_context():
+        db.session.add_all([Product(name=f'Bulk {i:02d}', category='Tools', price=1, inventory=1,
+                                    seller_id=seller_id, status='Active') for i in range(18)])
+        db.session.commit()
+    real = catalog.facet_counts
+
+    def stale(filters, total):
+        counts = real(filters)
+        counts.total = total
+        return counts
+
+    # snapshot taken before the 18 new products: page 1 still links to page 2
+    monkeypatch.setattr(catalog, 'facet_counts', lambda f: stale(f, 5))
+    page = client.get('/shop').data.decode()
+    assert 'page=2' in page
+    # snapshot taken before products were removed: the short page 2 is the last one
+    monkeypatch.setattr(catalog, 'facet_counts', lambda f: stale(f, 60))
+    page = client.get('/shop?page=2').data.decode()
+    assert '23 items' in page and 'page=3' not in page
+
+
+def test_product_form_offers_seeded_categories(app):
+    with app.test_request_context('/'):
+        offered = [value for value, _ in ProductForm().category.choices]
+    assert offered == list(PRODUCT_CATEGORIES)
+    assert set(SEEDED_CATEGORIES) <= set(offered)
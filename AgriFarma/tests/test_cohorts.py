@@ -0,0 +1,108 @@
+from datetime import date, datetime, timedelta, UTC
+
+from werkzeug.security import generate_password_hash
+from agrifarma.extensions import db
+from agrifarma.models.cohort import CohortRun, FunnelWeek
+from agrifarma.models.ecommerce import Order, Product
+from agrifarma.models.forum import Post, Thread
+from agrifarma.models.user import User
+from agrifarma.services import cohorts, funnel, tracking
+
+# a Monday, so week arithmetic in the assertions stays readable
+MONDAY = datetime(2024, 3, 4, 12)
+
+
+def add_user(email, joined):
+    user = User(email=email, password_hash=generate_password_hash('pw'), role='User', join_date=joined)
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def add_post(thread, user, when):
+    db.session.add(Post(thread_id=thread.id, author_id=user.id, content='hi', created_at=when))
+
+
+def add_order(user, when):
+    db.session.add(Order(user_id=user.id, shipping_address='x', payment_method='COD', created_at=when))
+
+
+def test_incremental_refresh_counts_distinct_users_per_week(app):
+    with app.app_context():
+        alice = add_user('alice@example.com', MONDAY)
+        bob = add_user('bob@example.com', MONDAY + timedelta(days=2))
+        carol = add_user('carol@example.com', MONDAY + timedelta(weeks=1))
+        thread = Thread(title='Soil', author_id=alice.id)
+        db.session.add(thread)
+        db.session.flush()
+        # alice posts twice and orders in her first week: counted once as active
+        add_post(thread, alice, MONDAY + timedelta(hours=1))
+        add_post(thread, alice, MONDAY + timedelta(days=1))
+        add_order(alice, MONDAY + timedelta(days=3))
+        add_order(bob, MONDAY + timedelta(weeks=1, days=1))
+        db.session.commit()
+
+        first = cohorts.refresh()
+        assert first.rows_processed == 3 + 3  # users + distinct (user, week, kind) activity
+
+        add_post(thread, bob, MONDAY + timedelta(weeks=1, days=2))  # same week as his order
+        add_post(thread, alice, MONDAY + timedelta(weeks=2))
+        add_post(thread, carol, MONDAY + timedelta(weeks=1))
+        db.session.commit()
+        second = cohorts.refresh()
+        assert second.rows_processed == 3
+        runs = CohortRun.query.count()
+        assert cohorts.refresh() is None and CohortRun.query.count() == runs  # nothing new: no run row
+
+        today = (MONDAY + timedelta(weeks=2)).date()
+        grid = cohorts.retention('active', cohorts=3, today=today)
+        assert [r['week'] for r in grid] == [date(2024, 3, 4), date(2024, 3, 11), date(2024, 3, 18)]
+        assert [r['size'] for r in grid] == [2, 1, 0]
+        assert grid[0]['cells'] == [(1, 50.0), (1, 50.0), (1, 50.0)]
+        assert grid[1]['cells'] == [(1, 100.0), (0, 0.0)]
+        posts = cohorts.retention('posts', cohorts=3, today=today)
+        assert [n for n, _ in posts[0]['cells']] == [1, 1, 1]
+
+        incremental = {m: cohorts.retention(m, cohorts=3, today=today) for m in cohorts.METRICS}
+        cohorts.refresh(full=True)
+        assert {m: cohorts.retention(m, cohorts=3, today=today) for m in cohorts.METRICS} == incremental
+
+
+def test_funnel_stages_and_reports_page(client, app):
+    with app.app_context():
+        admin = User(email='admin@example.com', password_hash=generate_password_hash('adminpass'), role='Admin')
+        db.session.add(admin)
+        db.session.flush()
+        product = Product(name='Hoe', price=5, inventory=10, status='Active', category='Tools', seller_id=admin.id)
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+
+    for _ in range(4):
+        client.get(f'/product/{product_id}')
+    with app.app_context():
+        assert FunnelWeek.query.filter_by(stage='view').count() == 0  # still in the tracking buffer
+
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'adminpass'}, follow_redirects=True)
+    client.post(f'/product/{product_id}/quick-add')
+    client.post(f'/product/{product_id}/quick-add')
+    with app.app_context():
+        funnel.record('checkout')
+        funnel.record('paid')
+        db.session.commit()
+        with app.test_request_context():
+            funnel.record('checkout')
+            db.session.rollback()  # a failed checkout takes its count with it
+
+    with app.app_context():
+        tracking.flush()  # the flush thread's job outside tests
+        cohorts.refresh()
+        runs = CohortRun.query.count()
+    page = client.get('/admin/reports').data.decode()
+    with app.app_context():
+        assert CohortRun.query.count() == runs  # viewing the report writes nothing
+        now = datetime.now(UTC)
+        rows = {r['stage']: r for r in funnel.summary(now - timedelta(days=1), now + timedelta(days=1))}
+    assert [rows[s]['events'] for s in funnel.STAGES] == [4, 2, 1, 1]
+    assert rows['cart']['step_rate'] == 50.0 and rows['paid']['overall_rate'] == 25.0
+    assert 'Purchase Funnel' in page and 'Cohort Retention' in page and '50.0%' in page
@@ -0,0 +1,55 @@
+from datetime import date, datetime, UTC
+from zoneinfo import ZoneInfo
+
+import pytest
+from werkzeug.security import generate_password_hash
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Order
+from agrifarma.models.user import User
+from agrifarma.services import date_ranges
+
+
+def test_bounds_are_half_open_local_midnights():
+    new_york = ZoneInfo('America/New_York')
+    # 2024-03-10 is 23 hours long in New York (DST starts)
+    dates = date_ranges.DateRange(date(2024, 3, 10), date(2024, 3, 10), new_york)
+    assert dates.start == datetime(2024, 3, 10, 5, tzinfo=UTC)
+    assert dates.end == datetime(2024, 3, 11, 4, tzinfo=UTC)
+    assert dates.end_day == date(2024, 3, 11) and dates.strings() == ('2024-03-10', '2024-03-10')
+
+    open_ended = date_ranges.DateRange(date(2024, 1, 1))
+    assert open_ended.end is None and open_ended.strings() == ('2024-01-01', '')
+    assert not date_ranges.DateRange()
+    with pytest.raises(ValueError):
+        date_ranges.DateRange(date(2024, 1, 2), date(2024, 1, 1))
+    with pytest.raises(ValueError):
+        date_ranges.parse_day('01/02/2024')
+
+
+def test_order_history_filters_in_report_timezone(client, app):
+    app.config['REPORT_TIMEZONE'] = 'Asia/Karachi'  # UTC+5
+    with app.app_context():
+        buyer = User(email='buyer@example.com', password_hash=generate_password_hash('pw12345'), role='User')
+        db.session.add(buyer)
+        db.session.flush()
+        placed = [
+            datetime(2024, 5, 31, 18, 59),  # 23:59 on 31 May in Karachi
+            datetime(2024, 5, 31, 19, 0),   # already 1 June in Karachi
+            datetime(2024, 5, 1, 0, 0),     # 05:00 on 1 May
+        ]
+        orders = [Order(user_id=buyer.id, shipping_address='x', payment_method='COD', created_at=at) for at in placed]
+        db.session.add_all(orders)
+        db.session.commit()
+        ids = [o.id for o in orders]
+
+        plan = ' '.join(str(row) for row in db.session.execute(db.text(
+            "EXPLAIN QUERY PLAN SELECT id FROM orders WHERE user_id = :u AND created_at >= :s AND created_at < :e "
+            "ORDER BY created_at DESC"), {'u': buyer.id, 's': '2024-05-01', 'e': '2024-06-01'}))
+        assert 'ix_orders_user_created' in plan
+
+    client.post('/login', data={'email': 'buyer@example.com', 'password': 'pw12345'}, follow_redirects=True)
+    html = client.get('/orders?date_from=2024-05-01&date_to=2024-05-31').get_data(as_text=True)
+    assert f'Order #{ids[0]}' in html and f'Order #{ids[2]}' in html
+    assert f'Order #{ids[1]}' not in html
+    html = client.get('/orders?date_from=not-a-date').get_data(as_text=True)  # ignored, like before
+    assert all(f'Order #{i}' in html for i in ids)
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, UTC
+
+import numpy as np
+from werkzeug.security import generate_password_hash
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Product
+from agrifarma.models.forecast import InventoryAlert, ProductForecast
+from agrifarma.models.seller import SellerProductDaily
+from agrifarma.models.user import User
+from agrifarma.services import forecast
+
+
+def test_smoothing_matches_the_recurrence_per_row():
+    rng = np.random.default_rng(7)
+    sales = rng.poisson(3, size=(5, 30)).astype(float)
+    starts = np.array([0, 4, 29, 10, 0])
+    level, rmse = forecast.smooth(sales, starts, 0.3)
+    for row, start in enumerate(starts):
+        expected, errors = sales[row, start], []
+        for x in sales[row, start + 1:]:
+            errors.append(x - expected)
+            expected += 0.3 * (x - expected)
+        assert np.isclose(level[row], expected)
+        assert np.isclose(rmse[row], np.sqrt(np.mean(np.square(errors))) if errors else 0.0)
+
+
+def test_refresh_raises_and_resolves_alerts(client, app):
+    app.config['FORECAST_HISTORY_DAYS'] = 30
+    with app.app_context():
+        admin = User(email='admin@example.com', password_hash=generate_password_hash('adminpass'), role='Admin')
+        db.session.add(admin)
+        db.session.flush()
+        listed = datetime.now(UTC) - timedelta(days=200)
+        fast = Product(name='Urea 50kg', price=30, inventory=40, status='Active', seller_id=admin.id, created_at=listed)
+        slow = Product(name='Pruning Saw', price=15, inventory=4, status='Active', seller_id=admin.id, created_at=listed)
+        idle = Product(name='Soil Probe', price=80, inventory=0, status='Active', seller_id=admin.id, created_at=listed)
+        db.session.add_all([fast, slow, idle])
+        db.session.flush()
+        today = datetime.now(UTC).date()
+        for back in range(1, 31):
+            day = today - timedelta(days=back)
+            db.session.add(SellerProductDaily(seller_id=admin.id, day=day, product_id=fast.id, units=10, revenue=300))
+            if back % 10 == 0:
+                db.session.add(SellerProductDaily(seller_id=admin.id, day=day, product_id=slow.id, units=1, revenue=15))
+        db.session.commit()
+        fast_id, slow_id, idle_id = fast.id, slow.id, idle.id
+
+        run = forecast.refresh()
+        assert run.products == 3 and run.alerts_raised == 1
+        rows = {f.product_id: f for f in ProductForecast.query.all()}
+        assert abs(rows[fast_id].daily_demand - 10) < 1e-6 and abs(rows[fast_id].days_of_cover - 4) < 1e-6
+        assert rows[fast_id].reorder_point == 70 and rows[fast_id].needs_reorder
+        assert not rows[slow_id].needs_reorder and rows[slow_id].days_of_cover > 14
+        assert rows[idle_id].days_of_cover is None and not rows[idle_id].needs_reorder
+
+        # a second run keeps the one open alert; restocking resolves it
+        assert forecast.refresh().alerts_raised == 0
+        db.session.get(Product, fast_id).inventory = 500
+        db.session.commit()
+        assert forecast.refresh().alerts_resolved == 1
+        alert = InventoryAlert.query.one()
+        assert alert.product_id == fast_id and alert.resolved_at is not None and alert.inventory == 40
+
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'adminpass'}, follow_redirects=True)
+    assert 'Urea 50kg' in client.get('/admin/inventory-alerts').get_data(as_text=True)
+    assert 'Urea 50kg' not in client.get('/admin/inventory-alerts?resolved=0').get_data(as_text=True)
+    assert 'Reorder Alerts' in client.get('/admin/reports').get_data(as_text=True)
@@ -85,4 +85,147 @@ def test_admin_moderation(client, app):
 
     # delete thread
     res = client.post(f'/forum/thread/{tid}/delete', follow_redirects=True)
-    assert b'Thread deleted' in res.data
\ No newline at end of file
+    assert b'Thread deleted' in res.data
+
+def test_thread_pagination_and_jump_links(client, app):
+    app.config['FORUM_POSTS_PER_PAGE'] = 3
+    with app.app_context():
+        db.session.add(Category(name='Paged'))
+        db.session.commit()
+    register_and_login(client, email='pager@example.com')
+    client.post('/forum/new', data={'title': 'Long thread', 'category_id': 1, 'content': 'reply-1'})
+    for n in range(2, 8):
+        res = client.post('/forum/thread/1', data={'content': f'reply-{n}'})
+    # a new reply lands on the last page, anchored at the post
+    assert res.headers['Location'].endswith('/forum/thread/1?page=3#post-7')
+
+    page2 = client.get('/forum/thread/1?page=2').data
+    assert b'reply-4' in page2 and b'reply-6' in page2
+    assert b'reply-3' not in page2 and b'reply-7' not in page2
+    assert b'#5' in page2
+
+    res = client.get('/forum/thread/1?post=5')
+    assert res.status_code == 302 and res.headers['Location'].endswith('?page=2#post-5')
+    assert client.get('/forum/thread/2?post=5').status_code == 404
+
+
+def test_legacy_posts_are_numbered_and_streamed(client, app):
+    app.config.update(FORUM_POSTS_PER_PAGE=2, FORUM_STREAM_THREADS=True)
+    with app.app_context():
+        from werkzeug.security import generate_password_hash
+        user = User(email='legacy@example.com', password_hash=generate_password_hash('pw'), role='User')
+        db.session.add(user)
+        db.session.flush()
+        t = Thread(title='Seeded', author_id=user.id)
+        db.session.add(t)
+        db.session.flush()
+        db.session.add_all([Post(thread_id=t.id, author_id=user.id, content=f'old-{n}') for n in range(1, 4)])
+        db.session.commit()
+    res = client.get('/forum/thread/1?page=2')
+    assert res.is_streamed
+    assert b'old-3' in res.data and b'old-1' not in res.data
+    with app.app_context():
+        assert db.session.get(Thread, 1).post_count == 3
+        assert [p.position for p in Post.query.order_by(Post.id)] == [1, 2, 3]
+
+
+def test_category_aggregates_roll_up_and_repair(client, app, runner):
+    with app.app_context():
+        from werkzeug.security import generate_password_hash
+        db.session.add(User(email='catadmin@example.com', password_hash=generate_password_hash('pw'), role='Admin'))
+        crops = Category(name='Crops')
+        db.session.add(crops)
+        db.session.flush()
+        db.session.add_all([Category(name='Wheat', parent_id=crops.id), Category(name='Livestock')])
+        db.session.commit()
+    client.post('/login', data={'email': 'catadmin@example.com', 'password': 'pw'})
+    client.post('/forum/new', data={'title': 'Rust on wheat', 'category_id': 2, 'content': 'help'})
+    client.post('/forum/thread/1', data={'content': 'fungicide'})
+    client.post('/forum/new', data={'title': 'Crop rotation', 'category_id': 1, 'content': 'ideas?'})
+
+    def stats():
+        with app.app_context():
+            db.session.expire_all()
+            return {c.name: (c.thread_count, c.post_count, c.last_thread_id) for c in Category.query.all()}
+
+    assert stats() == {'Crops': (2, 3, 2), 'Wheat': (1, 2, 1), 'Livestock': (0, 0, None)}
+    assert b'2 threads' in client.get('/forum/').data
+
+    client.post('/forum/thread/1', data={'category_id': 3, 'submit': 'Move'})
+    assert stats() == {'Crops': (1, 1, 2), 'Wheat': (0, 0, None), 'Livestock': (1, 2, 1)}
+    client.post('/forum/thread/2/delete')
+    assert stats() == {'Crops': (0, 0, None), 'Wheat': (0, 0, None), 'Livestock': (1, 2, 1)}
+
+    with app.app_context():
+        db.session.execute(db.update(Category).values(thread_count=99))
+        db.session.commit()
+    result = runner.invoke(args=['forum', 'repair-stats'])
+    assert 'repaired 3 categories' in result.output
+    assert stats() == {'Crops': (0, 0, None), 'Wheat': (0, 0, None), 'Livestock': (1, 2, 1)}
+
+
+def test_category_tree_closure_and_snapshot(client, app):
+    import pytest
+    from agrifarma.models.forum import CategoryClosure
+    from agrifarma.services import category_tree
+    with app.app_context():
+        soil = Category(name='Soil Health')
+        water = Category(name='Water')
+        db.session.add_all([soil, water])
+        db.session.flush()
+        ph = Category(name='pH', parent_id=soil.id)
+        db.session.add(ph)
+        db.session.flush()
+        lime = Category(name='Liming', parent_id=ph.id)
+        db.session.add(lime)
+        db.session.commit()
+
+        assert category_tree.ancestor_ids(lime.id) == [lime.id, ph.id, soil.id]
+        tree = category_tree.get_tree()
+        assert category_tree.get_tree() is tree  # reused until something changes
+        assert tree.choices() == [(soil.id, 'Soil Health'), (ph.id, '— pH'), (lime.id, '— — Liming'), (water.id, 'Water')]
+
+        # Re-parenting moves the whole subtree in the closure table and refreshes the snapshot
+        ph.parent_id = water.id
+        db.session.commit()
+        assert category_tree.ancestor_ids(lime.id) == [lime.id, ph.id, water.id]
+        assert category_tree.get_tree() is not tree
+        assert [n.name for n in category_tree.get_tree().ancestors(lime.id)] == ['Water', 'pH']
+
+        water.parent_id = lime.id
+        with pytest.raises(ValueError):
+            db.session.commit()
+        db.session.rollback()
+
+        user = User(email='tree@example.com', password_hash='x', role='User')
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Thread(title='Lime dosage', category_id=lime.id, author_id=user.id))
+        db.session.commit()
+        assert CategoryClosure.query.count() == 7  # 4 self links + Liming->pH, Liming->Water, pH->Water
+        water_id = water.id
+
+    res = client.get(f'/forum/category/{water_id}')
+    assert b'Lime dosage' in res.data and b'in Liming' in res.data
+
+
+def test_category_tree_reads_never_write(app):
+    from agrifarma.models.forum import CategoryClosure
+    from agrifarma.services import category_tree
+    with app.app_context():
+        soil = Category(name='Soil Health')
+        db.session.add(soil)
+        db.session.flush()
+        ph = Category(name='pH', parent_id=soil.id)
+        db.session.add(ph)
+        db.session.commit()
+        db.session.execute(db.delete(CategoryClosure))  # a database from before the closure table
+        db.session.commit()
+
+        # mid-request: something pending that the request may still roll back
+        db.session.add(User(email='pending@example.com', password_hash='x', role='User'))
+        assert category_tree.get_tree().choices() == [(soil.id, 'Soil Health'), (ph.id, '— pH')]
+        assert category_tree.ancestor_ids(ph.id) == [ph.id, soil.id]
+        db.session.rollback()
+        assert User.query.filter_by(email='pending@example.com').count() == 0
+        assert CategoryClosure.query.count() == 0
@@ -0,0 +1,114 @@
+import time
+from decimal import Decimal
+from werkzeug.security import generate_password_hash
+from payment_standin import StandinServer
+from agrifarma.extensions import db
+from agrifarma.models.user import User
+from agrifarma.models.ecommerce import Product, Order
+from agrifarma.models.idempotency import IdempotencyKey
+from agrifarma.services import payment, reconciliation
+
+
+def setup_cart(client, app, email='idem@example.com'):
+    with app.app_context():
+        seller = User(email='idem-seller@example.com', password_hash=generate_password_hash('pw'), role='Admin')
+        db.session.add(seller)
+        db.session.flush()
+        p = Product(name='Hoe', price=20, category='equipment', seller_id=seller.id, status='Active', inventory=10)
+        db.session.add(p)
+        db.session.commit()
+        pid = p.id
+    client.post('/register', data={
+        'name': 'Buyer', 'email': email, 'password': 'password123',
+        'confirm_password': 'password123', 'profession': 'farmer', 'expertise_level': 'beginner',
+    }, follow_redirects=True)
+    client.post(f'/product/{pid}', data={'quantity': 1}, follow_redirects=True)
+    return pid
+
+
+def test_double_submit_creates_one_order(client, app):
+    pid = setup_cart(client, app)
+    form = {'shipping_address': '1 Farm Rd', 'payment_method': 'card', 'idempotency_key': 'abc123'}
+    client.post('/checkout', data=form, follow_redirects=True)
+    res = client.post('/checkout', data=form, follow_redirects=True)
+    assert b'has already been placed' in res.data
+    with app.app_context():
+        assert Order.query.count() == 1
+        assert db.session.get(Product, pid).inventory == 9
+
+
+def test_header_key_and_checkout_page_issues_key(client, app):
+    setup_cart(client, app)
+    page = client.get('/checkout')
+    assert b'name="idempotency_key"' in page.data
+    form = {'shipping_address': '1 Farm Rd', 'payment_method': 'COD'}
+    client.post('/checkout', data=form, headers={'Idempotency-Key': 'hdr-1'})
+    client.post('/checkout', data=form, headers={'Idempotency-Key': 'hdr-1'})
+    with app.app_context():
+        assert Order.query.count() == 1
+        assert IdempotencyKey.query.filter_by(scope='checkout', key='hdr-1').one().status == 'completed'
+
+
+def test_charge_once_replays_without_calling_gateway(app):
+    calls = []
+
+    class CountingGateway(payment.MockPaymentGateway):
+        def process_payment(self, amount, currency="PKR", **kwargs):
+            calls.append(kwargs.get('idempotency_key'))
+            return super().process_payment(amount, currency, **kwargs)
+
+    with app.app_context():
+        gw = CountingGateway()
+        first = payment.charge_once(gw, 'order-7', Decimal('5.00'))
+        db.session.commit()
+        second = payment.charge_once(gw, 'order-7', Decimal('5.00'))
+        assert calls == ['order-7']
+        assert second.replayed and second.transaction_id == first.transaction_id
+
+
+def test_gateway_error_fails_the_order_and_returns_stock(client, app):
+    pid = setup_cart(client, app)
+
+    class BrokenGateway(payment.MockPaymentGateway):
+        def process_payment(self, amount, currency="PKR", **kwargs):
+            raise RuntimeError("gateway exploded")
+
+    app.extensions['payment_gateways'] = {'mock': BrokenGateway()}
+    form = {'shipping_address': '1 Farm Rd', 'payment_method': 'card', 'idempotency_key': 'boom-1'}
+    res = client.post('/checkout', data=form, follow_redirects=True)
+    assert b'Payment failed' in res.data
+    with app.app_context():
+        order = Order.query.one()
+        assert (order.payment_status, order.status) == ('Failed', 'Cancelled')
+        assert order.payment_transaction_id == payment.order_payment_key(order.id)  # reconcilable later
+        assert db.session.get(Product, pid).inventory == 10
+        assert IdempotencyKey.query.filter_by(scope='checkout', key='boom-1').one().status == 'completed'
+
+
+def test_gateway_timeout_leaves_the_order_pending_until_reconciled(client, app):
+    pid = setup_cart(client, app)
+    with StandinServer(latency=0.3) as srv:
+        app.config['PAYMENT_GATEWAY'] = 'stripe'
+        app.config['PAYMENT_STRIPE_CONFIG'] = {'base_url': srv.url, 'timeout': 0.1, 'max_retries': 0}
+        form = {'shipping_address': '1 Farm Rd', 'payment_method': 'card', 'idempotency_key': 'slow-1',
+                'payment_token': 'pm_test'}
+        res = client.post('/checkout', data=form, follow_redirects=True)
+        assert b'could not confirm your payment yet' in res.data
+        with app.app_context():
+            order = Order.query.one()
+            assert (order.payment_status, order.status) == ('Pending', 'Pending')
+            assert order.payment_transaction_id == payment.order_payment_key(order.id)
+            assert db.session.get(Product, pid).inventory == 9  # still reserved
+            # the unknown charge is not stored, so a retry would ask the gateway again
+            assert IdempotencyKey.query.filter_by(scope='payment:StripeGateway').count() == 0
+        assert b'waiting for payment confirmation' in client.post('/checkout', data=form, follow_redirects=True).data
+
+        time.sleep(0.4)  # the stand-in finishes the charge the client gave up on
+        srv.state.latency = 0
+        with app.app_context():
+            report = reconciliation.reconcile_payments(gateway=payment.get_payment_gateway('stripe'))
+            assert report.mismatches == [(order.id, 'Pending', 'Paid')]
+            db.session.expire_all()
+            order = db.session.get(Order, order.id)
+            assert (order.payment_status, order.status) == ('Paid', 'Confirmed')
+            assert order.payment_transaction_id.startswith('pi_')
@@ -0,0 +1,97 @@
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from agrifarma.extensions import db
+from agrifarma.models.consultancy import Consultant
+from agrifarma.models.message import Conversation, ConversationMember, Message
+from agrifarma.models.profile import UserStats
+from agrifarma.models.user import User
+from agrifarma.services import inbox
+
+
+def setup_pair(app):
+    with app.app_context():
+        farmer = User(email='farmer@example.com', password_hash=generate_password_hash('pw'), role='User')
+        expert = User(email='expert@example.com', password_hash=generate_password_hash('pw'), role='Consultant')
+        db.session.add_all([farmer, expert])
+        db.session.flush()
+        consultant = Consultant(user_id=expert.id, category='Crop Management', expertise_level='Expert',
+                                contact_email='expert@example.com', approval_status='Approved')
+        db.session.add(consultant)
+        db.session.commit()
+        return farmer.id, expert.id, consultant.id
+
+
+def login(client, email):
+    client.get('/logout')
+    client.post('/login', data={'email': email, 'password': 'pw'})
+
+
+def member(user_id):
+    return ConversationMember.query.filter_by(user_id=user_id).one()
+
+
+def test_conversation_threading_and_counters(client, app):
+    farmer, expert, consultant = setup_pair(app)
+    login(client, 'farmer@example.com')
+    for n in range(3):
+        client.post(f'/consultancy/message/{consultant}',
+                    data={'subject': f'Question {n}', 'content': f'My wheat has yellow leaves, case {n}.'})
+    with app.app_context():
+        convo = Conversation.query.one()
+        assert convo.message_count == 3 and convo.last_subject == 'Question 2'
+        assert member(expert).unread_count == 3 and member(farmer).unread_count == 0
+        assert db.session.get(UserStats, expert).unread_messages == 3
+        convo_id = convo.id
+
+    login(client, 'expert@example.com')
+    page = client.get('/consultancy/inbox').data.decode()
+    assert '3 unread' in page and 'Question 2' in page
+    page = client.get(f'/consultancy/conversation/{convo_id}').data.decode()
+    assert page.index('case 0') < page.index('case 2')
+    assert 'Re: Question 2' in page
+    client.post(f'/consultancy/conversation/{convo_id}',
+                data={'subject': 'Re: Question 2', 'content': 'Try a nitrogen top dressing this week.'})
+    with app.app_context():
+        assert db.session.get(UserStats, expert).unread_messages == 0
+        assert member(expert).unread_count == 0 and member(farmer).unread_count == 1
+        assert db.session.get(UserStats, farmer).unread_messages == 1
+        assert db.session.get(Conversation, convo_id).message_count == 4
+
+        # rebuilding from the message table reproduces the maintained state
+        inbox.rebuild()
+        assert member(farmer).unread_count == 1 and member(expert).unread_count == 0
+        assert db.session.get(UserStats, farmer).unread_messages == 1
+
+
+def test_bulk_mark_read_is_one_update(client, app):
+    farmer, expert, consultant = setup_pair(app)
+    with app.app_context():
+        for n in range(5):
+            inbox.send(farmer, expert, f'Note {n}', 'Some details about my field.')
+        db.session.commit()
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.append(a[2]))
+
+    login(client, 'expert@example.com')
+    res = client.post('/consultancy/inbox/mark-read', headers={'Accept': 'application/json'})
+    assert res.get_json() == {'marked': 5, 'unread': 0}
+    assert len([s for s in statements if s.startswith('UPDATE message')]) == 1
+    with app.app_context():
+        assert Message.query.filter_by(read=False).count() == 0
+        assert member(expert).unread_count == 0
+
+
+def test_unread_badge_without_stats_row_is_one_sum(app):
+    farmer, expert, consultant = setup_pair(app)
+    with app.app_context():
+        for n in range(2):
+            inbox.send(farmer, expert, f'Note {n}', 'Some details about my field.')
+        db.session.commit()
+        db.session.delete(db.session.get(UserStats, expert))
+        db.session.commit()
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.append(a[2]))
+        assert inbox.unread_total(expert) == 2
+        assert len(statements) == 2  # the missing primary-key read, then the SUM
+        assert db.session.get(UserStats, expert) is None
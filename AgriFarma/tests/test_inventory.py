@@ -0,0 +1,100 @@
+from werkzeug.security import generate_password_hash
+from agrifarma.extensions import db
+from agrifarma.models.user import User
+from agrifarma.models.ecommerce import Product, CartItem, Order, StockMovement
+from agrifarma.services import inventory
+
+
+def seed_products(app, stocks):
+    with app.app_context():
+        seller = User(email='seller@example.com', password_hash=generate_password_hash('pw'), role='Admin')
+        db.session.add(seller)
+        db.session.flush()
+        ids = []
+        for i, stock in enumerate(stocks):
+            p = Product(name=f'Item {i}', price=10, category='seeds', seller_id=seller.id, status='Active', inventory=stock)
+            db.session.add(p)
+            db.session.flush()
+            ids.append(p.id)
+        db.session.commit()
+        return seller.id, ids
+
+
+def test_reserve_is_all_or_nothing(app):
+    seller_id, (a, b) = seed_products(app, [5, 1])
+    with app.app_context():
+        order = Order(user_id=seller_id, shipping_address='x', payment_method='COD')
+        db.session.add(order)
+        db.session.flush()
+        res = inventory.reserve_order_stock(order.id, [(a, 2), (b, 3)])
+        assert not res.success
+        assert res.shortages == {b: 1}
+        # nothing was taken from the line that did fit
+        assert db.session.get(Product, a).inventory == 5
+        assert StockMovement.query.count() == 0
+
+        res = inventory.reserve_order_stock(order.id, [(a, 2), (a, 1), (b, 1)])
+        assert res.success
+        db.session.commit()
+        assert db.session.get(Product, a).inventory == 2
+        assert db.session.get(Product, b).inventory == 0
+
+
+def test_release_returns_ledger_balance_once(app):
+    seller_id, (a,) = seed_products(app, [4])
+    with app.app_context():
+        order = Order(user_id=seller_id, shipping_address='x', payment_method='card')
+        db.session.add(order)
+        db.session.flush()
+        assert inventory.reserve_order_stock(order.id, [(a, 3)]).success
+        assert inventory.release_order_stock(order.id) == {a: 3}
+        assert inventory.release_order_stock(order.id) == {}
+        db.session.commit()
+        assert db.session.get(Product, a).inventory == 4
+        reasons = [m.reason for m in StockMovement.query.order_by(StockMovement.id)]
+        assert reasons == ['reserve', 'release']
+
+
+def test_checkout_decrements_and_blocks_oversell(client, app):
+    _, (a,) = seed_products(app, [2])
+    client.post('/register', data={
+        'name': 'Buyer', 'email': 'stock@example.com', 'password': 'password123',
+        'confirm_password': 'password123', 'profession': 'farmer', 'expertise_level': 'beginner',
+    }, follow_redirects=True)
+    client.post(f'/product/{a}', data={'quantity': 3}, follow_redirects=True)
+    res = client.post('/checkout', data={'shipping_address': '1 Farm Rd', 'payment_method': 'COD'}, follow_redirects=True)
+    assert b'Not enough stock' in res.data
+    with app.app_context():
+        assert Order.query.count() == 0
+        assert db.session.get(Product, a).inventory == 2
+        CartItem.query.update({'quantity': 2})
+        db.session.commit()
+
+    client.post('/checkout', data={'shipping_address': '1 Farm Rd', 'payment_method': 'COD'}, follow_redirects=True)
+    with app.app_context():
+        assert Order.query.count() == 1
+        assert db.session.get(Product, a).inventory == 0
+
+
+def test_manual_adjustments_keep_sales_made_since_the_form_was_read(client, app):
+    seller_id, (a, b) = seed_products(app, [10, 4])
+    client.post('/login', data={'email': 'seller@example.com', 'password': 'pw'}, follow_redirects=True)
+    form = {'name': 'Item 0', 'price': '10.00', 'category': 'Seeds', 'status': 'Active', 'featured': 'false',
+            'inventory_seen': 10, 'inventory': 15}
+    with app.app_context():
+        order = Order(user_id=seller_id, shipping_address='x', payment_method='COD')
+        db.session.add(order)
+        db.session.flush()
+        assert inventory.reserve_order_stock(order.id, [(a, 3)]).success  # sold after the page rendered
+        db.session.commit()
+    client.post(f'/admin/product/{a}/edit', data=form, follow_redirects=True)
+    del form['inventory'], form['inventory_seen']
+    client.post(f'/admin/product/{a}/edit', data=form, follow_redirects=True)  # quick save without a count
+    with app.app_context():
+        assert db.session.get(Product, a).inventory == 12  # 10 - 3 sold + 5 added
+        # a decrease larger than what is left empties the product and logs what was removed
+        assert inventory.adjust_stock({a: 2, b: -6}) == {a: 2, b: -4}
+        db.session.commit()
+        assert db.session.get(Product, b).inventory == 0
+        ledger = [(m.product_id, m.delta) for m in StockMovement.query.filter_by(reason='adjust').order_by(StockMovement.id)]
+        assert ledger == [(a, 5), (a, 2), (b, -4)]
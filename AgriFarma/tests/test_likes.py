@@ -0,0 +1,76 @@
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+from agrifarma.extensions import db
+from agrifarma.models.forum import Thread, Post
+from agrifarma.models.likes import PostLike
+from agrifarma.models.user import User
+from agrifarma.services import likes as like_service
+
+
+def seed_thread(app, n_posts=4, liked=(1, 3)):
+    with app.app_context():
+        viewer = User(email='viewer@example.com', password_hash=generate_password_hash('pw'), role='User')
+        other = User(email='other@example.com', password_hash=generate_password_hash('pw'), role='User')
+        db.session.add_all([viewer, other])
+        db.session.flush()
+        t = Thread(title='Likes', author_id=other.id, post_count=n_posts)
+        db.session.add(t)
+        db.session.flush()
+        posts = [Post(thread_id=t.id, author_id=other.id, content=f'p{n}', position=n) for n in range(1, n_posts + 1)]
+        db.session.add_all(posts)
+        db.session.flush()
+        for n in liked:
+            db.session.add(PostLike(post_id=posts[n - 1].id, user_id=viewer.id))
+        db.session.add(PostLike(post_id=posts[0].id, user_id=other.id))
+        db.session.commit()
+        return viewer.id, [p.id for p in posts]
+
+
+def count_queries(app):
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.append(a[2]))
+    return statements
+
+
+def test_liked_ids_one_query_then_cached(app):
+    viewer, ids = seed_thread(app)
+    statements = count_queries(app)
+    with app.app_context():
+        assert like_service.liked_ids('post', viewer, ids) == {ids[0], ids[2]}
+        assert len([s for s in statements if 'post_likes' in s]) == 1
+        assert like_service.liked_ids('post', viewer, ids[:2]) == {ids[0]}
+        assert len([s for s in statements if 'post_likes' in s]) == 1  # served from cache
+        assert like_service.like_counts('post', ids) == {ids[0]: 2, ids[2]: 1}
+        assert like_service.liked_ids('post', None, ids) == set()
+
+
+def test_page_renders_like_state_and_toggle_updates_cache(client, app):
+    viewer, ids = seed_thread(app)
+    client.post('/login', data={'email': 'viewer@example.com', 'password': 'pw'})
+    page = client.get('/forum/thread/1').data.decode()
+    assert page.count('bi-heart-fill') == 2
+
+    res = client.post(f'/forum/post/{ids[1]}/like', headers={'Accept': 'application/json'})
+    assert res.get_json() == {'action': 'liked', 'like_count': 1}
+    with app.app_context():
+        # the toggle updated the cached state, so no stale "not liked" answer
+        assert like_service.liked_ids('post', viewer, ids) == {ids[0], ids[1], ids[2]}
+    assert client.get('/forum/thread/1').data.decode().count('bi-heart-fill') == 3
+
+
+def test_stale_page_cannot_flip_a_like_the_wrong_way(client, app):
+    viewer, ids = seed_thread(app)
+    client.post('/login', data={'email': 'viewer@example.com', 'password': 'pw'})
+    with app.app_context():
+        # another worker's cache still thinks post 1 is not liked, so its page showed "Like"
+        like_service.get_cache().store('post', viewer, {ids[0]: False})
+    res = client.post(f'/forum/post/{ids[0]}/like', data={'action': 'like'}, headers={'Accept': 'application/json'})
+    assert res.get_json() == {'action': 'liked', 'like_count': 2}
+    with app.app_context():
+        assert PostLike.query.filter_by(post_id=ids[0], user_id=viewer).count() == 1
+        assert like_service.liked_ids('post', viewer, [ids[0]]) == {ids[0]}
+    res = client.post(f'/forum/post/{ids[0]}/like', data={'action': 'unlike'}, headers={'Accept': 'application/json'})
+    assert res.get_json() == {'action': 'unliked', 'like_count': 1}
+    page = client.get('/forum/thread/1').data.decode()
+    assert page.count('name="action" value="unlike"') == 1  # only post 3 is still liked
@@ -0,0 +1,131 @@
+import http.client
+from decimal import Decimal
+import pytest
+from payment_standin import StandinServer
+from agrifarma.services import payment, http_client
+
+
+@pytest.fixture()
+def standin():
+    with StandinServer() as srv:
+        yield srv
+
+
+def configure(app, srv, **extra):
+    cfg = {'base_url': srv.url, 'timeout': 2, 'max_retries': 2, 'backoff_base': 0.001}
+    cfg.update(extra)
+    app.config['PAYMENT_STRIPE_CONFIG'] = cfg
+    app.config['PAYMENT_JAZZCASH_CONFIG'] = dict(cfg, merchant_id='MC1', password='pw', integrity_salt='salt')
+
+
+def test_gateways_are_cached_and_reuse_connections(app, standin):
+    configure(app, standin)
+    with app.app_context():
+        gw = payment.get_payment_gateway('stripe')
+        assert payment.get_payment_gateway('stripe') is gw
+        for i in range(5):
+            res = gw.process_payment(Decimal('12.50'), order_id=i, payment_token='pm_test')
+            assert res.success and res.transaction_id.startswith('pi_')
+        assert gw.verify_payment(res.transaction_id).data['status'] == 'completed'
+    assert standin.state.requests == 6
+    assert standin.state.connections == 1
+
+
+def test_jazzcash_round_trip(app, standin):
+    configure(app, standin)
+    with app.app_context():
+        gw = payment.get_payment_gateway('jazzcash')
+        res = gw.process_payment(Decimal('99.00'), order_id=3, idempotency_key='order-3',
+                             mobile_number='03001234567')
+        assert res.success and res.transaction_id == 'order-3'
+        assert gw.verify_payment('order-3').success
+        assert len(gw.secure_hash({'pp_Amount': 9900})) == 64
+
+
+def test_retries_then_breaker_opens(app, standin):
+    standin.state.failure_rate = 1.0
+    configure(app, standin, breaker_threshold=3, breaker_reset=60)
+    with app.app_context():
+        gw = payment.get_payment_gateway('stripe')
+        res = gw.process_payment(Decimal('1.00'), idempotency_key='k1', payment_token='pm_test')
+        assert not res.success and res.data['http_status'] == 503
+        assert standin.state.requests == 3  # first try + 2 retries
+        assert gw.transport.breaker.state == 'open'
+        res = gw.process_payment(Decimal('1.00'), idempotency_key='k2', payment_token='pm_test')
+        assert not res.success and res.data.get('transport_error')
+        assert standin.state.requests == 3  # short-circuited
+
+
+def test_post_without_key_is_not_retried_and_timeouts_are_bounded(app, standin):
+    standin.state.latency = 0.5
+    configure(app, standin, timeout=0.1)
+    with app.app_context():
+        transport = payment.get_payment_gateway('stripe').transport
+        with pytest.raises(http_client.TransportError):
+            transport.request('POST', '/v1/payment_intents', form={'amount': 1})
+    assert standin.state.requests == 1
+
+
+def test_non_json_responses_fail_the_charge(app):
+    class ProxyPage:
+        def request(self, method, path, **kwargs):
+            return http_client.HttpResponse(502, {'content-type': 'text/html'}, b'<html>Bad Gateway</html>')
+
+    with app.app_context():
+        for gw in (payment.StripeGateway(), payment.JazzCashGateway()):
+            gw._transport = ProxyPage()
+            res = gw.process_payment(Decimal('5.00'), order_id=1, idempotency_key='order-1',
+                                     payment_token='pm_test', mobile_number='03001234567')
+            assert not res.success and res.data['http_status'] == 502
+            assert not gw.verify_payment('order-1').success
+
+
+def test_missing_card_or_wallet_details_fail_without_a_request(app, standin):
+    configure(app, standin)
+    with app.app_context():
+        for name, field in (('stripe', 'payment_token'), ('jazzcash', 'mobile_number')):
+            res = payment.get_payment_gateway(name).process_payment(Decimal('5.00'), order_id=1, idempotency_key='order-1')
+            assert not res.success and res.data == {'missing': field} and 'required' in res.message
+    assert standin.state.requests == 0
+
+
+def test_stale_connection_resends_only_repeatable_requests():
+    class DroppedConn:
+        def request(self, *args, **kwargs):
+            raise http.client.RemoteDisconnected('closed')
+
+        def close(self):
+            pass
+
+    class FreshConn(DroppedConn):
+        def request(self, *args, **kwargs):
+            pass
+
+        def getresponse(self):
+            class Resp:
+                status, will_close = 200, True
+
+                def read(self):
+                    return b'{}'
+
+                def getheaders(self):
+                    return []
+            return Resp()
+
+    class StalePool:
+        fresh = 0
+
+        def acquire(self, scheme, host, port, timeout, fresh=False):
+            if fresh:
+                self.fresh += 1
+                return FreshConn(), False
+            return DroppedConn(), True
+
+    pool = StalePool()
+    transport = http_client.GatewayTransport('http://gateway.test', pool=pool, max_retries=0)
+    with pytest.raises(http_client.TransportError):
+        transport.request('POST', '/v1/payment_intents', form={'amount': 1})
+    assert pool.fresh == 0
+    assert transport.request('POST', '/v1/payment_intents', form={'amount': 1}, idempotency_key='k').status == 200
+    assert transport.request('GET', '/v1/payment_intents/pi_1').status == 200
+    assert pool.fresh == 2
@@ -0,0 +1,126 @@
+from io import BytesIO
+
+from werkzeug.security import generate_password_hash
+from sqlalchemy import update
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Product, StockMovement
+from agrifarma.models.product_import import ProductImport
+from agrifarma.models.user import User
+from agrifarma.services import product_import
+
+CSV = (
+    "SKU,Name,Price,Category,Inventory,Status\n"
+    "UR-50,Urea 50kg,32.50,,45,\n"          # update by SKU: price and stock
+    ",Hand Trowel,,,,\n"                    # matched by name, nothing to change
+    "TR-01,Garden Rake,,,12,\n"             # matched by name, gets a SKU
+    "NEW-1,Drip Kit,99,Irrigation,10,active\n"
+    "NEW-2,Bad Price,-4,Tools,,\n"          # fails ProductForm validation
+    "UR-50,Urea again,30,,,\n"              # duplicate key in the file
+)
+
+
+def _catalog(app):
+    with app.app_context():
+        admin = User(email='admin@example.com', password_hash=generate_password_hash('adminpass'), role='Admin')
+        db.session.add(admin)
+        db.session.flush()
+        db.session.add_all([
+            Product(sku='UR-50', name='Urea 50kg', price=30, category='Fertilizers', inventory=40, status='Active', seller_id=admin.id),
+            Product(name='Hand Trowel', price=8, category='Tools', inventory=5, status='Active', seller_id=admin.id),
+            Product(name='Garden Rake', price=12, category='Tools', inventory=3, status='Active', seller_id=admin.id),
+        ])
+        db.session.commit()
+        return admin.id
+
+
+def test_dry_run_reports_the_diff_and_apply_writes_it(app, tmp_path):
+    app.config['CATALOG_IMPORT_CHUNK_SIZE'] = 2  # several chunks, duplicates across them
+    admin_id = _catalog(app)
+    path = tmp_path / 'catalog.csv'
+    path.write_text(CSV)
+    with app.app_context():
+        job = product_import.run(product_import.queue(str(path), 'catalog.csv', admin_id).id)
+        assert job.status == 'done' and job.total_rows == 6 and job.processed_rows == 6
+        assert (job.created_count, job.updated_count, job.unchanged_count, job.error_count) == (1, 2, 1, 2)
+        entries = {e['row']: e for e in job.report}
+        assert entries[2]['changes'] == {'price': ['30.00', '32.50'], 'inventory': [40, 45]}
+        assert entries[4]['changes'] == {'sku': [None, 'TR-01'], 'inventory': [3, 12]}
+        assert entries[5]['action'] == 'create' and entries[5]['changes']['status'] == [None, 'Active']
+        assert 'price' in entries[6]['errors'] and 'row' in entries[7]['errors']
+        # a dry run leaves the catalog alone
+        assert Product.query.count() == 3 and Product.query.filter_by(sku='UR-50').one().inventory == 40
+
+        applied = product_import.run(product_import.apply(job, admin_id).id)
+        assert applied.status == 'done' and not applied.dry_run and applied.created_count == 1
+        urea = Product.query.filter_by(sku='UR-50').one()
+        assert float(urea.price) == 32.5 and urea.inventory == 45
+        assert Product.query.filter_by(name='Garden Rake').one().sku == 'TR-01'
+        kit = Product.query.filter_by(sku='NEW-1').one()
+        assert kit.seller_id == admin_id and kit.category == 'Irrigation' and kit.inventory == 10
+        ledger = {(m.product_id, m.delta) for m in StockMovement.query.filter_by(reason='adjust')}
+        assert ledger == {(urea.id, 5), (Product.query.filter_by(sku='TR-01').one().id, 9), (kit.id, 10)}
+
+        # re-running the same file changes nothing
+        again = product_import.run(product_import.apply(job, admin_id).id)
+        assert (again.created_count, again.updated_count, again.unchanged_count) == (0, 0, 4)
+
+
+def test_admin_upload_runs_as_a_job_with_progress(client, app, tmp_path):
+    app.config['UPLOADED_MEDIA_DEST'] = str(tmp_path)
+    _catalog(app)
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'adminpass'}, follow_redirects=True)
+    assert 'Bulk Product Import' in client.get('/admin/shop/import').get_data(as_text=True)
+
+    from openpyxl import Workbook
+    book = Workbook()
+    book.active.append(['sku', 'price', 'inventory'])
+    book.active.append(['UR-50', 28.0, 60])
+    data = BytesIO()
+    book.save(data)
+    data.seek(0)
+    resp = client.post('/admin/shop/import', data={'file': (data, 'prices.xlsx'), 'dry_run': 'y'},
+                       content_type='multipart/form-data')
+    assert resp.status_code == 302
+    with app.app_context():
+        job_id = ProductImport.query.one().id
+    assert client.get(f'/admin/shop/import/{job_id}/progress').get_json()['status'] == 'queued'
+    with app.app_context():
+        product_import.run(job_id)
+    progress = client.get(f'/admin/shop/import/{job_id}/progress').get_json()
+    assert progress['status'] == 'done' and progress['percent'] == 100 and progress['updated'] == 1
+    page = client.get(f'/admin/shop/import/{job_id}').get_data(as_text=True)
+    assert 'Dry-Run Diff' in page and 'Apply These Changes' in page
+
+    resp = client.post(f'/admin/shop/import/{job_id}/apply')
+    with app.app_context():
+        applied = ProductImport.query.filter_by(dry_run=False).one()
+        assert resp.headers['Location'].endswith(f'/admin/shop/import/{applied.id}')
+        product_import.run(applied.id)
+        assert Product.query.filter_by(sku='UR-50').one().inventory == 60
+
+    resp = client.post('/admin/shop/import', data={'file': (BytesIO(b'x'), 'notes.txt')},
+                       content_type='multipart/form-data')
+    assert resp.status_code == 200
+    with app.app_context():
+        assert ProductImport.query.count() == 2
+
+
+def test_import_adds_the_stock_difference_to_what_is_on_hand(app, tmp_path, monkeypatch):
+    admin_id = _catalog(app)
+    path = tmp_path / 'stock.csv'
+    path.write_text("SKU,Inventory\nUR-50,45\n")
+    read = product_import._existing
+
+    def existing_then_sale(chunk):
+        found = read(chunk)
+        # another worker's order takes 8 units after the chunk read the product at 40
+        db.session.execute(update(Product).where(Product.sku == 'UR-50').values(inventory=Product.inventory - 8)
+                           .execution_options(synchronize_session=False))
+        return found
+
+    monkeypatch.setattr(product_import, '_existing', existing_then_sale)
+    with app.app_context():
+        job = product_import.run(product_import.queue(str(path), 'stock.csv', admin_id, dry_run=False).id)
+        assert job.status == 'done' and job.updated_count == 1
+        assert Product.query.filter_by(sku='UR-50').one().inventory == 37  # 40 - 8 sold + 5 from the file
+        assert [m.delta for m in StockMovement.query.filter_by(reason='adjust')] == [5]
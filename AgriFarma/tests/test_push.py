@@ -0,0 +1,117 @@
+import json
+
+from werkzeug.security import generate_password_hash
+from agrifarma.extensions import db
+from agrifarma.models.forum import Category, Thread, Post
+from agrifarma.models.user import User
+from agrifarma.services import inbox, push
+
+
+def make_users(app):
+    with app.app_context():
+        users = [User(email=f'{name}@example.com', password_hash=generate_password_hash('pw'), role='User')
+                 for name in ('alice', 'bob')]
+        db.session.add_all(users)
+        db.session.commit()
+        return [u.id for u in users]
+
+
+def events(body):
+    """Parse an SSE body into (id, event, data) tuples, skipping comments."""
+    parsed = []
+    for block in body.split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if line and not line.startswith(':'))
+        if 'event' in fields:
+            parsed.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return parsed
+
+
+def test_bus_channels_replay_and_cap():
+    bus = push.EventBus(max_connections=2, queue_size=2)
+    first, second = bus.subscribe(1), bus.subscribe(2)
+    try:
+        bus.subscribe(3)
+        assert False, 'cap not enforced'
+    except push.TooManyConnections:
+        pass
+    ids = [bus.publish(1, 'message', {'n': n}) for n in range(3)]
+    # the slow reader keeps the newest events; other users hear nothing
+    assert [first.get(0)[2]['n'] for _ in range(2)] == [1, 2] and first.dropped == 1
+    assert second.get(0) is None
+
+    bus.unsubscribe(first)
+    replayed = bus.subscribe(1, last_event_id=ids[0])
+    assert [replayed.get(0)[0] for _ in range(2)] == ids[1:]
+    assert bus.stats() == {'connections': 2, 'users': 2, 'published': 3}
+
+
+def test_push_is_off_by_default(client, app):
+    alice, bob = make_users(app)
+    client.post('/login', data={'email': 'bob@example.com', 'password': 'pw'})
+    assert 'js/push.js' not in client.get('/forum/').get_data(as_text=True)
+    assert client.get('/events/stream').status_code == 404
+    with app.app_context():
+        sub = push.get_bus().subscribe(bob)
+        inbox.send(alice, bob, 'Quiet', 'nobody is listening')
+        db.session.commit()
+        assert sub.get(0) is None and push.get_bus().published == 0
+
+    app.config['PUSH_ENABLED'] = True
+    assert 'js/push.js' in client.get('/forum/').get_data(as_text=True)
+
+
+def test_events_publish_on_commit_only(client, app):
+    app.config['PUSH_ENABLED'] = True
+    alice, bob = make_users(app)
+    with app.app_context():
+        bus = push.get_bus()
+        sub = bus.subscribe(bob)
+        inbox.send(alice, bob, 'Rolled back', 'never delivered')
+        assert sub.get(0) is None
+        db.session.rollback()
+        inbox.send(alice, bob, 'Seed prices', 'Prices are up this week.')
+        db.session.commit()
+        _, name, data = sub.get(0)
+        assert name == 'message' and data['subject'] == 'Seed prices'
+        assert sub.get(0) is None
+
+        cat = Category(name='Push cat')
+        db.session.add(cat)
+        db.session.flush()
+        thread = Thread(title='Drip irrigation?', category_id=cat.id, author_id=bob, post_count=1)
+        db.session.add(thread)
+        db.session.flush()
+        db.session.add(Post(thread_id=thread.id, author_id=bob, content='How far apart?', position=1))
+        db.session.commit()
+        thread_id = thread.id
+
+    client.post('/login', data={'email': 'alice@example.com', 'password': 'pw'})
+    client.post(f'/forum/thread/{thread_id}', data={'content': 'About 30cm for vegetables.'})
+    _, name, data = sub.get(1)
+    assert name == 'reply' and data['thread_id'] == thread_id and f'/forum/thread/{thread_id}' in data['url']
+    bus.unsubscribe(sub)
+
+
+def test_stream_endpoint(client, app):
+    app.config['PUSH_ENABLED'] = True
+    alice, bob = make_users(app)
+    assert client.get('/events/stream').status_code in (302, 401)
+    app.config.update(PUSH_HEARTBEAT_SECONDS=0.05, PUSH_STREAM_MAX_SECONDS=0.3)
+    client.post('/login', data={'email': 'bob@example.com', 'password': 'pw'})
+    with app.app_context():
+        bus = push.get_bus()
+        missed = bus.publish(bob, 'order', {'order_id': 7})
+
+    resp = client.get('/events/stream', headers={'Last-Event-ID': str(missed - 1)}, buffered=False)
+    assert resp.mimetype == 'text/event-stream' and resp.headers['Cache-Control'] == 'no-cache'
+    bus.publish(bob, 'message', {'subject': 'live'})
+    body = resp.get_data(as_text=True)
+    assert body.startswith('retry: 50')
+    assert ': heartbeat' in body
+    assert [(name, data) for _, name, data in events(body)] == [('order', {'order_id': 7}), ('message', {'subject': 'live'})]
+    # the stream ended on its own and released its slot
+    assert bus.stats()['connections'] == 0
+
+    bus.max_connections = 0
+    resp = client.get('/events/stream')
+    assert resp.status_code == 503 and resp.headers['Retry-After']
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta, UTC
+
+import pytest
+from werkzeug.security import generate_password_hash
+from agrifarma.extensions import db
+from agrifarma.models.blog import BlogPost, Comment
+from agrifarma.models.forum import Category, Thread, Post
+from agrifarma.models.likes import BlogLike
+from agrifarma.models.user import User
+from agrifarma.services import ranking
+
+
+def now():
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+def make_user(email='ranker@example.com'):
+    user = User(email=email, password_hash=generate_password_hash('pw'), role='User')
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def test_decay_redecay_and_rebuild_agree(app):
+    with app.app_context():
+        user = make_user()
+        old = BlogPost(title='Old', content='old content', category='Techniques', author_id=user.id,
+                       created_at=now() - timedelta(hours=72))
+        new = BlogPost(title='New', content='new content', category='Techniques', author_id=user.id)
+        db.session.add_all([old, new])
+        db.session.flush()
+        ranking.record('blog', old.id, 'create', at=old.created_at)
+        ranking.record('blog', new.id, 'create', at=new.created_at)
+        # two half-lives (36h each) later the old post's creation weighs a quarter
+        assert ranking.current_score('blog', db.session.get(BlogPost, old.id).hot_score) == pytest.approx(0.25, rel=1e-3)
+
+        # three old comments outrank a single fresh creation
+        for _ in range(3):
+            db.session.add(Comment(blog_id=old.id, author_id=user.id, content='hi', created_at=now() - timedelta(hours=1)))
+            ranking.record('blog', old.id, 'comment', at=now() - timedelta(hours=1))
+        db.session.add(BlogLike(blog_id=new.id, user_id=user.id))
+        ranking.record('blog', new.id, 'like')
+        db.session.commit()
+        assert [p.title for p in ranking.top('blog', 2)] == ['Old', 'New']
+
+        before = {p.id: p.hot_score for p in BlogPost.query}
+        ranking.redecay('blog', now=now() + timedelta(hours=36))
+        db.session.commit()
+        db.session.expire_all()
+        after = {p.id: p.hot_score for p in BlogPost.query}
+        # one half-life later every score halves; the order is unchanged
+        assert after[old.id] / before[old.id] == pytest.approx(0.5, rel=1e-3)
+        assert after[new.id] / before[new.id] == pytest.approx(0.5, rel=1e-3)
+        assert [p.title for p in ranking.top('blog', 2)] == ['Old', 'New']
+
+        ranking.rebuild('blog', [old.id, new.id])
+        db.session.commit()
+        db.session.expire_all()
+        rebuilt = {p.id: p.hot_score for p in BlogPost.query}
+        assert rebuilt == pytest.approx(after, rel=1e-3)
+
+
+def test_likes_and_replies_drive_hot_threads(client, app):
+    with app.app_context():
+        author = make_user('author@example.com')
+        make_user('fan@example.com')
+        cat = Category(name='Hot cat')
+        db.session.add(cat)
+        db.session.flush()
+        for title in ('Quiet', 'Busy'):
+            t = Thread(title=title, category_id=cat.id, author_id=author.id, post_count=1)
+            db.session.add(t)
+            db.session.flush()
+            db.session.add(Post(thread_id=t.id, author_id=author.id, content='opening', position=1))
+        db.session.commit()
+        ranking.rebuild_all()
+        busy = Thread.query.filter_by(title='Busy').one()
+        busy_id, busy_post = busy.id, busy.posts[0].id
+        cat_id = cat.id
+
+    client.post('/login', data={'email': 'fan@example.com', 'password': 'pw'})
+    client.post(f'/forum/post/{busy_post}/like')
+    client.post(f'/forum/thread/{busy_id}', data={'content': 'Great question, here is my answer.'})
+    with app.app_context():
+        assert [t.title for t in ranking.top('thread', 2)] == ['Busy', 'Quiet']
+        incremental = db.session.get(Thread, busy_id).hot_score
+        ranking.rebuild('thread', [busy_id])
+        assert db.session.get(Thread, busy_id).hot_score == pytest.approx(incremental, rel=1e-3)
+
+    page = client.get(f'/forum/category/{cat_id}?sort=hot').data.decode()
+    assert page.index('>Busy<') < page.index('>Quiet<')
+    # unliking withdraws exactly the like's weight
+    client.post(f'/forum/post/{busy_post}/like')
+    with app.app_context():
+        withdrawn = db.session.get(Thread, busy_id).hot_score
+        ranking.rebuild('thread', [busy_id])
+        assert db.session.get(Thread, busy_id).hot_score == pytest.approx(withdrawn, rel=1e-3)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from werkzeug.security import generate_password_hash
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Order, OrderItem, Product
+from agrifarma.models.user import User
+from agrifarma.services import recommendations
+
+
+def place_order(buyer_id, products, payment_status='Paid'):
+    order = Order(user_id=buyer_id, shipping_address='Farm road 1', payment_method='COD', payment_status=payment_status)
+    db.session.add(order)
+    db.session.flush()
+    for p in products:
+        db.session.add(OrderItem(order_id=order.id, product_id=p.id, quantity=1, unit_price=p.price))
+    db.session.commit()
+
+
+def test_copurchase_pairs_counts_each_order_once():
+    left, right, counts = recommendations.copurchase_pairs([1, 1, 1, 2, 2, 3], [10, 11, 10, 10, 11, 12])
+    got = {(l, r): c for l, r, c in zip(left.tolist(), right.tolist(), counts.tolist())}
+    assert got == {(10, 10): 2, (10, 11): 2, (11, 10): 2, (11, 11): 2, (12, 12): 1}
+    # baskets above the cap are ignored entirely
+    left, _, _ = recommendations.copurchase_pairs([1, 1, 2], [10, 11, 12], max_basket=1)
+    assert left.tolist() == [12]
+
+
+def test_incremental_refresh_matches_full_and_feeds_product_page(client, app):
+    with app.app_context():
+        buyer = User(email='buyer@example.com', password_hash=generate_password_hash('pw'), role='User')
+        db.session.add(buyer)
+        db.session.flush()
+        seed, fertilizer, sprayer, gloves = products = [
+            Product(name=name, price=10, seller_id=buyer.id, inventory=50, status='Active', category='Tools')
+            for name in ('Wheat seed', 'Urea fertilizer', 'Hand sprayer', 'Work gloves')
+        ]
+        db.session.add_all(products)
+        db.session.commit()
+        place_order(buyer.id, [seed, fertilizer])
+        place_order(buyer.id, [seed, fertilizer])
+        place_order(buyer.id, [seed, sprayer])
+        place_order(buyer.id, [seed, gloves], payment_status='Failed')
+
+        run = recommendations.refresh(full=True)
+        assert run.orders_processed == 3
+        ranked = recommendations.neighbours(seed.id)
+        assert list(ranked) == [fertilizer.id, sprayer.id]
+        assert ranked[fertilizer.id] == pytest.approx(2 / np.sqrt(3 * 2))
+
+        # only the new order is read; its products and their co-purchase partners
+        # are re-ranked (the fertilizer's scores cannot change)
+        place_order(buyer.id, [sprayer, gloves])
+        run = recommendations.refresh()
+        assert run.orders_processed == 1 and run.products_refreshed == 3
+        incremental = {p.id: recommendations.neighbours(p.id) for p in products}
+        assert incremental[gloves.id] == {sprayer.id: pytest.approx(1 / np.sqrt(2))}
+        assert recommendations.refresh().orders_processed == 0
+
+        recommendations.refresh(full=True)
+        for p in products:
+            assert recommendations.neighbours(p.id) == pytest.approx(incremental[p.id])
+        seed_id = seed.id
+
+    page = client.get(f'/product/{seed_id}').data.decode()
+    related = page[page.index('Related Products'):]
+    assert related.index('Urea fertilizer') < related.index('Hand sprayer') < related.index('Work gloves')
@@ -0,0 +1,88 @@
+from decimal import Decimal
+from werkzeug.security import generate_password_hash
+from payment_standin import StandinServer
+from agrifarma.extensions import db
+from agrifarma.models.user import User
+from agrifarma.models.ecommerce import Order
+from agrifarma.services import payment, reconciliation
+
+
+def seed_orders(app, rows):
+    """rows: list of (payment_status, transaction_id)"""
+    with app.app_context():
+        user = User(email='recon@example.com', password_hash=generate_password_hash('pw'), role='User')
+        db.session.add(user)
+        db.session.flush()
+        ids = []
+        for status, txn in rows:
+            o = Order(user_id=user.id, shipping_address='x', payment_method='card',
+                      payment_status=status, payment_transaction_id=txn, status='Pending')
+            db.session.add(o)
+            db.session.flush()
+            ids.append(o.id)
+        db.session.commit()
+        return ids
+
+
+def test_reconcile_fixes_drift_with_mock_gateway(app):
+    ids = seed_orders(app, [
+        ('Pending', 'MOCK_AAA'),   # actually paid
+        ('Paid', 'BOGUS'),         # gateway doesn't know it
+        ('Paid', 'MOCK_BBB'),      # fine
+        ('Pending', 'COD_4'),      # skipped
+        ('Refunded', 'MOCK_CCC'),  # not scanned
+    ])
+    with app.app_context():
+        report = reconciliation.reconcile_payments(batch_size=2, workers=4)
+        assert report.scanned == 4 and report.batches == 2
+        assert report.skipped == 1
+        assert sorted(report.mismatches) == [(ids[0], 'Pending', 'Paid'), (ids[1], 'Paid', 'Failed')]
+        db.session.expire_all()
+        assert db.session.get(Order, ids[0]).payment_status == 'Paid'
+        assert db.session.get(Order, ids[0]).status == 'Confirmed'
+        assert db.session.get(Order, ids[1]).payment_status == 'Failed'
+
+
+def test_reconcile_dry_run_against_standin(app, runner):
+    with StandinServer() as srv:
+        app.config['PAYMENT_STRIPE_CONFIG'] = {'base_url': srv.url, 'timeout': 2}
+        with app.app_context():
+            gw = payment.get_payment_gateway('stripe')
+            paid = gw.process_payment(Decimal('10.00'), payment_token='pm_test').transaction_id
+        ids = seed_orders(app, [('Pending', paid), ('Pending', 'pi_missing')])
+        result = runner.invoke(args=['payments', 'reconcile', '--gateway', 'stripe', '--dry-run', '--workers', '2'])
+        assert result.exit_code == 0, result.output
+        assert f'order {ids[0]}: Pending -> Paid' in result.output
+        assert f'order {ids[1]}: Pending -> Failed' in result.output
+    with app.app_context():
+        assert {o.payment_status for o in Order.query.all()} == {'Pending'}
+
+
+def test_late_payment_retakes_stock_and_statuses_follow_payment(app):
+    from agrifarma.models.ecommerce import OrderItem, Product
+    from agrifarma.services import inventory
+    ids = seed_orders(app, [('Failed', 'MOCK_LATE'), ('Failed', 'MOCK_GONE'), ('Paid', 'BOGUS')])
+    with app.app_context():
+        seller = User.query.one()
+        hoe = Product(name='Hoe', price=20, seller_id=seller.id, status='Active', inventory=5)
+        rake = Product(name='Rake', price=20, seller_id=seller.id, status='Active', inventory=1)
+        db.session.add_all([hoe, rake])
+        db.session.flush()
+        for oid, product, qty in ((ids[0], hoe, 2), (ids[1], rake, 1), (ids[2], hoe, 1)):
+            db.session.add(OrderItem(order_id=oid, product_id=product.id, quantity=qty, unit_price=20))
+            assert inventory.reserve_order_stock(oid, [(product.id, qty)]).success
+        for oid in ids[:2]:  # the failed payments handed their stock back
+            inventory.release_order_stock(oid)
+            db.session.get(Order, oid).status = 'Cancelled'
+        db.session.get(Order, ids[2]).status = 'Confirmed'
+        rake.inventory = 0  # sold to someone else meanwhile
+        db.session.commit()
+
+        reconciliation.reconcile_payments()
+        db.session.expire_all()
+        late, gone, bogus = (db.session.get(Order, oid) for oid in ids)
+        assert (late.payment_status, late.status) == ('Paid', 'Confirmed')
+        assert (gone.payment_status, gone.status) == ('Paid', reconciliation.ON_HOLD_STATUS)
+        assert (bogus.payment_status, bogus.status) == ('Failed', 'Cancelled')
+        assert db.session.get(Product, hoe.id).inventory == 3  # 5 - 2 retaken, bogus order's 1 returned
+        assert db.session.get(Product, rake.id).inventory == 0
@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+from werkzeug.security import generate_password_hash
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Product, Review
+from agrifarma.models.user import User
+from agrifarma.services import reviews as review_service
+
+
+def login_as_admin(client, app):
+    with app.app_context():
+        admin = User(email='admin@shop.com', password_hash=generate_password_hash('adminpass'), role='Admin')
+        db.session.add(admin)
+        db.session.commit()
+    client.post('/login', data={'email': 'admin@shop.com', 'password': 'adminpass'}, follow_redirects=True)
+
+
+def aggregates(product_id):
+    p = db.session.get(Product, product_id)
+    db.session.refresh(p)
+    return p.rating_avg, p.rating_count, [p.rating_1, p.rating_2, p.rating_3, p.rating_4, p.rating_5]
+
+
+def test_moderation_keeps_aggregates_in_step(client, app):
+    with app.app_context():
+        buyer = User(email='buyer@example.com', password_hash=generate_password_hash('pw'), role='User')
+        db.session.add(buyer)
+        db.session.flush()
+        product = Product(name='Composter', price=50, status='Active', category='Soil Amendments', seller_id=buyer.id)
+        db.session.add(product)
+        db.session.flush()
+        pending = [Review(product_id=product.id, user_id=buyer.id, rating=r, approved=False) for r in (5, 4, 1)]
+        db.session.add_all(pending)
+        db.session.commit()
+        product_id, review_ids = product.id, [r.id for r in pending]
+
+    login_as_admin(client, app)
+    for rid in review_ids:
+        client.post(f'/admin/review/{rid}/approve')
+    client.post(f'/admin/review/{review_ids[0]}/approve')  # no double count
+    with app.app_context():
+        assert aggregates(product_id) == (pytest.approx(10 / 3), 3, [1, 0, 0, 1, 1])
+
+    client.post(f'/admin/review/{review_ids[2]}/reject')
+    client.post(f'/admin/review/{review_ids[1]}/delete')
+    with app.app_context():
+        assert aggregates(product_id) == (5.0, 1, [0, 0, 0, 0, 1])
+        incremental = aggregates(product_id)
+        review_service.rebuild()
+        assert aggregates(product_id) == incremental
+
+    page = client.get(f'/product/{product_id}').data.decode()
+    assert '5.0' in page and '1 review<' in page
+
+
+def test_concurrent_moderation_counts_a_review_once(app):
+    with app.app_context():
+        buyer = User(email='buyer@example.com', password_hash=generate_password_hash('pw'), role='User')
+        db.session.add(buyer)
+        db.session.flush()
+        product = Product(name='Seed Tray', price=9, status='Active', category='Tools', seller_id=buyer.id)
+        db.session.add(product)
+        db.session.flush()
+        review = Review(product_id=product.id, user_id=buyer.id, rating=4, approved=False)
+        db.session.add(review)
+        db.session.commit()
+
+        # another moderator approves it after this one loaded the page
+        db.session.execute(update(Review).where(Review.id == review.id).values(approved=True)
+                           .execution_options(synchronize_session=False))
+        review_service._adjust(product.id, 4, 1)
+        db.session.commit()
+        set_committed_value(review, 'approved', False)  # this moderator's stale copy
+
+        assert review_service.set_approved(review, True) is False
+        db.session.commit()
+        assert review.approved is True
+        assert aggregates(product.id) == (4.0, 1, [0, 0, 0, 1, 0])
+
+        assert review_service.set_approved(review, False) is True
+        db.session.commit()
+        assert aggregates(product.id) == (0.0, 0, [0, 0, 0, 0, 0])
+
+        # approved again, then another moderator rejects it while this one deletes it
+        assert review_service.set_approved(review, True) is True
+        db.session.commit()
+        db.session.execute(update(Review).where(Review.id == review.id).values(approved=False)
+                           .execution_options(synchronize_session=False))
+        review_service._adjust(product.id, 4, -1)
+        db.session.commit()
+        set_committed_value(review, 'approved', True)  # stale copy
+        review_service.delete(review)
+        db.session.commit()
+        assert db.session.get(Review, review.id) is None
+        assert aggregates(product.id) == (0.0, 0, [0, 0, 0, 0, 0])
+
+
+def test_reviews_are_keyset_paginated(client, app):
+    app.config['REVIEWS_PER_PAGE'] = 2
+    with app.app_context():
+        buyer = User(email='buyer@example.com', password_hash=generate_password_hash('pw'), role='User')
+        db.session.add(buyer)
+        db.session.flush()
+        product = Product(name='Sprayer', price=20, status='Active', category='Tools', seller_id=buyer.id)
+        db.session.add(product)
+        db.session.flush()
+        start = datetime(2024, 1, 1)
+        # two reviews share a timestamp so the id tie-break matters
+        stamps = [start, start + timedelta(days=1), start + timedelta(days=1), start + timedelta(days=2), start + timedelta(days=3)]
+        for i, ts in enumerate(stamps):
+            db.session.add(Review(product_id=product.id, user_id=buyer.id, rating=3, comment=f'review-{i}',
+                                  approved=True, created_at=ts))
+        db.session.commit()
+
+        seen, cursor = [], None
+        while True:
+            rows, cursor = review_service.page(product, cursor, per_page=2)
+            seen.append([r.comment for r in rows])
+            if cursor is None:
+                break
+        assert seen == [['review-4', 'review-3'], ['review-2', 'review-1'], ['review-0']]
+        product_id = product.id
+        first_page, second_cursor = review_service.page(product, None, per_page=2)
+
+    page = client.get(f'/product/{product_id}').data.decode()
+    assert 'review-4' in page and 'review-2' not in page
+    assert f'reviews_before={second_cursor}' in page
+    older = client.get(f'/product/{product_id}?reviews_before={second_cursor}').data.decode()
+    assert 'review-2' in older and 'review-4' not in older and 'Newest reviews' in older
+
+
+def test_rating_sort_in_shop_and_api(client, app):
+    with app.app_context():
+        buyer = User(email='buyer@example.com', password_hash=generate_password_hash('pw'), role='User')
+        db.session.add(buyer)
+        db.session.flush()
+        for name, ratings in (('Okay hoe', [3, 3]), ('Great rake', [5, 4]), ('Unrated spade', []), ('Loved shears', [5])):
+            p = Product(name=name, price=10, status='Active', category='Tools', seller_id=buyer.id)
+            db.session.add(p)
+            db.session.flush()
+            for r in ratings:
+                db.session.add(Review(product_id=p.id, user_id=buyer.id, rating=r, approved=True))
+        db.session.commit()
+        review_service.rebuild()
+
+    page = client.get('/shop?sort=rating').data.decode()
+    assert page.index('>Loved shears<') < page.index('>Great rake<') < page.index('>Okay hoe<') < page.index('>Unrated spade<')
+    items = client.get('/api/v1/products?sort=rating').get_json()['items']
+    assert [i['name'] for i in items] == ['Loved shears', 'Great rake', 'Okay hoe', 'Unrated spade']
+    assert items[1]['rating_avg'] == 4.5 and items[1]['rating_count'] == 2
+    assert '4★ &amp; up' in page
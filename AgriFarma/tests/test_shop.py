@@ -29,12 +29,12 @@ def test_admin_product_crud_and_listing(client, app):
     # create product (must include hidden fields for WTForms if any). ProductForm has CSRF disabled in tests due to WTF_CSRF_ENABLED False.
     res = client.post('/admin/shop', data={
         'name': 'Tractor', 'description': 'Heavy duty', 'price': '1200.00',
-        'category': 'equipment', 'images': '', 'status': 'Active', 'featured': 'true'
+        'category': 'Machinery', 'images': '', 'status': 'Active', 'featured': 'true'
     }, follow_redirects=True)
     assert b'Product created' in res.data, res.data[:400]
 
     # shop list shows product
-    res2 = client.get('/shop?category=equipment')
+    res2 = client.get('/shop?category=Machinery')
     assert b'Tractor' in res2.data
 
 
@@ -43,7 +43,7 @@ def test_cart_and_checkout_flow(client, app):
     login_as_admin(client, app)
     client.post('/admin/shop', data={
         'name': 'Seeder', 'description': 'Handy', 'price': '100.00',
-        'category': 'equipment', 'images': '', 'status': 'Active', 'featured': 'false'
+        'category': 'Machinery', 'images': '', 'status': 'Active', 'featured': 'false', 'inventory': '10'
     }, follow_redirects=True)
 
     # buyer adds to cart
@@ -66,7 +66,7 @@ def test_reviews_and_moderation(client, app):
     login_as_admin(client, app)
     client.post('/admin/shop', data={
         'name': 'Composter', 'description': 'Organic waste', 'price': '50.00',
-        'category': 'bio', 'images': '', 'status': 'Active', 'featured': 'false'
+        'category': 'Soil Amendments', 'images': '', 'status': 'Active', 'featured': 'false'
     }, follow_redirects=True)
 
     # buyer posts review
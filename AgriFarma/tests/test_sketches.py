@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta, UTC
+
+from werkzeug.security import generate_password_hash
+from agrifarma.extensions import db
+from agrifarma.models.ecommerce import Product
+from agrifarma.models.sketch import SketchDay
+from agrifarma.models.user import User
+from agrifarma.services import sketches
+
+
+def test_sketches_estimate_merge_and_round_trip():
+    # zipf-like stream: term i appears 200 // (i + 1) times
+    stream = [f'term{i}' for i in range(300) for _ in range(200 // (i + 1))]
+    whole = sketches.TopK(k=20)
+    halves = sketches.TopK(k=20), sketches.TopK(k=20)
+    for n, term in enumerate(stream):
+        whole.add(term)
+        halves[n % 2].add(term)
+    merged, other = halves
+    merged.merge(other)
+    assert (merged.cms.table == whole.cms.table).all()
+    assert [t for t, _ in merged.top(3)] == [t for t, _ in whole.top(3)] == ['term0', 'term1', 'term2']
+    assert all(whole.cms.estimate(f'term{i}') >= 200 // (i + 1) for i in range(300))
+    assert whole.cms.estimate('term0') <= 200 + 0.01 * len(stream)
+    restored = sketches.loads('searches', sketches.dumps(whole))
+    assert restored.top(5) == whole.top(5) and (restored.cms.table == whole.cms.table).all()
+
+    a, b = sketches.HyperLogLog(), sketches.HyperLogLog()
+    for i in range(20000):
+        a.add(f'visitor{i}')
+    for i in range(10000, 30000):
+        b.add(f'visitor{i}')
+    assert abs(a.count() - 20000) < 20000 * 0.05
+    a.merge(b)
+    assert abs(a.count() - 30000) < 30000 * 0.05
+    assert sketches.loads('visitors', sketches.dumps(a)).count() == a.count()
+    assert len(sketches.dumps(a)) < 5000
+
+
+def test_searches_and_visits_feed_the_dashboard(client, app):
+    with app.app_context():
+        admin = User(email='admin@example.com', password_hash=generate_password_hash('adminpass'), role='Admin')
+        db.session.add(admin)
+        db.session.flush()
+        product = Product(name='Seed Drill', price=90, inventory=2, status='Active', category='Tools', seller_id=admin.id)
+        db.session.add(product)
+        db.session.commit()
+        product_id = product.id
+
+    for q in ('Tomato', '  tomato ', 'TOMATO blight', 'wheat', 'x'):
+        client.get('/search/', query_string={'q': q})
+    client.get('/search/autocomplete', query_string={'q': 'tom'})
+    client.get(f'/product/{product_id}', headers={'User-Agent': 'other-browser'})
+    with app.app_context():
+        assert sketches.flush() == 4  # searches, autocomplete, products, visitors for today
+        # a second worker's sketch for the same day merges into the stored row
+        sketches.record_search('searches', 'Wheat')
+        sketches.record('visitors', 'anon:10.0.0.9|bot')
+        assert sketches.flush() == 2
+        assert SketchDay.query.count() == 4
+        today = datetime.now(UTC).date()
+        end = today + timedelta(days=1)
+        assert sketches.top('searches', today, end, 3) == [('tomato', 2), ('wheat', 2), ('tomato blight', 1)]
+        days, total = sketches.distinct_by_day('visitors', end - timedelta(days=7), end)
+        assert len(days) == 7 and days[-1] == (today, 3) and total == 3
+
+    client.post('/login', data={'email': 'admin@example.com', 'password': 'adminpass'}, follow_redirects=True)
+    page = client.get('/admin/').data.decode()
+    assert 'Top Searches' in page and 'tomato blight' in page and 'Seed Drill' in page
@@ -0,0 +1,86 @@
+from datetime import date, datetime, timedelta, UTC
+
+from werkzeug.security import generate_password_hash
+from agrifarma.extensions import db
+from agrifarma.models.blog import BlogPost
+from agrifarma.models.cohort import FunnelWeek
+from agrifarma.models.ecommerce import Product
+from agrifarma.models.forum import Thread
+from agrifarma.models.tracking import EventDailyCount, TrackedEvent
+from agrifarma.models.user import User
+from agrifarma.services import tracking
+
+
+def seed(app):
+    with app.app_context():
+        author = User(email='author@example.com', password_hash=generate_password_hash('pw'), role='User')
+        db.session.add(author)
+        db.session.flush()
+        product = Product(name='Rake', price=12, inventory=3, status='Active', category='Tools', seller_id=author.id)
+        post = BlogPost(title='Mulching', content='Cover the soil', category='Techniques', author_id=author.id, approved=True)
+        thread = Thread(title='Best cover crop?', author_id=author.id)
+        db.session.add_all([product, post, thread])
+        db.session.commit()
+        return product.id, post.id, thread.id
+
+
+def test_buffer_overwrites_oldest_when_full():
+    buffer = tracking.EventBuffer(3)
+    for i in range(5):
+        buffer.append({'entity_id': i})
+    assert len(buffer) == 3 and buffer.dropped == 2 and buffer.accepted == 5
+    assert [e['entity_id'] for e in buffer.drain(10)] == [2, 3, 4]
+    assert buffer.drain(10) == []
+
+
+def test_views_are_buffered_flushed_and_counted(client, app):
+    app.config['TRACKING_BATCH_SIZE'] = 2
+    product_id, post_id, thread_id = seed(app)
+
+    for _ in range(3):
+        client.get(f'/product/{product_id}')
+    client.get(f'/blog/post/{post_id}')
+    client.get(f'/forum/thread/{thread_id}')
+    client.get('/shop')
+    with app.app_context():
+        assert TrackedEvent.query.count() == 0  # nothing written by the requests themselves
+        assert tracking.get_tracker().stats()['pending'] == 6
+        assert tracking.flush() == 6  # three batches of two
+        assert tracking.view_count('product', product_id) == 3
+        assert tracking.view_count('blog', post_id) == 1
+        assert tracking.view_count('thread', thread_id) == 1
+        assert tracking.view_count('impression', product_id) == 1
+        assert FunnelWeek.query.filter_by(stage='view').one().events == 3
+
+    assert '3 views' in client.get(f'/product/{product_id}').data.decode()
+    assert '1 view' in client.get(f'/blog/post/{post_id}').data.decode()
+    assert '1 view' in client.get(f'/forum/thread/{thread_id}').data.decode()
+    with app.app_context():
+        tracking.flush()
+        assert tracking.view_count('product', product_id) == 4
+        today = datetime.now(UTC).date()
+        assert tracking.top('product', 5, today, today + timedelta(days=1)) == [(product_id, 4)]
+        assert tracking.top('blog') == [(post_id, 2)]
+
+
+def test_rollup_counts_each_event_once(app):
+    product_id, _, _ = seed(app)
+    with app.app_context():
+        old = datetime(2024, 1, 1, 9)
+        db.session.add_all([TrackedEvent(kind='product', entity_id=product_id, created_at=old) for _ in range(2)])
+        db.session.add(TrackedEvent(kind='product', entity_id=product_id, created_at=old + timedelta(days=1)))
+        db.session.commit()
+        with db.engine.begin() as conn:
+            assert tracking.rollup(conn) == 3
+        with db.engine.begin() as conn:
+            assert tracking.rollup(conn) == 0  # a second worker finds nothing above the watermark
+        days = {r.day: r.count for r in EventDailyCount.query.filter_by(kind='product')}
+        assert days == {date(2024, 1, 1): 2, date(2024, 1, 2): 1}
+        assert tracking.view_count('product', product_id) == 3
+
+        # rolled-up raw rows can go; the newest stays so ids are never reused
+        assert tracking.prune(days=30) == 2
+        assert TrackedEvent.query.count() == 1
+        tracking.track('product', product_id)
+        tracking.flush()
+        assert tracking.view_count('product', product_id) == 4
@@ -0,0 +1,109 @@
+from agrifarma.extensions import db
+from agrifarma.models.forum import Category, Thread, Post
+from agrifarma.models.likes import PostLike
+from agrifarma.models.profile import UserStats
+from agrifarma.models.user import User
+from agrifarma.services import user_stats
+
+
+def register_and_login(client, email):
+    data = {
+        'name': 'Stats User',
+        'email': email,
+        'password': 'password123',
+        'confirm_password': 'password123',
+        'mobile': '',
+        'city': '',
+        'state': '',
+        'country': '',
+        'profession': 'farmer',
+        'expertise_level': 'beginner',
+    }
+    client.post('/register', data=data, follow_redirects=True)
+
+
+def user_id(app, email):
+    with app.app_context():
+        return User.query.filter_by(email=email).first().id
+
+
+def snapshot(app, uid):
+    with app.app_context():
+        row = db.session.get(UserStats, uid)
+        return {c: getattr(row, c) for c in user_stats.COUNTERS}, [(a['kind'], a['title']) for a in row.latest_activity]
+
+
+def test_counters_follow_writes_and_match_rebuild(client, app, runner):
+    with app.app_context():
+        db.session.add(Category(name='General'))
+        db.session.commit()
+    register_and_login(client, 'author@example.com')
+    author = user_id(app, 'author@example.com')
+    client.post('/forum/new', data={'title': 'Soil pH', 'category_id': 1, 'content': 'First'})
+    client.post('/forum/thread/1', data={'content': 'Follow-up'})
+    client.post('/blog/new', data={'title': 'Drip tips', 'content': 'Drip lines save water.', 'category': 'Techniques', 'tags': 'water'})
+    client.post('/blog/post/1', data={'content': 'Nice write-up!'})
+    client.get('/logout')
+
+    register_and_login(client, 'fan@example.com')
+    with app.app_context():
+        post_ids = [p.id for p in Post.query.order_by(Post.id)]
+    for pid in post_ids:
+        client.post(f'/forum/post/{pid}/like')
+    client.post(f'/forum/post/{post_ids[0]}/like')  # unlike one
+
+    counts, latest = snapshot(app, author)
+    assert counts == {'posts_count': 2, 'threads_count': 1, 'likes_received': 1,
+                      'blog_posts_count': 1, 'comments_count': 1, 'orders_count': 0, 'unread_messages': 0}
+    assert latest == [('comment', 'Drip tips'), ('blog', 'Drip tips'), ('post', 'Soil pH'), ('thread', 'Soil pH')]
+
+    # Rebuilding from source tables gives the same answer
+    assert runner.invoke(args=['stats', 'rebuild']).exit_code == 0
+    assert snapshot(app, author) == (counts, latest)
+    with app.app_context():
+        # later blog activity does not push the forum posts (opening post included) out
+        assert [p.content for p in db.session.get(User, author).profile.latest_posts] == ['Follow-up', 'First']
+
+    res = client.get(f'/profile/{author}')
+    assert b'Drip tips' in res.data and b'Recent Activity' in res.data
+
+
+def test_thread_delete_rolls_back_counts(client, app):
+    with app.app_context():
+        db.session.add(Category(name='General'))
+        db.session.commit()
+    register_and_login(client, 'owner@example.com')
+    owner = user_id(app, 'owner@example.com')
+    client.post('/forum/new', data={'title': 'Temporary', 'category_id': 1, 'content': 'Opening post'})
+    client.post('/forum/thread/1', data={'content': 'A reply'})
+    assert snapshot(app, owner)[0]['posts_count'] == 2
+    client.post('/forum/thread/1/delete')
+    counts, latest = snapshot(app, owner)
+    assert counts['posts_count'] == 0 and counts['threads_count'] == 0
+    assert latest == []
+
+
+def test_missing_row_is_computed_without_writing(app):
+    with app.app_context():
+        u = User(email='legacy@example.com', password_hash='x', role='User')
+        db.session.add(u)
+        db.session.flush()
+        t = Thread(title='Old thread', author_id=u.id)
+        db.session.add(t)
+        db.session.flush()
+        db.session.add_all([Post(thread_id=t.id, author_id=u.id, content='a'),
+                            Post(thread_id=t.id, author_id=u.id, content='b')])
+        db.session.flush()
+        db.session.add(PostLike(post_id=t.posts[0].id, user_id=u.id))
+        db.session.commit()
+        assert db.session.get(UserStats, u.id) is None
+        stats = user_stats.stats_for(u.id)
+        assert (stats.posts_count, stats.threads_count, stats.likes_received) == (2, 1, 1)
+        assert [a['kind'] for a in stats.latest_activity] == ['post', 'thread']
+        # a read during rendering must not touch the caller's session
+        assert not (db.session.new or db.session.dirty)
+        assert db.session.get(UserStats, u.id) is None
+        # the user's next write stores the row
+        user_stats.touch(u.id)
+        db.session.commit()
+        assert db.session.get(UserStats, u.id).posts_count == 2
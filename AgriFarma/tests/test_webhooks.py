@@ -0,0 +1,145 @@
+import hashlib
+import hmac
+import json
+import time
+from datetime import timedelta
+
+import pytest
+from werkzeug.security import generate_password_hash
+from agrifarma.extensions import db
+from agrifarma.models.user import User
+from agrifarma.models.ecommerce import Order
+from agrifarma.models.webhook import WebhookEvent
+from agrifarma.services import webhooks
+
+
+@pytest.fixture(autouse=True)
+def mock_secret(app):
+    app.config['MOCK_WEBHOOK_SECRET'] = 'test'
+
+
+def make_order(app, payment_status='Pending', txn=None):
+    with app.app_context():
+        user = User.query.filter_by(email='hook@example.com').first()
+        if not user:
+            user = User(email='hook@example.com', password_hash=generate_password_hash('pw'), role='User')
+            db.session.add(user)
+            db.session.flush()
+        o = Order(user_id=user.id, shipping_address='x', payment_method='card',
+                  payment_status=payment_status, payment_transaction_id=txn, status='Pending')
+        db.session.add(o)
+        db.session.commit()
+        return o.id
+
+
+def post_mock(client, event, secret='test'):
+    body = json.dumps(event).encode()
+    sig = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return client.post('/webhooks/mock', data=body, content_type='application/json',
+                       headers={'X-Webhook-Signature': sig})
+
+
+def test_ingest_verifies_and_dedupes(client, app):
+    oid = make_order(app)
+    event = {'id': 'evt_1', 'type': 'payment.succeeded', 'order_id': oid}
+    assert post_mock(client, event).get_json() == {'status': 'queued'}
+    assert post_mock(client, event).get_json() == {'status': 'duplicate'}
+    assert post_mock(client, event, secret='wrong').status_code == 400
+    with app.app_context():
+        assert WebhookEvent.query.count() == 1
+        # nothing applied until the worker runs
+        assert db.session.get(Order, oid).payment_status == 'Pending'
+
+
+def test_worker_applies_transitions_in_order(client, app, runner):
+    paid = make_order(app)
+    by_txn = make_order(app, txn='MOCK_X1')
+    refunded = make_order(app, payment_status='Paid')
+    post_mock(client, {'id': 'e1', 'type': 'payment.succeeded', 'order_id': paid})
+    post_mock(client, {'id': 'e2', 'type': 'payment.failed', 'order_id': paid})  # late failure after success: ignored
+    post_mock(client, {'id': 'e3', 'type': 'payment.failed', 'transaction_id': 'MOCK_X1'})
+    post_mock(client, {'id': 'e4', 'type': 'payment.refunded', 'order_id': refunded})
+    post_mock(client, {'id': 'e5', 'type': 'payment.succeeded', 'order_id': 9999})
+
+    result = runner.invoke(args=['webhooks', 'work', '--once'])
+    assert result.exit_code == 0, result.output
+    assert 'processed=5 applied=3 ignored=1 errors=1' in result.output
+    with app.app_context():
+        assert db.session.get(Order, paid).payment_status == 'Paid'
+        assert db.session.get(Order, paid).status == 'Confirmed'
+        assert db.session.get(Order, by_txn).payment_status == 'Failed'
+        assert db.session.get(Order, refunded).payment_status == 'Refunded'
+        assert webhooks.lag_metrics()['pending'] == 0
+
+
+def test_stripe_signature(client, app):
+    app.config['PAYMENT_STRIPE_CONFIG'] = {'webhook_secret': 'whsec_test'}
+    oid = make_order(app)
+    body = json.dumps({'id': 'evt_s1', 'type': 'payment_intent.succeeded',
+                       'data': {'object': {'id': 'pi_1', 'metadata': {'order_id': str(oid)}}}}).encode()
+    ts = str(int(time.time()))
+    sig = hmac.new(b'whsec_test', ts.encode() + b'.' + body, hashlib.sha256).hexdigest()
+    res = client.post('/webhooks/stripe', data=body, content_type='application/json',
+                      headers={'Stripe-Signature': f't={ts},v1={sig}'})
+    assert res.status_code == 200
+    res = client.post('/webhooks/stripe', data=body, content_type='application/json',
+                      headers={'Stripe-Signature': f't={ts},v1={"0" * 64}'})
+    assert res.status_code == 400
+    with app.app_context():
+        ev = WebhookEvent.query.one()
+        assert (ev.order_id, ev.payment_status) == (oid, 'Paid')
+
+
+def test_paid_after_failure_retakes_stock_and_stores_transaction(client, app, runner):
+    from agrifarma.models.ecommerce import OrderItem, Product
+    from agrifarma.services import inventory
+    oid = make_order(app)
+    with app.app_context():
+        user = User.query.filter_by(email='hook@example.com').one()
+        hoe = Product(name='Hoe', price=20, seller_id=user.id, status='Active', inventory=4)
+        db.session.add(hoe)
+        db.session.flush()
+        db.session.add(OrderItem(order_id=oid, product_id=hoe.id, quantity=3, unit_price=20))
+        assert inventory.reserve_order_stock(oid, [(hoe.id, 3)]).success
+        db.session.commit()
+        hoe_id = hoe.id
+    post_mock(client, {'id': 'f1', 'type': 'payment.failed', 'order_id': oid, 'transaction_id': 'MOCK_T1'})
+    runner.invoke(args=['webhooks', 'work', '--once'])
+    with app.app_context():
+        order = db.session.get(Order, oid)
+        assert (order.payment_status, order.status, order.payment_transaction_id) == ('Failed', 'Cancelled', 'MOCK_T1')
+        assert db.session.get(Product, hoe_id).inventory == 4
+    post_mock(client, {'id': 'p1', 'type': 'payment.succeeded', 'order_id': oid, 'transaction_id': 'MOCK_T2'})
+    runner.invoke(args=['webhooks', 'work', '--once'])
+    with app.app_context():
+        order = db.session.get(Order, oid)
+        assert (order.payment_status, order.status, order.payment_transaction_id) == ('Paid', 'Confirmed', 'MOCK_T2')
+        assert db.session.get(Product, hoe_id).inventory == 1
+
+
+def test_mock_webhooks_need_their_own_secret(client, app):
+    oid = make_order(app)
+    event = {'id': 'evt_forged', 'type': 'payment.succeeded', 'order_id': oid}
+    app.config['MOCK_WEBHOOK_SECRET'] = ''
+    assert post_mock(client, event, secret='').status_code == 404
+    assert post_mock(client, event, secret='test').status_code == 404  # SECRET_KEY no longer signs webhooks
+    app.config['MOCK_WEBHOOK_SECRET'] = 'hook-secret'
+    assert post_mock(client, event, secret='test').status_code == 400
+    assert post_mock(client, event, secret='hook-secret').get_json() == {'status': 'queued'}
+
+
+def test_claimed_events_are_applied_by_one_worker(client, app):
+    oid = make_order(app)
+    post_mock(client, {'id': 'c1', 'type': 'payment.succeeded', 'order_id': oid})
+    with app.app_context():
+        assert [e.event_id for e in webhooks._claim(10)] == ['c1']  # another worker holds the batch
+        assert webhooks.process_pending()['processed'] == 0
+        assert db.session.get(Order, oid).payment_status == 'Pending'
+
+        # a claim abandoned by a crashed worker is taken over once it times out
+        event = WebhookEvent.query.one()
+        event.processed_at -= webhooks.CLAIM_TIMEOUT + timedelta(seconds=1)
+        db.session.commit()
+        assert webhooks.process_pending()['applied'] == 1
+        assert db.session.get(Order, oid).payment_status == 'Paid'
+        assert WebhookEvent.query.one().status == 'applied'